@@ -0,0 +1,432 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+actualizacion_precios.py - ACTUALIZACIÓN MASIVA DE COSTOS Y PRECIOS (LISTAS 1-5)
+═══════════════════════════════════════════════════════════════════════════════
+Cuando un proveedor aumenta, en vez de editar producto por producto:
+
+    1. SELECCIÓN   categoría, prefijo de código y/o lista explícita de
+                   ids / códigos (combos y productos sin costo quedan afuera)
+    2. CAMBIO      % sobre el costo, y por lista 1-5 un margen nuevo
+                   (fijar) o puntos a sumar/restar (ajustar)
+    3. REDONDEO    a un múltiplo (0.01, 1, 10, 50...) hacia arriba, abajo o
+                   al más cercano
+
+    POST /api/precios_masivos/vista_previa   cantidad, min/máx/promedio de la
+                                             variación por lista y una muestra
+    POST /api/precios_masivos/aplicar        mismo pedido, se ejecuta
+    POST /api/precios_masivos/programar      mismo pedido + vigente_desde: los
+                                             precios calculados quedan en
+                                             precio_programado (ver
+                                             precios_programados.py)
+
+Los valores nuevos se calculan en SQL con las mismas expresiones en la
+vista previa y en la aplicación, así que lo que se ve es lo que se graba.
+La aplicación es un único UPDATE por conjuntos dentro de una transacción,
+seguido de invalidar_catalogo().
+
+    precio_N = redondeo( costo_nuevo * (1 + margen_N / 100) )
+
+Las listas 2-5 sin margen propio siguen sin precio propio (usan la lista 1).
+La lista 1 con margen 0 o NULL usa MARGEN_POR_DEFECTO, la misma regla que
+/actualizar_costos_productos (COALESCE(NULLIF(margen, 0), 30)).
+═══════════════════════════════════════════════════════════════════════════════
+"""
+
+from flask import Blueprint, jsonify, request, session, render_template, redirect, url_for
+from sqlalchemy import text, bindparam
+from datetime import datetime
+import time
+
+import catalogo_cache
+from catalogo_cache import invalidar_catalogo
+from precios_programados import (asegurar_tablas_precios_programados, marcar_carteles, leer_vigencia)
+
+# Blueprint para las rutas de actualización masiva
+actualizacion_precios_bp = Blueprint('actualizacion_precios', __name__)
+
+# Variable global para db (se inicializa en init_actualizacion_precios)
+db = None
+
+LISTAS = (1, 2, 3, 4, 5)
+MARGEN_MAXIMO = 999.99          # producto.margen es DECIMAL(5,2)
+MARGEN_POR_DEFECTO = 30         # lista 1 con margen 0/NULL (como /actualizar_costos_productos)
+MUESTRA_VISTA_PREVIA = 50
+DIRECCIONES_REDONDEO = ('cercano', 'arriba', 'abajo')
+
+
+def init_actualizacion_precios(app, database):
+    """
+    Inicializa la actualización masiva de precios
+
+    Uso en app.py:
+        from actualizacion_precios import init_actualizacion_precios
+        init_actualizacion_precios(app, db)
+    """
+    global db
+    db = database
+    app.register_blueprint(actualizacion_precios_bp)
+    print("✅ Actualización masiva de precios inicializada")
+
+
+class PedidoInvalido(ValueError):
+    """Datos del pedido de actualización incorrectos (respuesta 400)"""
+
+
+# ═══════════════════════════════════════════════════════════════════════════════
+# ARMADO DEL SQL
+# ═══════════════════════════════════════════════════════════════════════════════
+
+def _columnas(lista):
+    """(columna de margen, columna de precio) de una lista"""
+    return ('margen', 'precio') if lista == 1 else (f'margen{lista}', f'precio{lista}')
+
+
+def _margen_actual(lista):
+    """Margen vigente de la fila 'p' en una lista (en la lista 1, 0/NULL es el margen por defecto)"""
+    columna_margen, _ = _columnas(lista)
+    if lista == 1:
+        return f'COALESCE(NULLIF(p.{columna_margen}, 0), {MARGEN_POR_DEFECTO})'
+    return f'p.{columna_margen}'
+
+
+def _numero(valor, nombre):
+    try:
+        return float(valor)
+    except (TypeError, ValueError):
+        raise PedidoInvalido(f'{nombre} inválido')
+
+
+def _seleccion(datos):
+    """WHERE de los productos alcanzados y sus parámetros"""
+    seleccion = datos.get('seleccion') or {}
+    condiciones = ['p.es_combo = 0', 'p.costo > 0']
+    params = {}
+    expandidos = []
+
+    if not seleccion.get('incluir_inactivos'):
+        condiciones.append('p.activo = 1')
+
+    categoria = (seleccion.get('categoria') or '').strip()
+    if categoria:
+        condiciones.append('p.categoria = :categoria')
+        params['categoria'] = categoria
+
+    prefijo = (seleccion.get('prefijo_codigo') or '').strip().upper()
+    if prefijo:
+        prefijo = prefijo.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+        condiciones.append('p.codigo LIKE :prefijo')
+        params['prefijo'] = f'{prefijo}%'
+
+    ids = [int(i) for i in seleccion.get('ids') or [] if str(i).strip().isdigit()]
+    if ids:
+        condiciones.append('p.id IN :ids')
+        params['ids'] = ids
+        expandidos.append('ids')
+
+    codigos = [str(c).strip().upper() for c in seleccion.get('codigos') or [] if str(c).strip()]
+    if codigos:
+        condiciones.append('p.codigo IN :codigos')
+        params['codigos'] = codigos
+        expandidos.append('codigos')
+
+    if not (categoria or prefijo or ids or codigos or seleccion.get('todos')):
+        raise PedidoInvalido('Elegí una categoría, un prefijo de código o una lista de productos')
+
+    return ' AND '.join(condiciones), params, expandidos
+
+
+def _redondeo(expresion, datos, params):
+    """Expresión SQL que redondea 'expresion' al múltiplo pedido"""
+    redondeo = datos.get('redondeo') or {}
+    multiplo = _numero(redondeo.get('multiplo', 0.01), 'Múltiplo de redondeo')
+    direccion = redondeo.get('direccion', 'cercano')
+    if multiplo <= 0:
+        raise PedidoInvalido('El múltiplo de redondeo debe ser mayor a 0')
+    if direccion not in DIRECCIONES_REDONDEO:
+        raise PedidoInvalido('Dirección de redondeo inválida')
+
+    params['multiplo'] = multiplo
+    funcion = {'cercano': 'ROUND', 'arriba': 'CEILING', 'abajo': 'FLOOR'}[direccion]
+    return f'ROUND({funcion}(({expresion}) / :multiplo) * :multiplo, 2)'
+
+
+def armar_cambios(datos):
+    """
+    Traduce el pedido a expresiones SQL sobre la fila 'p' (valores originales).
+
+    Returns:
+        (where, params, expandidos, costo_nuevo, {lista: (margen_nuevo, precio_nuevo)})
+    """
+    where, params, expandidos = _seleccion(datos)
+
+    porcentaje_costo = _numero(datos.get('costo_porcentaje') or 0, 'Porcentaje de costo')
+    if porcentaje_costo <= -100:
+        raise PedidoInvalido('El porcentaje de costo debe ser mayor a -100')
+    if porcentaje_costo:
+        costo_nuevo = 'ROUND(p.costo * :factor_costo, 2)'
+        params['factor_costo'] = 1 + porcentaje_costo / 100
+    else:
+        costo_nuevo = 'p.costo'
+
+    margenes = datos.get('margenes') or {}       # {lista: margen nuevo}
+    ajustes = datos.get('ajuste_margenes') or {}  # {lista: puntos a sumar}
+    try:
+        listas = [int(l) for l in datos.get('listas') or LISTAS]
+    except (TypeError, ValueError):
+        raise PedidoInvalido('Las listas válidas son 1 a 5')
+    if any(l not in LISTAS for l in listas):
+        raise PedidoInvalido('Las listas válidas son 1 a 5')
+
+    cambios = {}
+    for lista in listas:
+        _, columna_precio = _columnas(lista)
+        margen_actual = _margen_actual(lista)
+        fijo = margenes.get(str(lista), margenes.get(lista))
+        ajuste = ajustes.get(str(lista), ajustes.get(lista))
+
+        if fijo not in (None, ''):
+            fijo = _numero(fijo, f'Margen lista {lista}')
+            if not 0 <= fijo <= MARGEN_MAXIMO:
+                raise PedidoInvalido(f'El margen de la lista {lista} debe estar entre 0 y {MARGEN_MAXIMO}')
+            margen_nuevo = f':margen_{lista}'
+            params[f'margen_{lista}'] = fijo
+        elif ajuste not in (None, '') and _numero(ajuste, f'Ajuste lista {lista}'):
+            # Sin margen propio (NULL) la lista sigue usando la lista 1
+            margen_nuevo = f'LEAST(GREATEST({margen_actual} + :ajuste_{lista}, 0), {MARGEN_MAXIMO})'
+            params[f'ajuste_{lista}'] = float(ajuste)
+        elif porcentaje_costo:
+            margen_nuevo = margen_actual
+        else:
+            continue  # nada cambia en esta lista
+
+        precio_nuevo = (
+            f'CASE WHEN ({margen_nuevo}) IS NULL THEN p.{columna_precio} ELSE '
+            + _redondeo(f'{costo_nuevo} * (1 + ({margen_nuevo}) / 100)', datos, params)
+            + ' END'
+        )
+        cambios[lista] = (margen_nuevo, precio_nuevo)
+
+    if not cambios:
+        raise PedidoInvalido('No hay cambios para aplicar: indicá un % de costo o un margen')
+
+    return where, params, expandidos, costo_nuevo, cambios
+
+
+def _consulta(sql, expandidos):
+    consulta = text(sql)
+    for nombre in expandidos:
+        consulta = consulta.bindparams(bindparam(nombre, expanding=True))
+    return consulta
+
+
+# ═══════════════════════════════════════════════════════════════════════════════
+# VISTA PREVIA Y APLICACIÓN
+# ═══════════════════════════════════════════════════════════════════════════════
+
+def vista_previa(datos):
+    """Resumen por lista (cantidad y variación) y una muestra de productos"""
+    where, params, expandidos, costo_nuevo, cambios = armar_cambios(datos)
+
+    agregados = ['COUNT(*) AS cantidad',
+                 f'SUM(({costo_nuevo}) <> p.costo) AS cambia_costo']
+    for lista, (_, precio_nuevo) in cambios.items():
+        _, columna_precio = _columnas(lista)
+        diferencia = f'(({precio_nuevo}) - p.{columna_precio})'
+        porcentaje = f'({diferencia} * 100 / NULLIF(p.{columna_precio}, 0))'
+        agregados += [
+            f'SUM(COALESCE(({precio_nuevo}) <> p.{columna_precio}, 0)) AS cambian_{lista}',
+            f'MIN({diferencia}) AS min_{lista}', f'MAX({diferencia}) AS max_{lista}',
+            f'MIN({porcentaje}) AS min_pct_{lista}', f'MAX({porcentaje}) AS max_pct_{lista}',
+            f'AVG({porcentaje}) AS prom_pct_{lista}'
+        ]
+
+    resumen = db.session.execute(_consulta(
+        f"SELECT {', '.join(agregados)} FROM producto p WHERE {where}", expandidos
+    ), params).mappings().one()
+
+    columnas_muestra = ['p.id', 'p.codigo', 'p.nombre', 'p.costo', f'{costo_nuevo} AS costo_nuevo']
+    for lista, (margen_nuevo, precio_nuevo) in cambios.items():
+        columna_margen, columna_precio = _columnas(lista)
+        columnas_muestra += [f'p.{columna_margen} AS margen_{lista}', f'({margen_nuevo}) AS margen_nuevo_{lista}',
+                             f'p.{columna_precio} AS precio_{lista}', f'({precio_nuevo}) AS precio_nuevo_{lista}']
+
+    muestra = db.session.execute(_consulta(
+        f"SELECT {', '.join(columnas_muestra)} FROM producto p WHERE {where} ORDER BY p.codigo LIMIT :limite",
+        expandidos
+    ), dict(params, limite=MUESTRA_VISTA_PREVIA)).mappings().all()
+    db.session.commit()  # cerrar la transacción de lectura
+
+    def _float(valor):
+        return round(float(valor), 2) if valor is not None else None
+
+    return {
+        'cantidad': int(resumen['cantidad'] or 0),
+        'cambia_costo': int(resumen['cambia_costo'] or 0),
+        'listas': {
+            lista: {
+                'cambian': int(resumen[f'cambian_{lista}'] or 0),
+                'variacion_min': _float(resumen[f'min_{lista}']),
+                'variacion_max': _float(resumen[f'max_{lista}']),
+                'porcentaje_min': _float(resumen[f'min_pct_{lista}']),
+                'porcentaje_max': _float(resumen[f'max_pct_{lista}']),
+                'porcentaje_promedio': _float(resumen[f'prom_pct_{lista}'])
+            } for lista in cambios
+        },
+        'muestra': [{clave: (_float(valor) if clave not in ('id', 'codigo', 'nombre') else valor)
+                     for clave, valor in fila.items()} for fila in muestra]
+    }
+
+
+def aplicar(datos):
+    """
+    Aplica el cambio con un único UPDATE (en una transacción) e invalida el
+    catálogo. Devuelve la cantidad de productos actualizados.
+    """
+    where, params, expandidos, costo_nuevo, cambios = armar_cambios(datos)
+
+    # Bloquear las filas alcanzadas y guardar sus ids para invalidar el cache
+    ids = [row.id for row in db.session.execute(_consulta(
+        f"SELECT p.id FROM producto p WHERE {where} FOR UPDATE", expandidos
+    ), params)]
+    if not ids:
+        db.session.rollback()
+        return 0
+
+    # MySQL asigna de izquierda a derecha y cada asignación ve las anteriores:
+    # precios primero (calculados sobre costo y márgenes originales), después
+    # márgenes y por último el costo.
+    asignaciones = []
+    for lista, (_, precio_nuevo) in cambios.items():
+        asignaciones.append(f'p.{_columnas(lista)[1]} = {precio_nuevo}')
+    for lista, (margen_nuevo, _) in cambios.items():
+        asignaciones.append(f'p.{_columnas(lista)[0]} = {margen_nuevo}')
+    asignaciones.append(f'p.costo = {costo_nuevo}')
+    asignaciones.append('p.fecha_modificacion = NOW()')
+
+    actualizados = db.session.execute(_consulta(
+        f"UPDATE producto p SET {', '.join(asignaciones)} WHERE {where}", expandidos
+    ), params).rowcount
+    if 1 in cambios:
+        marcar_carteles(ids, 'precios_masivos')
+    db.session.commit()
+
+    if len(ids) > catalogo_cache.MAX_CAMBIOS_INCREMENTALES:
+        invalidar_catalogo()
+    else:
+        invalidar_catalogo(ids=ids)
+    return actualizados
+
+
+def programar(datos, vigente_desde, usuario_id=None):
+    """
+    Calcula los precios nuevos con las mismas expresiones que aplicar() y los
+    deja en precio_programado (un INSERT ... SELECT) en vez de grabarlos en
+    producto. Devuelve la cantidad de filas programadas (producto × lista).
+    """
+    where, params, expandidos, costo_nuevo, cambios = armar_cambios(datos)
+    asegurar_tablas_precios_programados()
+
+    # Sin cambio de costo no se programa costo: no pisar uno que cambie en el medio
+    costo = costo_nuevo if costo_nuevo != 'p.costo' else 'NULL'
+    selects = [
+        f"SELECT p.id, {lista}, {precio_nuevo}, {margen_nuevo}, {costo}, :vigente_desde, :usuario_id "
+        f"FROM producto p WHERE {where} AND ({margen_nuevo}) IS NOT NULL"
+        for lista, (margen_nuevo, precio_nuevo) in cambios.items()
+    ]
+    programados = db.session.execute(_consulta(
+        "INSERT INTO precio_programado (producto_id, lista, precio, margen, costo, vigente_desde, usuario_id) "
+        + ' UNION ALL '.join(selects), expandidos
+    ), dict(params, vigente_desde=vigente_desde, usuario_id=usuario_id)).rowcount
+    db.session.commit()
+    return programados
+
+
+# ═══════════════════════════════════════════════════════════════════════════════
+# ENDPOINTS
+# ═══════════════════════════════════════════════════════════════════════════════
+
+@actualizacion_precios_bp.route('/precios_masivos')
+def vista_precios_masivos():
+    """Pantalla de actualización masiva de precios"""
+    if 'user_id' not in session:
+        return redirect(url_for('login'))
+    return render_template('precios_masivos.html')
+
+
+@actualizacion_precios_bp.route('/api/precios_masivos/vista_previa', methods=['POST'])
+def api_vista_previa():
+    """Cuántos productos cambian y cuánto, sin grabar nada"""
+    if 'user_id' not in session:
+        return jsonify({'error': 'No autorizado'}), 401
+
+    try:
+        return jsonify({'success': True, **vista_previa(request.json or {})})
+
+    except PedidoInvalido as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    except Exception as e:
+        db.session.rollback()
+        print(f"❌ Error en vista previa de precios: {e}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+
+@actualizacion_precios_bp.route('/api/precios_masivos/aplicar', methods=['POST'])
+def api_aplicar():
+    """Graba el cambio de costos/márgenes/precios"""
+    if 'user_id' not in session:
+        return jsonify({'error': 'No autorizado'}), 401
+
+    try:
+        inicio = time.perf_counter()
+        actualizados = aplicar(request.json or {})
+        duracion = (time.perf_counter() - inicio) * 1000
+
+        print(f"💲 Actualización masiva: {actualizados} productos en {duracion:.0f} ms "
+              f"(usuario {session.get('nombre', session['user_id'])})")
+        return jsonify({
+            'success': True,
+            'message': f'Se actualizaron {actualizados} productos',
+            'productos_actualizados': actualizados,
+            'duracion_ms': round(duracion)
+        })
+
+    except PedidoInvalido as e:
+        db.session.rollback()
+        return jsonify({'success': False, 'error': str(e)}), 400
+    except Exception as e:
+        db.session.rollback()
+        print(f"❌ Error en actualización masiva de precios: {e}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+
+@actualizacion_precios_bp.route('/api/precios_masivos/programar', methods=['POST'])
+def api_programar():
+    """Programa el cambio para que entre en vigencia en vigente_desde"""
+    if 'user_id' not in session:
+        return jsonify({'error': 'No autorizado'}), 401
+
+    try:
+        datos = request.json or {}
+        try:
+            vigente_desde = leer_vigencia(datos.get('vigente_desde'))
+        except ValueError as e:
+            raise PedidoInvalido(str(e))
+        if vigente_desde <= datetime.now():
+            raise PedidoInvalido('La fecha de vigencia tiene que ser futura')
+
+        programados = programar(datos, vigente_desde, session['user_id'])
+        print(f"🕒 Actualización masiva programada para {vigente_desde:%d/%m/%Y %H:%M}: {programados} precios")
+        return jsonify({
+            'success': True,
+            'message': f'Se programaron {programados} precios para el {vigente_desde:%d/%m/%Y %H:%M}',
+            'precios_programados': programados
+        })
+
+    except PedidoInvalido as e:
+        db.session.rollback()
+        return jsonify({'success': False, 'error': str(e)}), 400
+    except Exception as e:
+        db.session.rollback()
+        print(f"❌ Error programando actualización masiva: {e}")
+        return jsonify({'success': False, 'error': str(e)}), 500
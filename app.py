@@ -7,7 +7,7 @@ from functools import wraps
 import sys 
 from flask_sqlalchemy import SQLAlchemy
 from sqlalchemy import Numeric, or_, and_, func, desc, asc, case, text  
-from sqlalchemy.orm import joinedload
+from sqlalchemy.orm import joinedload, selectinload, load_only, aliased
 from werkzeug.security import generate_password_hash, check_password_hash
 from datetime import datetime, timedelta
 from decimal import Decimal
@@ -22,7 +22,6 @@ import base64
 import hashlib
 import csv
 import io
-from flask import make_response
 # Importar la función del PDF
 from reporte_ventas_pdf import generar_pdf_reporte_ventas
 from cryptography import x509
@@ -42,6 +41,25 @@ from cta_cte import (
     obtener_saldo_cliente
 )
 from stock_audit import init_stock_audit, registrar_movimiento_stock
+from timing_ventas import init_timing_ventas, medir_etapas_venta, cronometro_actual
+from codigo_balanza import decodificar_etiqueta, codigos_candidatos, cantidad_desde_etiqueta
+from catalogo_cache import init_catalogo_cache, catalogo, invalidar_catalogo
+from catalogo_sync import init_catalogo_sync
+from versiones import init_versiones, get_condicional, incrementar_version
+from actualizacion_precios import init_actualizacion_precios
+from importacion_productos import init_importacion, codigos_existentes_productos, upsert_productos
+from importacion_planillas import init_importacion_planillas
+from clasificador_categorias import init_clasificador, clasificador, CATEGORIA_POR_DEFECTO
+from precios_programados import init_precios_programados, limpiar_carteles
+from resumen_ventas import init_resumen_ventas, consultar_ventas, compilar_consulta, sumar_factura, moviendo_factura
+from cubo_ventas import init_cubo_ventas
+from cache_reportes import init_cache_reportes, cache_reporte, invalidar_reportes
+from exportaciones import init_exportaciones, registrar_exportacion
+from descargas import filas_cursor, respuesta_csv, respuesta_xlsx, libro_xlsx, celda_xlsx, celdas_xlsx, combinar_xlsx
+from serializacion import (init_serializacion, respuesta_json, respuesta_json_cruda, producto_a_dict,
+                           campos_pedidos, proyectar)
+from stock_combos import (calcular_stock_combos, recalcular_stock_disponible, precio_normal_combos,
+                          descontar_stock_combo, normalizar_componentes, ComboSinComponentes)
 from reporte_ctacte_pdf import generar_pdf_cuentas_corrientes
 
 # ================ SISTEMA DE PEDIDOS (WEB) ================
@@ -158,6 +176,9 @@ init_cta_cte(app)
 # Inicializar módulo de auditoría de stock
 init_stock_audit(app)
 
+# Inicializar medición de tiempos por etapa de venta
+init_timing_ventas(app)
+
 # Intentar cargar configuración local, si no existe usar por defecto
 try:
     from config_cliente import Config, ARCAConfig  # ← Configuración centralizada
@@ -226,8 +247,47 @@ def requiere_licencia_activa(f):
 
 db = SQLAlchemy(app)
 
+# jsonify con orjson (si está instalado) y respuestas JSON para listados grandes
+init_serializacion(app)
+
 init_pedidos(app, db)
 
+# Cache en memoria del catálogo de productos (versionado por catalogo_cambio)
+init_catalogo_cache(app, db)
+
+# Snapshot + cambios incrementales del catálogo para las cajas
+init_catalogo_sync(app, db)
+
+# Versiones por entidad para responder 304 en los endpoints de lectura
+init_versiones(app, db)
+
+# Actualización masiva de costos y precios (listas 1-5)
+init_actualizacion_precios(app, db)
+
+# Importaciones masivas en segundo plano (upsert por lotes)
+init_importacion(app, db)
+
+# Planillas XLS/XLSX/CSV leídas en el servidor con perfiles de columnas
+init_importacion_planillas(app, db)
+
+# Categoría automática por palabras clave (reglas editables en la base)
+init_clasificador(app, db)
+
+# Cambios de precio con fecha de vigencia (aplicados por un hilo) y carteles a reimprimir
+init_precios_programados(app, db)
+
+# Resúmenes diarios de ventas (día × producto / usuario / medio de pago / IVA) para reportes
+init_resumen_ventas(app, db)
+
+# Consulta genérica de ventas (dimensiones × medidas) sobre los resúmenes
+init_cubo_ventas(app, db)
+
+# Cache de resultados de reportes (invalidado por facturas, NC y gastos)
+init_cache_reportes(app)
+
+# Exportaciones pesadas (CSV/Excel/PDF) en segundo plano
+init_exportaciones(app)
+
 # ================ SISTEMA DE IMPRESIÓN TÉRMICA ================
 import tempfile
 try:
@@ -240,7 +300,7 @@ except ImportError:
     print("⚠️ Sistema de impresión no disponible (instalar: pip install pywin32)")
 
 # IMPORTAR LA IMPRESORA DESDE EL ARCHIVO SEPARADO
-from impresora_termica import impresora_termica
+from impresora_termica import impresora_termica, lanzar_carteles_lote, estado_carteles_lote
 
 # Modelos de Base de Datos
 class Usuario(db.Model):
@@ -305,6 +365,8 @@ class Producto(db.Model):
     cantidad_combo_2 = db.Column(Numeric(8, 3), default=0.000)
     producto_base_3_id = db.Column(db.Integer, db.ForeignKey('producto.id'), nullable=True)
     cantidad_combo_3 = db.Column(Numeric(8, 3), default=0.000)
+    # Unidades de combo que alcanzan con el stock de sus bases (ver stock_combos.py)
+    stock_disponible = db.Column(db.Integer, default=0)
 
     # Relaciones
     producto_base = db.relationship('Producto', 
@@ -319,44 +381,26 @@ class Producto(db.Model):
     producto_base_3 = db.relationship('Producto', 
                                     foreign_keys=[producto_base_3_id], 
                                     remote_side=[id])
+
+    # Componentes del combo (tabla combo_componente, ver stock_combos.py)
+    componentes = db.relationship('ComboComponente',
+                                  foreign_keys='ComboComponente.combo_id',
+                                  order_by='ComboComponente.orden',
+                                  cascade='all, delete-orphan')
         
     def __repr__(self):
         return f'<Producto {self.codigo}: {self.nombre}>'
     
     def to_dict(self):
-        """Convertir producto a diccionario"""
-        return {
-            'id': self.id,
-            'codigo': self.codigo,
-            'nombre': self.nombre,
-            'descripcion': self.descripcion,
-            'precio': float(self.precio),
-            'costo': float(self.costo) if self.costo else 0.0,
-            'margen': float(self.margen) if self.margen else 0.0,
-            'stock': self.stock_dinamico,
-            'categoria': self.categoria,
-            'iva': float(self.iva),
+        """Convertir producto a diccionario (formato de venta + datos de administración)"""
+        datos = producto_a_dict(self)
+        datos.update({
             'activo': self.activo,
             'fecha_creacion': self.fecha_creacion.isoformat() if self.fecha_creacion else None,
             'fecha_modificacion': self.fecha_modificacion.isoformat() if self.fecha_modificacion else None,
-            'es_combo': self.es_combo,
-            'producto_base_id': self.producto_base_id,
-            'cantidad_combo': float(self.cantidad_combo) if self.cantidad_combo else 1.0,
-            'precio_unitario_base': float(self.precio_unitario_base) if self.precio_unitario_base else float(self.precio),
-            'descuento_porcentaje': float(self.descuento_porcentaje) if self.descuento_porcentaje else 0.0,
-            'ahorro_combo': self.calcular_ahorro_combo(),
-            'precio_normal': self.calcular_precio_normal(),
-            'producto_base_nombre': self.producto_base.nombre if self.producto_base else None,
-             # Listas de precios múltiples
-            'margen2': float(self.margen2) if self.margen2 else None,
-            'precio2': float(self.precio2) if self.precio2 else None,
-            'margen3': float(self.margen3) if self.margen3 else None,
-            'precio3': float(self.precio3) if self.precio3 else None,
-            'margen4': float(self.margen4) if self.margen4 else None,
-            'precio4': float(self.precio4) if self.precio4 else None,
-            'margen5': float(self.margen5) if self.margen5 else None,
-            'precio5': float(self.precio5) if self.precio5 else None,
-        }
+            'producto_base_nombre': self.producto_base.nombre if self.producto_base else None
+        })
+        return datos
 
     def obtener_precio_lista(self, numero_lista=1):
         """Obtener precio según la lista de precios seleccionada"""
@@ -422,21 +466,34 @@ class Producto(db.Model):
             return f"{self.nombre} - {cantidad_str} unidades (Ahorro: ${ahorro:.0f})"
         return self.nombre
     
+    def _oferta_aplicable(self, cantidad):
+        """
+        (cantidad_minima, precio_oferta, descripcion) de la mejor oferta por
+        volumen para la cantidad, o None. Usa la escala precargada del
+        catálogo (bisect, sin consultas) y si no hay cache, una sola consulta.
+        """
+        if catalogo.disponible():
+            escala = catalogo.escala_ofertas(self.id)
+            return escala.oferta_para(cantidad) if escala else None
+        
+        oferta = OfertaVolumen.query.filter(
+            and_(
+                OfertaVolumen.producto_id == self.id,
+                OfertaVolumen.cantidad_minima <= float(cantidad),
+                OfertaVolumen.activo == True
+            )
+        ).order_by(OfertaVolumen.cantidad_minima.desc()).first()
+        if oferta:
+            return float(oferta.cantidad_minima), float(oferta.precio_oferta), oferta.descripcion
+        return None
+    
     def obtener_precio_con_oferta(self, cantidad):
         """Obtener precio considerando ofertas por volumen"""
         try:
-            cantidad_decimal = float(cantidad)
-            
-            oferta = OfertaVolumen.query.filter(
-                and_(
-                    OfertaVolumen.producto_id == self.id,
-                    OfertaVolumen.cantidad_minima <= cantidad_decimal,
-                    OfertaVolumen.activo == True
-                )
-            ).order_by(OfertaVolumen.cantidad_minima.desc()).first()
+            oferta = self._oferta_aplicable(cantidad)
             
             if oferta:
-                return float(oferta.precio_oferta)
+                return oferta[1]
             else:
                 return float(self.precio)
                 
@@ -449,17 +506,10 @@ class Producto(db.Model):
         try:
             cantidad_decimal = float(cantidad)
             precio_normal = float(self.precio)
-            precio_con_oferta = self.obtener_precio_con_oferta(cantidad_decimal)
+            oferta = self._oferta_aplicable(cantidad_decimal)
             
-            oferta = OfertaVolumen.query.filter(
-                and_(
-                    OfertaVolumen.producto_id == self.id,
-                    OfertaVolumen.cantidad_minima <= cantidad_decimal,
-                    OfertaVolumen.activo == True
-                )
-            ).order_by(OfertaVolumen.cantidad_minima.desc()).first()
-            
-            if oferta and precio_con_oferta < precio_normal:
+            if oferta and oferta[1] < precio_normal:
+                cantidad_minima, precio_con_oferta, descripcion = oferta
                 ahorro_unitario = precio_normal - precio_con_oferta
                 ahorro_total = ahorro_unitario * cantidad_decimal
                 
@@ -469,8 +519,8 @@ class Producto(db.Model):
                     'precio_oferta': precio_con_oferta,
                     'ahorro_unitario': round(ahorro_unitario, 2),
                     'ahorro_total': round(ahorro_total, 2),
-                    'cantidad_minima': float(oferta.cantidad_minima),
-                    'descripcion_oferta': oferta.descripcion or f"Oferta por volumen desde {oferta.cantidad_minima} unidades"
+                    'cantidad_minima': cantidad_minima,
+                    'descripcion_oferta': descripcion or f"Oferta por volumen desde {cantidad_minima:g} unidades"
                 }
             
             return {
@@ -489,54 +539,42 @@ class Producto(db.Model):
 
     def tiene_ofertas_volumen(self):
         """Verificar si el producto tiene ofertas por volumen activas"""
+        if catalogo.disponible():
+            return catalogo.tiene_ofertas(self.id)
         return OfertaVolumen.query.filter_by(
             producto_id=self.id,
             activo=True
         ).count() > 0
 
+    @staticmethod
+    def ids_con_ofertas_volumen():
+        """Conjunto de producto_id con ofertas activas (para listados: una consulta como máximo)"""
+        if catalogo.disponible():
+            return catalogo.ids_con_ofertas()
+        return {fila.producto_id for fila in
+                db.session.query(OfertaVolumen.producto_id).filter_by(activo=True).distinct()}
+
     def calcular_stock_disponible_combo(self):
-        """Calcular stock disponible para combos basado en productos base"""
+        """Calcular stock disponible para combos basado en productos base (una consulta)"""
         if not self.es_combo:
             return self.stock
         
         try:
-            stocks_disponibles = []
-            
-            # Producto base 1 (obligatorio)
-            if self.producto_base_id and self.cantidad_combo and float(self.cantidad_combo) > 0:
-                producto_base = Producto.query.get(self.producto_base_id)
-                if producto_base and producto_base.activo:
-                    cantidad_necesaria = float(self.cantidad_combo)
-                    stock_posible = int(float(producto_base.stock) / cantidad_necesaria) if cantidad_necesaria > 0 else 0
-                    stocks_disponibles.append(stock_posible)
-            
-            # Producto base 2 (opcional)
-            if self.producto_base_2_id and self.cantidad_combo_2 and float(self.cantidad_combo_2) > 0:
-                producto_base_2 = Producto.query.get(self.producto_base_2_id)
-                if producto_base_2 and producto_base_2.activo:
-                    cantidad_necesaria = float(self.cantidad_combo_2)
-                    stock_posible = int(float(producto_base_2.stock) / cantidad_necesaria) if cantidad_necesaria > 0 else 0
-                    stocks_disponibles.append(stock_posible)
-            
-            # Producto base 3 (opcional)
-            if self.producto_base_3_id and self.cantidad_combo_3 and float(self.cantidad_combo_3) > 0:
-                producto_base_3 = Producto.query.get(self.producto_base_3_id)
-                if producto_base_3 and producto_base_3.activo:
-                    cantidad_necesaria = float(self.cantidad_combo_3)
-                    stock_posible = int(float(producto_base_3.stock) / cantidad_necesaria) if cantidad_necesaria > 0 else 0
-                    stocks_disponibles.append(stock_posible)
-            
-            return min(stocks_disponibles) if stocks_disponibles else 0
-            
+            return calcular_stock_combos(db, [self]).get(self.id, 0)
         except Exception as e:
             print(f"Error calculando stock de combo {self.codigo}: {e}")
             return 0
 
+    @staticmethod
+    def stock_vendible_sql():
+        """Expresión SQL del stock vendible (para filtrar u ordenar combos y bases juntos)"""
+        return case((Producto.es_combo == True, Producto.stock_disponible), else_=Producto.stock)
+
     @property
     def stock_dinamico(self):
-        """Propiedad que devuelve stock dinámico para combos, stock normal para productos base"""
+        """Stock vendible: para combos el materializado en stock_disponible, para productos base el stock"""
         if self.es_combo:
-            return self.calcular_stock_disponible_combo()
+            return int(self.stock_disponible or 0)
         else:
             return self.stock
 
@@ -547,20 +585,10 @@ class Producto(db.Model):
         
         debug_info = [f"DEBUG COMBO {self.codigo}:"]
         
-        if self.producto_base_id and self.cantidad_combo:
-            producto_base = Producto.query.get(self.producto_base_id)
-            if producto_base:
-                debug_info.append(f"  Base 1: {producto_base.codigo} stock={producto_base.stock}, necesita={self.cantidad_combo}")
-        
-        if self.producto_base_2_id and self.cantidad_combo_2:
-            producto_base_2 = Producto.query.get(self.producto_base_2_id)
-            if producto_base_2:
-                debug_info.append(f"  Base 2: {producto_base_2.codigo} stock={producto_base_2.stock}, necesita={self.cantidad_combo_2}")
-        
-        if self.producto_base_3_id and self.cantidad_combo_3:
-            producto_base_3 = Producto.query.get(self.producto_base_3_id)
-            if producto_base_3:
-                debug_info.append(f"  Base 3: {producto_base_3.codigo} stock={producto_base_3.stock}, necesita={self.cantidad_combo_3}")
+        for numero, componente in enumerate(self.componentes, 1):
+            base = componente.producto
+            if base:
+                debug_info.append(f"  Base {numero}: {base.codigo} stock={base.stock}, necesita={componente.cantidad}")
         
         debug_info.append(f"  Stock dinámico resultante: {self.stock_dinamico}")
         return "\n".join(debug_info)
@@ -568,7 +596,12 @@ class Producto(db.Model):
     @staticmethod
     def obtener_productos_con_ofertas():
         """Obtener productos base con sus ofertas"""
-        productos_base = Producto.query.filter_by(es_combo=False, activo=True).all()
+        productos = Producto.query.filter_by(activo=True).all()
+        
+        productos_base = [p for p in productos if not p.es_combo]
+        combos_por_base = {}
+        for combo in sorted((p for p in productos if p.es_combo), key=lambda c: c.precio):
+            combos_por_base.setdefault(combo.producto_base_id, []).append(combo)
         
         resultado = []
         for producto_base in productos_base:
@@ -576,13 +609,7 @@ class Producto(db.Model):
             item_base['tipo'] = 'BASE'
             resultado.append(item_base)
             
-            combos = Producto.query.filter_by(
-                producto_base_id=producto_base.id, 
-                es_combo=True, 
-                activo=True
-            ).order_by(Producto.precio).all()
-            
-            for combo in combos:
+            for combo in combos_por_base.get(producto_base.id, []):
                 item_combo = combo.to_dict()
                 item_combo['tipo'] = 'COMBO'
                 resultado.append(item_combo)
@@ -637,7 +664,38 @@ class OfertaVolumen(db.Model):
         }
 
 
+
+
+class ComboComponente(db.Model):
+    """Producto base que forma parte de un combo (un combo puede tener N)"""
+    __tablename__ = 'combo_componente'
+    __table_args__ = (
+        db.UniqueConstraint('combo_id', 'producto_id', name='uq_combo_componente'),
+        db.Index('idx_combo_componente_producto', 'producto_id'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    combo_id = db.Column(db.Integer, db.ForeignKey('producto.id', ondelete='CASCADE'), nullable=False)
+    producto_id = db.Column(db.Integer, db.ForeignKey('producto.id'), nullable=False)
+    cantidad = db.Column(Numeric(8, 3), nullable=False, default=1.000)
+    orden = db.Column(db.Integer, default=0)
+    
+    producto = db.relationship('Producto', foreign_keys=[producto_id])
+    
+    def __repr__(self):
+        return f'<ComboComponente combo={self.combo_id}: {self.cantidad}x {self.producto_id}>'
     
+    def to_dict(self):
+        """Convertir a diccionario"""
+        return {
+            'producto_id': self.producto_id,
+            'cantidad': float(self.cantidad),
+            'orden': self.orden,
+            'codigo': self.producto.codigo if self.producto else None,
+            'nombre': self.producto.nombre if self.producto else None,
+            'precio': float(self.producto.precio) if self.producto else None
+        }
+
 
 class Factura(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -1010,6 +1068,7 @@ def get_cuit():
 
 
 @app.route('/api/reporte_medios_pago')
+@cache_reporte(hasta='hasta', requiere_sesion=None)
 def api_reporte_medios_pago():
     try:
         fecha_desde = request.args.get('desde')
@@ -1044,6 +1103,7 @@ def api_reporte_medios_pago():
 
 
 @app.route('/api/reporte_gastos')
+@cache_reporte(hasta='hasta', requiere_sesion=None)
 def api_reporte_gastos():
     try:
         fecha_desde = request.args.get('desde')
@@ -1078,6 +1138,7 @@ def api_reporte_gastos():
 
 
 @app.route('/api/reporte_caja_diaria')
+@cache_reporte(hasta='hasta', requiere_sesion=None)
 def api_reporte_caja_diaria():
     print(">>> API reporte_caja_diaria llamada")
     try:
@@ -1831,7 +1892,86 @@ class ARCAClient:
             raise Exception(f"Error al obtener último comprobante: {e}")
 
 
-arca_client = ARCAClient()
+class ARCAClientSimulado(ARCAClient):
+    """
+    Reemplazo de AFIP para pruebas de carga (AFIP_SIMULADO=1).
+    No conecta con AFIP: espera una latencia configurable y devuelve un CAE
+    ficticio con numeración correlativa por tipo de comprobante.
+    """
+
+    def __init__(self):
+        import threading
+        super().__init__()
+        self.latencia_ms = int(os.environ.get('AFIP_SIMULADO_LATENCIA_MS', '150'))
+        self.tasa_error = float(os.environ.get('AFIP_SIMULADO_TASA_ERROR', '0'))
+        self._ultimos = {}
+        self._lock = threading.Lock()
+        print(f"🧪 AFIP SIMULADO activo (latencia {self.latencia_ms} ms, errores {self.tasa_error:.0%})")
+
+    def get_ticket_access(self):
+        return True
+
+    def get_ultimo_comprobante(self, tipo_cbte):
+        with self._lock:
+            if tipo_cbte not in self._ultimos:
+                ultimo = 0
+                facturas = Factura.query.filter_by(
+                    tipo_comprobante=str(tipo_cbte),
+                    punto_venta=self.config.PUNTO_VENTA
+                ).with_entities(Factura.numero).all()
+                for (numero,) in facturas:
+                    try:
+                        ultimo = max(ultimo, int(numero.split('-')[1]))
+                    except (AttributeError, IndexError, ValueError):
+                        pass
+                self._ultimos[tipo_cbte] = ultimo
+            return self._ultimos[tipo_cbte]
+
+    def autorizar_comprobante(self, datos_comprobante):
+        import random
+        import time
+
+        tipo_cbte = int(datos_comprobante['tipo_comprobante'])
+        pto_vta = int(datos_comprobante.get('punto_venta', self.config.PUNTO_VENTA))
+
+        # Latencia con variación de ±50%
+        if self.latencia_ms > 0:
+            time.sleep(self.latencia_ms * random.uniform(0.5, 1.5) / 1000)
+
+        if self.tasa_error and random.random() < self.tasa_error:
+            return {
+                'success': False,
+                'error': 'Error simulado de AFIP',
+                'cae': None,
+                'vto_cae': None,
+                'estado': 'error_afip'
+            }
+
+        ultimo = self.get_ultimo_comprobante(tipo_cbte)
+        with self._lock:
+            proximo_nro = self._ultimos[tipo_cbte] = max(ultimo, self._ultimos[tipo_cbte]) + 1
+
+        vencimiento = (datetime.now() + timedelta(days=10)).strftime('%Y%m%d')
+        return {
+            'success': True,
+            'cae': f"7{random.randint(0, 10**13 - 1):013d}",
+            'numero': f"{pto_vta:04d}-{proximo_nro:08d}",
+            'punto_venta': pto_vta,
+            'numero_comprobante': proximo_nro,
+            'fecha_vencimiento': vencimiento,
+            'fecha_proceso': datetime.now().strftime('%Y%m%d'),
+            'importe_total': round(datos_comprobante.get('importe_neto', 0) + datos_comprobante.get('importe_iva', 0), 2),
+            'tipo_comprobante': tipo_cbte,
+            'estado': 'autorizada',
+            'vto_cae': datetime.strptime(vencimiento, '%Y%m%d').date()
+        }
+
+
+# AFIP_SIMULADO=1 solo para pruebas de carga (ver prueba_carga_ventas.py)
+if os.environ.get('AFIP_SIMULADO') == '1':
+    arca_client = ARCAClientSimulado()
+else:
+    arca_client = ARCAClient()
 
 # Monitor AFIP simplificado
 class AFIPStatusMonitor:
@@ -1930,8 +2070,12 @@ def productos():
     if 'user_id' not in session:
         return redirect(url_for('login'))
     
-    productos = Producto.query.filter_by(activo=True).all()
-    return render_template('productos.html', productos=productos)
+    # Primera página del listado; el resto se pide a /buscar_productos_admin con el cursor
+    query = filtrar_productos_admin({'estado': 'activo'})
+    total_productos = contar_productos_admin(query)
+    productos, siguiente_cursor = paginar_productos_admin(query.options(selectinload(Producto.producto_base)))
+    return render_template('productos.html', productos=productos,
+                           total_productos=total_productos, siguiente_cursor=siguiente_cursor)
 
 @app.route('/combos')
 def combos():
@@ -1958,6 +2102,7 @@ def clientes():
     return render_template('clientes.html', clientes=clientes)
 
 @app.route('/api/clientes')
+@get_condicional('cliente')
 def api_clientes():
     """API para obtener lista de todos los clientes (para selects)"""
     if 'user_id' not in session:
@@ -2119,6 +2264,7 @@ def guardar_cliente():
             db.session.add(cliente)
         
         db.session.commit()
+        incrementar_version('cliente')
         
         return jsonify({
             'success': True,
@@ -2153,6 +2299,7 @@ def eliminar_cliente(cliente_id):
         # Si no tiene facturas, se puede eliminar
         db.session.delete(cliente)
         db.session.commit()
+        incrementar_version('cliente')
         
         return jsonify({
             'success': True,
@@ -2349,20 +2496,9 @@ def obtener_producto_detalle(producto_id):
             else:
                 resultado['producto_base_3'] = None
             
-            # CALCULAR PRECIO NORMAL TOTAL (TODOS LOS PRODUCTOS)
-            precio_normal_total = 0
-            
-            # Producto 1
-            if resultado.get('producto_base') and resultado.get('cantidad_combo'):
-                precio_normal_total += resultado['producto_base']['precio'] * float(resultado['cantidad_combo'])
-            
-            # Producto 2
-            if resultado.get('producto_base_2') and resultado.get('cantidad_combo_2'):
-                precio_normal_total += resultado['producto_base_2']['precio'] * float(resultado['cantidad_combo_2'])
-            
-            # Producto 3
-            if resultado.get('producto_base_3') and resultado.get('cantidad_combo_3'):
-                precio_normal_total += resultado['producto_base_3']['precio'] * float(resultado['cantidad_combo_3'])
+            # TODOS LOS COMPONENTES (pueden ser más de 3) Y PRECIO NORMAL EN UNA CONSULTA
+            resultado['componentes'] = [c.to_dict() for c in producto.componentes]
+            precio_normal_total = precio_normal_combos(db, [producto.id]).get(producto.id, 0.0)
             
             # AGREGAR INFORMACIÓN CALCULADA
             resultado['precio_normal_total'] = round(precio_normal_total, 2)
@@ -2485,8 +2621,13 @@ def guardar_producto():
         # Guardar en base de datos
         if not producto_id:
             db.session.add(producto)
+            db.session.flush()
+        
+        # activo/stock de un base cambian el stock de sus combos
+        recalcular_stock_disponible(db, bases=[producto.id])
         
         db.session.commit()
+        invalidar_catalogo(ids=[producto.id])
         
         print(f"✅ Producto {accion}: {codigo}")
         print(f"   Costo: ${costo:.2f}")
@@ -2553,8 +2694,12 @@ def ajustar_stock():
         else:
             return jsonify({'error': 'Tipo de movimiento inválido'}), 400
         
+        # Combos que usan este producto: recalcular en la misma transacción
+        recalcular_stock_disponible(db, bases=[producto.id])
+        
         # Guardar cambios
         db.session.commit()
+        invalidar_catalogo(ids=[producto.id])
         
         # Registrar el movimiento en consola
         print(f"MOVIMIENTO STOCK: Producto {producto.codigo} - {descripcion} - Motivo: {motivo}")
@@ -2603,7 +2748,11 @@ def toggle_producto(producto_id):
         producto.activo = not producto.activo
         estado = 'activado' if producto.activo else 'desactivado'
         
+        # Un base inactivo no cuenta para el stock de sus combos
+        recalcular_stock_disponible(db, bases=[producto.id])
+        
         db.session.commit()
+        invalidar_catalogo(ids=[producto.id])
         
         return jsonify({
             'success': True,
@@ -2616,130 +2765,218 @@ def toggle_producto(producto_id):
         print(f"Error cambiando estado del producto: {str(e)}")
         return jsonify({'error': f'Error al cambiar estado: {str(e)}'}), 500
 
-# 3. ACTUALIZAR LA RUTA /buscar_productos_admin
+# ═══════════════════════════════════════════════════════════════════════════════
+# LISTADO DE ADMINISTRACIÓN: FILTROS Y ORDEN EN SQL, PAGINADO POR CURSOR
+# ═══════════════════════════════════════════════════════════════════════════════
+# Paginación keyset: el cursor es (valor de la columna de orden, id) de la
+# última fila enviada; la página siguiente arranca en WHERE (col, id) > cursor
+# usando el índice, sin OFFSET, así cuesta lo mismo la página 1 que la 50.
+
+LIMITE_ADMIN_POR_DEFECTO = 200
+LIMITE_ADMIN_MAXIMO = 1000
+ORDENES_ADMIN = {'codigo': Producto.codigo, 'nombre': Producto.nombre, 'id': Producto.id}
+
+
+def _costo_admin(producto):
+    """Costo guardado o, si no hay, aproximado desde precio y margen"""
+    costo = float(producto.costo) if producto.costo else 0.0
+    margen = float(producto.margen) if producto.margen is not None else 0.0
+    if costo == 0.0 and producto.precio > 0 and margen > 0:
+        costo = float(producto.precio) / (1 + (margen / 100))
+    return round(costo, 2)
+
+
+# Campo de la respuesta → (columnas de producto que necesita, valor)
+CAMPOS_ADMIN = {
+    'id': (('id',), lambda p: p.id),
+    'codigo': (('codigo',), lambda p: p.codigo),
+    'nombre': (('nombre',), lambda p: p.nombre),
+    'descripcion': (('descripcion',), lambda p: p.descripcion),
+    'precio': (('precio',), lambda p: float(p.precio)),
+    'costo': (('costo', 'precio', 'margen'), _costo_admin),
+    'margen': (('margen',), lambda p: round(float(p.margen) if p.margen is not None else 0.0, 1)),
+    'stock': (('stock', 'stock_disponible', 'es_combo'), lambda p: p.stock_dinamico),
+    'categoria': (('categoria',), lambda p: p.categoria),
+    'iva': (('iva',), lambda p: float(p.iva)),
+    'activo': (('activo',), lambda p: p.activo),
+    'es_combo': (('es_combo',), lambda p: p.es_combo),
+    'acceso_rapido': (('acceso_rapido',), lambda p: p.acceso_rapido),
+    'orden_acceso_rapido': (('orden_acceso_rapido',), lambda p: p.orden_acceso_rapido),
+}
+
+
+def _precio_normal_combos_sql():
+    """Subconsulta combo_id → precio normal (SUM precio base × cantidad)"""
+    base = aliased(Producto)
+    return db.session.query(
+        ComboComponente.combo_id.label('combo_id'),
+        func.sum(base.precio * ComboComponente.cantidad).label('precio_normal')
+    ).join(
+        base, base.id == ComboComponente.producto_id
+    ).filter(
+        ComboComponente.cantidad > 0
+    ).group_by(ComboComponente.combo_id).subquery()
+
+
+def filtrar_productos_admin(args):
+    """Query de Producto con los filtros del listado de administración (todos en SQL)"""
+    buscar = (args.get('buscar') or '').strip()
+    categoria = (args.get('categoria') or '').strip()
+    filtro_stock = (args.get('stock') or '').strip()
+    estado = (args.get('estado') or '').strip()  # activo, inactivo
+    solo_combos = (args.get('solo_combos') or '').strip().lower() == 'true'
+    descuento = (args.get('descuento') or '').strip()  # alto, medio, bajo
+    
+    query = Producto.query
+    
+    if solo_combos:
+        query = query.filter(Producto.es_combo == True)
+    
+    if buscar:
+        query = query.filter(
+            or_(
+                Producto.codigo.ilike(f'%{buscar}%'),
+                Producto.nombre.ilike(f'%{buscar}%'),
+                Producto.descripcion.ilike(f'%{buscar}%')
+            )
+        )
+    
+    if categoria:
+        query = query.filter(Producto.categoria == categoria)
+    
+    # Combos filtran por su stock materializado, igual que los productos base
+    if filtro_stock == 'bajo':
+        query = query.filter(Producto.stock_vendible_sql() < 10)
+    elif filtro_stock == 'sin_stock':
+        query = query.filter(Producto.stock_vendible_sql() <= 0)
+    
+    if estado == 'activo':
+        query = query.filter(Producto.activo == True)
+    elif estado == 'inactivo':
+        query = query.filter(Producto.activo == False)
+    
+    # Banda de descuento de combos contra su precio normal (suma de sus componentes)
+    if descuento and solo_combos:
+        precio_normal = _precio_normal_combos_sql()
+        query = query.outerjoin(precio_normal, precio_normal.c.combo_id == Producto.id)
+        normal = precio_normal.c.precio_normal
+        porcentaje = case((normal > 0, (normal - Producto.precio) * 100 / normal), else_=0)
+        bandas = {
+            'alto': porcentaje > 30,
+            'medio': porcentaje.between(15, 30),
+            'bajo': porcentaje < 15
+        }
+        if descuento in bandas:
+            # Los combos sin componentes se muestran igual
+            query = query.filter(or_(normal.is_(None), bandas[descuento]))
+    
+    return query
+
+
+def contar_productos_admin(query):
+    """COUNT(*) de los filtros, sin ORDER BY ni cargar columnas"""
+    return query.order_by(None).with_entities(func.count(Producto.id)).scalar() or 0
+
+
+def _codificar_cursor(valor, producto_id):
+    return base64.urlsafe_b64encode(json.dumps([valor, producto_id]).encode()).decode()
+
+
+def _decodificar_cursor(cursor):
+    valor, producto_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    return valor, int(producto_id)
+
+
+def paginar_productos_admin(query, orden='codigo', descendente=False, cursor=None,
+                            limite=LIMITE_ADMIN_POR_DEFECTO):
+    """
+    Una página del listado ordenado por (orden, id) a partir del cursor.
+
+    Returns:
+        (productos, siguiente_cursor) - siguiente_cursor es None en la última página
+    """
+    columna = ORDENES_ADMIN.get(orden, Producto.codigo)
+    
+    if cursor:
+        valor, ultimo_id = _decodificar_cursor(cursor)
+        if orden == 'id':
+            condicion = Producto.id < ultimo_id if descendente else Producto.id > ultimo_id
+        elif descendente:
+            condicion = or_(columna < valor, and_(columna == valor, Producto.id < ultimo_id))
+        else:
+            condicion = or_(columna > valor, and_(columna == valor, Producto.id > ultimo_id))
+        query = query.filter(condicion)
+    
+    direccion = desc if descendente else asc
+    # Una fila de más para saber si hay otra página
+    productos = query.order_by(direccion(columna), direccion(Producto.id)).limit(limite + 1).all()
+    
+    siguiente_cursor = None
+    if len(productos) > limite:
+        productos = productos[:limite]
+        ultimo = productos[-1]
+        siguiente_cursor = _codificar_cursor(getattr(ultimo, columna.key), ultimo.id)
+    
+    return productos, siguiente_cursor
+
+
 @app.route('/buscar_productos_admin')
 def buscar_productos_admin():
-    """Buscar productos con filtros para administración - INCLUYE FILTROS PARA COMBOS"""
+    """
+    Listado de productos para administración - INCLUYE FILTROS PARA COMBOS
+    
+    Filtros: buscar, categoria, stock, estado, solo_combos, descuento
+    Página: orden (codigo|nombre|id), dir (asc|desc), limite, cursor
+    Proyección: campos=codigo,nombre,precio,... (sólo esas columnas)
+    """
     if 'user_id' not in session:
         return jsonify({'error': 'No autorizado'}), 401
     
     try:
-        # Obtener parámetros de búsqueda
-        buscar = request.args.get('buscar', '').strip()
-        categoria = request.args.get('categoria', '').strip()
-        filtro_stock = request.args.get('stock', '').strip()
-        estado = request.args.get('estado', '').strip()
-        
-        # ✅ NUEVOS PARÁMETROS PARA COMBOS
-        solo_combos = request.args.get('solo_combos', '').strip().lower() == 'true'
-        estado = request.args.get('estado', '').strip()  # activo, inactivo
-        descuento = request.args.get('descuento', '').strip()  # alto, medio, bajo
-        
-        print(f"🔍 Búsqueda productos admin:")
-        print(f"   Buscar: '{buscar}'")
-        print(f"   Solo combos: {solo_combos}")
-        print(f"   Estado: '{estado}'")
-        print(f"   Descuento: '{descuento}'")
-        
-        # Construir query base
-        query = Producto.query
-        
-        # ✅ FILTRO PARA SOLO COMBOS
-        if solo_combos:
-            query = query.filter(Producto.es_combo == True)
-            print("   Filtro aplicado: Solo combos")
-        
-        # Aplicar filtros generales
-        if buscar:
-            query = query.filter(
-                or_(
-                    Producto.codigo.ilike(f'%{buscar}%'),
-                    Producto.nombre.ilike(f'%{buscar}%'),
-                    Producto.descripcion.ilike(f'%{buscar}%')
-                )
-            )
-            print(f"   Filtro aplicado: Búsqueda '{buscar}'")
-        
-        if categoria:
-            query = query.filter(Producto.categoria == categoria)
-            print(f"   Filtro aplicado: Categoría '{categoria}'")
-        
-        if filtro_stock == 'bajo':
-            query = query.filter(Producto.stock < 10)
-        elif filtro_stock == 'sin_stock':
-            query = query.filter(Producto.stock <= 0)
+        orden = request.args.get('orden', 'codigo').strip()
+        if orden not in ORDENES_ADMIN:
+            orden = 'codigo'
+        descendente = request.args.get('dir', 'asc').strip().lower() == 'desc'
+        limite = request.args.get('limite', LIMITE_ADMIN_POR_DEFECTO, type=int) or LIMITE_ADMIN_POR_DEFECTO
+        limite = max(1, min(limite, LIMITE_ADMIN_MAXIMO))
+        cursor = request.args.get('cursor', '').strip() or None
+        campos = [c.strip() for c in request.args.get('campos', '').split(',') if c.strip() in CAMPOS_ADMIN]
+        
+        query = filtrar_productos_admin(request.args)
+        
+        # El total sólo hace falta en la primera página
+        total = contar_productos_admin(query) if not cursor else None
+        
+        # Con proyección sólo se leen las columnas pedidas (y las del orden)
+        completo = not campos
+        if completo:
+            campos = list(CAMPOS_ADMIN)
+            query = query.options(selectinload(Producto.producto_base))
+        else:
+            columnas = {col for campo in campos for col in CAMPOS_ADMIN[campo][0]} | {'id', orden}
+            query = query.options(load_only(*[getattr(Producto, col) for col in columnas]))
         
-        # ✅ FILTRO DE ESTADO (ACTIVO/INACTIVO)
-        if estado == 'activo':
-            query = query.filter(Producto.activo == True)
-            print("   Filtro aplicado: Solo activos")
-        elif estado == 'inactivo':
-            query = query.filter(Producto.activo == False)
-            print("   Filtro aplicado: Solo inactivos")
+        try:
+            productos, siguiente_cursor = paginar_productos_admin(query, orden, descendente, cursor, limite)
+        except (ValueError, TypeError):
+            return jsonify({'success': False, 'error': 'Cursor inválido'}), 400
         
-        # Obtener resultados SIN filtro de descuento primero
-        productos = query.order_by(Producto.codigo).all()
-        print(f"   Productos encontrados (antes filtro descuento): {len(productos)}")
-        
-        # ✅ APLICAR FILTRO DE DESCUENTO DESPUÉS (solo para combos)
-        if descuento and solo_combos:
-            productos_filtrados = []
-            
-            for producto in productos:
-                if producto.es_combo and producto.producto_base:
-                    # Calcular descuento del combo
-                    precio_normal = float(producto.producto_base.precio) * float(producto.cantidad_combo)
-                    precio_combo = float(producto.precio)
-                    descuento_porcentaje = ((precio_normal - precio_combo) / precio_normal) * 100 if precio_normal > 0 else 0
-                    
-                    # Aplicar filtro según nivel de descuento
-                    if descuento == 'alto' and descuento_porcentaje > 30:
-                        productos_filtrados.append(producto)
-                    elif descuento == 'medio' and 15 <= descuento_porcentaje <= 30:
-                        productos_filtrados.append(producto)
-                    elif descuento == 'bajo' and descuento_porcentaje < 15:
-                        productos_filtrados.append(producto)
-                else:
-                    # Si no es combo, incluir sin filtro de descuento
-                    productos_filtrados.append(producto)
-            
-            productos = productos_filtrados
-            print(f"   Productos después filtro descuento '{descuento}': {len(productos)}")
+        # Precio normal de los combos de la página en una sola consulta
+        precios_normales = {}
+        if completo:
+            precios_normales = precio_normal_combos(db, [p.id for p in productos if p.es_combo])
         
-        # Formatear respuesta
         resultado = []
         for producto in productos:
-            # Manejar valores por defecto
-            costo = float(producto.costo) if producto.costo else 0.0
-            margen = float(producto.margen) if producto.margen is not None else 0.0
-            
-            # Si no hay costo guardado, calcularlo aproximadamente desde precio
-            if costo == 0.0 and producto.precio > 0 and margen > 0:
-                costo = float(producto.precio) / (1 + (margen / 100))
-            
-            producto_dict = {
-                'id': producto.id,
-                'codigo': producto.codigo,
-                'nombre': producto.nombre,
-                'descripcion': producto.descripcion,
-                'precio': float(producto.precio),
-                'costo': round(costo, 2),
-                'margen': round(margen, 1),
-                'stock': producto.stock_dinamico,
-                'categoria': producto.categoria,
-                'iva': float(producto.iva),
-                'activo': producto.activo,
-                'es_combo': producto.es_combo,
-                'acceso_rapido': producto.acceso_rapido if hasattr(producto, 'acceso_rapido') else False,
-                'orden_acceso_rapido': producto.orden_acceso_rapido if hasattr(producto, 'orden_acceso_rapido') else 0
-            }
+            producto_dict = {campo: CAMPOS_ADMIN[campo][1](producto) for campo in campos}
             
             # ✅ AGREGAR INFORMACIÓN ESPECÍFICA PARA COMBOS
-            if producto.es_combo:
+            if completo and producto.es_combo:
                 producto_dict.update({
                     'producto_base_id': producto.producto_base_id,
                     'cantidad_combo': float(producto.cantidad_combo) if producto.cantidad_combo else 1.0,
-                    'precio_unitario_base': float(producto.precio_unitario_base) if producto.precio_unitario_base else 0.0
+                    'precio_unitario_base': float(producto.precio_unitario_base) if producto.precio_unitario_base else 0.0,
+                    'precio_normal': precios_normales.get(producto.id, 0.0)
                 })
                 
                 # Información del producto base
@@ -2753,19 +2990,26 @@ def buscar_productos_admin():
             
             resultado.append(producto_dict)
         
-        print(f"✅ Búsqueda completada: {len(resultado)} productos")
+        print(f"🔍 Productos admin: {len(resultado)} de {total if total is not None else '?'} "
+              f"(orden {orden}{' desc' if descendente else ''}, {'con cursor' if cursor else 'primera página'})")
         
         return jsonify({
             'success': True,
             'productos': resultado,
-            'total': len(resultado),
+            'total': total,
+            'cantidad': len(resultado),
+            'siguiente_cursor': siguiente_cursor,
+            'hay_mas': siguiente_cursor is not None,
+            'orden': orden,
+            'dir': 'desc' if descendente else 'asc',
+            'limite': limite,
             'filtros_aplicados': {
-                'buscar': buscar,
-                'solo_combos': solo_combos,
-                'estado': estado,
-                'descuento': descuento,
-                'categoria': categoria,
-                'filtro_stock': filtro_stock
+                'buscar': request.args.get('buscar', '').strip(),
+                'solo_combos': request.args.get('solo_combos', '').strip().lower() == 'true',
+                'estado': request.args.get('estado', '').strip(),
+                'descuento': request.args.get('descuento', '').strip(),
+                'categoria': request.args.get('categoria', '').strip(),
+                'filtro_stock': request.args.get('stock', '').strip()
             }
         })
         
@@ -2783,26 +3027,25 @@ def actualizar_costos_productos():
         return jsonify({'error': 'No autorizado'}), 401
     
     try:
-        productos_sin_costo = Producto.query.filter(
-            or_(Producto.costo == 0, Producto.costo.is_(None))
-        ).all()
+        # costo = precio / (1 + margen/100), en un solo UPDATE
+        filtro = "(costo = 0 OR costo IS NULL) AND precio > 0"
+        ids = [row.id for row in db.session.execute(
+            text(f"SELECT id FROM producto WHERE {filtro} FOR UPDATE")
+        )]
         
         contador_actualizados = 0
-        
-        for producto in productos_sin_costo:
-            if producto.precio > 0:
-                margen = float(producto.margen) if producto.margen else 30.0
-                # Calcular costo desde precio: costo = precio / (1 + margen/100)
-                costo_calculado = float(producto.precio) / (1 + (margen / 100))
-                
-                producto.costo = Decimal(str(round(costo_calculado, 2)))
-                producto.fecha_modificacion = datetime.now()
-                
-                contador_actualizados += 1
-                print(f"📦 Actualizado: {producto.codigo} - Precio=${float(producto.precio):.2f} → Costo=${costo_calculado:.2f}")
-        
-        if contador_actualizados > 0:
+        if ids:
+            contador_actualizados = db.session.execute(text(f"""
+                UPDATE producto
+                SET costo = ROUND(precio / (1 + COALESCE(NULLIF(margen, 0), 30) / 100), 2),
+                    fecha_modificacion = NOW()
+                WHERE {filtro}
+            """)).rowcount
             db.session.commit()
+            invalidar_catalogo(ids=ids)
+            print(f"📦 Costo calculado desde precio y margen en {contador_actualizados} productos")
+        else:
+            db.session.rollback()
         
         return jsonify({
             'success': True,
@@ -2816,6 +3059,7 @@ def actualizar_costos_productos():
         return jsonify({'error': f'Error al actualizar costos: {str(e)}'}), 500
 
 @app.route('/obtener_categorias')
+@get_condicional('catalogo')
 def obtener_categorias():
     """Obtener lista de categorías únicas"""
     if 'user_id' not in session:
@@ -2867,8 +3111,9 @@ def crear_combo():
     try:
         datos = request.get_json()
         
-        # Validación básica
-        if not datos.get('producto_base_id'):
+        # Componentes: lista 'componentes' (N productos) o los 3 campos del formulario
+        componentes = componentes_desde_datos(datos)
+        if not componentes:
             return jsonify({'success': False, 'error': 'Producto base 1 es requerido'})
             
         # Si es edición, buscar combo existente
@@ -2883,32 +3128,18 @@ def crear_combo():
             combo.stock = 0
         
         # Datos básicos del combo
-        combo.producto_base_id = datos['producto_base_id']
-        combo.cantidad_combo = Decimal(str(float(datos['cantidad_combo'])))  # Conversión segura
         combo.precio = Decimal(str(datos['precio_combo']))
-        
-        # NUEVOS CAMPOS: Productos adicionales
-        combo.producto_base_2_id = datos.get('producto_base_2_id')
-        if datos.get('cantidad_combo_2'):
-            combo.cantidad_combo_2 = Decimal(str(float(datos['cantidad_combo_2'])))
-        else:
-            combo.cantidad_combo_2 = Decimal('0')
-        
-        combo.producto_base_3_id = datos.get('producto_base_3_id')
-        if datos.get('cantidad_combo_3'):
-            combo.cantidad_combo_3 = Decimal(str(float(datos['cantidad_combo_3'])))
-        else:
-            combo.cantidad_combo_3 = Decimal('0')
+        asignar_componentes_combo(combo, componentes)
         
         # Generar código automático si no se proporciona
         if not datos.get('codigo_combo'):
-            combo.codigo = generar_codigo_combo_multi(combo)
+            combo.codigo = generar_codigo_combo_multi(componentes)
         else:
             combo.codigo = datos['codigo_combo']
             
         # Generar nombre automático si no se proporciona
         if not datos.get('nombre_combo'):
-            combo.nombre = generar_nombre_combo_multi(combo)
+            combo.nombre = generar_nombre_combo_multi(componentes)
         else:
             combo.nombre = datos['nombre_combo']
             
@@ -2919,22 +3150,27 @@ def crear_combo():
             combo.iva = Decimal(str(datos['iva']))
         else:
             # Heredar IVA del producto base principal
-            producto_base = Producto.query.get(combo.producto_base_id)
+            producto_base = Producto.query.get(componentes[0][0])
             if producto_base:
                 combo.iva = producto_base.iva
             else:
                 combo.iva = Decimal('21')  # Default 21%
         
+        db.session.add(combo)
+        db.session.flush()
+        
         # Validar que el precio de oferta sea menor al precio normal
         precio_normal_total = calcular_precio_normal_multi(combo)
         if float(combo.precio) >= precio_normal_total:
+            db.session.rollback()
             return jsonify({
                 'success': False, 
                 'error': 'El precio de oferta debe ser menor al precio normal'
             })
         
-        db.session.add(combo)
+        recalcular_stock_disponible(db, combos=[combo.id])
         db.session.commit()
+        invalidar_catalogo(ids=[combo.id])
         
         return jsonify({
             'success': True, 
@@ -2946,99 +3182,59 @@ def crear_combo():
         db.session.rollback()
         return jsonify({'success': False, 'error': str(e)})
 
-def calcular_precio_normal_multi(combo):
-    """Calcular precio normal total del combo multi-producto"""
-    try:
-        precio_total = 0.0  # Empezar con float
-        
-        print(f"🔍 DEBUG calcular_precio_normal_multi:")
-        print(f"   Combo ID: {getattr(combo, 'id', 'NUEVO')}")
-        
-        # Producto 1 (obligatorio)
-        if combo.producto_base_id and combo.cantidad_combo:
-            producto1 = Producto.query.get(combo.producto_base_id)
-            if producto1:
-                precio_unit = float(producto1.precio)
-                cantidad = float(combo.cantidad_combo)
-                subtotal = precio_unit * cantidad
-                precio_total += subtotal
-                
-                print(f"   Producto 1: {precio_unit} x {cantidad} = {subtotal}")
-        
-        # Producto 2 (opcional)
-        if combo.producto_base_2_id and combo.cantidad_combo_2 and float(combo.cantidad_combo_2) > 0:
-            producto2 = Producto.query.get(combo.producto_base_2_id)
-            if producto2:
-                precio_unit = float(producto2.precio)
-                cantidad = float(combo.cantidad_combo_2)
-                subtotal = precio_unit * cantidad
-                precio_total += subtotal
-                
-                print(f"   Producto 2: {precio_unit} x {cantidad} = {subtotal}")
-        
-        # Producto 3 (opcional)
-        if combo.producto_base_3_id and combo.cantidad_combo_3 and float(combo.cantidad_combo_3) > 0:
-            producto3 = Producto.query.get(combo.producto_base_3_id)
-            if producto3:
-                precio_unit = float(producto3.precio)
-                cantidad = float(combo.cantidad_combo_3)
-                subtotal = precio_unit * cantidad
-                precio_total += subtotal
-                
-                print(f"   Producto 3: {precio_unit} x {cantidad} = {subtotal}")
-        
-        print(f"   Total calculado: {precio_total}")
-        return precio_total
-        
-    except Exception as e:
-        print(f"❌ Error en calcular_precio_normal_multi: {str(e)}")
-        print(f"❌ Tipos de datos:")
-        print(f"   combo.cantidad_combo: {type(getattr(combo, 'cantidad_combo', None))}")
-        print(f"   combo.cantidad_combo_2: {type(getattr(combo, 'cantidad_combo_2', None))}")
-        print(f"   combo.cantidad_combo_3: {type(getattr(combo, 'cantidad_combo_3', None))}")
-        raise e
+def componentes_desde_datos(datos):
+    """[(producto_id, cantidad)] del combo enviado: 'componentes' o los 3 campos fijos"""
+    if datos.get('componentes'):
+        lista = [(c.get('producto_id'), c.get('cantidad')) for c in datos['componentes']]
+    else:
+        lista = [(datos.get('producto_base_id'), datos.get('cantidad_combo')),
+                 (datos.get('producto_base_2_id'), datos.get('cantidad_combo_2')),
+                 (datos.get('producto_base_3_id'), datos.get('cantidad_combo_3'))]
+    return normalizar_componentes(lista)
+
+def asignar_componentes_combo(combo, componentes):
+    """Guardar los componentes en combo_componente (y el espejo en las 3 columnas fijas)"""
+    # Reusar las filas de las bases que siguen: no choca con la clave única (combo, producto)
+    existentes = {c.producto_id: c for c in combo.componentes}
+    nuevos = []
+    for orden, (producto_id, cantidad) in enumerate(componentes, 1):
+        componente = existentes.pop(producto_id, None) or ComboComponente(producto_id=producto_id)
+        componente.cantidad = Decimal(str(cantidad))
+        componente.orden = orden
+        nuevos.append(componente)
+    combo.componentes = nuevos  # las que no vinieron se borran (delete-orphan)
+    
+    # Espejo de los 3 primeros para pantallas y reportes que usan las columnas viejas
+    espejo = list(componentes[:3]) + [(None, 0)] * (3 - min(len(componentes), 3))
+    combo.producto_base_id = espejo[0][0]
+    combo.cantidad_combo = Decimal(str(espejo[0][1]))
+    combo.producto_base_2_id = espejo[1][0]
+    combo.cantidad_combo_2 = Decimal(str(espejo[1][1]))
+    combo.producto_base_3_id = espejo[2][0]
+    combo.cantidad_combo_3 = Decimal(str(espejo[2][1]))
 
-        
-def generar_codigo_combo_multi(combo):
+def calcular_precio_normal_multi(combo):
+    """Calcular precio normal total del combo: SUM(precio base × cantidad) en una consulta"""
+    db.session.flush()
+    precio_total = precio_normal_combos(db, [combo.id]).get(combo.id, 0.0)
+    print(f"🔍 Precio normal combo {combo.codigo}: {precio_total}")
+    return precio_total
+
+def _bases_de_componentes(componentes):
+    """[(Producto, cantidad)] de los componentes, con una sola consulta"""
+    ids = [producto_id for producto_id, _ in componentes]
+    por_id = {p.id: p for p in Producto.query.filter(Producto.id.in_(ids)).all()}
+    return [(por_id[producto_id], cantidad) for producto_id, cantidad in componentes if producto_id in por_id]
+        
+def generar_codigo_combo_multi(componentes):
     """Generar código automático para combo multi-producto"""
-    codigos = []
-    
-    if combo.producto_base_id:
-        producto1 = Producto.query.get(combo.producto_base_id)
-        if producto1:
-            codigos.append(producto1.codigo)
-    
-    if combo.producto_base_2_id:
-        producto2 = Producto.query.get(combo.producto_base_2_id)
-        if producto2:
-            codigos.append(producto2.codigo)
-    
-    if combo.producto_base_3_id:
-        producto3 = Producto.query.get(combo.producto_base_3_id)
-        if producto3:
-            codigos.append(producto3.codigo)
-    
+    codigos = [producto.codigo for producto, _ in _bases_de_componentes(componentes)]
     return f"{'_'.join(codigos)}_COMBO"
 
-def generar_nombre_combo_multi(combo):
+def generar_nombre_combo_multi(componentes):
     """Generar nombre automático para combo multi-producto"""
-    nombres = []
-    
-    if combo.producto_base_id and combo.cantidad_combo:
-        producto1 = Producto.query.get(combo.producto_base_id)
-        if producto1:
-            nombres.append(f"{combo.cantidad_combo}x {producto1.nombre}")
-    
-    if combo.producto_base_2_id and combo.cantidad_combo_2:
-        producto2 = Producto.query.get(combo.producto_base_2_id)
-        if producto2:
-            nombres.append(f"{combo.cantidad_combo_2}x {producto2.nombre}")
-    
-    if combo.producto_base_3_id and combo.cantidad_combo_3:
-        producto3 = Producto.query.get(combo.producto_base_3_id)
-        if producto3:
-            nombres.append(f"{combo.cantidad_combo_3}x {producto3.nombre}")
-    
+    nombres = [f"{Decimal(str(cantidad))}x {producto.nombre}"
+               for producto, cantidad in _bases_de_componentes(componentes)]
     return f"Pack: {' + '.join(nombres)} (Oferta)"
 
 #**************************************************************
@@ -3051,12 +3247,14 @@ def obtener_combos_producto(producto_id):
     try:
         producto_base = Producto.query.get_or_404(producto_id)
         
-        # Obtener combos del producto
-        combos = Producto.query.filter_by(
-            producto_base_id=producto_id,
-            es_combo=True,
-            activo=True
-        ).order_by(Producto.cantidad_combo.asc()).all()
+        # Obtener combos que usan el producto (en cualquier componente)
+        combos = Producto.query.join(
+            ComboComponente, ComboComponente.combo_id == Producto.id
+        ).filter(
+            ComboComponente.producto_id == producto_id,
+            Producto.es_combo == True,
+            Producto.activo == True
+        ).order_by(ComboComponente.cantidad.asc()).all()
         
         # Preparar respuesta
         combos_data = []
@@ -3168,13 +3366,18 @@ def crear_ejemplos_combos():
                 producto_base_id=producto_base.id,
                 cantidad_combo=Decimal(str(combo_data['cantidad'])),
                 precio_unitario_base=producto_base.precio,
-                descuento_porcentaje=Decimal(str(descuento_porcentaje))
+                descuento_porcentaje=Decimal(str(descuento_porcentaje)),
+                componentes=[ComboComponente(producto_id=producto_base.id,
+                                             cantidad=Decimal(str(combo_data['cantidad'])),
+                                             orden=1)]
             )
             
             db.session.add(combo)
             print(f"✅ Combo creado: {combo_data['codigo']} - Descuento: {descuento_porcentaje:.1f}%")
         
+        recalcular_stock_disponible(db)
         db.session.commit()
+        invalidar_catalogo()
         print("🎉 Ejemplos de combos creados exitosamente")
         
     except Exception as e:
@@ -3227,54 +3430,50 @@ def nueva_venta():
 # 4. ACTUALIZAR LAS APIS DE BÚSQUEDA PARA INCLUIR COSTO
 @app.route('/api/buscar_productos/<termino>')
 def buscar_productos(termino):
-    """Busca productos por código o nombre - CORREGIDO"""
+    """Busca productos por código o nombre (índice en memoria, sin acentos, todas las palabras)"""
     if not termino or len(termino) < 2:
         return jsonify([])
     
     try:
+        # Servir desde el cache en memoria si está disponible
+        campos = campos_pedidos()
+        encontrados = catalogo.buscar(termino)
+        if encontrados is not None:
+            if campos:
+                return respuesta_json(proyectar(
+                    [catalogo.a_dict_venta(p, match_tipo) for p, match_tipo in encontrados], campos))
+            return respuesta_json_cruda(catalogo.lista_venta_json(encontrados))
+        
         # Búsqueda por código exacto primero
         producto_exacto = Producto.query.filter_by(codigo=termino.upper(), activo=True).first()
         if producto_exacto:
-            resultado = {
-                'id': producto_exacto.id,
-                'codigo': producto_exacto.codigo,
-                'nombre': producto_exacto.nombre,
-                'precio': float(producto_exacto.precio),
-                'precio2': float(producto_exacto.precio2) if producto_exacto.precio2 else None,
-                'precio3': float(producto_exacto.precio3) if producto_exacto.precio3 else None,
-                'precio4': float(producto_exacto.precio4) if producto_exacto.precio4 else None,
-                'precio5': float(producto_exacto.precio5) if producto_exacto.precio5 else None,
-                'precio_base': float(producto_exacto.precio),
-                'costo': float(producto_exacto.costo) if producto_exacto.costo else 0.0,
-                'margen': float(producto_exacto.margen) if producto_exacto.margen else 0.0,
-                'stock': producto_exacto.stock_dinamico,
-                'iva': float(producto_exacto.iva),
-                'match_tipo': 'codigo_exacto',
-                'descripcion': producto_exacto.descripcion or '',
-                'es_combo': producto_exacto.es_combo,
-                'producto_base_id': producto_exacto.producto_base_id,
-                'cantidad_combo': float(producto_exacto.cantidad_combo) if producto_exacto.cantidad_combo else 1.0,
-                'precio_unitario_base': float(producto_exacto.precio_unitario_base) if producto_exacto.precio_unitario_base else float(producto_exacto.precio),
-                'descuento_porcentaje': float(producto_exacto.descuento_porcentaje) if producto_exacto.descuento_porcentaje else 0.0,
-                'ahorro_combo': producto_exacto.calcular_ahorro_combo(),
-                'precio_normal': producto_exacto.calcular_precio_normal(),
-                'tiene_ofertas': producto_exacto.tiene_ofertas_volumen()
-            }
-            return jsonify([resultado])
+            resultado = producto_a_dict(producto_exacto, producto_exacto.tiene_ofertas_volumen(), 'codigo_exacto')
+            return respuesta_json(proyectar([resultado], campos))
         
-        # Búsqueda parcial en código y nombre
+        # Primero los prefijos de código y nombre (LIKE 'x%' usa sus índices);
+        # el escaneo '%x%' sólo corre si no alcanzan para los 15 resultados
+        prefijo = termino.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%'
         termino_busqueda = f"%{termino.lower()}%"
-        
-        productos = Producto.query.filter(
-            and_(
-                Producto.activo == True,
-                or_(
-                    Producto.codigo.ilike(termino_busqueda),
-                    Producto.nombre.ilike(termino_busqueda),
-                    Producto.descripcion.ilike(termino_busqueda)
-                )
+        condiciones = [
+            Producto.codigo.like(prefijo, escape='\\'),
+            Producto.nombre.like(prefijo, escape='\\'),
+            or_(
+                Producto.codigo.ilike(termino_busqueda),
+                Producto.nombre.ilike(termino_busqueda),
+                Producto.descripcion.ilike(termino_busqueda)
             )
-        ).limit(15).all()
+        ]
+        
+        productos = []
+        for condicion in condiciones:
+            faltan = 15 - len(productos)
+            if faltan <= 0:
+                break
+            query = Producto.query.filter(and_(Producto.activo == True, condicion))
+            if productos:
+                query = query.filter(~Producto.id.in_([p.id for p in productos]))
+            productos.extend(query.limit(faltan).all())
+        ids_con_ofertas = Producto.ids_con_ofertas_volumen()
         
         resultados = []
         for producto in productos:
@@ -3285,32 +3484,7 @@ def buscar_productos(termino):
             elif termino.lower() in producto.nombre.lower()[:20]:
                 match_tipo = 'nombre_inicio'
             
-            resultado = {
-                'id': producto.id,
-                'codigo': producto.codigo,
-                'nombre': producto.nombre,
-                'precio': float(producto.precio),
-                'precio2': float(producto.precio2) if producto.precio2 else None,
-                'precio3': float(producto.precio3) if producto.precio3 else None,
-                'precio4': float(producto.precio4) if producto.precio4 else None,
-                'precio5': float(producto.precio5) if producto.precio5 else None,
-                'precio_base': float(producto.precio),
-                'costo': float(producto.costo) if producto.costo else 0.0,
-                'margen': float(producto.margen) if producto.margen else 0.0,
-                'stock': producto.stock_dinamico,
-                'iva': float(producto.iva),
-                'match_tipo': match_tipo,
-                'descripcion': producto.descripcion or '',
-                'es_combo': producto.es_combo,
-                'producto_base_id': producto.producto_base_id,
-                'cantidad_combo': float(producto.cantidad_combo) if producto.cantidad_combo else 1.0,
-                'precio_unitario_base': float(producto.precio_unitario_base) if producto.precio_unitario_base else float(producto.precio),
-                'descuento_porcentaje': float(producto.descuento_porcentaje) if producto.descuento_porcentaje else 0.0,
-                'ahorro_combo': producto.calcular_ahorro_combo(),
-                'precio_normal': producto.calcular_precio_normal(),
-                'tiene_ofertas': producto.tiene_ofertas_volumen()
-            }
-            resultados.append(resultado)
+            resultados.append(producto_a_dict(producto, producto.id in ids_con_ofertas, match_tipo))
         
         def orden_relevancia(item):
             if item['match_tipo'] == 'codigo_exacto':
@@ -3323,7 +3497,7 @@ def buscar_productos(termino):
                 return 3
         
         resultados.sort(key=orden_relevancia)
-        return jsonify(resultados)
+        return respuesta_json(proyectar(resultados, campos))
         
     except Exception as e:
         print(f"❌ Error en buscar_productos: {str(e)}")
@@ -3336,64 +3510,97 @@ def buscar_productos(termino):
 @app.route('/api/producto_por_id/<int:producto_id>')
 def get_producto_por_id(producto_id):
     """Obtiene un producto por ID - INCLUYE COSTO Y LISTAS DE PRECIOS"""
+    if catalogo.disponible():
+        datos = catalogo.obtener(producto_id)
+        if datos:
+            return respuesta_json_cruda(catalogo.venta_json(datos))
+        return jsonify({'error': 'Producto no encontrado'}), 404
+    
     producto = Producto.query.filter_by(id=producto_id, activo=True).first()
     if producto:
-        return jsonify({
-            'id': producto.id,
-            'codigo': producto.codigo,
-            'nombre': producto.nombre,
-            'precio': float(producto.precio),
-            'precio2': float(producto.precio2) if producto.precio2 else None,
-            'precio3': float(producto.precio3) if producto.precio3 else None,
-            'precio4': float(producto.precio4) if producto.precio4 else None,
-            'precio5': float(producto.precio5) if producto.precio5 else None,
-            'costo': float(producto.costo) if producto.costo else 0.0,
-            'margen': float(producto.margen) if producto.margen else 0.0,
-            'margen2': float(producto.margen2) if producto.margen2 else None,
-            'margen3': float(producto.margen3) if producto.margen3 else None,
-            'margen4': float(producto.margen4) if producto.margen4 else None,
-            'margen5': float(producto.margen5) if producto.margen5 else None,
-            'stock': producto.stock_dinamico,
-            'iva': float(producto.iva),
-            'descripcion': producto.descripcion or '',
-            'es_combo': producto.es_combo,
-            'producto_base_id': producto.producto_base_id,
-            'cantidad_combo': float(producto.cantidad_combo) if producto.cantidad_combo else 1.0,
-            'precio_unitario_base': float(producto.precio_unitario_base) if producto.precio_unitario_base else float(producto.precio),
-            'descuento_porcentaje': float(producto.descuento_porcentaje) if producto.descuento_porcentaje else 0.0,
-            'ahorro_combo': producto.calcular_ahorro_combo(),
-            'precio_normal': producto.calcular_precio_normal()
-        })
+        return jsonify(producto_a_dict(producto))
     return jsonify({'error': 'Producto no encontrado'}), 404
 
 
+def buscar_producto_por_codigo_o_etiqueta(codigo):
+    """
+    Busca un producto por código exacto o, si es una etiqueta de balanza
+    (EAN-13 prefijo 20-29), por su PLU. Una sola consulta sobre el índice
+    único de codigo. Devuelve (producto, etiqueta) - etiqueta es None si
+    coincidió el código exacto.
+    """
+    etiqueta = decodificar_etiqueta(codigo, app.config.get('BALANZA_FORMATOS'))
+    if not etiqueta:
+        return Producto.query.filter_by(codigo=codigo.upper(), activo=True).first(), None
+    
+    candidatos = [codigo] + codigos_candidatos(etiqueta['plu'], app.config.get('BALANZA_REEMPLAZOS_PLU'))
+    encontrados = {p.codigo: p for p in Producto.query.filter(
+        Producto.codigo.in_(candidatos),
+        Producto.activo == True
+    ).all()}
+    
+    if codigo in encontrados:
+        return encontrados[codigo], None
+    for candidato in candidatos[1:]:
+        if candidato in encontrados:
+            return encontrados[candidato], etiqueta
+    return None, None
+
+
+def buscar_en_catalogo_por_codigo_o_etiqueta(codigo):
+    """Igual que buscar_producto_por_codigo_o_etiqueta pero sobre el cache en memoria"""
+    producto = catalogo.por_codigo(codigo.upper()) or catalogo.por_codigo(codigo)
+    if producto:
+        return producto, None
+    
+    etiqueta = decodificar_etiqueta(codigo, app.config.get('BALANZA_FORMATOS'))
+    if not etiqueta:
+        return None, None
+    for candidato in codigos_candidatos(etiqueta['plu'], app.config.get('BALANZA_REEMPLAZOS_PLU')):
+        producto = catalogo.por_codigo(candidato)
+        if producto:
+            return producto, etiqueta
+    return None, None
+
+
 @app.route('/api/producto/<codigo>')
 def get_producto(codigo):
-    """Obtiene un producto por código exacto - INCLUYE COSTO"""
-    producto = Producto.query.filter_by(codigo=codigo.upper(), activo=True).first()
+    """Obtiene un producto por código exacto o etiqueta de balanza - INCLUYE COSTO"""
+    if catalogo.disponible():
+        producto, etiqueta = buscar_en_catalogo_por_codigo_o_etiqueta(codigo)
+        if not producto:
+            return jsonify({'error': 'Producto no encontrado'}), 404
+        if not etiqueta:
+            return respuesta_json_cruda(catalogo.venta_json(producto))
+        datos = catalogo.a_dict_venta(producto)
+        agregar_datos_balanza(datos, etiqueta, producto['precio'])
+        return jsonify(datos)
+    
+    producto, etiqueta = buscar_producto_por_codigo_o_etiqueta(codigo)
     if producto:
-        return jsonify({
-            'id': producto.id,
-            'codigo': producto.codigo,
-            'nombre': producto.nombre,
-            'precio': float(producto.precio),
-            'costo': float(producto.costo) if producto.costo else 0.0,  # ← NUEVO
-            'margen': float(producto.margen) if producto.margen else 0.0,  # ← NUEVO
-            'stock': producto.stock_dinamico,
-            'iva': float(producto.iva),
-            'descripcion': producto.descripcion or '',
-            'es_combo': producto.es_combo,
-            'producto_base_id': producto.producto_base_id,
-            'cantidad_combo': float(producto.cantidad_combo) if producto.cantidad_combo else 1.0,
-            'precio_unitario_base': float(producto.precio_unitario_base) if producto.precio_unitario_base else float(producto.precio),
-            'descuento_porcentaje': float(producto.descuento_porcentaje) if producto.descuento_porcentaje else 0.0,
-            'ahorro_combo': producto.calcular_ahorro_combo(),
-            'precio_normal': producto.calcular_precio_normal()
-
-        })
+        datos = producto_a_dict(producto)
+        
+        # Etiqueta de balanza: devolver también la cantidad a facturar
+        if etiqueta:
+            agregar_datos_balanza(datos, etiqueta, producto.precio)
+        
+        return jsonify(datos)
     return jsonify({'error': 'Producto no encontrado'}), 404
 
 
+def agregar_datos_balanza(datos, etiqueta, precio_unitario):
+    """Agrega a la respuesta la cantidad leída de la etiqueta de balanza"""
+    cantidad = cantidad_desde_etiqueta(etiqueta, precio_unitario)
+    datos['cantidad'] = cantidad
+    datos['balanza'] = {
+        'prefijo': etiqueta['prefijo'],
+        'plu': etiqueta['plu'],
+        'tipo': etiqueta['tipo'],
+        'valor': etiqueta['valor'],
+        'cantidad': cantidad
+    }
+
+
 # 5. FUNCIÓN AUXILIAR PARA MIGRAR PRODUCTOS EXISTENTES
 def migrar_productos_sin_costo_margen():
     """Función para migrar productos existentes que no tienen costo ni margen"""
@@ -3435,7 +3642,7 @@ def migrar_productos_sin_costo_margen():
 
 # REGISTRAR DESCUENTOEN PROCESAR_VENTA 
 def registrar_descuento_factura(factura_id, porcentaje, monto, total_original, usuario_id):
-    """Registrar descuento en tabla separada - se llama DESPUÉS de crear factura"""
+    """Registrar descuento en tabla separada - se llama DESPUÉS de crear factura (sin commit: va con la venta)"""
     try:
         if porcentaje > 0 and monto > 0:
             descuento = DescuentoFactura(
@@ -3446,7 +3653,6 @@ def registrar_descuento_factura(factura_id, porcentaje, monto, total_original, u
                 usuario_id=usuario_id
             )
             db.session.add(descuento)
-            db.session.commit()
             print(f"Descuento registrado: {porcentaje}% = ${monto} para factura {factura_id}")
             return True
     except Exception as e:
@@ -3455,106 +3661,53 @@ def registrar_descuento_factura(factura_id, porcentaje, monto, total_original, u
 
 
 def actualizar_stock_combo(combo, cantidad_vendida, factura_id=None):
-    """Actualizar stock de productos base al vender combo"""
-    try:
-        print(f"Actualizando stock para combo {combo.codigo} - cantidad vendida: {cantidad_vendida}")
-        
-        # Producto base 1 (obligatorio)
-        if combo.producto_base_id and combo.cantidad_combo and float(combo.cantidad_combo) > 0:
-            producto_base = Producto.query.get(combo.producto_base_id)
-            if producto_base:
-                descuento = float(combo.cantidad_combo) * cantidad_vendida
-                stock_anterior = float(producto_base.stock)
-                producto_base.stock -= Decimal(str(descuento))
-                print(f"  Base 1 - {producto_base.codigo}: {stock_anterior} - {descuento} = {float(producto_base.stock)}")
-                
-                # Auditoría
-                registrar_movimiento_stock(
-                    db=db,
-                    producto_id=producto_base.id,
-                    tipo='combo',
-                    cantidad=descuento,
-                    signo='-',
-                    stock_anterior=stock_anterior,
-                    stock_nuevo=float(producto_base.stock),
-                    referencia_tipo='factura',
-                    referencia_id=factura_id,
-                    motivo=f'Combo {combo.codigo}',
-                    usuario_id=session.get('user_id'),
-                    usuario_nombre=session.get('nombre', 'Sistema'),
-                    codigo_producto=producto_base.codigo,
-                    nombre_producto=producto_base.nombre
-                )
-        
-        # Producto base 2 (opcional)
-        if combo.producto_base_2_id and combo.cantidad_combo_2 and float(combo.cantidad_combo_2) > 0:
-            producto_base_2 = Producto.query.get(combo.producto_base_2_id)
-            if producto_base_2:
-                descuento = float(combo.cantidad_combo_2) * cantidad_vendida
-                stock_anterior = float(producto_base_2.stock)
-                producto_base_2.stock -= Decimal(str(descuento))
-                print(f"  Base 2 - {producto_base_2.codigo}: {stock_anterior} - {descuento} = {float(producto_base_2.stock)}")
-                
-                # Auditoría
-                registrar_movimiento_stock(
-                    db=db,
-                    producto_id=producto_base_2.id,
-                    tipo='combo',
-                    cantidad=descuento,
-                    signo='-',
-                    stock_anterior=stock_anterior,
-                    stock_nuevo=float(producto_base_2.stock),
-                    referencia_tipo='factura',
-                    referencia_id=factura_id,
-                    motivo=f'Combo {combo.codigo}',
-                    usuario_id=session.get('user_id'),
-                    usuario_nombre=session.get('nombre', 'Sistema'),
-                    codigo_producto=producto_base_2.codigo,
-                    nombre_producto=producto_base_2.nombre
-                )
-        
-        # Producto base 3 (opcional)
-        if combo.producto_base_3_id and combo.cantidad_combo_3 and float(combo.cantidad_combo_3) > 0:
-            producto_base_3 = Producto.query.get(combo.producto_base_3_id)
-            if producto_base_3:
-                descuento = float(combo.cantidad_combo_3) * cantidad_vendida
-                stock_anterior = float(producto_base_3.stock)
-                producto_base_3.stock -= Decimal(str(descuento))
-                print(f"  Base 3 - {producto_base_3.codigo}: {stock_anterior} - {descuento} = {float(producto_base_3.stock)}")
-                
-                # Auditoría
-                registrar_movimiento_stock(
-                    db=db,
-                    producto_id=producto_base_3.id,
-                    tipo='combo',
-                    cantidad=descuento,
-                    signo='-',
-                    stock_anterior=stock_anterior,
-                    stock_nuevo=float(producto_base_3.stock),
-                    referencia_tipo='factura',
-                    referencia_id=factura_id,
-                    motivo=f'Combo {combo.codigo}',
-                    usuario_id=session.get('user_id'),
-                    usuario_nombre=session.get('nombre', 'Sistema'),
-                    codigo_producto=producto_base_3.codigo,
-                    nombre_producto=producto_base_3.nombre
-                )
-        
-        return True
+    """
+    Actualizar stock de productos base al vender combo (un UPDATE para todos
+    los componentes). Devuelve los ids de las bases descontadas; los errores
+    (p.ej. ComboSinComponentes) suben hasta el rollback de la venta.
+    """
+    print(f"Actualizando stock para combo {combo.codigo} - cantidad vendida: {cantidad_vendida}")
+    
+    movimientos = descontar_stock_combo(db, combo.id, cantidad_vendida)
+    
+    for mov in movimientos:
+        print(f"  Base {mov['codigo']}: {mov['stock_anterior']} - {mov['descuento']} = {mov['stock_nuevo']}")
         
-    except Exception as e:
-        print(f"Error actualizando stock de combo {combo.codigo}: {e}")
-        return False
+        # Auditoría
+        with cronometro_actual().sub_etapa('auditoria'):
+            registrar_movimiento_stock(
+                db=db,
+                producto_id=mov['producto_id'],
+                tipo='combo',
+                cantidad=mov['descuento'],
+                signo='-',
+                stock_anterior=mov['stock_anterior'],
+                stock_nuevo=mov['stock_nuevo'],
+                referencia_tipo='factura',
+                referencia_id=factura_id,
+                motivo=f'Combo {combo.codigo}',
+                usuario_id=session.get('user_id'),
+                usuario_nombre=session.get('nombre', 'Sistema'),
+                codigo_producto=mov['codigo'],
+                nombre_producto=mov['nombre'],
+                commit=False
+            )
+    
+    return [mov['producto_id'] for mov in movimientos]
 
 # FUNCIÓN PROCESAR_VENTA
 
 @app.route('/procesar_venta', methods=['POST'])
+@medir_etapas_venta
 def procesar_venta():
     """Procesar venta con medios de pago y items detallados para AFIP + CTA.CTE"""
     if 'user_id' not in session:
         return jsonify({'error': 'No autorizado'}), 401
     
+    cronometro = cronometro_actual()
+    
     try:
+        cronometro.etapa('validacion')
         data = request.json
         
         # Validar datos básicos
@@ -3626,6 +3779,7 @@ def procesar_venta():
                 })
             
             # Guardar en CTA.CTE (esto YA descuenta stock automáticamente)
+            cronometro.etapa('venta_fiada')
             resultado = guardar_venta_fiada(
                 db=db,
                 cliente_id=cliente_id,
@@ -3714,6 +3868,7 @@ def procesar_venta():
         print(f"✅ Validación exitosa. Procediendo con la venta.")
         
         # ═══ NUMERACIÓN Y CREACIÓN DE FACTURA (tu código original) ═══
+        cronometro.etapa('numeracion')
         tipo_comprobante_int = int(tipo_comprobante)
         punto_venta = ARCA_CONFIG.PUNTO_VENTA
         
@@ -3759,10 +3914,12 @@ def procesar_venta():
         
         # ═══ AGREGAR DETALLES Y DESCONTAR STOCK ═══
         # *** CORREGIDO: Descuento por producto individual ***
+        cronometro.etapa('stock')
         print(f"📦 Procesando {len(items)} productos...")
         if productos_cta_cte_ids:
             print(f"⚠️ {len(productos_cta_cte_ids)} productos vienen de CTA.CTE (ya descontados)")
         
+        productos_stock_modificado = set()
         for i, item in enumerate(items):
             item_detalle = items_detalle[i] if i < len(items_detalle) else {}
             iva_porcentaje = float(item_detalle.get('iva_porcentaje', 21.0))
@@ -3791,36 +3948,38 @@ def procesar_venta():
                 if producto:
                     if producto.es_combo:
                         print(f"📦 Combo {producto.codigo}: descontando de productos base...")
-                        exito = actualizar_stock_combo(producto, item['cantidad'], factura.id)
-                        if exito:
-                            print(f"   ✅ Stock actualizado para combo {producto.codigo}")
-                        else:
-                            print(f"   ❌ Error actualizando stock de combo {producto.codigo}")
+                        bases_descontadas = actualizar_stock_combo(producto, item['cantidad'], factura.id)
+                        productos_stock_modificado.update(bases_descontadas)
+                        print(f"   ✅ Stock actualizado para combo {producto.codigo}")
                     else:
                         stock_anterior = float(producto.stock)
                         producto.stock -= Decimal(str(item['cantidad']))
+                        productos_stock_modificado.add(producto.id)
                         print(f"📦 {producto.codigo}: {stock_anterior} - {item['cantidad']} = {float(producto.stock)}")
                         
                         # Auditoría de stock
-                        registrar_movimiento_stock(
-                            db=db,
-                            producto_id=producto.id,
-                            tipo='venta',
-                            cantidad=item['cantidad'],
-                            signo='-',
-                            stock_anterior=stock_anterior,
-                            stock_nuevo=float(producto.stock),
-                            referencia_tipo='factura',
-                            referencia_id=factura.id,
-                            usuario_id=session.get('user_id'),
-                            usuario_nombre=session.get('nombre', 'Sistema'),
-                            codigo_producto=producto.codigo,
-                            nombre_producto=producto.nombre
-                        )
+                        with cronometro_actual().sub_etapa('auditoria'):
+                            registrar_movimiento_stock(
+                                db=db,
+                                producto_id=producto.id,
+                                tipo='venta',
+                                cantidad=item['cantidad'],
+                                signo='-',
+                                stock_anterior=stock_anterior,
+                                stock_nuevo=float(producto.stock),
+                                referencia_tipo='factura',
+                                referencia_id=factura.id,
+                                usuario_id=session.get('user_id'),
+                                usuario_nombre=session.get('nombre', 'Sistema'),
+                                codigo_producto=producto.codigo,
+                                nombre_producto=producto.nombre,
+                                commit=False
+                            )
             else:
                 print(f"⏭️ Producto {item['producto_id']}: ya descontado en CTA.CTE, saltando...")
         
         # ═══ MEDIOS DE PAGO (tu código original) ═══
+        cronometro.etapa('medios_pago')
         print(f"💳 Agregando {len(medios_pago)} medios de pago...")
         for medio_data in medios_pago:
             medio_pago = MedioPago(
@@ -3833,6 +3992,7 @@ def procesar_venta():
             print(f"💰 Medio agregado: {medio_data['medio_pago']} ${medio_data['importe']}")
         
         # ═══ AUTORIZACIÓN AFIP (tu código original) ═══
+        cronometro.etapa('afip')
         try:
             print("📄 Autorizando en AFIP con items detallados...")
             cliente = Cliente.query.get(cliente_id)
@@ -3892,26 +4052,9 @@ def procesar_venta():
             print(f"❌ Error completo al autorizar en AFIP: {e}")
             print(f"📝 Manteniendo número temporal: {factura.numero}")
         
-        # ═══ COMMIT A BASE DE DATOS ═══
-        db.session.commit()
-        
-        print(f"🎉 Venta procesada exitosamente: {factura.numero}")
-        
-        # ═══ NUEVO: MARCAR PRODUCTOS DE CTA.CTE COMO PAGADOS ═══
-        if len(productos_cta_cte_ids) > 0:
-            print(f"✅ Marcando {len(productos_cta_cte_ids)} productos de CTA.CTE como pagados...")
-            resultado_marca = marcar_productos_como_pagados(
-                db=db,
-                detalle_ids=productos_cta_cte_ids,
-                factura_id=factura.id
-            )
-            if resultado_marca['success']:
-                print("✅ Productos de CTA.CTE marcados como pagados")
-            else:
-                print(f"⚠️ Error al marcar productos: {resultado_marca['mensaje']}")
-        
         # ═══ ACTUALIZAR SALDO DEL CLIENTE ═══
         if cliente_id and int(cliente_id) > 1:
+            cronometro.etapa('saldo_cliente')
             cliente = Cliente.query.get(cliente_id)
             if cliente:
                 # Calcular nuevo saldo
@@ -3941,13 +4084,10 @@ def procesar_venta():
                         print(f"💰 Saldo cliente {cliente.nombre}: pagó todo, saldo anterior ${saldo_anterior:.2f} cancelado")
                         factura.observaciones = f"Saldo anterior cancelado: ${saldo_anterior:,.2f}"
                     cliente.saldo = Decimal('0')
-                
-                # ═══ GUARDAR CAMBIOS DE SALDO Y OBSERVACIONES ═══
-                db.session.commit()
-                print(f"✅ Saldo del cliente guardado correctamente")
 
         # ═══ REGISTRAR DESCUENTO (tu código original) ═══
         if data.get('descuento_monto', 0) > 0:
+            cronometro.etapa('descuento')
             total_antes_descuento = float(data.get('subtotal', 0)) + float(data.get('iva', 0))
             registrar_descuento_factura(
                 factura.id, 
@@ -3957,8 +4097,41 @@ def procesar_venta():
                 session['user_id']
             )
 
+        # ═══ COMMIT A BASE DE DATOS ═══
+        # Un solo commit: factura, detalles, stock, auditoría, combos y resúmenes juntos
+        cronometro.etapa('commit')
+        with cronometro.sub_etapa('stock_combos'):
+            recalcular_stock_disponible(db, bases=productos_stock_modificado)
+        with cronometro.sub_etapa('resumen_ventas'):
+            db.session.flush()
+            sumar_factura(factura.id)
+        db.session.commit()
+        
+        # Stock cambiado: avisar al cache de catálogo de todos los workers
+        with cronometro.sub_etapa('catalogo'):
+            invalidar_catalogo(ids=productos_stock_modificado)
+        with cronometro.sub_etapa('cache_reportes'):
+            invalidar_reportes()
+        
+        print(f"🎉 Venta procesada exitosamente: {factura.numero}")
+        
+        # ═══ NUEVO: MARCAR PRODUCTOS DE CTA.CTE COMO PAGADOS ═══
+        if len(productos_cta_cte_ids) > 0:
+            cronometro.etapa('cta_cte')
+            print(f"✅ Marcando {len(productos_cta_cte_ids)} productos de CTA.CTE como pagados...")
+            resultado_marca = marcar_productos_como_pagados(
+                db=db,
+                detalle_ids=productos_cta_cte_ids,
+                factura_id=factura.id
+            )
+            if resultado_marca['success']:
+                print("✅ Productos de CTA.CTE marcados como pagados")
+            else:
+                print(f"⚠️ Error al marcar productos: {resultado_marca['mensaje']}")
+        
         # ═══ IMPRESIÓN AUTOMÁTICA (tu código original) ═══
         if imprimir_automatico and IMPRESION_DISPONIBLE:
+            cronometro.etapa('impresion')
             try:
                 print("🖨️ Imprimiendo factura automáticamente...")
                 impresora_termica.imprimir_factura(factura)
@@ -3974,6 +4147,11 @@ def procesar_venta():
             'mensaje': f"Factura {factura.numero} generada correctamente"
         })
         
+    except ComboSinComponentes as e:
+        db.session.rollback()
+        print(f"❌ Venta cancelada: {e}")
+        return jsonify({'success': False, 'error': str(e)}), 400
+        
     except Exception as e:
         print(f"❌ Error en procesar_venta: {str(e)}")
         import traceback
@@ -4084,6 +4262,7 @@ def limpiar_facturas_duplicadas():
         
         if facturas_duplicadas:
             print(f"⚠️ Encontradas {len(facturas_duplicadas)} facturas con números duplicados")
+            fechas_eliminadas = []
             
             for numero_duplicado in facturas_duplicadas:
                 numero = numero_duplicado[0]
@@ -4094,13 +4273,16 @@ def limpiar_facturas_duplicadas():
                     if i > 0:  # Eliminar todas excepto la primera
                         print(f"🗑️ Eliminando factura duplicada: {factura.numero} (ID: {factura.id})")
                         
-                        # Eliminar detalles primero
+                        # Sacarla de los resúmenes y eliminar detalles primero
+                        sumar_factura(factura.id, -1)
+                        fechas_eliminadas.append(factura.fecha)
                         DetalleFactura.query.filter_by(factura_id=factura.id).delete()
                         
                         # Eliminar factura
                         db.session.delete(factura)
             
             db.session.commit()
+            invalidar_reportes(*fechas_eliminadas)
             print("✅ Limpieza de duplicados completada")
         else:
             print("✅ No se encontraron facturas duplicadas")
@@ -4258,7 +4440,8 @@ def api_estado_afip_rapido():
         estado = afip_monitor.verificar_rapido()
         return jsonify({
             'success': True,
-            'estado': estado
+            'estado': estado,
+            'simulado': isinstance(arca_client, ARCAClientSimulado)
         })
     except Exception as e:
         return jsonify({
@@ -4633,7 +4816,35 @@ def reporte_ventas():
     return render_template('reporte_ventas.html')
 
 
+# orden del reporte → orden de consultar_ventas ('-' = descendente)
+ORDENES_REPORTE_VENTAS = {
+    'cantidad_desc': ['-unidades'],
+    'cantidad_asc': ['unidades'],
+    'total_desc': ['-neto'],
+    'total_asc': ['neto'],
+    'codigo': ['codigo'],
+    'nombre': ['nombre']
+}
+
+def ventas_por_producto_reporte(fecha_desde_dt, fecha_hasta_dt, categoria=None, orden=None, en_streaming=False):
+    """
+    Ventas por producto del período (todas las facturas), para el reporte y su exportación.
+    en_streaming=True: generador leído de un cursor del servidor (descargas grandes)
+    """
+    consulta, parametros, _ = compilar_consulta(
+        'productos',
+        ['unidades', 'cantidad', 'neto', 'precio_promedio', 'ultima_venta', 'lineas'],
+        fecha_desde_dt.date(), fecha_hasta_dt.date(),
+        agrupar=['producto_id', 'codigo', 'nombre', 'descripcion', 'categoria', 'es_combo', 'cantidad_combo'],
+        filtros={'categoria': categoria} if categoria else None,
+        orden=ORDENES_REPORTE_VENTAS.get(orden)
+    )
+    if en_streaming:
+        return filas_cursor(db.session, consulta, parametros)
+    return db.session.execute(consulta, parametros).fetchall()
+
 @app.route('/api/reporte_ventas_productos')
+@cache_reporte(hasta='fecha_hasta')
 def api_reporte_ventas_productos():
     """API para generar reporte de ventas por producto - CORREGIDO PARA COMBOS"""
     if 'user_id' not in session:
@@ -4676,95 +4887,22 @@ def api_reporte_ventas_productos():
         print(f"   Orden: {orden}")
         print(f"   Solo con ventas: {solo_con_ventas}")
         
-        # ✅ QUERY CORREGIDA: Incluir cantidad_combo en el cálculo
-        query = db.session.query(
-            Producto.id,
-            Producto.codigo,
-            Producto.nombre,
-            Producto.descripcion,
-            Producto.categoria,
-            Producto.es_combo,
-            Producto.cantidad_combo,
-            # *** CLAVE: Multiplicar cantidad por cantidad_combo si es combo ***
-            func.sum(
-                case(
-                    (Producto.es_combo == True, DetalleFactura.cantidad * Producto.cantidad_combo),
-                    else_=DetalleFactura.cantidad
-                )
-            ).label('cantidad_real_vendida'),
-            func.sum(DetalleFactura.cantidad).label('unidades_combos_vendidas'),  # Para mostrar también combos vendidos
-            func.sum(DetalleFactura.subtotal).label('total_vendido'),
-            func.avg(DetalleFactura.precio_unitario).label('precio_promedio'),
-            func.max(Factura.fecha).label('ultima_venta'),
-            func.count(DetalleFactura.id).label('num_transacciones')
-        ).join(
-            DetalleFactura, Producto.id == DetalleFactura.producto_id
-        ).join(
-            Factura, DetalleFactura.factura_id == Factura.id
-        ).filter(
-            and_(
-                Factura.fecha >= fecha_desde_dt,
-                Factura.fecha <= fecha_hasta_dt
-                # Incluye TODAS las facturas (sin filtro de estado)
-            )
-        )
-        
-        print(f"✅ Query configurada con corrección para combos")
-        
-        # Filtrar por categoría si se especifica
-        if categoria:
-            query = query.filter(Producto.categoria == categoria)
-            print(f"   Filtro categoría aplicado: {categoria}")
-        
-        # Agrupar por producto
-        query = query.group_by(
-            Producto.id,
-            Producto.codigo,
-            Producto.nombre,
-            Producto.descripcion,
-            Producto.categoria,
-            Producto.es_combo,
-            Producto.cantidad_combo
-        )
-        
-        # *** APLICAR ORDENAMIENTO USANDO LA CANTIDAD REAL ***
-        if orden == 'cantidad_desc':
-            query = query.order_by(desc('cantidad_real_vendida'))
-        elif orden == 'cantidad_asc':
-            query = query.order_by(asc('cantidad_real_vendida'))
-        elif orden == 'total_desc':
-            query = query.order_by(desc('total_vendido'))
-        elif orden == 'total_asc':
-            query = query.order_by(asc('total_vendido'))
-        elif orden == 'codigo':
-            query = query.order_by(Producto.codigo)
-        elif orden == 'nombre':
-            query = query.order_by(Producto.nombre)
-        
-        print(f"   Ordenamiento aplicado: {orden} (usando cantidad real)")
-        
-        # Ejecutar query
+        # ✅ Cantidad real (combos × cantidad_combo), desde los resúmenes diarios si están
         print(f"🔍 Ejecutando consulta...")
-        resultados = query.all()
+        resultados = ventas_por_producto_reporte(fecha_desde_dt, fecha_hasta_dt, categoria, orden)
         print(f"📋 Encontrados {len(resultados)} productos con ventas")
         
         # Consulta adicional: información de estados de facturas para debug
-        debug_estados = db.session.query(
-            Factura.estado,
-            func.count(Factura.id).label('cantidad'),
-            func.sum(Factura.total).label('total')
-        ).filter(
-            and_(
-                Factura.fecha >= fecha_desde_dt,
-                Factura.fecha <= fecha_hasta_dt
-            )
-        ).group_by(Factura.estado).all()
+        debug_estados = consultar_ventas(
+            'facturas', ['tickets', 'importe'], fecha_desde_dt.date(), fecha_hasta_dt.date(),
+            agrupar=['estado']
+        )
         
         estados_info = {}
-        for estado, cantidad, total in debug_estados:
-            estados_info[estado] = {
-                'cantidad': cantidad,
-                'total': float(total) if total else 0.0
+        for fila in debug_estados:
+            estados_info[fila.estado] = {
+                'cantidad': int(fila.tickets or 0),
+                'total': float(fila.importe) if fila.importe else 0.0
             }
         
         print(f"📊 Estados de facturas en el período:")
@@ -4778,9 +4916,9 @@ def api_reporte_ventas_productos():
         
         for resultado in resultados:
             # *** USAR CANTIDAD REAL (ya calculada en SQL) ***
-            cantidad_real = float(resultado.cantidad_real_vendida) if resultado.cantidad_real_vendida else 0.0
-            unidades_combos = int(resultado.unidades_combos_vendidas) if resultado.unidades_combos_vendidas else 0
-            total_producto = float(resultado.total_vendido) if resultado.total_vendido else 0.0
+            cantidad_real = float(resultado.unidades) if resultado.unidades else 0.0
+            unidades_combos = int(resultado.cantidad) if resultado.cantidad else 0
+            total_producto = float(resultado.neto) if resultado.neto else 0.0
             precio_promedio = float(resultado.precio_promedio) if resultado.precio_promedio else 0.0
             
             # *** INFORMACIÓN ADICIONAL PARA COMBOS ***
@@ -4800,12 +4938,12 @@ def api_reporte_ventas_productos():
                 print(f"📦 {resultado.codigo}: {unidades_combos} combos × {cantidad_combo:g} = {cantidad_real:g} {unidad_medida}")
             
             productos.append({
-                'id': resultado.id,
+                'id': resultado.producto_id,
                 'codigo': resultado.codigo,
                 'nombre': resultado.nombre,
                 'descripcion': resultado.descripcion,
                 'categoria': resultado.categoria,
-                'es_combo': resultado.es_combo,
+                'es_combo': bool(resultado.es_combo),
                 'cantidad_combo': float(resultado.cantidad_combo) if resultado.cantidad_combo else 1.0,
                 'cantidad_vendida': cantidad_real,  # *** CANTIDAD REAL ***
                 'unidades_combos_vendidas': unidades_combos,  # *** COMBOS VENDIDOS ***
@@ -4814,7 +4952,7 @@ def api_reporte_ventas_productos():
                 'total_vendido': total_producto,
                 'precio_promedio': precio_promedio,
                 'ultima_venta': resultado.ultima_venta.isoformat() if resultado.ultima_venta else None,
-                'num_transacciones': int(resultado.num_transacciones) if resultado.num_transacciones else 0
+                'num_transacciones': int(resultado.lineas) if resultado.lineas else 0
             })
             
             total_unidades_reales += cantidad_real
@@ -4865,6 +5003,77 @@ def api_reporte_ventas_productos():
         }), 500
 
 
+def formatear_producto_exportacion(resultado):
+    """Fila de ventas_por_producto_reporte → dict de producto para CSV/Excel/PDF"""
+    cantidad_real = float(resultado.unidades) if resultado.unidades else 0.0
+    unidades_combos = int(resultado.cantidad) if resultado.cantidad else 0
+    
+    # Información del tipo de producto
+    if resultado.es_combo:
+        tipo_producto = "Combo/Oferta"
+        cantidad_combo = float(resultado.cantidad_combo) if resultado.cantidad_combo else 1.0
+        detalle_unidades = f"{unidades_combos} combos × {cantidad_combo:g} c/u"
+    else:
+        tipo_producto = "Producto Base"
+        detalle_unidades = f"{int(cantidad_real)} unidades"
+    
+    return {
+        'id': resultado.producto_id,
+        'codigo': resultado.codigo,
+        'nombre': resultado.nombre,
+        'descripcion': resultado.descripcion or '',
+        'categoria': resultado.categoria or 'Sin categoría',
+        'tipo_producto': tipo_producto,
+        'cantidad_real': cantidad_real,
+        'detalle_unidades': detalle_unidades,
+        'precio_promedio': float(resultado.precio_promedio) if resultado.precio_promedio else 0.0,
+        'total_vendido': float(resultado.neto) if resultado.neto else 0.0,
+        'ultima_venta': resultado.ultima_venta,
+        'num_transacciones': int(resultado.lineas) if resultado.lineas else 0
+    }
+
+
+def datos_exportacion_ventas(fecha_desde, fecha_hasta, categoria='', orden='cantidad_desc', en_streaming=False):
+    """
+    (productos, resumen, parametros) del reporte de ventas, para exportar en cualquier formato.
+
+    en_streaming=True: 'productos' es un generador que lee de un cursor del
+    servidor (recorrerlo una sola vez, después de las demás consultas)
+    """
+    # Validar fechas
+    fecha_desde_dt = datetime.strptime(fecha_desde, '%Y-%m-%d')
+    fecha_hasta_dt = datetime.strptime(fecha_hasta, '%Y-%m-%d').replace(hour=23, minute=59, second=59)
+    
+    # Resumen con una sola consulta sin agrupar (antes de abrir el cursor)
+    totales = consultar_ventas(
+        'productos', ['productos', 'unidades', 'neto'], fecha_desde_dt.date(), fecha_hasta_dt.date(),
+        filtros={'categoria': categoria} if categoria else None
+    )[0]
+    total_productos = int(totales.productos or 0)
+    total_ventas = float(totales.neto or 0)
+    resumen = {
+        'total_productos': total_productos,
+        'total_unidades_reales': float(totales.unidades or 0),
+        'total_ventas': total_ventas,
+        'promedio_por_producto': total_ventas / total_productos if total_productos > 0 else 0
+    }
+    print(f"📊 Exportando {total_productos} productos")
+    
+    # *** MISMA CONSULTA DEL REPORTE ***
+    resultados = ventas_por_producto_reporte(fecha_desde_dt, fecha_hasta_dt, categoria, orden, en_streaming)
+    productos_formateados = map(formatear_producto_exportacion, resultados)
+    if not en_streaming:
+        productos_formateados = list(productos_formateados)
+    
+    parametros = {
+        'fecha_desde': fecha_desde,
+        'fecha_hasta': fecha_hasta,
+        'categoria': categoria,
+        'orden': orden
+    }
+    return productos_formateados, resumen, parametros
+
+
 @app.route('/exportar_reporte_ventas')
 def exportar_reporte_ventas():
     """Exportar reporte de ventas a Excel, CSV o PDF - CORREGIDO PARA COMBOS"""
@@ -4879,126 +5088,12 @@ def exportar_reporte_ventas():
         orden = request.args.get('orden', 'cantidad_desc')
         formato = request.args.get('formato', 'csv')  # csv, excel o pdf
         
-        # Validar fechas
-        fecha_desde_dt = datetime.strptime(fecha_desde, '%Y-%m-%d')
-        fecha_hasta_dt = datetime.strptime(fecha_hasta, '%Y-%m-%d').replace(hour=23, minute=59, second=59)
-        
         print(f"📤 Exportando reporte a {formato.upper()}: {fecha_desde} a {fecha_hasta}")
-        
-        # *** QUERY CORREGIDA (MISMA DEL REPORTE) ***
-        query = db.session.query(
-            Producto.id,
-            Producto.codigo,
-            Producto.nombre,
-            Producto.descripcion,
-            Producto.categoria,
-            Producto.es_combo,
-            Producto.cantidad_combo,
-            # *** CANTIDAD REAL CALCULADA ***
-            func.sum(
-                case(
-                    (Producto.es_combo == True, DetalleFactura.cantidad * Producto.cantidad_combo),
-                    else_=DetalleFactura.cantidad
-                )
-            ).label('cantidad_real_vendida'),
-            func.sum(DetalleFactura.cantidad).label('unidades_combos_vendidas'),
-            func.sum(DetalleFactura.subtotal).label('total_vendido'),
-            func.avg(DetalleFactura.precio_unitario).label('precio_promedio'),
-            func.max(Factura.fecha).label('ultima_venta'),
-            func.count(DetalleFactura.id).label('num_transacciones')
-        ).join(
-            DetalleFactura, Producto.id == DetalleFactura.producto_id
-        ).join(
-            Factura, DetalleFactura.factura_id == Factura.id
-        ).filter(
-            and_(
-                Factura.fecha >= fecha_desde_dt,
-                Factura.fecha <= fecha_hasta_dt
-            )
-        )
-        
-        if categoria:
-            query = query.filter(Producto.categoria == categoria)
-        
-        query = query.group_by(
-            Producto.id,
-            Producto.codigo,
-            Producto.nombre,
-            Producto.descripcion,
-            Producto.categoria,
-            Producto.es_combo,
-            Producto.cantidad_combo
+        # CSV/Excel: las filas van del cursor al archivo sin juntarlas en memoria
+        productos_formateados, resumen, parametros = datos_exportacion_ventas(
+            fecha_desde, fecha_hasta, categoria, orden, en_streaming=formato != 'pdf'
         )
         
-        # *** ORDENAMIENTO USANDO CANTIDAD REAL ***
-        if orden == 'cantidad_desc':
-            query = query.order_by(desc('cantidad_real_vendida'))
-        elif orden == 'cantidad_asc':
-            query = query.order_by(asc('cantidad_real_vendida'))
-        elif orden == 'total_desc':
-            query = query.order_by(desc('total_vendido'))
-        elif orden == 'total_asc':
-            query = query.order_by(asc('total_vendido'))
-        elif orden == 'codigo':
-            query = query.order_by(Producto.codigo)
-        elif orden == 'nombre':
-            query = query.order_by(Producto.nombre)
-        
-        resultados = query.all()
-        print(f"📊 Exportando {len(resultados)} productos")
-        
-        # Calcular resumen
-        total_unidades_reales = 0
-        total_ventas = 0.0
-        
-        productos_formateados = []
-        for resultado in resultados:
-            cantidad_real = float(resultado.cantidad_real_vendida) if resultado.cantidad_real_vendida else 0.0
-            unidades_combos = int(resultado.unidades_combos_vendidas) if resultado.unidades_combos_vendidas else 0
-            total_producto = float(resultado.total_vendido) if resultado.total_vendido else 0.0
-            
-            # Información del tipo de producto
-            if resultado.es_combo:
-                tipo_producto = "Combo/Oferta"
-                cantidad_combo = float(resultado.cantidad_combo) if resultado.cantidad_combo else 1.0
-                detalle_unidades = f"{unidades_combos} combos × {cantidad_combo:g} c/u"
-            else:
-                tipo_producto = "Producto Base"
-                detalle_unidades = f"{int(cantidad_real)} unidades"
-            
-            productos_formateados.append({
-                'id': resultado.id,
-                'codigo': resultado.codigo,
-                'nombre': resultado.nombre,
-                'descripcion': resultado.descripcion or '',
-                'categoria': resultado.categoria or 'Sin categoría',
-                'tipo_producto': tipo_producto,
-                'cantidad_real': cantidad_real,
-                'detalle_unidades': detalle_unidades,
-                'precio_promedio': float(resultado.precio_promedio) if resultado.precio_promedio else 0.0,
-                'total_vendido': total_producto,
-                'ultima_venta': resultado.ultima_venta,
-                'num_transacciones': int(resultado.num_transacciones) if resultado.num_transacciones else 0
-            })
-            
-            total_unidades_reales += cantidad_real
-            total_ventas += total_producto
-        
-        # Crear resumen
-        resumen = {
-            'total_productos': len(productos_formateados),
-            'total_unidades_reales': total_unidades_reales,
-            'total_ventas': total_ventas,
-            'promedio_por_producto': total_ventas / len(productos_formateados) if len(productos_formateados) > 0 else 0
-        }
-        
-        parametros = {
-            'fecha_desde': fecha_desde,
-            'fecha_hasta': fecha_hasta,
-            'categoria': categoria,
-            'orden': orden
-        }
-        
         # Generar archivo según formato
         if formato == 'pdf':
             return exportar_pdf_reporte(productos_formateados, resumen, parametros)
@@ -5014,6 +5109,37 @@ def exportar_reporte_ventas():
         return jsonify({'error': f'Error al exportar: {str(e)}'}), 500
 
 
+def exportar_reporte_ventas_archivo(parametros, archivo, progreso):
+    """Exportación en segundo plano del reporte de ventas (ver exportaciones.py)"""
+    formato = parametros.get('formato', 'csv')
+    progreso(5, 'Consultando ventas...')
+    productos, resumen, parametros = datos_exportacion_ventas(
+        parametros.get('fecha_desde'), parametros.get('fecha_hasta'),
+        (parametros.get('categoria') or '').strip(), parametros.get('orden', 'cantidad_desc'),
+        en_streaming=formato != 'pdf'
+    )
+    progreso(50, f"Generando {formato.upper()} de {resumen['total_productos']} productos...")
+    nombre = f"reporte_ventas_{parametros['fecha_desde']}_{parametros['fecha_hasta']}"
+    
+    if formato == 'pdf':
+        archivo.write(generar_pdf_reporte_ventas(productos, resumen, parametros))
+        return f'{nombre}.pdf', 'application/pdf'
+    if formato == 'excel':
+        try:
+            escribir_excel_reporte_mejorado(archivo, productos, resumen, parametros)
+            return f'{nombre}.xlsx', 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+        except ImportError:
+            archivo.seek(0)
+            archivo.truncate()
+    texto = io.TextIOWrapper(archivo, encoding='utf-8', newline='')
+    escribir_csv_reporte_mejorado(texto, productos, resumen, parametros)
+    texto.detach()
+    return f'{nombre}.csv', 'text/csv; charset=utf-8'
+
+
+registrar_exportacion('reporte_ventas', exportar_reporte_ventas_archivo)
+
+
 def exportar_pdf_reporte(productos, resumen, parametros):
     """Generar archivo PDF del reporte usando la función importada"""
     try:
@@ -5041,29 +5167,39 @@ def exportar_pdf_reporte(productos, resumen, parametros):
 
 
 def generar_csv_reporte_mejorado(productos, resumen, parametros):
-    """Generar archivo CSV del reporte mejorado"""
-    output = io.StringIO()
-    writer = csv.writer(output)
-    
+    """Generar archivo CSV del reporte mejorado (en streaming, fila por fila)"""
+    return respuesta_csv(
+        filas_csv_reporte_mejorado(productos, resumen, parametros),
+        f"reporte_ventas_{parametros['fecha_desde']}_{parametros['fecha_hasta']}.csv"
+    )
+
+
+def escribir_csv_reporte_mejorado(output, productos, resumen, parametros):
+    """Escribe el CSV del reporte mejorado en un archivo de texto"""
+    csv.writer(output).writerows(filas_csv_reporte_mejorado(productos, resumen, parametros))
+
+
+def filas_csv_reporte_mejorado(productos, resumen, parametros):
+    """Filas del CSV del reporte mejorado (productos puede ser un generador)"""
     fecha_desde = parametros['fecha_desde']
     fecha_hasta = parametros['fecha_hasta']
     
     # Encabezado del reporte
-    writer.writerow(['Reporte de Ventas por Producto'])
-    writer.writerow([f'Período: {fecha_desde} al {fecha_hasta}'])
-    writer.writerow([f'Generado: {datetime.now().strftime("%d/%m/%Y %H:%M")}'])
-    writer.writerow([])
+    yield ['Reporte de Ventas por Producto']
+    yield [f'Período: {fecha_desde} al {fecha_hasta}']
+    yield [f'Generado: {datetime.now().strftime("%d/%m/%Y %H:%M")}']
+    yield []
     
     # Resumen
-    writer.writerow(['RESUMEN DEL PERÍODO'])
-    writer.writerow(['Productos Vendidos', resumen['total_productos']])
-    writer.writerow(['Total Unidades', f"{resumen['total_unidades_reales']:,.2f}"])
-    writer.writerow(['Total Vendido', f"${resumen['total_ventas']:,.2f}"])
-    writer.writerow(['Promedio por Producto', f"${resumen['promedio_por_producto']:,.2f}"])
-    writer.writerow([])
+    yield ['RESUMEN DEL PERÍODO']
+    yield ['Productos Vendidos', resumen['total_productos']]
+    yield ['Total Unidades', f"{resumen['total_unidades_reales']:,.2f}"]
+    yield ['Total Vendido', f"${resumen['total_ventas']:,.2f}"]
+    yield ['Promedio por Producto', f"${resumen['promedio_por_producto']:,.2f}"]
+    yield []
     
     # Encabezados de datos
-    writer.writerow([
+    yield [
         'Código',
         'Producto',
         'Descripción',
@@ -5075,11 +5211,11 @@ def generar_csv_reporte_mejorado(productos, resumen, parametros):
         'Total Vendido',
         'Última Venta',
         'Número de Transacciones'
-    ])
+    ]
     
     # Datos
     for producto in productos:
-        writer.writerow([
+        yield [
             producto['codigo'],
             producto['nombre'],
             producto['descripcion'],
@@ -5091,248 +5227,98 @@ def generar_csv_reporte_mejorado(productos, resumen, parametros):
             f"${producto['total_vendido']:,.2f}",
             producto['ultima_venta'].strftime('%d/%m/%Y') if producto['ultima_venta'] else 'N/A',
             producto['num_transacciones']
-        ])
-    
-    output.seek(0)
-    response = make_response(output.getvalue())
-    response.headers['Content-Type'] = 'text/csv; charset=utf-8'
-    response.headers['Content-Disposition'] = f'attachment; filename=reporte_ventas_{fecha_desde}_{fecha_hasta}.csv'
-    
-    return response
+        ]
 
 
 def generar_excel_reporte_mejorado(productos, resumen, parametros):
-    """Generar archivo Excel del reporte mejorado"""
+    """Generar archivo Excel del reporte mejorado (write-only, desde un archivo temporal)"""
     try:
-        import openpyxl
-        from openpyxl.styles import Font, PatternFill, Alignment, Border, Side
-        from openpyxl.utils import get_column_letter
-        
-        fecha_desde = parametros['fecha_desde']
-        fecha_hasta = parametros['fecha_hasta']
-        
-        wb = openpyxl.Workbook()
-        ws = wb.active
-        ws.title = "Reporte de Ventas"
-        
-        # Estilos
-        titulo_font = Font(bold=True, size=16, color="FFFFFF")
-        titulo_fill = PatternFill(start_color="366092", end_color="366092", fill_type="solid")
-        encabezado_font = Font(bold=True, size=11, color="FFFFFF")
-        encabezado_fill = PatternFill(start_color="366092", end_color="366092", fill_type="solid")
-        border = Border(
-            left=Side(style='thin'),
-            right=Side(style='thin'),
-            top=Side(style='thin'),
-            bottom=Side(style='thin')
-        )
-        
-        # Título
-        ws.merge_cells('A1:K1')
-        celda_titulo = ws['A1']
-        celda_titulo.value = 'Reporte de Ventas por Producto'
-        celda_titulo.font = titulo_font
-        celda_titulo.fill = titulo_fill
-        celda_titulo.alignment = Alignment(horizontal='center', vertical='center')
-        
-        ws['A2'] = f'Período: {fecha_desde} al {fecha_hasta}'
-        ws['A3'] = f'Generado: {datetime.now().strftime("%d/%m/%Y %H:%M")}'
-        
-        # Resumen
-        fila = 5
-        ws.merge_cells(f'A{fila}:K{fila}')
-        ws[f'A{fila}'] = 'RESUMEN DEL PERÍODO'
-        ws[f'A{fila}'].font = Font(bold=True, size=12)
-        
-        fila += 1
-        ws[f'A{fila}'] = 'Productos Vendidos:'
-        ws[f'B{fila}'] = resumen['total_productos']
-        ws[f'D{fila}'] = 'Total Unidades:'
-        ws[f'E{fila}'] = resumen['total_unidades_reales']
-        
-        fila += 1
-        ws[f'A{fila}'] = 'Total Vendido:'
-        ws[f'B{fila}'] = resumen['total_ventas']
-        ws[f'D{fila}'] = 'Promedio por Producto:'
-        ws[f'E{fila}'] = resumen['promedio_por_producto']
-        
-        # Encabezados de tabla
-        fila += 2
-        encabezados = [
-            'Código', 'Producto', 'Descripción', 'Categoría', 'Tipo',
-            'Cantidad Real', 'Unidades/Combos', 'Precio Prom.', 
-            'Total Vendido', 'Última Venta', 'Transacciones'
-        ]
-        
-        for col, encabezado in enumerate(encabezados, 1):
-            celda = ws.cell(row=fila, column=col, value=encabezado)
-            celda.font = encabezado_font
-            celda.fill = encabezado_fill
-            celda.alignment = Alignment(horizontal='center', vertical='center')
-            celda.border = border
-        
-        # Datos
-        fila += 1
-        for producto in productos:
-            ws.cell(row=fila, column=1, value=producto['codigo'])
-            ws.cell(row=fila, column=2, value=producto['nombre'])
-            ws.cell(row=fila, column=3, value=producto['descripcion'])
-            ws.cell(row=fila, column=4, value=producto['categoria'])
-            ws.cell(row=fila, column=5, value=producto['tipo_producto'])
-            ws.cell(row=fila, column=6, value=producto['cantidad_real'])
-            ws.cell(row=fila, column=7, value=producto['detalle_unidades'])
-            ws.cell(row=fila, column=8, value=producto['precio_promedio'])
-            ws.cell(row=fila, column=9, value=producto['total_vendido'])
-            ws.cell(row=fila, column=10, value=producto['ultima_venta'].strftime('%d/%m/%Y') if producto['ultima_venta'] else 'N/A')
-            ws.cell(row=fila, column=11, value=producto['num_transacciones'])
-            
-            fila += 1
-        
-        # Ajustar anchos
-        ws.column_dimensions['A'].width = 15
-        ws.column_dimensions['B'].width = 40
-        ws.column_dimensions['C'].width = 30
-        ws.column_dimensions['D'].width = 15
-        ws.column_dimensions['E'].width = 15
-        ws.column_dimensions['F'].width = 15
-        ws.column_dimensions['G'].width = 25
-        ws.column_dimensions['H'].width = 15
-        ws.column_dimensions['I'].width = 15
-        ws.column_dimensions['J'].width = 15
-        ws.column_dimensions['K'].width = 15
-        
-        # Guardar
-        output = io.BytesIO()
-        wb.save(output)
-        output.seek(0)
-        
-        response = make_response(output.getvalue())
-        response.headers['Content-Type'] = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
-        response.headers['Content-Disposition'] = f'attachment; filename=reporte_ventas_{fecha_desde}_{fecha_hasta}.xlsx'
-        
-        return response
-        
+        wb = libro_excel_reporte_mejorado(productos, resumen, parametros)
     except ImportError:
-        return generar_csv_reporte_mejorado(productos, resumen, parametros)        
+        return generar_csv_reporte_mejorado(productos, resumen, parametros)
+    
+    return respuesta_xlsx(wb, f"reporte_ventas_{parametros['fecha_desde']}_{parametros['fecha_hasta']}.xlsx")
 
-def generar_csv_reporte(datos, fecha_desde, fecha_hasta):
-    """Generar archivo CSV del reporte"""
-    output = io.StringIO()
-    writer = csv.writer(output)
+
+def escribir_excel_reporte_mejorado(output, productos, resumen, parametros):
+    """Escribe el Excel del reporte mejorado en un archivo binario (ImportError sin openpyxl)"""
+    libro_excel_reporte_mejorado(productos, resumen, parametros).save(output)
+
+
+def libro_excel_reporte_mejorado(productos, resumen, parametros):
+    """
+    Libro write-only del reporte mejorado: cada producto se escribe al leerlo
+    (productos puede ser un generador de filas_cursor). ImportError sin
+    openpyxl, antes de tocar 'productos'.
+    """
+    fecha_desde = parametros['fecha_desde']
+    fecha_hasta = parametros['fecha_hasta']
     
-    # Escribir encabezado del reporte
-    writer.writerow([f'Reporte de Ventas por Producto'])
-    writer.writerow([f'Período: {fecha_desde} al {fecha_hasta}'])
-    writer.writerow([f'Generado: {datetime.now().strftime("%d/%m/%Y %H:%M")}'])
-    writer.writerow([])  # Línea vacía
+    wb, ws = libro_xlsx("Reporte de Ventas", anchos=[15, 40, 30, 15, 15, 15, 25, 15, 15, 15, 15])
     
-    # Escribir datos
-    for fila in datos:
-        writer.writerow(fila)
+    # Título
+    combinar_xlsx(ws, 'A1:K1')
+    ws.append(celdas_xlsx(ws, ['Reporte de Ventas por Producto'] + [None] * 10, 'reporte_titulo'))
+    ws.append([f'Período: {fecha_desde} al {fecha_hasta}'])
+    ws.append([f'Generado: {datetime.now().strftime("%d/%m/%Y %H:%M")}'])
+    ws.append([])
     
-    # Crear respuesta
-    output.seek(0)
-    response = make_response(output.getvalue())
-    response.headers['Content-Type'] = 'text/csv'
-    response.headers['Content-Disposition'] = f'attachment; filename=reporte_ventas_{fecha_desde}_{fecha_hasta}.csv'
+    # Resumen
+    combinar_xlsx(ws, 'A5:K5')
+    ws.append([celda_xlsx(ws, 'RESUMEN DEL PERÍODO', 'reporte_seccion')])
+    ws.append(['Productos Vendidos:', resumen['total_productos'], None,
+               'Total Unidades:', resumen['total_unidades_reales']])
+    ws.append(['Total Vendido:', resumen['total_ventas'], None,
+               'Promedio por Producto:', resumen['promedio_por_producto']])
+    ws.append([])
+    
+    # Encabezados de tabla
+    ws.append(celdas_xlsx(ws, [
+        'Código', 'Producto', 'Descripción', 'Categoría', 'Tipo',
+        'Cantidad Real', 'Unidades/Combos', 'Precio Prom.', 
+        'Total Vendido', 'Última Venta', 'Transacciones'
+    ], 'reporte_encabezado'))
     
-    return response
-
-def generar_excel_reporte(datos, fecha_desde, fecha_hasta):
-    """Generar archivo Excel del reporte (requiere openpyxl)"""
-    try:
-        import openpyxl
-        from openpyxl.styles import Font, PatternFill, Alignment
-        from openpyxl.utils import get_column_letter
-        
-        # Crear workbook
-        wb = openpyxl.Workbook()
-        ws = wb.active
-        ws.title = "Reporte de Ventas"
-        
-        # Estilos
-        titulo_font = Font(bold=True, size=16)
-        encabezado_font = Font(bold=True, size=12, color="FFFFFF")
-        encabezado_fill = PatternFill(start_color="366092", end_color="366092", fill_type="solid")
-        
-        # Título del reporte
-        ws['A1'] = f'Reporte de Ventas por Producto'
-        ws['A1'].font = titulo_font
-        ws['A2'] = f'Período: {fecha_desde} al {fecha_hasta}'
-        ws['A3'] = f'Generado: {datetime.now().strftime("%d/%m/%Y %H:%M")}'
-        
-        # Fila inicial para datos
-        fila_inicio = 5
-        
-        # Escribir encabezados
-        encabezados = datos[0]
-        for col, encabezado in enumerate(encabezados, 1):
-            celda = ws.cell(row=fila_inicio, column=col, value=encabezado)
-            celda.font = encabezado_font
-            celda.fill = encabezado_fill
-            celda.alignment = Alignment(horizontal='center')
-        
-        # Escribir datos
-        for fila_idx, fila_datos in enumerate(datos[1:], fila_inicio + 1):
-            for col_idx, valor in enumerate(fila_datos, 1):
-                ws.cell(row=fila_idx, column=col_idx, value=valor)
-        
-        # Ajustar ancho de columnas
-        for col in range(1, len(encabezados) + 1):
-            ws.column_dimensions[get_column_letter(col)].width = 15
-        
-        # Guardar en memoria
-        output = io.BytesIO()
-        wb.save(output)
-        output.seek(0)
-        
-        # Crear respuesta
-        response = make_response(output.getvalue())
-        response.headers['Content-Type'] = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
-        response.headers['Content-Disposition'] = f'attachment; filename=reporte_ventas_{fecha_desde}_{fecha_hasta}.xlsx'
-        
-        return response
-        
-    except ImportError:
-        # Si no está instalado openpyxl, devolver CSV
-        return generar_csv_reporte(datos, fecha_desde, fecha_hasta)
+    # Datos
+    for producto in productos:
+        ws.append([
+            producto['codigo'],
+            producto['nombre'],
+            producto['descripcion'],
+            producto['categoria'],
+            producto['tipo_producto'],
+            producto['cantidad_real'],
+            producto['detalle_unidades'],
+            producto['precio_promedio'],
+            producto['total_vendido'],
+            producto['ultima_venta'].strftime('%d/%m/%Y') if producto['ultima_venta'] else 'N/A',
+            producto['num_transacciones']
+        ])
+    
+    return wb
 
 # ==================== REPORTE RÁPIDO DE TOP PRODUCTOS ====================
 
 @app.route('/api/top_productos_vendidos')
+@cache_reporte()
 def api_top_productos_vendidos():
     """API para obtener top 10 productos más vendidos (últimos 30 días)"""
     if 'user_id' not in session:
         return jsonify({'error': 'No autorizado'}), 401
     
     try:
-        # Últimos 30 días
-        fecha_hasta = datetime.now()
+        # Últimos 30 días (días completos, desde los resúmenes diarios si están)
+        fecha_hasta = datetime.now().date()
         fecha_desde = fecha_hasta - timedelta(days=30)
         
         # Query para top productos
-        resultados = db.session.query(
-            Producto.codigo,
-            Producto.nombre,
-            func.sum(DetalleFactura.cantidad).label('cantidad_vendida'),
-            func.sum(DetalleFactura.subtotal).label('total_vendido')
-        ).join(
-            DetalleFactura, Producto.id == DetalleFactura.producto_id
-        ).join(
-            Factura, DetalleFactura.factura_id == Factura.id
-        ).filter(
-            and_(
-                Factura.fecha >= fecha_desde,
-                Factura.fecha <= fecha_hasta,
-                Factura.estado == 'autorizada'
-            )
-        ).group_by(
-            Producto.id,
-            Producto.codigo,
-            Producto.nombre
-        ).order_by(
-            desc('cantidad_vendida')
-        ).limit(10).all()
+        resultados = consultar_ventas(
+            'productos', ['cantidad', 'neto'], fecha_desde, fecha_hasta,
+            agrupar=['producto_id', 'codigo', 'nombre'],
+            estados=['autorizada'],
+            orden=['-cantidad'],
+            limite=10
+        )
         
         # Formatear respuesta
         top_productos = []
@@ -5340,8 +5326,8 @@ def api_top_productos_vendidos():
             top_productos.append({
                 'codigo': resultado.codigo,
                 'nombre': resultado.nombre,
-                'cantidad_vendida': int(resultado.cantidad_vendida),
-                'total_vendido': float(resultado.total_vendido)
+                'cantidad_vendida': int(resultado.cantidad),
+                'total_vendido': float(resultado.neto)
             })
         
         return jsonify({
@@ -5362,6 +5348,7 @@ def api_top_productos_vendidos():
 # REEMPLAZA tu función api_dashboard_ventas() existente con esta versión mejorada:
 
 @app.route('/api/dashboard_ventas')
+@cache_reporte()
 def api_dashboard_ventas():
     """API para dashboard de ventas (resumen del día) - VERSIÓN CORREGIDA"""
     if 'user_id' not in session:
@@ -5375,51 +5362,29 @@ def api_dashboard_ventas():
         hoy = date.today()
         print(f"📅 Consultando ventas para: {hoy}")
         
-        # CONSULTA 1: Datos básicos de ventas del día
-        # Usar DATE() para comparar solo la fecha, no hora
-        consulta_ventas = db.session.query(
-            func.count(Factura.id).label('num_facturas'),
-            func.coalesce(func.sum(Factura.total), 0).label('total_vendido')
-        ).filter(
-            func.date(Factura.fecha) == hoy
-        ).first()
+        # CONSULTA 1: Datos básicos de ventas del día (resúmenes diarios si están)
+        consulta_ventas = consultar_ventas('facturas', ['tickets', 'importe'], hoy, hoy)[0]
         
         print(f"📊 Consulta ventas básicas completada")
-        print(f"   Facturas: {consulta_ventas.num_facturas}")
-        print(f"   Total: ${consulta_ventas.total_vendido}")
+        print(f"   Facturas: {consulta_ventas.tickets}")
+        print(f"   Total: ${consulta_ventas.importe or 0}")
         
         # CONSULTA 2: Total de unidades vendidas del día
-        consulta_unidades = db.session.query(
-            func.coalesce(func.sum(DetalleFactura.cantidad), 0).label('total_unidades')
-        ).join(
-            Factura, DetalleFactura.factura_id == Factura.id
-        ).filter(
-            func.date(Factura.fecha) == hoy
-        ).first()
+        consulta_unidades = consultar_ventas('productos', ['cantidad'], hoy, hoy)[0]
         
-        print(f"📦 Unidades vendidas: {consulta_unidades.total_unidades}")
+        print(f"📦 Unidades vendidas: {consulta_unidades.cantidad or 0}")
         
         # CONSULTA 3: Producto más vendido del día
-        consulta_top_producto = db.session.query(
-            Producto.codigo,
-            Producto.nombre,
-            func.sum(DetalleFactura.cantidad).label('cantidad_vendida')
-        ).join(
-            DetalleFactura, Producto.id == DetalleFactura.producto_id
-        ).join(
-            Factura, DetalleFactura.factura_id == Factura.id
-        ).filter(
-            func.date(Factura.fecha) == hoy
-        ).group_by(
-            Producto.id,
-            Producto.codigo, 
-            Producto.nombre
-        ).order_by(
-            desc('cantidad_vendida')
-        ).first()
+        top = consultar_ventas(
+            'productos', ['cantidad'], hoy, hoy,
+            agrupar=['producto_id', 'codigo', 'nombre'],
+            orden=['-cantidad'],
+            limite=1
+        )
+        consulta_top_producto = top[0] if top else None
         
         if consulta_top_producto:
-            print(f"👑 Top producto: {consulta_top_producto.codigo} - {consulta_top_producto.nombre} ({consulta_top_producto.cantidad_vendida} unidades)")
+            print(f"👑 Top producto: {consulta_top_producto.codigo} - {consulta_top_producto.nombre} ({consulta_top_producto.cantidad} unidades)")
         else:
             print("👑 No hay ventas de productos hoy")
         
@@ -5427,9 +5392,9 @@ def api_dashboard_ventas():
         response_data = {
             'success': True,
             'ventas_hoy': {
-                'num_facturas': int(consulta_ventas.num_facturas or 0),
-                'total_vendido': float(consulta_ventas.total_vendido or 0),
-                'unidades_vendidas': int(consulta_unidades.total_unidades or 0)
+                'num_facturas': int(consulta_ventas.tickets or 0),
+                'total_vendido': float(consulta_ventas.importe or 0),
+                'unidades_vendidas': int(consulta_unidades.cantidad or 0)
             },
             'producto_top_hoy': None
         }
@@ -5439,7 +5404,7 @@ def api_dashboard_ventas():
             response_data['producto_top_hoy'] = {
                 'codigo': consulta_top_producto.codigo,
                 'nombre': consulta_top_producto.nombre,
-                'cantidad': int(consulta_top_producto.cantidad_vendida)
+                'cantidad': int(consulta_top_producto.cantidad)
             }
         
         print(f"✅ Dashboard data preparada correctamente")
@@ -5665,127 +5630,38 @@ def importar_productos_vista():
 
 @app.route('/api/importar_productos_lote', methods=['POST'])
 def importar_productos_lote():
+    """Importación sincrónica de un lote chico (para listas grandes usar /api/importaciones)"""
     try:
         data = request.get_json()
         productos = data.get('productos', [])
         opciones = data.get('opciones', {})
         
-        solo_actualizar = opciones.get('solo_actualizar', False)
-        crear_nuevos = opciones.get('crear_nuevos', True)
-        incluir_costo_margen = opciones.get('incluir_costo_margen', True)
-        
         if not productos:
             return jsonify({
                 'success': False,
                 'error': 'No se recibieron productos para importar'
             })
         
-        resultados = {
-            'nuevos': 0,
-            'actualizados': 0,
-            'errores': 0,
-            'productos_procesados': [],
-            'detalles_errores': []
-        }
-        
         print(f"Procesando {len(productos)} productos...")
         
-        for producto_data in productos:
-            try:
-                codigo = producto_data.get('codigo', '').strip()
-                descripcion = producto_data.get('descripcion', '').strip()
-                precio = producto_data.get('precio', 0)
-                costo = producto_data.get('costo', 0) if incluir_costo_margen else 0
-                margen = producto_data.get('margen', 0) if incluir_costo_margen else 0
-                
-                # Validaciones básicas
-                if not codigo or not descripcion or precio <= 0:
-                    resultados['errores'] += 1
-                    resultados['detalles_errores'].append({
-                        'codigo': codigo,
-                        'error': 'Datos incompletos o inválidos'
-                    })
-                    continue
-                
-                # Verificar si el producto existe (usando SQLAlchemy)
-                producto_existente = Producto.query.filter_by(codigo=codigo).first()
-                
-                if producto_existente:
-                    # Producto existe - actualizar
-                    if solo_actualizar or crear_nuevos:
-                        producto_existente.nombre = descripcion
-                        producto_existente.descripcion = descripcion
-                        producto_existente.precio = Decimal(str(precio))
-                        
-                        if incluir_costo_margen:
-                            producto_existente.costo = Decimal(str(costo))
-                            producto_existente.margen = Decimal(str(margen))
-                        
-                        producto_existente.fecha_modificacion = datetime.now()
-                        
-                        resultados['actualizados'] += 1
-                        resultados['productos_procesados'].append({
-                            'codigo': codigo,
-                            'estado': 'actualizado'
-                        })
-                        print(f"Actualizado: {codigo}")
-                    else:
-                        resultados['productos_procesados'].append({
-                            'codigo': codigo,
-                            'estado': 'existente'
-                        })
-                
-                else:
-                    # Producto no existe - crear nuevo
-                    if crear_nuevos:
-                        nuevo_producto = Producto(
-                            codigo=codigo,
-                            nombre=descripcion,
-                            descripcion=descripcion,
-                            precio=Decimal(str(precio)),
-                            costo=Decimal(str(costo)) if incluir_costo_margen else Decimal('0'),
-                            margen=Decimal(str(margen)) if incluir_costo_margen else Decimal('0'),
-                            stock=0,
-                            categoria='Importado',
-                            iva=Decimal('21.00'),
-                            activo=True
-                        )
-                        
-                        db.session.add(nuevo_producto)
-                        
-                        resultados['nuevos'] += 1
-                        resultados['productos_procesados'].append({
-                            'codigo': codigo,
-                            'estado': 'nuevo'
-                        })
-                        print(f"Creado: {codigo}")
-                    else:
-                        resultados['productos_procesados'].append({
-                            'codigo': codigo,
-                            'estado': 'no_creado'
-                        })
-                
-            except Exception as e:
-                resultados['errores'] += 1
-                resultados['detalles_errores'].append({
-                    'codigo': producto_data.get('codigo', 'N/A'),
-                    'error': str(e)
-                })
-                print(f"Error procesando producto {producto_data.get('codigo')}: {e}")
-        
-        # Guardar todos los cambios
+        # Mismo upsert por lotes que las importaciones en segundo plano
+        existentes = codigos_existentes_productos(db)
+        resultados = upsert_productos(db, productos, opciones, existentes)
         db.session.commit()
+        if resultados['ids']:
+            invalidar_catalogo(ids=resultados['ids'])
         
         print(f"Importación completada: {resultados['nuevos']} nuevos, "
-              f"{resultados['actualizados']} actualizados, {resultados['errores']} errores")
+              f"{resultados['actualizados']} actualizados, {len(resultados['errores'])} errores")
         
         return jsonify({
             'success': True,
             'nuevos': resultados['nuevos'],
             'actualizados': resultados['actualizados'],
-            'errores': resultados['errores'],
-            'productos_procesados': resultados['productos_procesados'],
-            'detalles_errores': resultados['detalles_errores']
+            'errores': len(resultados['errores']),
+            'productos_procesados': resultados['procesados'],
+            'detalles_errores': [{'codigo': e['codigo'], 'error': e['error']} for e in resultados['errores']],
+            'sin_categoria': resultados['sin_categoria']
         })
         
     except Exception as e:
@@ -5799,29 +5675,8 @@ def importar_productos_lote():
                 
 
 def detectar_categoria(descripcion):
-    """Detectar categoría básica desde la descripción del producto"""
-    descripcion_lower = descripcion.lower()
-    
-    # Mapeo de palabras clave a categorías
-    categorias = {
-        'POLLO': ['pollo', 'pechuga', 'muslo', 'ala', 'carcasa'],
-        'CARNE': ['carne', 'bife', 'asado', 'costilla', 'vacio', 'chorizo'],
-        'CERDO': ['cerdo', 'bondiola', 'matambre', 'costilla cerdo'],
-        'PESCADO': ['pescado', 'salmon', 'merluza', 'atun'],
-        'CHACINADOS': ['salame', 'jamon', 'mortadela', 'chorizo', 'morcilla'],
-        'LACTEOS': ['leche', 'queso', 'yogur', 'manteca', 'crema'],
-        'CONGELADOS': ['congelado', 'frozen', 'helado'],
-        'BEBIDAS': ['gaseosa', 'agua', 'jugo', 'cerveza', 'vino'],
-        'PANADERIA': ['pan', 'facturas', 'torta', 'galletas'],
-        'LIMPIEZA': ['detergente', 'lavandina', 'jabon', 'shampoo'],
-        'VERDURAS': ['verdura', 'lechuga', 'tomate', 'cebolla', 'papa']
-    }
-    
-    for categoria, palabras_clave in categorias.items():
-        if any(palabra in descripcion_lower for palabra in palabras_clave):
-            return categoria
-    
-    return 'GENERAL'  # Categoría por defecto
+    """Detectar categoría básica desde la descripción del producto (reglas en regla_categoria)"""
+    return clasificador.clasificar([descripcion])[0] or CATEGORIA_POR_DEFECTO
 
 # AGREGAR esta nueva ruta en app.py:
 
@@ -5892,6 +5747,7 @@ def eliminar_combo(combo_id):
         
         db.session.delete(combo)
         db.session.commit()
+        invalidar_catalogo(ids=[combo_id])
         
         print(f"🗑️ Combo eliminado exitosamente: {codigo_combo}")
         
@@ -6039,16 +5895,26 @@ def buscar_facturas():
         # Ordenar por fecha descendente (más recientes primero)
         query = query.order_by(Factura.fecha.desc())
         
-        # Aplicar límite
-        facturas = query.limit(limite).all()
+        # Aplicar límite (cliente, usuario, medios de pago y detalles en consultas por lote)
+        facturas = query.options(
+            joinedload(Factura.cliente), joinedload(Factura.usuario),
+            selectinload(Factura.medios_pago), selectinload(Factura.detalles)
+        ).limit(limite).all()
         
         print(f"   Facturas encontradas: {len(facturas)}")
         
+        # ✅ DESCUENTOS APLICADOS: una sola consulta para todas las facturas
+        descuentos = {}
+        if facturas:
+            for descuento in DescuentoFactura.query.filter(
+                DescuentoFactura.factura_id.in_([f.id for f in facturas])
+            ).order_by(DescuentoFactura.id.desc()):
+                descuentos[descuento.factura_id] = descuento
+        
         # Formatear resultados
         resultado = []
         for factura in facturas:
-            # ✅ BUSCAR DESCUENTO APLICADO
-            descuento = DescuentoFactura.query.filter_by(factura_id=factura.id).first()
+            descuento = descuentos.get(factura.id)
 
             # Obtener información de medios de pago
             medios_pago = []
@@ -6089,7 +5955,7 @@ def buscar_facturas():
             
             resultado.append(factura_dict)
         
-        return jsonify({
+        return respuesta_json({
             'success': True,
             'facturas': resultado,
             'total': len(resultado),
@@ -6199,9 +6065,11 @@ def reintentar_afip(factura_id):
             
             factura.cae = resultado_afip['cae']
             factura.vto_cae = resultado_afip['vto_cae']
-            factura.estado = 'autorizada'
+            with moviendo_factura(factura.id):
+                factura.estado = 'autorizada'
             
             db.session.commit()
+            invalidar_reportes(factura.fecha)
             
             print(f"✅ Reintento exitoso. CAE: {factura.cae}")
             
@@ -6214,8 +6082,10 @@ def reintentar_afip(factura_id):
             })
         else:
             # Actualizar estado a error
-            factura.estado = 'error_afip'
+            with moviendo_factura(factura.id):
+                factura.estado = 'error_afip'
             db.session.commit()
+            invalidar_reportes(factura.fecha)
             
             print(f"❌ Reintento falló: {resultado_afip.get('error', 'Error desconocido')}")
             
@@ -6298,7 +6168,8 @@ def anular_factura(factura_id):
                     usuario_id=session.get('user_id'),
                     usuario_nombre=session.get('nombre', 'Sistema'),
                     codigo_producto=producto.codigo,
-                    nombre_producto=producto.nombre
+                    nombre_producto=producto.nombre,
+                    commit=False
                 )
             else:
                 print(f"   ⚠️ ADVERTENCIA: Producto ID {item.producto_id} no encontrado")
@@ -6306,15 +6177,19 @@ def anular_factura(factura_id):
         print(f"✅ Stock reintegrado: {len(productos_reintegrados)} productos")
         # ==========================================================
         
-        # Marcar como anulada
-        factura.estado = 'anulada'
+        # Marcar como anulada (y pasarla a 'anulada' en los resúmenes de ventas)
+        with moviendo_factura(factura.id):
+            factura.estado = 'anulada'
         
         # OPCIONAL: Si querés guardar el motivo y fecha
         # (necesitarías agregar estos campos al modelo Factura)
         # factura.fecha_anulacion = datetime.now()
         # factura.motivo_anulacion = motivo
         
+        recalcular_stock_disponible(db, bases=[item.producto_id for item in items_factura])
         db.session.commit()
+        invalidar_catalogo(ids=[item.producto_id for item in items_factura])
+        invalidar_reportes(factura.fecha)
         
         return jsonify({
             'success': True,
@@ -6890,6 +6765,7 @@ def toggle_acceso_rapido(producto_id):
             accion = 'agregado a'
         
         db.session.commit()
+        invalidar_catalogo(ids=[producto.id])
         
         return jsonify({
             'success': True,
@@ -6924,6 +6800,7 @@ def reordenar_acceso_rapido():
                 producto.orden_acceso_rapido = i + 1
         
         db.session.commit()
+        invalidar_catalogo(ids=productos_orden)
         
         return jsonify({
             'success': True,
@@ -6939,6 +6816,7 @@ def reordenar_acceso_rapido():
 
 
 @app.route('/api/productos_acceso_rapido')
+@get_condicional('catalogo', requiere_sesion=None)
 def obtener_productos_acceso_rapido():
     """Obtener productos marcados como acceso rápido"""
     try:
@@ -6999,6 +6877,7 @@ def migrar_acceso_rapido():
             producto.orden_acceso_rapido = 0
         
         db.session.commit()
+        invalidar_catalogo()
         print(f"✅ Migración completada: {len(productos_iniciales)} productos en acceso rápido")
         
     except Exception as e:
@@ -7156,6 +7035,8 @@ def crear_gasto():
         
         db.session.add(gasto)
         db.session.commit()
+        incrementar_version('gasto')
+        invalidar_reportes(gasto.fecha)
         
         print(f"✅ Gasto creado: ID {gasto.id} - {descripcion} - ${monto:.2f}")
         
@@ -7239,6 +7120,8 @@ def eliminar_gasto(gasto_id):
         # Eliminar el gasto
         db.session.delete(gasto)
         db.session.commit()
+        incrementar_version('gasto')
+        invalidar_reportes(gasto.fecha)
         
         print(f"✅ Gasto {gasto_id} eliminado correctamente")
         
@@ -7268,6 +7151,7 @@ def actualizar_gasto(gasto_id):
     try:
         data = request.get_json()
         gasto = Gasto.query.get_or_404(gasto_id)
+        fecha_anterior = gasto.fecha
         
         if not gasto.activo:
             return jsonify({
@@ -7327,6 +7211,8 @@ def actualizar_gasto(gasto_id):
         gasto.fecha_modificacion = datetime.now()
         
         db.session.commit()
+        incrementar_version('gasto')
+        invalidar_reportes(fecha_anterior, gasto.fecha)
         
         print(f"✅ Gasto actualizado: ID {gasto_id}")
         
@@ -7346,6 +7232,7 @@ def actualizar_gasto(gasto_id):
 
 
 @app.route('/api/gastos/categorias', methods=['GET'])
+@get_condicional('gasto')
 def obtener_categorias_gastos():
     """Obtener categorías de gastos disponibles y estadísticas de uso"""
     if 'user_id' not in session:
@@ -7416,6 +7303,7 @@ def obtener_medios_pago_gastos():
 
 
 @app.route('/api/gastos/resumen_periodo')
+@cache_reporte(hasta='hasta')
 def resumen_gastos_periodo():
     """Obtener resumen de gastos para un período específico"""
     if 'user_id' not in session:
@@ -7622,6 +7510,7 @@ def crear_oferta_volumen():
         
         db.session.add(nueva_oferta)
         db.session.commit()
+        invalidar_catalogo('oferta', [producto_id])
         
         print(f"Oferta creada: {producto.codigo} - {cantidad_minima}+ = ${precio_oferta}")
         
@@ -7651,6 +7540,7 @@ def eliminar_oferta_volumen(oferta_id):
         oferta.fecha_modificacion = datetime.now()
         
         db.session.commit()
+        invalidar_catalogo('oferta', [oferta.producto_id])
         
         return jsonify({
             'success': True,
@@ -7673,6 +7563,7 @@ def ofertas_volumen():
 
 
 @app.route('/api/ofertas_volumen_todas')
+@get_condicional('catalogo')
 def obtener_todas_ofertas_volumen():
     """Obtener todas las ofertas por volumen con información del producto"""
     if 'user_id' not in session:
@@ -7775,6 +7666,7 @@ def actualizar_oferta_volumen(oferta_id):
         oferta.fecha_modificacion = datetime.now()
         
         db.session.commit()
+        invalidar_catalogo('oferta', [oferta.producto_id])
         
         print(f"Oferta actualizada: {oferta.producto.codigo} - {cantidad_minima}+ = ${precio_oferta}")
         
@@ -8083,13 +7975,16 @@ def obtener_productos_con_ofertas_volumen():
             )
         ).distinct().all()
         
+        # Todas las ofertas activas en una consulta, agrupadas por producto
+        ofertas_por_producto = {}
+        for oferta in OfertaVolumen.query.filter_by(activo=True).order_by(
+                OfertaVolumen.producto_id, OfertaVolumen.cantidad_minima.asc()).all():
+            ofertas_por_producto.setdefault(oferta.producto_id, []).append(oferta)
+        
         resultado = {}
         
         for producto in productos_con_ofertas:
-            ofertas = OfertaVolumen.query.filter_by(
-                producto_id=producto.id,
-                activo=True
-            ).order_by(OfertaVolumen.cantidad_minima.asc()).all()
+            ofertas = ofertas_por_producto.get(producto.id, [])
             
             resultado[str(producto.id)] = {
                 'producto': {
@@ -8232,23 +8127,27 @@ def debug_certificados():
 ###### ruta de debug oara comparar stock
 @app.route('/api/comparar_stocks')
 def comparar_stocks():
-    """Comparar stock actual vs stock dinámico"""
+    """Comparar stock materializado de combos vs el calculado desde sus bases"""
     if 'user_id' not in session:
         return jsonify({'error': 'No autorizado'}), 401
     
     try:
         # Solo combos para comparar
         combos = Producto.query.filter_by(es_combo=True, activo=True).all()
+        stock_calculado = calcular_stock_combos(db, combos)
         
         comparaciones = []
         for combo in combos:
+            # Materializado (stock_disponible) contra el cálculo en vivo desde las bases
+            calculado = stock_calculado.get(combo.id, 0)
             comparaciones.append({
                 'codigo': combo.codigo,
                 'nombre': combo.nombre,
                 'stock_actual': float(combo.stock),
                 'stock_dinamico': combo.stock_dinamico,
-                'diferencia': combo.stock_dinamico - float(combo.stock),
-                'necesita_ajuste': combo.stock_dinamico != float(combo.stock)
+                'stock_calculado': calculado,
+                'diferencia': combo.stock_dinamico - calculado,
+                'necesita_ajuste': combo.stock_dinamico != calculado
             })
         
         return jsonify({
@@ -8281,6 +8180,43 @@ def api_productos_para_carteles():
         estado = request.args.get('estado', 'activo')
         ofertas = request.args.get('ofertas', 'todos')
         
+        # Productos activos: filtrar sobre el cache en memoria, sin consultas por producto
+        productos_cache = catalogo.productos() if estado == 'activo' else None
+        if productos_cache is not None:
+            termino = buscar.lower()
+            resultado = []
+            for p in sorted(productos_cache, key=lambda x: x['codigo']):
+                if termino and not (termino in p['_codigo_l'] or termino in p['_nombre_l']
+                                    or termino in p['_descripcion_l']):
+                    continue
+                if categoria and p['categoria'] != categoria:
+                    continue
+                tiene_ofertas = catalogo.tiene_ofertas(p['id'])
+                if ofertas == 'con_ofertas' and not (p['es_combo'] or tiene_ofertas):
+                    continue
+                if ofertas == 'sin_ofertas' and (p['es_combo'] or tiene_ofertas):
+                    continue
+                datos = catalogo.a_dict_venta(p)
+                resultado.append({
+                    'id': p['id'],
+                    'codigo': p['codigo'],
+                    'nombre': p['nombre'],
+                    'descripcion': p['descripcion'],
+                    'precio': p['precio'],
+                    'stock_dinamico': datos['stock'],
+                    'categoria': p['categoria'],
+                    'activo': True,
+                    'es_combo': p['es_combo'],
+                    'tiene_ofertas': tiene_ofertas,
+                    'ahorro_combo': datos['ahorro_combo']
+                })
+            
+            return respuesta_json({
+                'success': True,
+                'productos': proyectar(resultado, campos_pedidos()),
+                'total': len(resultado)
+            })
+        
         # Construir query base
         query = Producto.query
         
@@ -8328,12 +8264,13 @@ def api_productos_para_carteles():
         
         # Obtener resultados
         productos = query.order_by(Producto.codigo).all()
+        ids_con_ofertas = Producto.ids_con_ofertas_volumen()
         
         # Formatear respuesta
         resultado = []
         for producto in productos:
             # Verificar si tiene ofertas
-            tiene_ofertas = producto.tiene_ofertas_volumen()
+            tiene_ofertas = producto.id in ids_con_ofertas
             
             producto_dict = {
                 'id': producto.id,
@@ -8351,9 +8288,9 @@ def api_productos_para_carteles():
             
             resultado.append(producto_dict)
         
-        return jsonify({
+        return respuesta_json({
             'success': True,
-            'productos': resultado,
+            'productos': proyectar(resultado, campos_pedidos()),
             'total': len(resultado)
         })
         
@@ -8389,34 +8326,44 @@ def imprimir_carteles():
                 'error': 'No se encontraron productos'
             }), 400
         
-        # Generar e imprimir carteles
-        carteles_impresos = 0
+        # Ofertas en una consulta (o desde el cache) y todos los carteles en memoria
+        ids_con_ofertas = Producto.ids_con_ofertas_volumen()
+        carteles = []
+        for producto in sorted(productos, key=lambda p: p.codigo):
+            tiene_ofertas = producto.id in ids_con_ofertas or producto.es_combo
+            carteles.append((producto.id, impresora_termica.cartel_escpos(producto, tiene_ofertas)))
         
-        for producto in productos:
-            try:
-                # Verificar si tiene ofertas
-                tiene_ofertas = producto.tiene_ofertas_volumen() or producto.es_combo
-                
-                # Generar cartel
-                resultado = impresora_termica.imprimir_cartel_precio(producto, tiene_ofertas)
-                
-                if resultado:
-                    carteles_impresos += 1
-                    print(f"Cartel impreso: {producto.codigo} - {producto.nombre}")
-                else:
-                    print(f"Error imprimiendo cartel: {producto.codigo}")
-                    
-            except Exception as e:
-                print(f"Error imprimiendo producto {producto.codigo}: {e}")
+        por_trabajo = app.config.get('CARTELES_POR_TRABAJO', 50)
+        
+        # Lotes grandes: se imprimen en segundo plano, el navegador consulta el progreso
+        if len(carteles) > por_trabajo:
+            trabajo_id = lanzar_carteles_lote(carteles, por_trabajo, _carteles_impresos)
+            return jsonify({
+                'success': True,
+                'trabajo_id': trabajo_id,
+                'total_solicitados': len(carteles),
+                'mensaje': f'Imprimiendo {len(carteles)} carteles...'
+            }), 202
+        
+        ids_impresos, error = impresora_termica.imprimir_carteles_lote(carteles)
+        if error:
+            print(f"Error imprimiendo carteles: {error}")
+            if not ids_impresos:
+                return jsonify({'success': False, 'error': f'Error al imprimir carteles: {error}'}), 500
+
+        # Los impresos ya no figuran como pendientes de reimpresión
+        limpiar_carteles(ids_impresos)
+        db.session.commit()
         
         return jsonify({
             'success': True,
-            'carteles_impresos': carteles_impresos,
+            'carteles_impresos': len(ids_impresos),
             'total_solicitados': len(productos),
-            'mensaje': f'Se imprimieron {carteles_impresos} de {len(productos)} carteles solicitados'
+            'mensaje': f'Se imprimieron {len(ids_impresos)} de {len(productos)} carteles solicitados'
         })
         
     except Exception as e:
+        db.session.rollback()
         print(f"Error en imprimir_carteles: {str(e)}")
         return jsonify({
             'success': False,
@@ -8424,6 +8371,29 @@ def imprimir_carteles():
         }), 500
 
 
+def _carteles_impresos(ids_impresos):
+    """Al terminar un lote en segundo plano: quitar los impresos de pendientes"""
+    with app.app_context():
+        try:
+            limpiar_carteles(ids_impresos)
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            print(f"Error limpiando carteles pendientes: {e}")
+
+@app.route('/imprimir_carteles/<int:trabajo_id>')
+def estado_impresion_carteles(trabajo_id):
+    """Progreso de un lote de carteles impreso en segundo plano"""
+    if 'user_id' not in session:
+        return jsonify({'error': 'No autorizado'}), 401
+    
+    estado = estado_carteles_lote(trabajo_id)
+    if not estado:
+        return jsonify({'success': False, 'error': 'Trabajo de impresión no encontrado'}), 404
+    
+    return jsonify({'success': True, **estado})
+
+
 
 @app.route('/verificar_licencia')
 def verificar_licencia_manual():
@@ -8471,71 +8441,76 @@ def ayuda_ctacte():
     return render_template('ayuda_ctacte.html')
 
 
+def datos_pdf_cta_cte():
+    """(clientes, resumen) de cuentas corrientes con saldo o movimientos pendientes"""
+    # Query corregida con los nombres REALES de las columnas
+    query = text("""
+        SELECT 
+            c.id,
+            c.nombre,
+            c.documento,
+            COUNT(DISTINCT m.id) as movimientos_pendientes,
+            COALESCE(SUM(CASE WHEN m.tipo = 'venta_fiada' THEN m.monto_total ELSE -m.monto_total END), 0) as saldo_pendiente,
+            MAX(m.fecha) as ultima_operacion
+        FROM cliente c
+        LEFT JOIN cta_cte_movimiento m ON c.id = m.cliente_id AND m.estado = 'pendiente'
+        GROUP BY c.id, c.nombre, c.documento
+        HAVING saldo_pendiente > 0 OR movimientos_pendientes > 0
+        ORDER BY saldo_pendiente DESC
+    """)
+    
+    result = db.session.execute(query)
+    clientes = []
+    
+    total_adeudado = 0
+    clientes_con_deuda = 0
+    total_movimientos = 0
+    
+    for row in result:
+        saldo = float(row.saldo_pendiente)
+        movimientos = int(row.movimientos_pendientes)
+        
+        # Convertir fecha a string AQUÍ
+        ultima_op_str = 'Sin ops.'
+        if row.ultima_operacion:
+            try:
+                ultima_op_str = row.ultima_operacion.strftime('%d/%m/%Y')
+            except:
+                ultima_op_str = str(row.ultima_operacion)[:10]
+        
+        clientes.append({
+            'id': row.id,
+            'nombre': row.nombre,
+            'documento': row.documento or 'S/D',
+            'movimientos_pendientes': movimientos,
+            'saldo_pendiente': saldo,
+            'ultima_operacion': ultima_op_str  # ✅ YA ES STRING
+        })
+        
+        total_adeudado += saldo
+        if saldo > 0:
+            clientes_con_deuda += 1
+        total_movimientos += movimientos
+    
+    print(f"📊 Clientes encontrados: {len(clientes)}")
+    print(f"💰 Total adeudado: ${total_adeudado:,.2f}")
+    print(f"👥 Clientes con deuda: {clientes_con_deuda}")
+    
+    # Preparar resumen
+    resumen = {
+        'total_adeudado': total_adeudado,
+        'clientes_con_deuda': clientes_con_deuda,
+        'total_clientes': len(clientes),
+        'total_movimientos': total_movimientos
+    }
+    return clientes, resumen
+
+
 @app.route('/api/cta_cte/exportar_pdf')
 def exportar_pdf_cta_cte():
     try:
         print("🔍 Iniciando exportación PDF cuentas corrientes")
-        
-        # Query corregida con los nombres REALES de las columnas
-        query = text("""
-            SELECT 
-                c.id,
-                c.nombre,
-                c.documento,
-                COUNT(DISTINCT m.id) as movimientos_pendientes,
-                COALESCE(SUM(CASE WHEN m.tipo = 'venta_fiada' THEN m.monto_total ELSE -m.monto_total END), 0) as saldo_pendiente,
-                MAX(m.fecha) as ultima_operacion
-            FROM cliente c
-            LEFT JOIN cta_cte_movimiento m ON c.id = m.cliente_id AND m.estado = 'pendiente'
-            GROUP BY c.id, c.nombre, c.documento
-            HAVING saldo_pendiente > 0 OR movimientos_pendientes > 0
-            ORDER BY saldo_pendiente DESC
-        """)
-        
-        result = db.session.execute(query)
-        clientes = []
-        
-        total_adeudado = 0
-        clientes_con_deuda = 0
-        total_movimientos = 0
-        
-        for row in result:
-            saldo = float(row.saldo_pendiente)
-            movimientos = int(row.movimientos_pendientes)
-            
-            # Convertir fecha a string AQUÍ
-            ultima_op_str = 'Sin ops.'
-            if row.ultima_operacion:
-                try:
-                    ultima_op_str = row.ultima_operacion.strftime('%d/%m/%Y')
-                except:
-                    ultima_op_str = str(row.ultima_operacion)[:10]
-            
-            clientes.append({
-                'id': row.id,
-                'nombre': row.nombre,
-                'documento': row.documento or 'S/D',
-                'movimientos_pendientes': movimientos,
-                'saldo_pendiente': saldo,
-                'ultima_operacion': ultima_op_str  # ✅ YA ES STRING
-            })
-            
-            total_adeudado += saldo
-            if saldo > 0:
-                clientes_con_deuda += 1
-            total_movimientos += movimientos
-        
-        print(f"📊 Clientes encontrados: {len(clientes)}")
-        print(f"💰 Total adeudado: ${total_adeudado:,.2f}")
-        print(f"👥 Clientes con deuda: {clientes_con_deuda}")
-        
-        # Preparar resumen
-        resumen = {
-            'total_adeudado': total_adeudado,
-            'clientes_con_deuda': clientes_con_deuda,
-            'total_clientes': len(clientes),
-            'total_movimientos': total_movimientos
-        }
+        clientes, resumen = datos_pdf_cta_cte()
         
         # Generar el PDF con ambos parámetros
         pdf_bytes = generar_pdf_cuentas_corrientes(clientes, resumen)
@@ -8565,6 +8540,18 @@ def exportar_pdf_cta_cte():
         }), 500
 
 
+def exportar_pdf_cta_cte_archivo(parametros, archivo, progreso):
+    """Exportación en segundo plano del PDF de cuentas corrientes (ver exportaciones.py)"""
+    progreso(10, 'Consultando saldos...')
+    clientes, resumen = datos_pdf_cta_cte()
+    progreso(50, f'Generando PDF de {len(clientes)} clientes...')
+    archivo.write(generar_pdf_cuentas_corrientes(clientes, resumen))
+    return f"Cuentas_Corrientes_{datetime.now().strftime('%Y%m%d_%H%M%S')}.pdf", 'application/pdf'
+
+
+registrar_exportacion('cta_cte_pdf', exportar_pdf_cta_cte_archivo)
+
+
 # ═══════════════════════════════════════════════════════════════════════════
 # REPORTE DE SALDOS DE CLIENTES
 # ═══════════════════════════════════════════════════════════════════════════
@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+benchmark_busqueda.py - BENCHMARK DEL ÍNDICE DE BÚSQUEDA DE PRODUCTOS
+═══════════════════════════════════════════════════════════════════════════════
+Genera un catálogo sintético (50.000 productos por defecto), construye el
+índice de busqueda_productos.py y mide las búsquedas típicas de caja.
+No necesita base de datos ni servidor.
+
+Uso:
+    python benchmark_busqueda.py
+    python benchmark_busqueda.py --productos 100000 --repeticiones 50
+═══════════════════════════════════════════════════════════════════════════════
+"""
+
+import argparse
+import random
+import time
+
+from busqueda_productos import IndiceBusqueda
+
+OBJETIVO_MS = 20.0
+
+MARCAS = ['Coca Cola', 'Pepsi', 'Arcor', 'Bagley', 'Terrabusi', 'La Serenísima', 'Sancor',
+          'Quilmes', 'Brahma', 'Marolio', 'Molinos', 'Ledesma', 'Paty', 'Swift', 'Knorr',
+          'Hellmann\'s', 'Natura', 'Cañuelas', 'Lucchetti', 'Matarazzo', 'Don Satur', 'Mamá Cocina']
+TIPOS = ['Gaseosa', 'Galletitas', 'Leche', 'Yogur', 'Cerveza', 'Aceite', 'Azúcar', 'Fideos',
+         'Harina', 'Arroz', 'Mayonesa', 'Caldo', 'Hamburguesas', 'Queso', 'Manteca', 'Café',
+         'Yerba', 'Jabón', 'Detergente', 'Papel Higiénico', 'Salchichas', 'Dulce de Leche']
+VARIANTES = ['Light', 'Zero', 'Entera', 'Descremada', 'Clásico', 'Integral', 'Tradicional',
+             'Sin TACC', 'Frutilla', 'Vainilla', 'Chocolate', 'Limón', 'Original', '']
+PRESENTACIONES = ['500ml', '1.5L', '2.25L', '1L', '250g', '500g', '1kg', 'x12', 'x6', '354ml', '']
+
+CONSULTAS = [
+    'coca', 'coca 1.5', 'gaseosa zero', 'leche desc', 'serenisima', 'yerba', 'cafe',
+    'dulce de leche', 'galletitas chocolate', 'fideos luc', 'ar', 'queso', 'sin tacc',
+    'hamb swift', 'cañuelas', 'papel', '779', 'XYZ', 'mayo hell', 'azucar ledesma 1kg'
+]
+
+
+def generar_catalogo(cantidad, semilla):
+    rnd = random.Random(semilla)
+    productos = []
+    for i in range(1, cantidad + 1):
+        nombre = ' '.join(x for x in (rnd.choice(TIPOS), rnd.choice(MARCAS),
+                                      rnd.choice(VARIANTES), rnd.choice(PRESENTACIONES)) if x)
+        productos.append({
+            'id': i,
+            'codigo': str(7790000000000 + rnd.randint(0, 9999999)) if rnd.random() < 0.8 else str(100000 + i),
+            'nombre': nombre.upper() if rnd.random() < 0.3 else nombre,
+            'descripcion': f'{nombre} - artículo {i}' if rnd.random() < 0.3 else None
+        })
+    velocidad = {rnd.randint(1, cantidad): rnd.randint(1, 500) for _ in range(cantidad // 10)}
+    return productos, velocidad
+
+
+def percentil(valores, p):
+    valores = sorted(valores)
+    return valores[min(len(valores) - 1, int(len(valores) * p / 100))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark del índice de búsqueda de productos')
+    parser.add_argument('--productos', type=int, default=50000)
+    parser.add_argument('--repeticiones', type=int, default=20)
+    parser.add_argument('--semilla', type=int, default=42)
+    args = parser.parse_args()
+
+    print(f"📦 Generando {args.productos} productos...")
+    productos, velocidad = generar_catalogo(args.productos, args.semilla)
+
+    inicio = time.perf_counter()
+    indice = IndiceBusqueda.construir(productos, velocidad)
+    print(f"🔨 Índice construido en {(time.perf_counter() - inicio) * 1000:.0f} ms "
+          f"({len(indice.trigramas)} trigramas, {len(indice.prefijos)} prefijos)")
+
+    inicio = time.perf_counter()
+    indice.con_velocidad(velocidad)
+    print(f"📈 Recálculo de velocidad de ventas: {(time.perf_counter() - inicio) * 1000:.0f} ms")
+
+    # Actualización incremental de un producto renombrado (lo que hace el cache al guardar)
+    renombrado = dict(productos[0], nombre='Producto Renombrado De Prueba')
+    inicio = time.perf_counter()
+    indice.actualizar([renombrado['id']], [renombrado])
+    print(f"✏️  Actualización incremental: {(time.perf_counter() - inicio) * 1000:.2f} ms")
+
+    print(f"\n{'consulta':<25}{'res':>5}{'p50 ms':>10}{'p99 ms':>10}  primer resultado")
+    print('─' * 90)
+    todos = []
+    for consulta in CONSULTAS:
+        tiempos = []
+        for _ in range(args.repeticiones):
+            inicio = time.perf_counter()
+            resultado = indice.buscar(consulta, 15)
+            tiempos.append((time.perf_counter() - inicio) * 1000)
+        todos.extend(tiempos)
+        primero = indice.docs[resultado[0][0]].nombre[:35] if resultado else '-'
+        print(f"{consulta:<25}{len(resultado):>5}{percentil(tiempos, 50):>10.2f}"
+              f"{percentil(tiempos, 99):>10.2f}  {primero}")
+
+    p99 = percentil(todos, 99)
+    print('─' * 90)
+    print(f"TOTAL  p50={percentil(todos, 50):.2f} ms  p99={p99:.2f} ms  max={max(todos):.2f} ms")
+    print(f"{'✅' if p99 < OBJETIVO_MS else '❌'} Objetivo p99 < {OBJETIVO_MS:.0f} ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,293 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+busqueda_productos.py - ÍNDICE DE BÚSQUEDA DE PRODUCTOS EN MEMORIA
+═══════════════════════════════════════════════════════════════════════════════
+Índice invertido sobre código, nombre y descripción normalizados (sin acentos,
+minúsculas, sólo letras y números):
+
+    trigramas  'coc' → {ids}    coincidencia en cualquier parte (como ILIKE '%x%')
+    prefijos   'coca' → {ids}   palabras que empiezan así (hasta LARGO_PREFIJO)
+    códigos y nombres ordenados, para rangos de prefijo con bisect
+
+Una búsqueda de varias palabras exige que estén TODAS (AND), en cualquier
+orden. Los resultados salen por niveles de relevancia:
+
+    1. código exacto            'codigo_exacto'
+    2. código que empieza así   'codigo'
+    3. nombre que empieza así   'nombre_inicio'
+    4. palabras que empiezan así (nombre, código o descripción)  'nombre'
+    5. coincidencia parcial en cualquier parte                    'nombre'
+
+y dentro de cada nivel por velocidad de venta reciente y nombre más corto.
+Sólo se evalúan los niveles necesarios para completar el límite, y la
+clasificación es con operaciones de conjuntos, así las búsquedas muy
+amplias ('ar', '779') no recorren todo el catálogo en Python.
+
+El índice es inmutable: actualizar() devuelve uno nuevo que comparte las
+estructuras no afectadas, así se puede reemplazar mientras otros hilos buscan.
+═══════════════════════════════════════════════════════════════════════════════
+"""
+
+from collections import namedtuple
+from bisect import bisect_left, insort
+import unicodedata
+import heapq
+import math
+import re
+
+# La descripción es TEXT: sólo se indexa el comienzo
+MAX_CARACTERES_DESCRIPCION = 200
+
+# Largo máximo de los prefijos de palabra indexados
+LARGO_PREFIJO = 4
+
+_NO_ALFANUMERICO = re.compile(r'[^a-z0-9]+')
+_FIN_RANGO = '\U0010ffff'
+
+_Documento = namedtuple('_Documento', 'codigo nombre texto')
+
+
+def normalizar(texto):
+    """'Café  Molido-500g' → 'cafe molido 500g'"""
+    if not texto:
+        return ''
+    texto = unicodedata.normalize('NFKD', str(texto))
+    texto = ''.join(c for c in texto if not unicodedata.combining(c)).lower()
+    return _NO_ALFANUMERICO.sub(' ', texto).strip()
+
+
+def _trigramas(palabra):
+    return {palabra[i:i + 3] for i in range(len(palabra) - 2)}
+
+
+def _claves_documento(doc):
+    """Claves de índice (trigramas y prefijos de palabra) de un documento"""
+    trigramas = set()
+    prefijos = set()
+    for palabra in doc.texto.split():
+        for largo in range(1, min(len(palabra), LARGO_PREFIJO) + 1):
+            prefijos.add(palabra[:largo])
+        trigramas |= _trigramas(palabra)
+    return trigramas, prefijos
+
+
+def documento_desde_producto(p):
+    """Arma el documento indexable a partir del dict del catálogo"""
+    codigo = normalizar(p.get('codigo'))
+    nombre = normalizar(p.get('nombre'))
+    descripcion = normalizar((p.get('descripcion') or '')[:MAX_CARACTERES_DESCRIPCION])
+    return _Documento(
+        codigo=codigo.replace(' ', ''),
+        nombre=nombre,
+        texto=' '.join(x for x in (codigo, nombre, descripcion) if x)
+    )
+
+
+def _rango(doc, unidades_vendidas):
+    """Orden dentro de un nivel: más vendidos primero, después nombres más cortos"""
+    bonus = min(150.0, 30.0 * math.log1p(unidades_vendidas)) if unidades_vendidas > 0 else 0.0
+    return bonus - len(doc.nombre) * 0.1
+
+
+def _rango_de_lista(lista, prefijo):
+    """ids de una lista ordenada de (texto, id) cuyo texto empieza con prefijo"""
+    desde = bisect_left(lista, (prefijo,))
+    hasta = bisect_left(lista, (prefijo + _FIN_RANGO,))
+    return {pid for _, pid in lista[desde:hasta]}
+
+
+class IndiceBusqueda:
+
+    def __init__(self, docs=None, trigramas=None, prefijos=None,
+                 codigos=None, nombres=None, rango=None, velocidad=None):
+        self.docs = docs or {}              # id → _Documento
+        self.trigramas = trigramas or {}    # trigrama → {ids}
+        self.prefijos = prefijos or {}      # prefijo de palabra → {ids}
+        self.codigos = codigos or []        # [(codigo, id)] ordenada
+        self.nombres = nombres or []        # [(nombre, id)] ordenada
+        self.rango = rango or {}            # id → orden dentro de un nivel
+        self.velocidad = velocidad or {}    # id → unidades vendidas recientes
+
+    # ─── Construcción ────────────────────────────────────────────────────────
+
+    @classmethod
+    def construir(cls, productos, velocidad=None):
+        """Índice completo a partir de una lista de dicts de producto"""
+        velocidad = velocidad or {}
+        docs = {}
+        trigramas = {}
+        prefijos = {}
+        for p in productos:
+            doc = documento_desde_producto(p)
+            docs[p['id']] = doc
+            claves_tri, claves_pre = _claves_documento(doc)
+            for clave in claves_tri:
+                trigramas.setdefault(clave, set()).add(p['id'])
+            for clave in claves_pre:
+                prefijos.setdefault(clave, set()).add(p['id'])
+
+        codigos = sorted((doc.codigo, pid) for pid, doc in docs.items())
+        nombres = sorted((doc.nombre, pid) for pid, doc in docs.items())
+        rango = {pid: _rango(doc, velocidad.get(pid, 0)) for pid, doc in docs.items()}
+        return cls(docs, trigramas, prefijos, codigos, nombres, rango, velocidad)
+
+    def con_velocidad(self, velocidad):
+        """Mismo índice con otra velocidad de ventas (recalcula sólo el orden)"""
+        rango = {pid: _rango(doc, velocidad.get(pid, 0)) for pid, doc in self.docs.items()}
+        return IndiceBusqueda(self.docs, self.trigramas, self.prefijos,
+                              self.codigos, self.nombres, rango, velocidad)
+
+    def actualizar(self, quitar_ids, productos):
+        """
+        Nuevo índice sin quitar_ids y con 'productos' (re)indexados.
+        Si ningún texto cambió devuelve el mismo índice (caso típico: ventas
+        que sólo cambian stock).
+        """
+        nuevos_docs = {p['id']: documento_desde_producto(p) for p in productos}
+        afectados = {pid for pid in set(quitar_ids) | set(nuevos_docs)
+                     if self.docs.get(pid) != nuevos_docs.get(pid)}
+        if not afectados:
+            return self
+
+        docs = dict(self.docs)
+        trigramas = dict(self.trigramas)
+        prefijos = dict(self.prefijos)
+        codigos = list(self.codigos)
+        nombres = list(self.nombres)
+        rango = dict(self.rango)
+        copiadas = set()
+
+        def _lista(indice, tipo, clave):
+            # Copiar el conjunto la primera vez que se toca (copy-on-write)
+            if (tipo, clave) not in copiadas:
+                indice[clave] = set(indice.get(clave, ()))
+                copiadas.add((tipo, clave))
+            return indice[clave]
+
+        for pid in afectados:
+            viejo = docs.pop(pid, None)
+            if viejo:
+                claves_tri, claves_pre = _claves_documento(viejo)
+                for clave in claves_tri:
+                    _lista(trigramas, 't', clave).discard(pid)
+                for clave in claves_pre:
+                    _lista(prefijos, 'p', clave).discard(pid)
+                for lista, texto in ((codigos, viejo.codigo), (nombres, viejo.nombre)):
+                    i = bisect_left(lista, (texto, pid))
+                    if i < len(lista) and lista[i] == (texto, pid):
+                        del lista[i]
+                rango.pop(pid, None)
+
+            nuevo = nuevos_docs.get(pid)
+            if nuevo:
+                docs[pid] = nuevo
+                claves_tri, claves_pre = _claves_documento(nuevo)
+                for clave in claves_tri:
+                    _lista(trigramas, 't', clave).add(pid)
+                for clave in claves_pre:
+                    _lista(prefijos, 'p', clave).add(pid)
+                insort(codigos, (nuevo.codigo, pid))
+                insort(nombres, (nuevo.nombre, pid))
+                rango[pid] = _rango(nuevo, self.velocidad.get(pid, 0))
+
+        return IndiceBusqueda(docs, trigramas, prefijos, codigos, nombres, rango, self.velocidad)
+
+    # ─── Búsqueda ────────────────────────────────────────────────────────────
+
+    def _candidatos(self, termino):
+        """ids que contienen el término (palabra que empieza así si es corto)"""
+        if len(termino) < 3:
+            return self.prefijos.get(termino, set())
+        listas = [self.trigramas.get(t) for t in _trigramas(termino)]
+        if not all(listas):
+            return set()
+        listas.sort(key=len)
+        return listas[0].intersection(*listas[1:])
+
+    def _inicio_de_palabra(self, termino, candidatos):
+        """ids con alguna palabra que empieza con el término"""
+        if len(termino) <= LARGO_PREFIJO:
+            return self.prefijos.get(termino, set())
+        return self.prefijos.get(termino[:LARGO_PREFIJO], set()) & candidatos
+
+    def _codigos_exactos(self, codigo):
+        i = bisect_left(self.codigos, (codigo,))
+        ids = set()
+        while i < len(self.codigos) and self.codigos[i][0] == codigo:
+            ids.add(self.codigos[i][1])
+            i += 1
+        return ids
+
+    def _mejores(self, ids, cuantos, terminos):
+        """Los 'cuantos' ids de mayor rango que contienen todos los términos"""
+        verifica = lambda pid: all(t in self.docs[pid].texto for t in terminos)
+        clave = self.rango.__getitem__
+
+        parcial = len(ids) > cuantos * 8
+        orden = heapq.nlargest(cuantos * 8, ids, key=clave) if parcial else sorted(ids, key=clave, reverse=True)
+        elegidos = [pid for pid in orden if verifica(pid)][:cuantos]
+        if len(elegidos) < cuantos and parcial:
+            orden = sorted(ids, key=clave, reverse=True)
+            elegidos = []
+            for pid in orden:
+                if verifica(pid):
+                    elegidos.append(pid)
+                    if len(elegidos) == cuantos:
+                        break
+        return elegidos
+
+    def buscar(self, consulta, limite=15):
+        """
+        Devuelve [(producto_id, match_tipo)] ordenado por relevancia.
+
+        match_tipo mantiene los valores que usa nueva_venta.html:
+        'codigo_exacto', 'codigo', 'nombre_inicio' o 'nombre'.
+        """
+        q = normalizar(consulta)
+        terminos = q.split()
+        if not terminos:
+            return []
+
+        # Todos los términos (AND), empezando por el más selectivo
+        terminos_unicos = sorted(set(terminos), key=len, reverse=True)
+        candidatos = None
+        for termino in terminos_unicos:
+            ids = self._candidatos(termino)
+            candidatos = ids if candidatos is None else candidatos & ids
+            if not candidatos:
+                return []
+
+        q_compacta = q.replace(' ', '')
+        resultado = []
+        vistos = set()
+
+        def _nivel(ids, match_tipo):
+            ids = ids - vistos
+            if not ids:
+                return
+            for pid in self._mejores(ids, limite - len(resultado), terminos):
+                resultado.append((pid, match_tipo))
+                vistos.add(pid)
+
+        # Con un solo término, empezar con él implica contenerlo: no hace falta intersectar
+        un_termino = len(terminos_unicos) == 1
+
+        niveles = (
+            (lambda: self._codigos_exactos(q_compacta), 'codigo_exacto'),
+            (lambda: _rango_de_lista(self.codigos, q_compacta) if un_termino
+                     else _rango_de_lista(self.codigos, q_compacta) & candidatos, 'codigo'),
+            (lambda: _rango_de_lista(self.nombres, terminos[0]) & candidatos, 'nombre_inicio'),
+            (lambda: set.intersection(*[self._inicio_de_palabra(t, candidatos) for t in terminos_unicos])
+                     & candidatos, 'nombre'),
+            (lambda: candidatos, 'nombre'),
+        )
+        for obtener_ids, match_tipo in niveles:
+            if len(resultado) >= limite:
+                break
+            _nivel(obtener_ids(), match_tipo)
+
+        return resultado
+
+    def __len__(self):
+        return len(self.docs)
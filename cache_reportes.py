@@ -0,0 +1,227 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+cache_reportes.py - CACHE DE RESULTADOS DE REPORTES Y ESTADÍSTICAS
+═══════════════════════════════════════════════════════════════════════════════
+Reportes, estadísticas y dashboard repiten las mismas consultas pesadas
+cada vez que se cambia de pestaña. Ahora la respuesta se guarda en memoria
+por endpoint + parámetros normalizados (orden y espacios no importan):
+
+    @app.route('/api/reporte_ventas_productos')
+    @cache_reporte(hasta='fecha_hasta')
+    def api_reporte_ventas_productos(): ...
+
+VIGENCIA
+    Período cerrado (hasta < hoy)   vale mientras no cambie 'reportes_historicos'
+                                    (una venta o un gasto de HOY no lo toca)
+    Período que incluye hoy         además depende de 'reportes' y del día
+
+invalidar_reportes(*fechas) avanza esas versiones (versiones.py); se llama
+DESPUÉS del commit de facturas, notas de crédito y gastos. Si alguna fecha
+tocada es anterior a hoy (anulación de una factura vieja, gasto cargado
+con fecha pasada) también avanza 'reportes_historicos'.
+
+Pedidos iguales simultáneos se agrupan: el primero calcula y los demás
+esperan su resultado en lugar de repetir la consulta.
+
+Sólo se guardan respuestas 200 de GET que no sean {'success': false}
+(varios reportes devuelven así sus errores con status 200: un corte de la
+base no tiene que quedar guardado). El cache es por proceso y las
+versiones se comparten por la base, así que todos los procesos invalidan
+a la vez.
+═══════════════════════════════════════════════════════════════════════════════
+"""
+
+from flask import request, session, current_app, make_response
+from collections import OrderedDict
+from functools import wraps
+from datetime import date, datetime
+import threading
+
+from versiones import versiones, incrementar_version
+
+USAR_CACHE = True
+MAXIMO_ENTRADAS = 300       # respuestas guardadas por proceso
+ESPERA_MAXIMA = 120         # segundos que un pedido espera a otro igual en curso
+PARAMETROS_IGNORADOS = ('_',)   # anti-cache de jQuery y similares
+
+
+def init_cache_reportes(app):
+    """
+    Configura el cache de reportes
+
+    Uso en app.py:
+        from cache_reportes import init_cache_reportes, cache_reporte, invalidar_reportes
+        init_cache_reportes(app)
+
+    Config:
+        REPORTES_CACHE           False para desactivarlo
+        REPORTES_CACHE_MAXIMO    respuestas guardadas por proceso (300)
+    """
+    global USAR_CACHE, MAXIMO_ENTRADAS
+    USAR_CACHE = app.config.get('REPORTES_CACHE', USAR_CACHE)
+    MAXIMO_ENTRADAS = app.config.get('REPORTES_CACHE_MAXIMO', MAXIMO_ENTRADAS)
+    print(f"✅ Cache de reportes {'activo' if USAR_CACHE else 'desactivado'}")
+
+
+# ═══════════════════════════════════════════════════════════════════════════════
+# INVALIDACIÓN
+# ═══════════════════════════════════════════════════════════════════════════════
+
+def invalidar_reportes(*fechas):
+    """
+    Avisa que cambiaron ventas o gastos (después del commit).
+
+    Args:
+        fechas: días tocados (date o datetime). Sin fechas = sólo hoy
+    """
+    hoy = date.today()
+    dias = [f.date() if isinstance(f, datetime) else f for f in fechas if f]
+    if any(dia < hoy for dia in dias):
+        incrementar_version('reportes', 'reportes_historicos')
+    else:
+        incrementar_version('reportes')
+
+
+# ═══════════════════════════════════════════════════════════════════════════════
+# CACHE
+# ═══════════════════════════════════════════════════════════════════════════════
+
+class _CacheReportes:
+    """Respuestas por clave, LRU acotado, con agrupación de pedidos en curso"""
+
+    def __init__(self):
+        self._respuestas = OrderedDict()
+        self._en_curso = {}
+        self._lock = threading.Lock()
+
+    def obtener(self, clave):
+        with self._lock:
+            respuesta = self._respuestas.get(clave)
+            if respuesta is not None:
+                self._respuestas.move_to_end(clave)
+            return respuesta
+
+    def calcular(self, clave, funcion):
+        """Devuelve (datos, True si vinieron del cache o de otro pedido igual)"""
+        with self._lock:
+            respuesta = self._respuestas.get(clave)
+            if respuesta is not None:
+                self._respuestas.move_to_end(clave)
+                return respuesta, True
+            evento = self._en_curso.get(clave)
+            lider = evento is None
+            if lider:
+                evento = self._en_curso[clave] = threading.Event()
+
+        if not lider:
+            evento.wait(ESPERA_MAXIMA)
+            respuesta = self.obtener(clave)
+            if respuesta is not None:
+                return respuesta, True
+            # El otro pedido falló o no era cacheable: calcular por cuenta propia
+            return funcion(), False
+
+        try:
+            respuesta = funcion()
+            if respuesta is not None:
+                with self._lock:
+                    self._respuestas[clave] = respuesta
+                    while len(self._respuestas) > MAXIMO_ENTRADAS:
+                        self._respuestas.popitem(last=False)
+            return respuesta, False
+        finally:
+            with self._lock:
+                self._en_curso.pop(clave, None)
+            evento.set()
+
+
+cache = _CacheReportes()
+
+
+def _ultimo_dia(hasta):
+    """Último día que cubre el pedido (date) o None si no se sabe / no aplica"""
+    if hasta is None:
+        return None
+    try:
+        if callable(hasta):
+            return hasta()
+        valor = request.args.get(hasta, '').strip()
+        return datetime.strptime(valor, '%Y-%m-%d').date() if valor else None
+    except (ValueError, TypeError):
+        return None
+
+
+def _clave(hasta):
+    parametros = sorted(
+        (nombre, valor.strip())
+        for nombre, valores in request.args.lists() if nombre not in PARAMETROS_IGNORADOS
+        for valor in valores
+    )
+    valores = versiones.obtener()
+    historicos = valores.get('reportes_historicos', (0, None))[0]
+
+    ultimo_dia = _ultimo_dia(hasta)
+    hoy = date.today()
+    if ultimo_dia is not None and ultimo_dia < hoy:
+        vigencia = ('cerrado', historicos)
+    else:
+        vigencia = ('abierto', historicos, valores.get('reportes', (0, None))[0], hoy.isoformat())
+    return (request.endpoint, tuple(parametros), vigencia)
+
+
+def _es_error(respuesta):
+    """True para los errores que algunos reportes devuelven con status 200"""
+    if not respuesta.is_json:
+        return False
+    datos = respuesta.get_json(silent=True)
+    return isinstance(datos, dict) and datos.get('success') is False
+
+
+def cache_reporte(hasta=None, requiere_sesion='user_id'):
+    """
+    Decorador de endpoints GET de reportes: guarda la respuesta 200 y la
+    devuelve mientras los datos del período no cambien.
+
+    Args:
+        hasta: parámetro con el último día del período (YYYY-MM-DD) o función
+            sin argumentos que lo devuelve (date). Sin él, o si no viene,
+            se trata como un período que incluye hoy
+        requiere_sesion: clave de sesión requerida; sin ella la vista se
+            ejecuta normalmente (y responde su 401). None = endpoint público
+    """
+    def decorador(vista):
+        @wraps(vista)
+        def envoltura(*args, **kwargs):
+            if (not USAR_CACHE or request.method != 'GET'
+                    or (requiere_sesion and requiere_sesion not in session)):
+                return vista(*args, **kwargs)
+
+            try:
+                clave = _clave(hasta)
+            except Exception as e:
+                print(f"⚠️ Versiones no disponibles, reporte sin cache: {e}")
+                return vista(*args, **kwargs)
+
+            propia = {}
+
+            def calcular():
+                respuesta = propia['respuesta'] = make_response(vista(*args, **kwargs))
+                if respuesta.status_code != 200 or _es_error(respuesta):
+                    return None
+                return (respuesta.get_data(), respuesta.mimetype)
+
+            resultado, desde_cache = cache.calcular(clave, calcular)
+
+            if 'respuesta' in propia:
+                # Calculada en este pedido (o no cacheable, p.ej. un error)
+                respuesta = propia['respuesta']
+                if resultado is not None:
+                    respuesta.headers['X-Cache-Reporte'] = 'MISS'
+                return respuesta
+            cuerpo, mimetype = resultado
+            respuesta = current_app.response_class(cuerpo, mimetype=mimetype)
+            respuesta.headers['X-Cache-Reporte'] = 'HIT'
+            return respuesta
+        return envoltura
+    return decorador
@@ -0,0 +1,643 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+catalogo_cache.py - CACHE EN MEMORIA DEL CATÁLOGO DE PRODUCTOS
+═══════════════════════════════════════════════════════════════════════════════
+Mantiene en memoria los productos activos (listas de precio 1-5, datos de
+combo, pesables, acceso rápido) y las escalas de ofertas por volumen, para
+que la búsqueda de nueva_venta, los carteles y las consultas por código o id
+no vayan a la base en cada tecla. La búsqueda usa el índice de
+busqueda_productos.py, ordenado también por ventas de los últimos 30 días.
+
+INVALIDACIÓN
+    Cada escritura que toca productos u ofertas llama a invalidar_catalogo()
+    DESPUÉS de su commit. Eso inserta una fila en catalogo_cambio, cuyo id
+    autoincremental es la versión monotónica del catálogo (compartida entre
+    workers). Cada proceso compara su versión con MAX(id) como mucho cada
+    CATALOGO_CACHE_INTERVALO segundos y recarga sólo los productos cambiados.
+
+    Las lecturas del cache usan su propia conexión (como versiones.py): se
+    refresca en medio de una venta sin tocar la transacción del pedido.
+
+    catalogo_cambio se purga (como mucho una vez por hora y por proceso) de
+    filas con más de CATALOGO_CAMBIOS_DIAS días, dejando siempre la última.
+    Un proceso o una caja con una versión anterior a lo purgado recarga todo.
+
+MEMORIA
+    Sólo productos activos, como dicts planos (sin objetos ORM). Si el
+    catálogo supera CATALOGO_CACHE_MAX_PRODUCTOS el cache se desactiva y los
+    endpoints vuelven a consultar la base; el tamaño se vuelve a contar cada
+    INTERVALO_EXCEDIDO segundos y cuando baja del máximo se carga solo.
+═══════════════════════════════════════════════════════════════════════════════
+"""
+
+from sqlalchemy import text, bindparam
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from bisect import bisect_right
+from busqueda_productos import IndiceBusqueda
+from versiones import versiones as versiones_entidades
+from serializacion import codificar
+import threading
+import time
+
+# Variable global para db (se inicializa en init_catalogo_cache)
+db = None
+
+INTERVALO_CHEQUEO = 0.5          # segundos entre consultas de versión
+MAX_PRODUCTOS = 200000           # por encima de esto no se cachea
+INTERVALO_EXCEDIDO = 60          # segundos entre recuentos con el cache desactivado por tamaño
+MAX_CAMBIOS_INCREMENTALES = 2000 # más cambios que esto → recarga completa
+MAX_BUSQUEDAS_CACHEADAS = 256
+INTERVALO_VELOCIDAD = 600        # segundos entre recálculos de ventas recientes
+DIAS_VELOCIDAD = 30              # ventana de ventas para el ranking de búsqueda
+DIAS_CAMBIOS = 7                 # antigüedad máxima de las filas de catalogo_cambio
+INTERVALO_PURGA = 3600           # segundos entre purgas de catalogo_cambio
+
+COLUMNAS_PRODUCTO = """
+    id, codigo, nombre, descripcion, categoria, iva, stock, costo,
+    precio, precio2, precio3, precio4, precio5,
+    margen, margen2, margen3, margen4, margen5,
+    es_combo, producto_base_id, cantidad_combo,
+    producto_base_2_id, cantidad_combo_2, producto_base_3_id, cantidad_combo_3,
+    precio_unitario_base, descuento_porcentaje, es_pesable,
+    acceso_rapido, orden_acceso_rapido
+"""
+
+
+# ═══════════════════════════════════════════════════════════════════════════════
+# INICIALIZACIÓN Y TABLA DE CAMBIOS
+# ═══════════════════════════════════════════════════════════════════════════════
+
+def init_catalogo_cache(app, database):
+    """
+    Inicializa el cache del catálogo
+
+    Uso en app.py:
+        from catalogo_cache import init_catalogo_cache, catalogo, invalidar_catalogo
+        init_catalogo_cache(app, db)
+    """
+    global db, INTERVALO_CHEQUEO, MAX_PRODUCTOS, DIAS_CAMBIOS
+    db = database
+    INTERVALO_CHEQUEO = app.config.get('CATALOGO_CACHE_INTERVALO', INTERVALO_CHEQUEO)
+    MAX_PRODUCTOS = app.config.get('CATALOGO_CACHE_MAX_PRODUCTOS', MAX_PRODUCTOS)
+    DIAS_CAMBIOS = app.config.get('CATALOGO_CAMBIOS_DIAS', DIAS_CAMBIOS)
+    print("✅ Cache de catálogo inicializado")
+
+
+_tabla_verificada = False
+
+
+def asegurar_tabla_cambios():
+    """Crea catalogo_cambio si no existe (una sola vez por proceso)"""
+    global _tabla_verificada
+    if _tabla_verificada:
+        return
+    with db.engine.begin() as conn:
+        conn.execute(text("""
+            CREATE TABLE IF NOT EXISTS catalogo_cambio (
+                id BIGINT NOT NULL AUTO_INCREMENT,
+                entidad VARCHAR(20) NOT NULL,
+                entidad_id INT NULL,
+                fecha TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+                PRIMARY KEY (id),
+                KEY idx_fecha (fecha)
+            ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
+        """))
+    _tabla_verificada = True
+
+
+def invalidar_catalogo(entidad='producto', ids=None):
+    """
+    Registra un cambio del catálogo y devuelve la nueva versión.
+
+    Llamar DESPUÉS del commit de la escritura, así ningún worker recarga
+    antes de que los datos nuevos sean visibles. Usa su propia conexión
+    (transacción cortísima) para no tomar locks dentro de la venta.
+
+    Args:
+        entidad: 'producto' u 'oferta' (ids = producto_id), o '*' para recarga completa
+        ids: ids afectados; None = todo el catálogo
+    """
+    try:
+        asegurar_tabla_cambios()
+        if ids is None:
+            filas = [{'entidad': '*', 'entidad_id': None}]
+        else:
+            filas = [{'entidad': entidad, 'entidad_id': int(i)} for i in set(ids) if i]
+            if not filas:
+                return catalogo.version
+
+        with db.engine.begin() as conn:
+            conn.execute(text(
+                "INSERT INTO catalogo_cambio (entidad, entidad_id) VALUES (:entidad, :entidad_id)"
+            ), filas)
+            version = conn.execute(text("SELECT MAX(id) FROM catalogo_cambio")).scalar() or 0
+
+        catalogo.marcar_desactualizado()
+        versiones_entidades.marcar_desactualizado()
+        return version
+
+    except Exception as e:
+        # Nunca romper la operación que invalidó: como mucho el cache queda viejo
+        print(f"⚠️ Error invalidando catálogo: {e}")
+        catalogo.marcar_desactualizado()
+        versiones_entidades.marcar_desactualizado()
+        return None
+
+
+def purgar_cambios(dias=None):
+    """
+    Borra de catalogo_cambio las filas de más de 'dias' (DIAS_CAMBIOS).
+    La última fila se conserva siempre: su id es la versión del catálogo.
+
+    Returns:
+        cantidad de filas borradas
+    """
+    asegurar_tabla_cambios()
+    limite = datetime.now() - timedelta(days=DIAS_CAMBIOS if dias is None else dias)
+    with db.engine.begin() as conn:
+        ultimo = conn.execute(text("SELECT MAX(id) FROM catalogo_cambio")).scalar()
+        if not ultimo:
+            return 0
+        resultado = conn.execute(text(
+            "DELETE FROM catalogo_cambio WHERE fecha < :limite AND id < :ultimo"
+        ), {'limite': limite, 'ultimo': ultimo})
+    if resultado.rowcount:
+        print(f"🧹 catalogo_cambio: {resultado.rowcount} cambios de más de {DIAS_CAMBIOS} días purgados")
+    return resultado.rowcount
+
+
+# ═══════════════════════════════════════════════════════════════════════════════
+# CACHE
+# ═══════════════════════════════════════════════════════════════════════════════
+
+class _Snapshot:
+    """Estado inmutable del cache: se reemplaza entero en cada recarga"""
+
+    def __init__(self, productos, por_codigo, ofertas, indice, version, serializados=None):
+        self.productos = productos      # id → dict
+        self.por_codigo = por_codigo    # codigo → id
+        self.ofertas = ofertas          # producto_id → EscalaOfertas
+        self.indice = indice            # IndiceBusqueda sobre código / nombre / descripción
+        self.version = version
+        # id → bytes JSON de a_dict_venta, armado la primera vez que se pide
+        self.serializados = serializados if serializados is not None else {}
+
+
+class CatalogoCache:
+
+    def __init__(self):
+        self._snapshot = None
+        self._lock = threading.Lock()
+        self._ultimo_chequeo = 0.0
+        self._forzar_chequeo = False
+        self._busquedas = OrderedDict()
+        self._velocidad = {}
+        self._velocidad_cargada = 0.0
+        self._ultima_purga = None
+        self._excedido = None           # último recuento que superó MAX_PRODUCTOS (monotonic)
+
+    # ─── Estado ──────────────────────────────────────────────────────────────
+
+    @property
+    def version(self):
+        return self._snapshot.version if self._snapshot else 0
+
+    def marcar_desactualizado(self):
+        self._forzar_chequeo = True
+
+    def _desactivado_por_tamano(self):
+        return self._excedido is not None and time.monotonic() - self._excedido < INTERVALO_EXCEDIDO
+
+    def _vigente(self):
+        """Devuelve el snapshot actualizado, o None si el cache no está disponible"""
+        if db is None or self._desactivado_por_tamano():
+            return None
+
+        ahora = time.monotonic()
+        snapshot = self._snapshot
+        if snapshot and not self._forzar_chequeo and ahora - self._ultimo_chequeo < INTERVALO_CHEQUEO:
+            return snapshot
+
+        with self._lock:
+            # Otro hilo pudo haber refrescado (o vuelto a contar) mientras esperábamos
+            if self._desactivado_por_tamano():
+                return None
+            if (self._snapshot and not self._forzar_chequeo
+                    and time.monotonic() - self._ultimo_chequeo < INTERVALO_CHEQUEO):
+                return self._snapshot
+            try:
+                self._refrescar()
+            except Exception as e:
+                print(f"⚠️ Error refrescando cache de catálogo: {e}")
+                return None
+            return self._snapshot
+
+    def _refrescar(self):
+        asegurar_tabla_cambios()
+        self._forzar_chequeo = False
+        self._ultimo_chequeo = time.monotonic()
+        self._purgar()
+
+        # Conexión propia: nunca cerrar ni confirmar la transacción del pedido
+        with db.engine.connect() as conn:
+            self._refrescar_con(conn)
+
+    def _purgar(self):
+        if self._ultima_purga is not None and time.monotonic() - self._ultima_purga < INTERVALO_PURGA:
+            return
+        self._ultima_purga = time.monotonic()
+        try:
+            purgar_cambios()
+        except Exception as e:
+            # Sin purga el cache funciona igual; se reintenta en la próxima hora
+            print(f"⚠️ Error purgando catalogo_cambio: {e}")
+
+    def _refrescar_con(self, conn):
+        if time.monotonic() - self._velocidad_cargada > INTERVALO_VELOCIDAD:
+            self._cargar_velocidad(conn)
+
+        version_db, minimo = conn.execute(text(
+            "SELECT COALESCE(MAX(id), 0), MIN(id) FROM catalogo_cambio"
+        )).one()
+
+        if self._snapshot is None:
+            self._carga_completa(conn, version_db)
+            return
+
+        if version_db <= self._snapshot.version:
+            return
+
+        # Los cambios posteriores a nuestra versión ya se purgaron: no hay delta
+        if minimo is not None and self._snapshot.version < minimo - 1:
+            self._carga_completa(conn, version_db)
+            return
+
+        cambios = conn.execute(text("""
+            SELECT entidad, entidad_id FROM catalogo_cambio
+            WHERE id > :desde AND id <= :hasta
+            LIMIT :limite
+        """), {'desde': self._snapshot.version, 'hasta': version_db,
+               'limite': MAX_CAMBIOS_INCREMENTALES + 1}).fetchall()
+
+        if len(cambios) > MAX_CAMBIOS_INCREMENTALES or any(c.entidad == '*' for c in cambios):
+            self._carga_completa(conn, version_db)
+            return
+
+        ids_productos = {c.entidad_id for c in cambios if c.entidad == 'producto'}
+        ids_ofertas = {c.entidad_id for c in cambios if c.entidad == 'oferta'}
+        self._carga_incremental(conn, version_db, ids_productos, ids_ofertas)
+
+    def _carga_completa(self, conn, version):
+        inicio = time.perf_counter()
+
+        total = conn.execute(text("SELECT COUNT(*) FROM producto WHERE activo = 1")).scalar()
+        if total > MAX_PRODUCTOS:
+            if self._excedido is None:
+                print(f"⚠️ Catálogo con {total} productos supera el máximo ({MAX_PRODUCTOS}); cache desactivado")
+            self._excedido = time.monotonic()
+            self._snapshot = None
+            return
+        if self._excedido is not None:
+            print(f"✅ Catálogo con {total} productos, bajo el máximo ({MAX_PRODUCTOS}); cache reactivado")
+            self._excedido = None
+
+        productos = {}
+        por_codigo = {}
+        componentes = _cargar_componentes(conn)
+        for row in conn.execute(text(f"SELECT {COLUMNAS_PRODUCTO} FROM producto WHERE activo = 1")):
+            p = _fila_a_producto(row, componentes.get(row.id, ()))
+            productos[p['id']] = p
+            por_codigo[p['codigo']] = p['id']
+
+        ofertas = _compilar_ofertas(conn.execute(text("""
+            SELECT id, producto_id, cantidad_minima, precio_oferta, descripcion
+            FROM ofertas_volumen WHERE activo = 1
+            ORDER BY producto_id, cantidad_minima
+        """)))
+
+        indice = IndiceBusqueda.construir(productos.values(), self._velocidad)
+
+        self._snapshot = _Snapshot(productos, por_codigo, ofertas, indice, version)
+        self._busquedas = OrderedDict()
+        print(f"📚 Catálogo cargado en memoria: {len(productos)} productos, "
+              f"{len(ofertas)} con ofertas, versión {version} ({(time.perf_counter() - inicio) * 1000:.0f} ms)")
+
+    def _carga_incremental(self, conn, version, ids_productos, ids_ofertas):
+        anterior = self._snapshot
+        productos = dict(anterior.productos)
+        por_codigo = dict(anterior.por_codigo)
+        ofertas = dict(anterior.ofertas)
+
+        if ids_productos:
+            # Quitar versiones viejas (pudo cambiar el código o desactivarse)
+            for producto_id in ids_productos:
+                viejo = productos.pop(producto_id, None)
+                if viejo and por_codigo.get(viejo['codigo']) == producto_id:
+                    del por_codigo[viejo['codigo']]
+
+            filas = conn.execute(
+                text(f"SELECT {COLUMNAS_PRODUCTO} FROM producto WHERE activo = 1 AND id IN :ids")
+                .bindparams(bindparam('ids', expanding=True)),
+                {'ids': list(ids_productos)}
+            )
+            componentes = _cargar_componentes(conn, ids_productos)
+            for row in filas:
+                p = _fila_a_producto(row, componentes.get(row.id, ()))
+                productos[p['id']] = p
+                por_codigo[p['codigo']] = p['id']
+
+        if ids_ofertas:
+            for producto_id in ids_ofertas:
+                ofertas.pop(producto_id, None)
+            filas = conn.execute(
+                text("""
+                    SELECT id, producto_id, cantidad_minima, precio_oferta, descripcion
+                    FROM ofertas_volumen WHERE activo = 1 AND producto_id IN :ids
+                    ORDER BY producto_id, cantidad_minima
+                """).bindparams(bindparam('ids', expanding=True)),
+                {'ids': list(ids_ofertas)}
+            )
+            ofertas.update(_compilar_ofertas(filas))
+
+        indice = anterior.indice
+        if ids_productos:
+            indice = indice.actualizar(ids_productos, [productos[i] for i in ids_productos if i in productos])
+
+        # Las representaciones JSON que no cambiaron se conservan; los combos
+        # se descartan siempre porque su stock depende de los productos base
+        serializados = {
+            producto_id: cuerpo for producto_id, cuerpo in anterior.serializados.items()
+            if producto_id not in ids_productos and producto_id not in ids_ofertas
+            and not productos[producto_id]['es_combo']
+        }
+
+        self._snapshot = _Snapshot(productos, por_codigo, ofertas, indice, version, serializados)
+        self._busquedas = OrderedDict()
+
+    def _cargar_velocidad(self, conn):
+        """Unidades vendidas por producto en los últimos DIAS_VELOCIDAD días (para el ranking)"""
+        self._velocidad_cargada = time.monotonic()
+        filas = conn.execute(text("""
+            SELECT d.producto_id, SUM(d.cantidad) AS unidades
+            FROM detalle_factura d
+            JOIN factura f ON f.id = d.factura_id
+            WHERE f.fecha >= :desde AND f.estado <> 'anulada'
+            GROUP BY d.producto_id
+        """), {'desde': datetime.now() - timedelta(days=DIAS_VELOCIDAD)})
+        self._velocidad = {row.producto_id: float(row.unidades or 0) for row in filas}
+
+        anterior = self._snapshot
+        if anterior:
+            self._snapshot = _Snapshot(anterior.productos, anterior.por_codigo, anterior.ofertas,
+                                       anterior.indice.con_velocidad(self._velocidad), anterior.version,
+                                       anterior.serializados)
+        self._busquedas = OrderedDict()
+
+    # ─── Consultas ───────────────────────────────────────────────────────────
+
+    def disponible(self):
+        return self._vigente() is not None
+
+    def instantanea(self):
+        """Snapshot vigente completo (inmutable), o None si el cache no está disponible"""
+        return self._vigente()
+
+    def obtener(self, producto_id):
+        snapshot = self._vigente()
+        if snapshot is None:
+            return None
+        return snapshot.productos.get(producto_id)
+
+    def por_codigo(self, codigo):
+        snapshot = self._vigente()
+        if snapshot is None:
+            return None
+        producto_id = snapshot.por_codigo.get(codigo)
+        return snapshot.productos.get(producto_id) if producto_id else None
+
+    def productos(self):
+        """Lista de productos activos (o None si el cache no está disponible)"""
+        snapshot = self._vigente()
+        return list(snapshot.productos.values()) if snapshot else None
+
+    def tiene_ofertas(self, producto_id):
+        snapshot = self._vigente()
+        return bool(snapshot) and producto_id in snapshot.ofertas
+
+    def ids_con_ofertas(self):
+        snapshot = self._vigente()
+        return snapshot.ofertas.keys() if snapshot else set()
+
+    def escala_ofertas(self, producto_id):
+        """EscalaOfertas del producto, o None si no tiene (o no hay cache)"""
+        snapshot = self._vigente()
+        return snapshot.ofertas.get(producto_id) if snapshot else None
+
+    def stock_dinamico(self, producto):
+        """Stock para combos calculado con el stock en memoria de los productos base"""
+        if not producto['es_combo']:
+            return producto['stock']
+        snapshot = self._snapshot
+        stocks = []
+        for base_id, cantidad in producto['componentes']:
+            base = snapshot.productos.get(base_id) if snapshot else None
+            if base:
+                stocks.append(int(base['stock'] / cantidad))
+        return min(stocks) if stocks else 0
+
+    def buscar(self, termino, limite=15):
+        """
+        Búsqueda de /api/buscar_productos: código exacto primero; si no,
+        índice de búsqueda (todas las palabras, sin acentos) ordenado por
+        relevancia. Devuelve lista de (producto, match_tipo) o None si no hay cache.
+        """
+        snapshot = self._vigente()
+        if snapshot is None:
+            return None
+
+        clave = (snapshot.version, termino, limite)
+        busquedas = self._busquedas
+        resultado = busquedas.get(clave)
+        if resultado is not None:
+            return resultado
+
+        exacto_id = snapshot.por_codigo.get(termino.upper()) or snapshot.por_codigo.get(termino)
+        if exacto_id:
+            resultado = [(snapshot.productos[exacto_id], 'codigo_exacto')]
+        else:
+            resultado = [(snapshot.productos[pid], match_tipo)
+                         for pid, match_tipo in snapshot.indice.buscar(termino, limite)]
+
+        busquedas[clave] = resultado
+        while len(busquedas) > MAX_BUSQUEDAS_CACHEADAS:
+            busquedas.popitem(last=False)
+        return resultado
+
+    # ─── Serialización ───────────────────────────────────────────────────────
+
+    def a_dict_venta(self, p, match_tipo=None):
+        """Mismo formato que devolvían buscar_productos / get_producto_por_id"""
+        precio_normal = p['precio']
+        if p['es_combo'] and p['precio_unitario_base'] and p['cantidad_combo']:
+            precio_normal = p['precio_unitario_base'] * p['cantidad_combo']
+
+        datos = {
+            'id': p['id'],
+            'codigo': p['codigo'],
+            'nombre': p['nombre'],
+            'precio': p['precio'],
+            'precio2': p['precio2'],
+            'precio3': p['precio3'],
+            'precio4': p['precio4'],
+            'precio5': p['precio5'],
+            'precio_base': p['precio'],
+            'costo': p['costo'] or 0.0,
+            'margen': p['margen'] or 0.0,
+            'margen2': p['margen2'],
+            'margen3': p['margen3'],
+            'margen4': p['margen4'],
+            'margen5': p['margen5'],
+            'stock': self.stock_dinamico(p),
+            'iva': p['iva'],
+            'descripcion': p['descripcion'] or '',
+            'categoria': p['categoria'],
+            'es_combo': p['es_combo'],
+            'es_pesable': p['es_pesable'],
+            'producto_base_id': p['producto_base_id'],
+            'cantidad_combo': p['cantidad_combo'] or 1.0,
+            'precio_unitario_base': p['precio_unitario_base'] or p['precio'],
+            'descuento_porcentaje': p['descuento_porcentaje'] or 0.0,
+            'ahorro_combo': (precio_normal - p['precio']) if p['es_combo'] else 0.0,
+            'precio_normal': precio_normal,
+            'tiene_ofertas': self.tiene_ofertas(p['id'])
+        }
+        if match_tipo:
+            datos['match_tipo'] = match_tipo
+        return datos
+
+    def venta_json(self, p, snapshot=None):
+        """a_dict_venta(p) ya codificado en JSON: se arma una vez por producto y snapshot"""
+        snapshot = snapshot or self._vigente()
+        cuerpo = snapshot.serializados.get(p['id']) if snapshot else None
+        if cuerpo is None:
+            cuerpo = codificar(self.a_dict_venta(p))
+            if snapshot and snapshot.productos.get(p['id']) is p:
+                snapshot.serializados[p['id']] = cuerpo
+        return cuerpo
+
+    def lista_venta_json(self, items):
+        """[(producto, match_tipo)] → bytes de un array JSON con las representaciones cacheadas"""
+        snapshot = self._vigente()
+        partes = []
+        for p, match_tipo in items:
+            cuerpo = self.venta_json(p, snapshot)
+            if match_tipo:
+                cuerpo = cuerpo[:-1] + b',"match_tipo":' + codificar(match_tipo) + b'}'
+            partes.append(cuerpo)
+        return b'[' + b','.join(partes) + b']'
+
+
+class EscalaOfertas:
+    """
+    Ofertas por volumen activas de un producto, compiladas en arreglos
+    ordenados por cantidad mínima: la oferta para una cantidad es un bisect.
+    """
+
+    __slots__ = ('cantidades', 'precios', 'ids', 'descripciones')
+
+    def __init__(self, filas):
+        filas = sorted(filas)
+        self.cantidades = tuple(f[0] for f in filas)
+        self.precios = tuple(f[1] for f in filas)
+        self.ids = tuple(f[2] for f in filas)
+        self.descripciones = tuple(f[3] for f in filas)
+
+    def oferta_para(self, cantidad):
+        """(cantidad_minima, precio_oferta, descripcion) de la mayor escala alcanzada, o None"""
+        i = bisect_right(self.cantidades, float(cantidad)) - 1
+        if i < 0:
+            return None
+        return self.cantidades[i], self.precios[i], self.descripciones[i]
+
+    def __len__(self):
+        return len(self.cantidades)
+
+
+def _compilar_ofertas(filas):
+    """Filas de ofertas_volumen → {producto_id: EscalaOfertas}"""
+    por_producto = {}
+    for row in filas:
+        por_producto.setdefault(row.producto_id, []).append(
+            (float(row.cantidad_minima), float(row.precio_oferta), row.id, row.descripcion))
+    return {producto_id: EscalaOfertas(lista) for producto_id, lista in por_producto.items()}
+
+
+def _decimal_o_none(valor):
+    return float(valor) if valor else None
+
+
+def _cargar_componentes(conn, combo_ids=None):
+    """{combo_id: ((producto_id, cantidad), ...)} desde combo_componente (todos o los pedidos)"""
+    sql = "SELECT combo_id, producto_id, cantidad FROM combo_componente WHERE cantidad > 0"
+    params = {}
+    if combo_ids is not None:
+        sql += " AND combo_id IN :ids"
+        params['ids'] = list(combo_ids)
+    consulta = text(sql + " ORDER BY combo_id, orden, id")
+    if combo_ids is not None:
+        consulta = consulta.bindparams(bindparam('ids', expanding=True))
+
+    componentes = {}
+    for row in conn.execute(consulta, params):
+        componentes.setdefault(row.combo_id, []).append((row.producto_id, float(row.cantidad)))
+    return {combo_id: tuple(lista) for combo_id, lista in componentes.items()}
+
+
+def _fila_a_producto(row, componentes=()):
+    """Fila de producto → dict compacto con los campos ya convertidos a float"""
+    codigo = row.codigo or ''
+    nombre = row.nombre or ''
+    descripcion = row.descripcion or ''
+    return {
+        'id': row.id,
+        'codigo': codigo,
+        'nombre': nombre,
+        'descripcion': row.descripcion,
+        'categoria': row.categoria,
+        'iva': float(row.iva) if row.iva is not None else 21.0,
+        'stock': float(row.stock or 0),
+        'costo': _decimal_o_none(row.costo),
+        'precio': float(row.precio or 0),
+        'precio2': _decimal_o_none(row.precio2),
+        'precio3': _decimal_o_none(row.precio3),
+        'precio4': _decimal_o_none(row.precio4),
+        'precio5': _decimal_o_none(row.precio5),
+        'margen': _decimal_o_none(row.margen),
+        'margen2': _decimal_o_none(row.margen2),
+        'margen3': _decimal_o_none(row.margen3),
+        'margen4': _decimal_o_none(row.margen4),
+        'margen5': _decimal_o_none(row.margen5),
+        'es_combo': bool(row.es_combo),
+        'producto_base_id': row.producto_base_id,
+        'cantidad_combo': _decimal_o_none(row.cantidad_combo),
+        'producto_base_2_id': row.producto_base_2_id,
+        'cantidad_combo_2': _decimal_o_none(row.cantidad_combo_2),
+        'producto_base_3_id': row.producto_base_3_id,
+        'cantidad_combo_3': _decimal_o_none(row.cantidad_combo_3),
+        'componentes': tuple(componentes) if row.es_combo else (),
+        'precio_unitario_base': _decimal_o_none(row.precio_unitario_base),
+        'descuento_porcentaje': _decimal_o_none(row.descuento_porcentaje),
+        'es_pesable': bool(row.es_pesable),
+        'acceso_rapido': bool(row.acceso_rapido),
+        'orden_acceso_rapido': row.orden_acceso_rapido or 0,
+        # Textos normalizados para búsqueda
+        '_codigo_l': codigo.lower(),
+        '_nombre_l': nombre.lower(),
+        '_descripcion_l': descripcion.lower()
+    }
+
+
+# Instancia única por proceso
+catalogo = CatalogoCache()
@@ -0,0 +1,250 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+catalogo_sync.py - SINCRONIZACIÓN DEL CATÁLOGO PARA LAS CAJAS
+═══════════════════════════════════════════════════════════════════════════════
+En vez de ir al servidor en cada búsqueda, una caja puede tener su copia
+local del catálogo y mantenerla al día con cambios incrementales:
+
+    GET /api/catalogo/snapshot           catálogo completo (gzip) con su versión
+    GET /api/catalogo/changes?since=N    lo que cambió desde la versión N
+
+La versión es la misma del cache en memoria (MAX(id) de catalogo_cambio),
+así que el snapshot y los cambios salen de catalogo_cache sin consultar
+productos. Si /changes responde completo=true (recarga global, demasiados
+cambios o log purgado) la caja vuelve a bajar el snapshot.
+
+FORMATO COMPACTO
+    columnas     nombres de los campos de cada producto
+    productos    una lista por producto, en el orden de 'columnas'
+    ofertas      {producto_id: [[cantidad_minima, precio, descripcion], ...]}
+    combos       {combo_id: [[producto_base_id, cantidad], ...]}
+    acceso_rapido  ids ordenados por posición
+
+El stock de un combo viaja calculado, pero como depende de sus bases,
+/changes también devuelve los combos que usan un producto base cambiado.
+═══════════════════════════════════════════════════════════════════════════════
+"""
+
+from flask import Blueprint, jsonify, request, session, make_response
+from sqlalchemy import text
+from datetime import datetime
+import threading
+import gzip
+
+import catalogo_cache
+from catalogo_cache import catalogo
+from serializacion import codificar
+
+# Blueprint para las rutas de sincronización
+catalogo_sync_bp = Blueprint('catalogo_sync', __name__)
+
+# Variable global para db (se inicializa en init_catalogo_sync)
+db = None
+
+COLUMNAS_SYNC = (
+    'id', 'codigo', 'nombre', 'descripcion', 'categoria', 'iva',
+    'precio', 'precio2', 'precio3', 'precio4', 'precio5',
+    'stock', 'es_combo', 'es_pesable', 'descuento_porcentaje',
+    'acceso_rapido', 'orden_acceso_rapido'
+)
+
+NIVEL_GZIP = 6
+
+
+def init_catalogo_sync(app, database):
+    """
+    Inicializa los endpoints de sincronización del catálogo
+
+    Uso en app.py:
+        from catalogo_sync import init_catalogo_sync
+        init_catalogo_sync(app, db)
+    """
+    global db
+    db = database
+    app.register_blueprint(catalogo_sync_bp)
+    print("✅ Sincronización de catálogo para cajas inicializada")
+
+
+# ═══════════════════════════════════════════════════════════════════════════════
+# SERIALIZACIÓN
+# ═══════════════════════════════════════════════════════════════════════════════
+
+def _fila_sync(p):
+    """Producto del cache → lista en el orden de COLUMNAS_SYNC"""
+    return [catalogo.stock_dinamico(p) if columna == 'stock' else p[columna]
+            for columna in COLUMNAS_SYNC]
+
+
+def _ofertas_sync(escala):
+    return [[cantidad, precio, descripcion] for cantidad, precio, descripcion
+            in zip(escala.cantidades, escala.precios, escala.descripciones)]
+
+
+def _combo_sync(p):
+    return [[base_id, cantidad] for base_id, cantidad in p['componentes']]
+
+
+class _PorVersion:
+    """Último valor calculado para una versión del catálogo (se recalcula al cambiar)"""
+
+    def __init__(self, calcular):
+        self._calcular = calcular
+        self._version = None
+        self._valor = None
+        self._lock = threading.Lock()
+
+    def obtener(self, snapshot):
+        if self._version != snapshot.version:
+            with self._lock:
+                if self._version != snapshot.version:
+                    self._valor = self._calcular(snapshot)
+                    self._version = snapshot.version
+        return self._valor
+
+
+def _armar_snapshot(snapshot):
+    """(json, json gzip) del catálogo completo: se arma una vez por versión"""
+    productos = snapshot.productos.values()
+    datos = {
+        'version': snapshot.version,
+        'generado': datetime.now().isoformat(timespec='seconds'),
+        'columnas': COLUMNAS_SYNC,
+        'productos': [_fila_sync(p) for p in productos],
+        'ofertas': {producto_id: _ofertas_sync(escala) for producto_id, escala in snapshot.ofertas.items()},
+        'combos': {p['id']: _combo_sync(p) for p in productos if p['es_combo']},
+        'acceso_rapido': [p['id'] for p in sorted(
+            (p for p in productos if p['acceso_rapido']), key=lambda p: p['orden_acceso_rapido'])]
+    }
+    cuerpo = codificar(datos)
+    return cuerpo, gzip.compress(cuerpo, NIVEL_GZIP)
+
+
+def _armar_combos_por_base(snapshot):
+    """{producto_base_id: [combo_id]} para propagar cambios de stock a los combos"""
+    combos_por_base = {}
+    for p in snapshot.productos.values():
+        for base_id, _ in p['componentes']:
+            combos_por_base.setdefault(base_id, []).append(p['id'])
+    return combos_por_base
+
+
+_snapshot_serializado = _PorVersion(_armar_snapshot)
+_combos_por_base = _PorVersion(_armar_combos_por_base)
+
+
+def _etag(version):
+    return f'"catalogo-{version}"'
+
+
+# ═══════════════════════════════════════════════════════════════════════════════
+# ENDPOINTS
+# ═══════════════════════════════════════════════════════════════════════════════
+
+@catalogo_sync_bp.route('/api/catalogo/snapshot')
+def api_catalogo_snapshot():
+    """Catálogo completo comprimido, con ETag de la versión"""
+    if 'user_id' not in session:
+        return jsonify({'error': 'No autorizado'}), 401
+
+    try:
+        snapshot = catalogo.instantanea()
+        if snapshot is None:
+            return jsonify({'success': False, 'error': 'Catálogo en memoria no disponible'}), 503
+
+        etag = _etag(snapshot.version)
+        if etag in request.headers.get('If-None-Match', ''):
+            respuesta = make_response('', 304)
+        else:
+            cuerpo, cuerpo_gzip = _snapshot_serializado.obtener(snapshot)
+            if 'gzip' in request.headers.get('Accept-Encoding', '').lower():
+                respuesta = make_response(cuerpo_gzip)
+                respuesta.headers['Content-Encoding'] = 'gzip'
+            else:
+                respuesta = make_response(cuerpo)
+            respuesta.headers['Content-Type'] = 'application/json; charset=utf-8'
+
+        respuesta.headers['ETag'] = etag
+        respuesta.headers['X-Catalogo-Version'] = str(snapshot.version)
+        respuesta.headers['Cache-Control'] = 'private, no-cache'
+        respuesta.headers['Vary'] = 'Accept-Encoding'
+        return respuesta
+
+    except Exception as e:
+        print(f"❌ Error generando snapshot del catálogo: {e}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+
+@catalogo_sync_bp.route('/api/catalogo/changes')
+def api_catalogo_cambios():
+    """Productos, ofertas y combos cambiados desde la versión 'since'"""
+    if 'user_id' not in session:
+        return jsonify({'error': 'No autorizado'}), 401
+
+    desde = request.args.get('since', type=int)
+    if desde is None or desde < 0:
+        return jsonify({'success': False, 'error': 'Parámetro since requerido'}), 400
+
+    try:
+        snapshot = catalogo.instantanea()
+        if snapshot is None:
+            return jsonify({'success': False, 'error': 'Catálogo en memoria no disponible'}), 503
+
+        respuesta = {
+            'success': True,
+            'version': snapshot.version,
+            'completo': False,
+            'columnas': COLUMNAS_SYNC,
+            'productos': [],
+            'eliminados': [],
+            'ofertas': {},
+            'combos': {}
+        }
+        if desde >= snapshot.version:
+            return jsonify(respuesta)
+
+        # Si el log ya no tiene la versión pedida no se puede armar el delta.
+        # Conexión propia de sólo lectura: un GET no hace commit en db.session
+        with db.engine.connect() as conn:
+            minimo = conn.execute(text("SELECT MIN(id) FROM catalogo_cambio")).scalar()
+            cambios = conn.execute(text("""
+                SELECT entidad, entidad_id FROM catalogo_cambio
+                WHERE id > :desde AND id <= :hasta
+                LIMIT :limite
+            """), {'desde': desde, 'hasta': snapshot.version,
+                   'limite': catalogo_cache.MAX_CAMBIOS_INCREMENTALES + 1}).fetchall()
+
+        if ((minimo is not None and desde < minimo - 1)
+                or len(cambios) > catalogo_cache.MAX_CAMBIOS_INCREMENTALES
+                or any(c.entidad == '*' for c in cambios)):
+            respuesta['completo'] = True
+            return jsonify(respuesta)
+
+        ids_productos = {c.entidad_id for c in cambios if c.entidad == 'producto' and c.entidad_id}
+        ids_ofertas = {c.entidad_id for c in cambios if c.entidad == 'oferta' and c.entidad_id}
+
+        # El stock de un combo cambia cuando cambia el de sus bases
+        combos_por_base = _combos_por_base.obtener(snapshot)
+        for producto_id in list(ids_productos):
+            ids_productos.update(combos_por_base.get(producto_id, ()))
+
+        for producto_id in sorted(ids_productos):
+            p = snapshot.productos.get(producto_id)
+            if p is None:
+                respuesta['eliminados'].append(producto_id)
+                continue
+            respuesta['productos'].append(_fila_sync(p))
+            if p['es_combo']:
+                respuesta['combos'][producto_id] = _combo_sync(p)
+
+        # Lista vacía = el producto se quedó sin ofertas
+        for producto_id in sorted(ids_ofertas):
+            escala = snapshot.ofertas.get(producto_id)
+            respuesta['ofertas'][producto_id] = _ofertas_sync(escala) if escala else []
+
+        return jsonify(respuesta)
+
+    except Exception as e:
+        print(f"❌ Error obteniendo cambios del catálogo: {e}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
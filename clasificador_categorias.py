@@ -0,0 +1,347 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+clasificador_categorias.py - CATEGORÍA AUTOMÁTICA POR PALABRAS CLAVE
+═══════════════════════════════════════════════════════════════════════════════
+Las reglas (palabra clave → categoría, con prioridad) viven en la tabla
+regla_categoria y se compilan en UNA expresión regular con límites de
+palabra; cada descripción se recorre una sola vez, sin importar cuántas
+reglas haya:
+
+    'CHORIZO PARRILLERO X KG'   → chorizo (CHACINADOS, prioridad 20)
+                                  gana a chorizo (CARNE, prioridad 10)
+    'COSTILLA CERDO'            → 'costilla cerdo' (CERDO) antes que 'costilla'
+    'ENSALADA MIXTA'            → sin categoría ('ala' no matchea dentro de otra palabra)
+
+Si una descripción matchea varias reglas gana la de mayor prioridad; a
+igual prioridad, la palabra más larga y después la que aparece primero.
+Mayúsculas y acentos no importan, y cada palabra acepta plural (s / es).
+
+La expresión compilada se guarda en memoria y se recompila sola cuando
+cambia la versión 'regla_categoria' (ver versiones.py).
+
+    GET    /api/categorias/reglas           reglas cargadas
+    POST   /api/categorias/reglas           crea o modifica una regla
+    DELETE /api/categorias/reglas/<id>      borra una regla
+    POST   /api/categorias/clasificar       clasifica descripciones o productos
+                                            existentes (y opcionalmente aplica)
+═══════════════════════════════════════════════════════════════════════════════
+"""
+
+from flask import Blueprint, jsonify, request, session
+from sqlalchemy import text, bindparam
+import unicodedata
+import threading
+import re
+
+import catalogo_cache
+from catalogo_cache import invalidar_catalogo
+from versiones import versiones, incrementar_version
+
+# Blueprint para las rutas del clasificador
+clasificador_bp = Blueprint('clasificador', __name__)
+
+# Variable global para db (se inicializa en init_clasificador)
+db = None
+
+CATEGORIA_POR_DEFECTO = 'GENERAL'
+
+# Reglas iniciales (las mismas que tenía detectar_categoria); prioridad
+# explícita donde una palabra aparece en dos categorías
+REGLAS_INICIALES = [
+    ('POLLO', ['pollo', 'pechuga', 'muslo', 'ala', 'carcasa'], 10),
+    ('CARNE', ['carne', 'bife', 'asado', 'costilla', 'vacio', 'chorizo'], 10),
+    ('CERDO', ['cerdo', 'bondiola', 'matambre'], 10),
+    ('CERDO', ['costilla cerdo'], 20),
+    ('PESCADO', ['pescado', 'salmon', 'merluza', 'atun'], 10),
+    ('CHACINADOS', ['salame', 'jamon', 'mortadela', 'morcilla'], 10),
+    ('CHACINADOS', ['chorizo'], 20),
+    ('LACTEOS', ['leche', 'queso', 'yogur', 'manteca', 'crema'], 10),
+    ('CONGELADOS', ['congelado', 'frozen', 'helado'], 10),
+    ('BEBIDAS', ['gaseosa', 'agua', 'jugo', 'cerveza', 'vino'], 10),
+    ('PANADERIA', ['pan', 'facturas', 'torta', 'galletas'], 10),
+    ('LIMPIEZA', ['detergente', 'lavandina', 'jabon', 'shampoo'], 10),
+    ('VERDURAS', ['verdura', 'lechuga', 'tomate', 'cebolla', 'papa'], 10),
+]
+
+
+def init_clasificador(app, database):
+    """
+    Inicializa el clasificador de categorías
+
+    Uso en app.py:
+        from clasificador_categorias import init_clasificador, clasificador
+        init_clasificador(app, db)
+    """
+    global db
+    db = database
+    app.register_blueprint(clasificador_bp)
+    print("✅ Clasificador de categorías por palabras clave inicializado")
+
+
+_tabla_verificada = False
+
+
+def asegurar_tabla_reglas():
+    """Crea regla_categoria si no existe y la carga con las reglas iniciales"""
+    global _tabla_verificada
+    if _tabla_verificada:
+        return
+    with db.engine.begin() as conn:
+        conn.execute(text("""
+            CREATE TABLE IF NOT EXISTS regla_categoria (
+                id INT NOT NULL AUTO_INCREMENT,
+                palabra VARCHAR(100) NOT NULL,
+                categoria VARCHAR(100) NOT NULL,
+                prioridad INT NOT NULL DEFAULT 10,
+                activo TINYINT(1) NOT NULL DEFAULT 1,
+                PRIMARY KEY (id),
+                UNIQUE KEY uq_regla_palabra_categoria (palabra, categoria)
+            ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
+        """))
+        if not conn.execute(text("SELECT 1 FROM regla_categoria LIMIT 1")).fetchone():
+            conn.execute(text("""
+                INSERT IGNORE INTO regla_categoria (palabra, categoria, prioridad)
+                VALUES (:palabra, :categoria, :prioridad)
+            """), [{'palabra': palabra, 'categoria': categoria, 'prioridad': prioridad}
+                   for categoria, palabras, prioridad in REGLAS_INICIALES for palabra in palabras])
+    _tabla_verificada = True
+
+
+def normalizar(texto):
+    """'Jamón  Cocido' → 'jamon cocido'"""
+    texto = unicodedata.normalize('NFKD', str(texto or '')).encode('ascii', 'ignore').decode('ascii')
+    return re.sub(r'\s+', ' ', texto).strip().lower()
+
+
+# ═══════════════════════════════════════════════════════════════════════════════
+# CLASIFICADOR COMPILADO
+# ═══════════════════════════════════════════════════════════════════════════════
+
+class _Clasificador:
+    """Una regex con todas las palabras clave + {palabra: (categoria, prioridad)}"""
+
+    def __init__(self):
+        self._compilado = (None, {})
+        self._version = None
+        self._lock = threading.Lock()
+
+    def _compilar(self, filas):
+        reglas = {}
+        for row in filas:
+            palabra = normalizar(row.palabra)
+            if not palabra:
+                continue
+            # Una palabra en dos categorías: queda la de mayor prioridad
+            if palabra not in reglas or row.prioridad > reglas[palabra][1]:
+                reglas[palabra] = (row.categoria, row.prioridad)
+
+        if not reglas:
+            return None, {}
+        # Más largas primero: en la misma posición 'costilla cerdo' gana a 'costilla'
+        alternativas = '|'.join(re.escape(p).replace(r'\ ', r'\s+')
+                                for p in sorted(reglas, key=len, reverse=True))
+        return re.compile(rf'\b({alternativas})(?:es|s)?\b'), reglas
+
+    def _vigente(self):
+        version = versiones.obtener().get('regla_categoria', (0, None))[0]
+        if self._version == version:
+            return self._compilado
+
+        with self._lock:
+            if self._version != version:
+                asegurar_tabla_reglas()
+                with db.engine.connect() as conn:
+                    filas = conn.execute(text(
+                        "SELECT palabra, categoria, prioridad FROM regla_categoria WHERE activo = 1"
+                    )).fetchall()
+                self._compilado = self._compilar(filas)
+                self._version = version
+            return self._compilado
+
+    def clasificar(self, descripciones):
+        """
+        Clasifica una lista de descripciones en una pasada.
+
+        Returns:
+            lista paralela con la categoría de cada descripción (None si no
+            matchea ninguna regla)
+        """
+        patron, reglas = self._vigente()
+        if patron is None:
+            return [None] * len(descripciones)
+
+        categorias = []
+        for descripcion in descripciones:
+            mejor = None
+            for coincidencia in patron.finditer(normalizar(descripcion)):
+                palabra = re.sub(r'\s+', ' ', coincidencia.group(1))
+                categoria, prioridad = reglas[palabra]
+                clave = (prioridad, len(palabra), -coincidencia.start())
+                if mejor is None or clave > mejor[0]:
+                    mejor = (clave, categoria)
+            categorias.append(mejor[1] if mejor else None)
+        return categorias
+
+
+clasificador = _Clasificador()
+
+
+def clasificar_lote(descripciones):
+    """
+    Clasifica un lote y separa lo que no matcheó.
+
+    Returns:
+        (categorias, sin_clasificar): lista paralela de categorías (None sin
+        match) e índices de las descripciones sin categoría
+    """
+    categorias = clasificador.clasificar(descripciones)
+    return categorias, [i for i, categoria in enumerate(categorias) if categoria is None]
+
+
+# ═══════════════════════════════════════════════════════════════════════════════
+# ENDPOINTS
+# ═══════════════════════════════════════════════════════════════════════════════
+
+@clasificador_bp.route('/api/categorias/reglas')
+def api_reglas_categoria():
+    """Reglas de categoría (palabra, categoría, prioridad)"""
+    if 'user_id' not in session:
+        return jsonify({'error': 'No autorizado'}), 401
+
+    try:
+        asegurar_tabla_reglas()
+        reglas = db.session.execute(text("""
+            SELECT id, palabra, categoria, prioridad, activo FROM regla_categoria
+            ORDER BY categoria, prioridad DESC, palabra
+        """)).fetchall()
+        db.session.commit()
+        return jsonify({'success': True, 'reglas': [
+            {'id': r.id, 'palabra': r.palabra, 'categoria': r.categoria,
+             'prioridad': r.prioridad, 'activo': bool(r.activo)} for r in reglas
+        ]})
+
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+
+@clasificador_bp.route('/api/categorias/reglas', methods=['POST'])
+def api_guardar_regla_categoria():
+    """Crea o modifica una regla (misma palabra y categoría = la misma regla)"""
+    if 'user_id' not in session:
+        return jsonify({'error': 'No autorizado'}), 401
+
+    try:
+        data = request.get_json() or {}
+        palabra = normalizar(data.get('palabra'))[:100]
+        categoria = str(data.get('categoria') or '').strip()[:100]
+        if not palabra or not categoria:
+            return jsonify({'success': False, 'error': 'Palabra y categoría son obligatorias'}), 400
+        prioridad = int(data.get('prioridad', 10))
+
+        asegurar_tabla_reglas()
+        db.session.execute(text("""
+            INSERT INTO regla_categoria (palabra, categoria, prioridad, activo)
+            VALUES (:palabra, :categoria, :prioridad, :activo)
+            ON DUPLICATE KEY UPDATE prioridad = VALUES(prioridad), activo = VALUES(activo)
+        """), {'palabra': palabra, 'categoria': categoria, 'prioridad': prioridad,
+               'activo': 1 if data.get('activo', True) else 0})
+        db.session.commit()
+        incrementar_version('regla_categoria')
+        return jsonify({'success': True, 'palabra': palabra, 'categoria': categoria})
+
+    except (TypeError, ValueError):
+        return jsonify({'success': False, 'error': 'Prioridad inválida'}), 400
+    except Exception as e:
+        db.session.rollback()
+        print(f"❌ Error guardando regla de categoría: {e}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+
+@clasificador_bp.route('/api/categorias/reglas/<int:regla_id>', methods=['DELETE'])
+def api_borrar_regla_categoria(regla_id):
+    """Borra una regla"""
+    if 'user_id' not in session:
+        return jsonify({'error': 'No autorizado'}), 401
+
+    try:
+        asegurar_tabla_reglas()
+        borradas = db.session.execute(text(
+            "DELETE FROM regla_categoria WHERE id = :id"
+        ), {'id': regla_id}).rowcount
+        db.session.commit()
+        if not borradas:
+            return jsonify({'success': False, 'error': 'Regla no encontrada'}), 404
+        incrementar_version('regla_categoria')
+        return jsonify({'success': True})
+
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+
+@clasificador_bp.route('/api/categorias/clasificar', methods=['POST'])
+def api_clasificar():
+    """
+    Clasifica en una pasada:
+        {descripciones: [...]}                       sólo informa
+        {categoria_actual: 'Importado', aplicar: true}  reclasifica productos
+            existentes de esa categoría y graba los que matchean
+    """
+    if 'user_id' not in session:
+        return jsonify({'error': 'No autorizado'}), 401
+
+    try:
+        data = request.get_json() or {}
+
+        if 'descripciones' in data:
+            descripciones = [str(d or '') for d in data['descripciones']]
+            categorias, sin_clasificar = clasificar_lote(descripciones)
+            return jsonify({
+                'success': True,
+                'categorias': categorias,
+                'sin_clasificar': [descripciones[i] for i in sin_clasificar]
+            })
+
+        productos = db.session.execute(text("""
+            SELECT id, codigo, nombre FROM producto
+            WHERE categoria = :categoria AND es_combo = 0
+            FOR UPDATE
+        """), {'categoria': data.get('categoria_actual') or 'Importado'}).fetchall()
+        categorias, sin_clasificar = clasificar_lote([p.nombre for p in productos])
+
+        # Un UPDATE por categoría destino, no uno por producto
+        por_categoria = {}
+        for producto, categoria in zip(productos, categorias):
+            if categoria:
+                por_categoria.setdefault(categoria, []).append(producto.id)
+
+        if data.get('aplicar'):
+            for categoria, ids in por_categoria.items():
+                db.session.execute(
+                    text("UPDATE producto SET categoria = :categoria WHERE id IN :ids")
+                    .bindparams(bindparam('ids', expanding=True)),
+                    {'categoria': categoria, 'ids': ids}
+                )
+            db.session.commit()
+            ids = [i for lista in por_categoria.values() for i in lista]
+            if len(ids) > catalogo_cache.MAX_CAMBIOS_INCREMENTALES:
+                invalidar_catalogo()
+            elif ids:
+                invalidar_catalogo(ids=ids)
+        else:
+            db.session.rollback()
+
+        return jsonify({
+            'success': True,
+            'aplicado': bool(data.get('aplicar')),
+            'clasificados': {categoria: len(ids) for categoria, ids in por_categoria.items()},
+            'sin_clasificar': [{'codigo': productos[i].codigo, 'nombre': productos[i].nombre}
+                               for i in sin_clasificar]
+        })
+
+    except Exception as e:
+        db.session.rollback()
+        print(f"❌ Error clasificando productos: {e}")
+        return jsonify({'success': False, 'error': str(e)}), 500
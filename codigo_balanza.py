@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+codigo_balanza.py - DECODIFICACIÓN DE ETIQUETAS DE BALANZA (EAN-13)
+═══════════════════════════════════════════════════════════════════════════════
+Las balanzas imprimen EAN-13 de uso interno con prefijo 20-29:
+
+    PP | LLLLL | VVVVV | D
+    PP    = prefijo (20-29), define si el valor es peso o precio
+    LLLLL = PLU del producto (cantidad de dígitos configurable)
+    VVVVV = peso en gramos o importe (el resto hasta 12 dígitos)
+    D     = dígito verificador EAN-13
+
+El formato se configura por prefijo en config_cliente.py (BALANZA_FORMATOS)
+y la conversión PLU → código de producto con BALANZA_REEMPLAZOS_PLU.
+═══════════════════════════════════════════════════════════════════════════════
+"""
+
+# Formato usado hasta ahora en nueva_venta.html: prefijo 20, PLU de 5 dígitos, peso en gramos
+FORMATOS_POR_DEFECTO = {
+    '20': {'tipo': 'peso', 'digitos_plu': 5, 'decimales': 3},
+}
+
+# Los pesables tienen PLU 00XXX en la balanza pero código 100XXX en la base
+REEMPLAZOS_PLU_POR_DEFECTO = [('00', '100')]
+
+
+def digito_verificador_ean13(primeros_12):
+    """Calcula el dígito verificador EAN-13 de los primeros 12 dígitos"""
+    suma = 0
+    for i, caracter in enumerate(primeros_12):
+        suma += int(caracter) * (3 if i % 2 else 1)
+    return (10 - suma % 10) % 10
+
+
+def es_ean13_valido(codigo):
+    """True si son 13 dígitos con dígito verificador correcto"""
+    return (len(codigo) == 13 and codigo.isdigit()
+            and digito_verificador_ean13(codigo[:12]) == int(codigo[12]))
+
+
+def decodificar_etiqueta(codigo, formatos=None):
+    """
+    Decodifica una etiqueta de balanza.
+
+    Returns:
+        dict con prefijo, plu, tipo ('peso' o 'precio') y valor (kg o $),
+        o None si el código no es una etiqueta de balanza válida.
+    """
+    codigo = (codigo or '').strip()
+    if len(codigo) != 13 or not codigo.isdigit() or codigo[0] != '2':
+        return None
+
+    formato = (formatos or FORMATOS_POR_DEFECTO).get(codigo[:2])
+    if not formato:
+        return None
+    # Algunas balanzas viejas no calculan bien el verificador: se puede desactivar por prefijo
+    if formato.get('validar_digito', True) and not es_ean13_valido(codigo):
+        return None
+
+    digitos_plu = int(formato.get('digitos_plu', 5))
+    plu = codigo[2:2 + digitos_plu]
+    valor_raw = codigo[2 + digitos_plu:12]
+    if not plu or not valor_raw:
+        return None
+
+    decimales = int(formato.get('decimales', 3 if formato.get('tipo') == 'peso' else 2))
+    valor = int(valor_raw) / (10 ** decimales)
+
+    return {
+        'codigo': codigo,
+        'prefijo': codigo[:2],
+        'plu': plu,
+        'tipo': formato.get('tipo', 'peso'),
+        'valor': valor
+    }
+
+
+def codigos_candidatos(plu, reemplazos=None):
+    """
+    Códigos de producto posibles para un PLU, en orden de preferencia.
+    Ej: '00035' → ['100035', '00035', '35']
+    """
+    candidatos = []
+    for prefijo_plu, reemplazo in (REEMPLAZOS_PLU_POR_DEFECTO if reemplazos is None else reemplazos):
+        if plu.startswith(prefijo_plu):
+            candidatos.append(reemplazo + plu[len(prefijo_plu):])
+            break
+    candidatos.append(plu)
+    sin_ceros = plu.lstrip('0')
+    if sin_ceros:
+        candidatos.append(sin_ceros)
+
+    # Sin duplicados, manteniendo el orden
+    vistos = set()
+    return [c for c in candidatos if not (c in vistos or vistos.add(c))]
+
+
+def cantidad_desde_etiqueta(etiqueta, precio_unitario):
+    """Cantidad (kg) a facturar según la etiqueta: peso directo o importe / precio"""
+    if etiqueta['tipo'] == 'peso':
+        return round(etiqueta['valor'], 3)
+    if precio_unitario and float(precio_unitario) > 0:
+        return round(etiqueta['valor'] / float(precio_unitario), 3)
+    return 0.0
@@ -44,6 +44,18 @@ USE_HOMOLOGACION = False                # ← True = Pruebas, False = Producció
 CERT_PATH = 'certificados/certificado.crt'  # ← Ruta del certificado
 KEY_PATH = 'certificados/private.key'       # ← Ruta de la clave privada
 
+# ═══ ETIQUETAS DE BALANZA (EAN-13 prefijo 20-29) ═══
+# Por prefijo: 'peso' (gramos) o 'precio' (importe), dígitos del PLU y decimales del valor
+BALANZA_FORMATOS = {
+    '20': {'tipo': 'peso', 'digitos_plu': 5, 'decimales': 3},
+    # '21': {'tipo': 'precio', 'digitos_plu': 5, 'decimales': 2},
+}
+BALANZA_REEMPLAZOS_PLU = [('00', '100')]   # ← PLU 00035 de balanza = código 100035
+
+# ═══ CACHE DE CATÁLOGO EN MEMORIA ═══
+CATALOGO_CACHE_INTERVALO = 0.5          # ← segundos entre chequeos de versión
+CATALOGO_CACHE_MAX_PRODUCTOS = 200000   # ← con más productos activos no se cachea
+
 # ═══════════════════════════════════════════════════════════════════════════════
 # FIN DE CONFIGURACIÓN - NO MODIFICAR DEBAJO DE ESTA LÍNEA
 # ═══════════════════════════════════════════════════════════════════════════════
@@ -78,6 +90,12 @@ class Config:
     # Configuración de sesiones
     PERMANENT_SESSION_LIFETIME = timedelta(hours=8)
     
+    # Etiquetas de balanza
+    BALANZA_FORMATOS = BALANZA_FORMATOS
+    BALANZA_REEMPLAZOS_PLU = BALANZA_REEMPLAZOS_PLU
+    CATALOGO_CACHE_INTERVALO = CATALOGO_CACHE_INTERVALO
+    CATALOGO_CACHE_MAX_PRODUCTOS = CATALOGO_CACHE_MAX_PRODUCTOS
+    
     # Debug
     DEBUG = True
     TESTING = False
@@ -20,6 +20,11 @@ except ImportError:
     def registrar_movimiento_stock(*args, **kwargs):
         pass
 
+from catalogo_cache import invalidar_catalogo
+from stock_combos import recalcular_stock_disponible, descontar_stock_combo
+from exportaciones import registrar_exportacion
+from descargas import filas_cursor, libro_xlsx, celda_xlsx, celdas_xlsx, combinar_xlsx, respuesta_xlsx
+
 # Blueprint para las rutas de CTA.CTE
 cta_cte_bp = Blueprint('cta_cte', __name__)
 
@@ -67,6 +72,9 @@ def guardar_venta_fiada(db, cliente_id, productos, usuario_id, observaciones=Non
     - NO emite factura
     - SÍ descuenta stock (incluyendo combos)
     - Guarda como pendiente de pago
+    
+    Movimiento, detalle, descuento de stock, auditoría y stock de combos
+    se confirman en UN solo commit al final: si algo falla no queda nada.
     """
     try:
         # Calcular total
@@ -85,9 +93,9 @@ def guardar_venta_fiada(db, cliente_id, productos, usuario_id, observaciones=Non
             'monto_total': float(monto_total),
             'usuario_id': usuario_id,
             'observaciones': observaciones
-        }, commit=True)
+        })
         
-        movimiento_id = result
+        movimiento_id = result.lastrowid
         
         # 2. Insertar los detalles de productos
         query_detalle = """
@@ -107,131 +115,51 @@ def guardar_venta_fiada(db, cliente_id, productos, usuario_id, observaciones=Non
                 'subtotal': float(producto['subtotal']),
                 'porcentaje_iva': float(producto.get('porcentaje_iva', 21.00)),
                 'importe_iva': float(producto.get('importe_iva', 0.00))
-            }, commit=True)
+            })
         
         # 3. Descontar stock - CORREGIDO PARA COMBOS CON AUDITORÍA
+        productos_stock_modificado = set()
         for producto in productos:
             producto_id = producto['producto_id']
             cantidad = float(producto['cantidad'])
             
             # Verificar si es combo
             query_check_combo = """
-                SELECT id, codigo, nombre, es_combo, stock, producto_base_id, cantidad_combo,
-                       producto_base_id_2, cantidad_combo_2,
-                       producto_base_id_3, cantidad_combo_3
+                SELECT id, codigo, nombre, es_combo, stock
                 FROM producto WHERE id = :producto_id
             """
             result_combo = ejecutar_query(db, query_check_combo, {'producto_id': producto_id})
             row = result_combo.fetchone()
             
+            if row:
+                productos_stock_modificado.add(producto_id)
+            
             if row and row.es_combo:
-                # Es combo - descontar de productos base
-                if row.producto_base_id and row.cantidad_combo:
-                    descuento = cantidad * float(row.cantidad_combo)
-                    
-                    # Obtener info del producto base para auditoría
-                    query_base_info = "SELECT id, codigo, nombre, stock FROM producto WHERE id = :base_id"
-                    result_base = ejecutar_query(db, query_base_info, {'base_id': row.producto_base_id})
-                    base_info = result_base.fetchone()
-                    
-                    if base_info:
-                        stock_anterior = float(base_info.stock)
-                        stock_nuevo = stock_anterior - descuento
-                        
-                        query_stock_base = """
-                            UPDATE producto 
-                            SET stock = stock - :descuento 
-                            WHERE id = :base_id
-                        """
-                        ejecutar_query(db, query_stock_base, {
-                            'descuento': descuento,
-                            'base_id': row.producto_base_id
-                        }, commit=True)
-                        print(f"📦 Combo: descontado {descuento} de producto base {row.producto_base_id}")
-                        
-                        # Auditoría
-                        registrar_movimiento_stock(
-                            db=db,
-                            producto_id=base_info.id,
-                            tipo='venta_fiada',
-                            cantidad=descuento,
-                            signo='-',
-                            stock_anterior=stock_anterior,
-                            stock_nuevo=stock_nuevo,
-                            referencia_tipo='cta_cte',
-                            referencia_id=movimiento_id,
-                            motivo=f'Combo en CTA.CTE',
-                            usuario_id=session.get('user_id'),
-                            usuario_nombre=session.get('nombre', 'Sistema'),
-                            codigo_producto=base_info.codigo,
-                            nombre_producto=base_info.nombre
-                        )
-                
-                if row.producto_base_id_2 and row.cantidad_combo_2:
-                    descuento = cantidad * float(row.cantidad_combo_2)
-                    
-                    result_base = ejecutar_query(db, query_base_info, {'base_id': row.producto_base_id_2})
-                    base_info = result_base.fetchone()
-                    
-                    if base_info:
-                        stock_anterior = float(base_info.stock)
-                        stock_nuevo = stock_anterior - descuento
-                        
-                        ejecutar_query(db, query_stock_base, {
-                            'descuento': descuento,
-                            'base_id': row.producto_base_id_2
-                        }, commit=True)
-                        print(f"📦 Combo: descontado {descuento} de producto base 2 {row.producto_base_id_2}")
-                        
-                        registrar_movimiento_stock(
-                            db=db,
-                            producto_id=base_info.id,
-                            tipo='venta_fiada',
-                            cantidad=descuento,
-                            signo='-',
-                            stock_anterior=stock_anterior,
-                            stock_nuevo=stock_nuevo,
-                            referencia_tipo='cta_cte',
-                            referencia_id=movimiento_id,
-                            motivo=f'Combo en CTA.CTE',
-                            usuario_id=session.get('user_id'),
-                            usuario_nombre=session.get('nombre', 'Sistema'),
-                            codigo_producto=base_info.codigo,
-                            nombre_producto=base_info.nombre
-                        )
+                # Es combo - descontar de todos los productos base con un UPDATE
+                movimientos = descontar_stock_combo(db, producto_id, cantidad)
                 
-                if row.producto_base_id_3 and row.cantidad_combo_3:
-                    descuento = cantidad * float(row.cantidad_combo_3)
+                for mov in movimientos:
+                    productos_stock_modificado.add(mov['producto_id'])
+                    print(f"📦 Combo: descontado {mov['descuento']} de producto base {mov['producto_id']}")
                     
-                    result_base = ejecutar_query(db, query_base_info, {'base_id': row.producto_base_id_3})
-                    base_info = result_base.fetchone()
-                    
-                    if base_info:
-                        stock_anterior = float(base_info.stock)
-                        stock_nuevo = stock_anterior - descuento
-                        
-                        ejecutar_query(db, query_stock_base, {
-                            'descuento': descuento,
-                            'base_id': row.producto_base_id_3
-                        }, commit=True)
-                        print(f"📦 Combo: descontado {descuento} de producto base 3 {row.producto_base_id_3}")
-                        
-                        registrar_movimiento_stock(
-                            db=db,
-                            producto_id=base_info.id,
-                            tipo='venta_fiada',
-                            cantidad=descuento,
-                            signo='-',
-                            stock_anterior=stock_anterior,
-                            stock_nuevo=stock_nuevo,
-                            referencia_tipo='cta_cte',
-                            referencia_id=movimiento_id,
-                            motivo=f'Combo en CTA.CTE',
-                            usuario_id=session.get('user_id'),
-                            usuario_nombre=session.get('nombre', 'Sistema'),
-                            codigo_producto=base_info.codigo,
-                            nombre_producto=base_info.nombre
-                        )
+                    # Auditoría
+                    registrar_movimiento_stock(
+                        db=db,
+                        producto_id=mov['producto_id'],
+                        tipo='venta_fiada',
+                        cantidad=mov['descuento'],
+                        signo='-',
+                        stock_anterior=mov['stock_anterior'],
+                        stock_nuevo=mov['stock_nuevo'],
+                        referencia_tipo='cta_cte',
+                        referencia_id=movimiento_id,
+                        motivo=f'Combo en CTA.CTE',
+                        usuario_id=session.get('user_id'),
+                        usuario_nombre=session.get('nombre', 'Sistema'),
+                        codigo_producto=mov['codigo'],
+                        nombre_producto=mov['nombre'],
+                        commit=False
+                    )
             else:
                 # Producto normal - descontar directo
                 stock_anterior = float(row.stock) if row else 0
@@ -245,7 +173,7 @@ def guardar_venta_fiada(db, cliente_id, productos, usuario_id, observaciones=Non
                 ejecutar_query(db, query_stock, {
                     'cantidad': cantidad,
                     'producto_id': producto_id
-                }, commit=True)
+                })
                 print(f"📦 Stock descontado: {cantidad} de producto {producto_id}")
                 
                 # Auditoría
@@ -263,9 +191,17 @@ def guardar_venta_fiada(db, cliente_id, productos, usuario_id, observaciones=Non
                         usuario_id=session.get('user_id'),
                         usuario_nombre=session.get('nombre', 'Sistema'),
                         codigo_producto=row.codigo,
-                        nombre_producto=row.nombre
+                        nombre_producto=row.nombre,
+                        commit=False
                     )
         
+        # Stock materializado de los combos que usan los productos descontados
+        recalcular_stock_disponible(db, bases=productos_stock_modificado)
+        
+        # Un solo commit para todo lo anterior
+        db.session.commit()
+        invalidar_catalogo(ids=productos_stock_modificado)
+        
         return {
             'success': True,
             'movimiento_id': movimiento_id,
@@ -824,14 +760,10 @@ def api_exportar_excel():
     Exporta reporte de cuentas corrientes a Excel REAL (.xlsx)
     Mismo estilo que el reporte de ventas usando openpyxl
     """
-    from flask import current_app, send_file
-    import io
-    from datetime import datetime
+    from flask import current_app
     
     try:
         import openpyxl
-        from openpyxl.styles import Font, PatternFill, Alignment, Border, Side
-        from openpyxl.utils import get_column_letter
     except ImportError:
         return jsonify({'error': 'openpyxl no está instalado'}), 500
     
@@ -840,160 +772,7 @@ def api_exportar_excel():
     try:
         print("🔍 Iniciando exportación Excel cuentas corrientes")
         
-        query = """
-            SELECT 
-                c.id,
-                c.nombre,
-                c.documento,
-                c.tipo_documento,
-                c.telefono,
-                c.email,
-                COUNT(DISTINCT m.id) as movimientos_pendientes,
-                COALESCE(SUM(CASE WHEN m.tipo = 'venta_fiada' THEN m.monto_total ELSE -m.monto_total END), 0) as saldo_pendiente,
-                MAX(m.fecha) as ultima_operacion
-            FROM cliente c
-            LEFT JOIN cta_cte_movimiento m ON c.id = m.cliente_id AND m.estado = 'pendiente'
-            GROUP BY c.id, c.nombre, c.documento, c.tipo_documento, c.telefono, c.email
-            HAVING saldo_pendiente > 0 OR movimientos_pendientes > 0
-            ORDER BY saldo_pendiente DESC
-        """
-        
-        result = ejecutar_query(db, query)
-        
-        # Procesar datos
-        total_adeudado = 0
-        clientes_con_deuda = 0
-        total_movimientos = 0
-        total_clientes = 0
-        
-        datos_clientes = []
-        for row in result:
-            saldo = float(row.saldo_pendiente)
-            movimientos = int(row.movimientos_pendientes)
-            
-            ultima_op_str = 'Sin operaciones'
-            if row.ultima_operacion:
-                try:
-                    ultima_op_str = row.ultima_operacion.strftime('%d/%m/%Y')
-                except:
-                    ultima_op_str = str(row.ultima_operacion)[:10]
-            
-            estado = 'DEBE' if saldo > 0 else 'AL DÍA'
-            
-            datos_clientes.append({
-                'id': row.id,
-                'nombre': row.nombre,
-                'tipo_documento': row.tipo_documento or 'N/A',
-                'documento': str(row.documento or 'S/D'),
-                'telefono': str(row.telefono or 'N/A'),
-                'email': row.email or 'N/A',
-                'movimientos': movimientos,
-                'saldo': saldo,
-                'estado': estado,
-                'ultima_operacion': ultima_op_str
-            })
-            
-            total_adeudado += saldo
-            if saldo > 0:
-                clientes_con_deuda += 1
-            total_movimientos += movimientos
-            total_clientes += 1
-        
-        # Crear workbook
-        wb = openpyxl.Workbook()
-        ws = wb.active
-        ws.title = "Cuentas Corrientes"
-        
-        # Estilos (igual al reporte de ventas)
-        titulo_font = Font(bold=True, size=16, color="FFFFFF")
-        titulo_fill = PatternFill(start_color="366092", end_color="366092", fill_type="solid")
-        encabezado_font = Font(bold=True, size=11, color="FFFFFF")
-        encabezado_fill = PatternFill(start_color="366092", end_color="366092", fill_type="solid")
-        border = Border(
-            left=Side(style='thin'),
-            right=Side(style='thin'),
-            top=Side(style='thin'),
-            bottom=Side(style='thin')
-        )
-        
-        # Título
-        ws.merge_cells('A1:J1')
-        celda_titulo = ws['A1']
-        celda_titulo.value = 'Reporte de Cuentas Corrientes'
-        celda_titulo.font = titulo_font
-        celda_titulo.fill = titulo_fill
-        celda_titulo.alignment = Alignment(horizontal='center', vertical='center')
-        
-        ws['A2'] = f'Generado: {datetime.now().strftime("%d/%m/%Y %H:%M")}'
-        
-        # Resumen
-        fila = 4
-        ws.merge_cells(f'A{fila}:J{fila}')
-        ws[f'A{fila}'] = 'RESUMEN DEL PERÍODO'
-        ws[f'A{fila}'].font = Font(bold=True, size=12)
-        
-        fila += 1
-        ws[f'A{fila}'] = 'Clientes con Movimientos:'
-        ws[f'B{fila}'] = total_clientes
-        ws[f'D{fila}'] = 'Total Adeudado:'
-        ws[f'E{fila}'] = total_adeudado
-        ws[f'E{fila}'].number_format = '$#,##0.00'
-        
-        fila += 1
-        ws[f'A{fila}'] = 'Clientes con Deuda:'
-        ws[f'B{fila}'] = clientes_con_deuda
-        ws[f'D{fila}'] = 'Movimientos Pendientes:'
-        ws[f'E{fila}'] = total_movimientos
-        
-        # Encabezados de tabla
-        fila += 2
-        encabezados = [
-            'ID', 'Cliente', 'Tipo Doc.', 'Documento', 'Teléfono',
-            'Email', 'Mov. Pendientes', 'Saldo Pendiente', 'Estado', 'Última Operación'
-        ]
-        
-        for col, encabezado in enumerate(encabezados, 1):
-            celda = ws.cell(row=fila, column=col, value=encabezado)
-            celda.font = encabezado_font
-            celda.fill = encabezado_fill
-            celda.alignment = Alignment(horizontal='center', vertical='center')
-            celda.border = border
-        
-        # Datos
-        fila += 1
-        for cliente in datos_clientes:
-            ws.cell(row=fila, column=1, value=cliente['id'])
-            ws.cell(row=fila, column=2, value=cliente['nombre'])
-            ws.cell(row=fila, column=3, value=cliente['tipo_documento'])
-            ws.cell(row=fila, column=4, value=cliente['documento'])
-            ws.cell(row=fila, column=5, value=cliente['telefono'])
-            ws.cell(row=fila, column=6, value=cliente['email'])
-            ws.cell(row=fila, column=7, value=f"{cliente['movimientos']} movimientos")
-            
-            celda_saldo = ws.cell(row=fila, column=8, value=cliente['saldo'])
-            celda_saldo.number_format = '$#,##0.00'
-            
-            ws.cell(row=fila, column=9, value=cliente['estado'])
-            ws.cell(row=fila, column=10, value=cliente['ultima_operacion'])
-            
-            fila += 1
-        
-        # Ajustar anchos
-        ws.column_dimensions['A'].width = 8
-        ws.column_dimensions['B'].width = 30
-        ws.column_dimensions['C'].width = 12
-        ws.column_dimensions['D'].width = 15
-        ws.column_dimensions['E'].width = 15
-        ws.column_dimensions['F'].width = 30
-        ws.column_dimensions['G'].width = 18
-        ws.column_dimensions['H'].width = 18
-        ws.column_dimensions['I'].width = 12
-        ws.column_dimensions['J'].width = 18
-        
-        # Guardar en memoria
-        output = io.BytesIO()
-        wb.save(output)
-        output.seek(0)
+        wb, total_clientes, total_adeudado = libro_excel_cta_cte(db)
         
         fecha_actual = datetime.now().strftime('%Y%m%d_%H%M%S')
         nombre_archivo = f'Cuentas_Corrientes_{fecha_actual}.xlsx'
@@ -1002,12 +781,8 @@ def api_exportar_excel():
         print(f"   Total clientes: {total_clientes}")
         print(f"   Total adeudado: ${total_adeudado:,.2f}")
         
-        return send_file(
-            output,
-            mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
-            as_attachment=True,
-            download_name=nombre_archivo
-        )
+        # Se guarda en un archivo temporal que se borra al terminar la descarga
+        return respuesta_xlsx(wb, nombre_archivo)
         
     except Exception as e:
         print(f"❌ Error generando Excel de cuentas corrientes: {str(e)}")
@@ -1017,4 +792,119 @@ def api_exportar_excel():
             'success': False,
             'error': 'connection',
             'detail': str(e)
-        }), 500
\ No newline at end of file
+        }), 500
+
+
+# Clientes con saldo o movimientos pendientes (sin ORDER BY: se usa también para los totales)
+QUERY_SALDOS_EXCEL = """
+    SELECT 
+        c.id,
+        c.nombre,
+        c.documento,
+        c.tipo_documento,
+        c.telefono,
+        c.email,
+        COUNT(DISTINCT m.id) as movimientos_pendientes,
+        COALESCE(SUM(CASE WHEN m.tipo = 'venta_fiada' THEN m.monto_total ELSE -m.monto_total END), 0) as saldo_pendiente,
+        MAX(m.fecha) as ultima_operacion
+    FROM cliente c
+    LEFT JOIN cta_cte_movimiento m ON c.id = m.cliente_id AND m.estado = 'pendiente'
+    GROUP BY c.id, c.nombre, c.documento, c.tipo_documento, c.telefono, c.email
+    HAVING saldo_pendiente > 0 OR movimientos_pendientes > 0
+"""
+
+
+def escribir_excel_cta_cte(db, output):
+    """
+    Escribe el Excel de cuentas corrientes en un archivo binario
+
+    Returns:
+        (cantidad de clientes, total adeudado)
+    """
+    wb, total_clientes, total_adeudado = libro_excel_cta_cte(db)
+    wb.save(output)
+    return total_clientes, total_adeudado
+
+
+def libro_excel_cta_cte(db):
+    """
+    Libro write-only de cuentas corrientes: totales con una consulta y los
+    clientes leídos de un cursor del servidor, fila por fila.
+
+    Returns:
+        (libro, cantidad de clientes, total adeudado)
+    """
+    wb, ws = libro_xlsx("Cuentas Corrientes", anchos=[8, 30, 12, 15, 15, 30, 18, 18, 12, 18])
+    
+    # Totales (antes de abrir el cursor)
+    totales = ejecutar_query(db, f"""
+        SELECT 
+            COUNT(*) as clientes,
+            COALESCE(SUM(saldo_pendiente), 0) as adeudado,
+            COALESCE(SUM(CASE WHEN saldo_pendiente > 0 THEN 1 ELSE 0 END), 0) as con_deuda,
+            COALESCE(SUM(movimientos_pendientes), 0) as movimientos
+        FROM ({QUERY_SALDOS_EXCEL}) saldos
+    """).fetchone()
+    total_clientes = int(totales.clientes)
+    total_adeudado = float(totales.adeudado)
+    
+    # Título
+    combinar_xlsx(ws, 'A1:J1')
+    ws.append(celdas_xlsx(ws, ['Reporte de Cuentas Corrientes'] + [None] * 9, 'reporte_titulo'))
+    ws.append([f'Generado: {datetime.now().strftime("%d/%m/%Y %H:%M")}'])
+    ws.append([])
+    
+    # Resumen
+    combinar_xlsx(ws, 'A4:J4')
+    ws.append([celda_xlsx(ws, 'RESUMEN DEL PERÍODO', 'reporte_seccion')])
+    ws.append(['Clientes con Movimientos:', total_clientes, None,
+               'Total Adeudado:', celda_xlsx(ws, total_adeudado, 'reporte_moneda')])
+    ws.append(['Clientes con Deuda:', int(totales.con_deuda), None,
+               'Movimientos Pendientes:', int(totales.movimientos)])
+    ws.append([])
+    
+    # Encabezados de tabla
+    ws.append(celdas_xlsx(ws, [
+        'ID', 'Cliente', 'Tipo Doc.', 'Documento', 'Teléfono',
+        'Email', 'Mov. Pendientes', 'Saldo Pendiente', 'Estado', 'Última Operación'
+    ], 'reporte_encabezado'))
+    
+    # Datos
+    consulta = text(QUERY_SALDOS_EXCEL + " ORDER BY saldo_pendiente DESC")
+    for row in filas_cursor(db.session, consulta):
+        saldo = float(row.saldo_pendiente)
+        
+        ultima_op_str = 'Sin operaciones'
+        if row.ultima_operacion:
+            try:
+                ultima_op_str = row.ultima_operacion.strftime('%d/%m/%Y')
+            except:
+                ultima_op_str = str(row.ultima_operacion)[:10]
+        
+        ws.append([
+            row.id,
+            row.nombre,
+            row.tipo_documento or 'N/A',
+            str(row.documento or 'S/D'),
+            str(row.telefono or 'N/A'),
+            row.email or 'N/A',
+            f"{int(row.movimientos_pendientes)} movimientos",
+            celda_xlsx(ws, saldo, 'reporte_moneda'),
+            'DEBE' if saldo > 0 else 'AL DÍA',
+            ultima_op_str
+        ])
+    
+    return wb, total_clientes, total_adeudado
+
+
+def exportar_excel_cta_cte_archivo(parametros, archivo, progreso):
+    """Exportación en segundo plano del Excel de cuentas corrientes (ver exportaciones.py)"""
+    from flask import current_app
+    
+    progreso(10, 'Generando Excel de cuentas corrientes...')
+    escribir_excel_cta_cte(current_app.extensions['sqlalchemy'].db, archivo)
+    return (f"Cuentas_Corrientes_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx",
+            'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
+
+
+registrar_exportacion('cta_cte_excel', exportar_excel_cta_cte_archivo)
\ No newline at end of file
@@ -0,0 +1,267 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+cubo_ventas.py - CONSULTA GENÉRICA DE VENTAS (DIMENSIONES × MEDIDAS)
+═══════════════════════════════════════════════════════════════════════════════
+Un solo endpoint para cualquier corte de ventas en lugar de un GROUP BY
+escrito a mano por reporte:
+
+    GET  /api/ventas/cubo?dimensiones=mes,categoria&medidas=importe,unidades
+                         &desde=2024-01-01&hasta=2024-12-31&usuario=3,4
+    POST /api/ventas/cubo   {"dimensiones": [...], "medidas": [...],
+                             "desde": ..., "hasta": ..., "filtros": {...}}
+
+    dimensiones   dia, semana, mes, ano, hora, producto, categoria,
+                  medio_pago, alicuota, usuario, cliente, tipo_comprobante,
+                  estado
+    medidas       importe, neto, iva, unidades (combos × cantidad_combo),
+                  cantidad, tickets, operaciones, lineas
+    filtros       las mismas dimensiones (salvo las de tiempo); varios
+                  valores separados por coma
+    excluir       estados a dejar afuera ('cancelada' por defecto; vacío =
+                  ninguno). Con filtro de estado no se excluye nada
+    orden         p.ej. -importe (por defecto: tiempo ascendente, si no la
+                  primera medida descendente)
+    limite        máximo de filas
+
+Se compila a UNA consulta con resumen_ventas.compilar_consulta(): sobre los
+resúmenes diarios si cubren todo lo pedido, sobre factura/detalle_factura
+si no (hora, cliente, tipo de comprobante, tickets por producto).
+
+La tabla base sale de lo pedido: producto/categoría/unidades → líneas de
+factura; medio_pago/operaciones → medios de pago; alícuota → IVA; lo demás
+→ facturas. Ojo: 'importe' por producto es neto + IVA de las líneas; el de
+facturas es el total del comprobante (incluye descuentos generales).
+═══════════════════════════════════════════════════════════════════════════════
+"""
+
+from flask import Blueprint, jsonify, request, session
+from datetime import datetime, timedelta
+
+from resumen_ventas import consultar_ventas, compilar_consulta
+from serializacion import respuesta_json
+from cache_reportes import cache_reporte
+
+# Blueprint para la consulta genérica de ventas
+cubo_ventas_bp = Blueprint('cubo_ventas', __name__)
+
+# Variable global para db (se inicializa en init_cubo_ventas)
+db = None
+
+DIAS_POR_DEFECTO = 30
+MAXIMO_FILAS = 5000
+
+# dimensión pública → columnas de resumen_ventas que devuelve
+DIMENSIONES = {
+    'dia': ['dia'],
+    'semana': ['semana'],
+    'mes': ['ano_mes'],
+    'ano': ['ano'],
+    'hora': ['hora'],
+    'producto': ['producto_id', 'codigo', 'nombre'],
+    'categoria': ['categoria'],
+    'medio_pago': ['medio_pago'],
+    'alicuota': ['alicuota'],
+    'usuario': ['usuario_id', 'usuario'],
+    'cliente': ['cliente_id', 'cliente'],
+    'tipo_comprobante': ['tipo_comprobante'],
+    'estado': ['estado'],
+}
+DIMENSIONES_TIEMPO = ('dia', 'semana', 'mes', 'ano', 'hora')
+
+# filtro público → columna de resumen_ventas
+FILTROS = {
+    'producto': 'producto_id',
+    'codigo': 'codigo',
+    'categoria': 'categoria',
+    'medio_pago': 'medio_pago',
+    'alicuota': 'alicuota',
+    'usuario': 'usuario_id',
+    'cliente': 'cliente_id',
+    'tipo_comprobante': 'tipo_comprobante',
+}
+FILTROS_NUMERICOS = ('producto', 'usuario', 'cliente')
+
+MEDIDAS = ('importe', 'neto', 'iva', 'unidades', 'cantidad', 'tickets', 'operaciones', 'lineas')
+
+# Qué pide cada tabla base (dimensiones, filtros o medidas que sólo ella tiene)
+_EXCLUSIVOS = {
+    'productos': {'producto', 'codigo', 'categoria', 'unidades', 'cantidad'},
+    'medios_pago': {'medio_pago', 'operaciones'},
+    'iva': {'alicuota'},
+}
+
+
+def init_cubo_ventas(app, database):
+    """
+    Inicializa la consulta genérica de ventas
+
+    Uso en app.py:
+        from cubo_ventas import init_cubo_ventas
+        init_cubo_ventas(app, db)
+    """
+    global db
+    db = database
+    app.register_blueprint(cubo_ventas_bp)
+    print("✅ Cubo de ventas inicializado")
+
+
+def elegir_fuente(nombres):
+    """Tabla base de resumen_ventas para estas dimensiones/filtros/medidas"""
+    pedidos = set(nombres)
+    fuentes = [fuente for fuente, exclusivos in _EXCLUSIVOS.items() if exclusivos & pedidos]
+    if len(fuentes) > 1:
+        conflicto = sorted(pedidos & set().union(*(_EXCLUSIVOS[fuente] for fuente in fuentes)))
+        raise ValueError(f"No se pueden combinar en una consulta: {', '.join(conflicto)}")
+    return fuentes[0] if fuentes else 'facturas'
+
+
+def consultar_cubo(dimensiones, medidas, desde, hasta, filtros=None, excluir=('cancelada',),
+                   orden=None, limite=None):
+    """
+    Ejecuta una consulta del cubo.
+
+    Args:
+        dimensiones:  nombres de DIMENSIONES
+        medidas:      nombres de MEDIDAS
+        desde/hasta:  días (date), ambos incluidos
+        filtros:      {nombre de FILTROS o 'estado': valor o lista}
+        excluir:      estados a dejar afuera (se ignora si se filtra por estado)
+        orden:        ['-importe', 'mes'] con nombres públicos
+        limite:       máximo de filas
+
+    Returns:
+        dict con fuente, desde_resumen, columnas, filas (dicts) y totales
+    """
+    filtros = dict(filtros or {})
+    for nombre in dimensiones:
+        if nombre not in DIMENSIONES:
+            raise ValueError(f'Dimensión desconocida: {nombre}')
+    for nombre in medidas:
+        if nombre not in MEDIDAS:
+            raise ValueError(f'Medida desconocida: {nombre}')
+    if not medidas:
+        raise ValueError('Debe pedir al menos una medida')
+    estados = filtros.pop('estado', None)
+    for nombre in filtros:
+        if nombre not in FILTROS:
+            raise ValueError(f'Filtro desconocido: {nombre}')
+    if estados or 'estado' in dimensiones:
+        excluir = None
+
+    fuente = elegir_fuente(list(dimensiones) + list(filtros) + list(medidas))
+    columnas = [columna for nombre in dimensiones for columna in DIMENSIONES[nombre]]
+    filtros_sql = {FILTROS[nombre]: valor for nombre, valor in filtros.items()}
+    if isinstance(estados, str):
+        estados = [estados]
+
+    orden_sql = []
+    for campo in orden or []:
+        nombre = campo.lstrip('-')
+        if nombre in DIMENSIONES:
+            orden_sql.append(campo[:len(campo) - len(nombre)] + DIMENSIONES[nombre][0])
+        elif nombre in medidas:
+            orden_sql.append(campo)
+        else:
+            raise ValueError(f'No se puede ordenar por {nombre}')
+    if not orden_sql and dimensiones:
+        tiempo = [DIMENSIONES[nombre][0] for nombre in dimensiones if nombre in DIMENSIONES_TIEMPO]
+        orden_sql = tiempo or [f'-{medidas[0]}']
+
+    argumentos = dict(estados=estados, excluir=list(excluir) if excluir else None, filtros=filtros_sql)
+    consulta, parametros, desde_resumen = compilar_consulta(
+        fuente, medidas, desde, hasta, columnas, orden=orden_sql,
+        limite=max(1, min(int(limite or MAXIMO_FILAS), MAXIMO_FILAS)), **argumentos
+    )
+    filas = db.session.execute(consulta, parametros).fetchall()
+
+    # Totales con la misma consulta sin agrupar (tickets por producto no se pueden sumar)
+    if columnas:
+        total = consultar_ventas(fuente, medidas, desde, hasta, **argumentos)[0]
+    else:
+        total = filas[0] if filas else None
+
+    return {
+        'fuente': fuente,
+        'desde_resumen': desde_resumen,
+        'columnas': columnas + list(medidas),
+        'filas': [dict(fila._mapping) for fila in filas],
+        'totales': {medida: getattr(total, medida, None) or 0 for medida in medidas},
+    }
+
+
+# ═══════════════════════════════════════════════════════════════════════════════
+# ENDPOINT
+# ═══════════════════════════════════════════════════════════════════════════════
+
+def _lista(valor):
+    """'a,b' o ['a', 'b'] → ['a', 'b']"""
+    if valor is None:
+        return []
+    if isinstance(valor, (list, tuple)):
+        return [str(v).strip() for v in valor if str(v).strip()]
+    return [v.strip() for v in str(valor).split(',') if v.strip()]
+
+
+def _leer_filtros(crudos):
+    filtros = {}
+    for nombre, valor in crudos.items():
+        if nombre not in FILTROS and nombre != 'estado':
+            continue
+        valores = _lista(valor)
+        if not valores:
+            continue
+        if nombre in FILTROS_NUMERICOS:
+            valores = [int(v) for v in valores]
+        filtros[nombre] = valores if len(valores) > 1 else valores[0]
+    return filtros
+
+
+@cubo_ventas_bp.route('/api/ventas/cubo', methods=['GET', 'POST'])
+@cache_reporte(hasta='hasta')
+def api_cubo_ventas():
+    """Ventas agregadas por las dimensiones y medidas pedidas"""
+    if 'user_id' not in session:
+        return jsonify({'error': 'No autorizado'}), 401
+
+    if request.method == 'POST':
+        data = request.get_json(silent=True) or {}
+        crudos_filtros = data.get('filtros') or {}
+    else:
+        data = request.args
+        crudos_filtros = request.args
+
+    try:
+        dimensiones = _lista(data.get('dimensiones'))
+        medidas = _lista(data.get('medidas')) or ['importe', 'tickets']
+        hasta = datetime.strptime(data['hasta'], '%Y-%m-%d').date() if data.get('hasta') else datetime.now().date()
+        desde = (datetime.strptime(data['desde'], '%Y-%m-%d').date() if data.get('desde')
+                 else hasta - timedelta(days=DIAS_POR_DEFECTO - 1))
+        filtros = _leer_filtros(crudos_filtros)
+        excluir = _lista(data['excluir']) if 'excluir' in data else ['cancelada']
+        orden = _lista(data.get('orden'))
+        limite = int(data['limite']) if data.get('limite') else None
+    except (ValueError, TypeError):
+        return jsonify({'success': False, 'error': 'Parámetros inválidos (fechas YYYY-MM-DD, ids numéricos)'}), 400
+
+    if desde > hasta:
+        return jsonify({'success': False, 'error': 'La fecha desde es posterior a la fecha hasta'}), 400
+    if limite is not None and limite < 1:
+        return jsonify({'success': False, 'error': 'El límite debe ser mayor a cero'}), 400
+
+    try:
+        resultado = consultar_cubo(dimensiones, medidas, desde, hasta, filtros, excluir, orden, limite)
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    except Exception as e:
+        print(f"❌ Error en cubo de ventas: {e}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+    return respuesta_json({
+        'success': True,
+        'desde': desde,
+        'hasta': hasta,
+        'dimensiones': dimensiones,
+        'medidas': medidas,
+        **resultado
+    })
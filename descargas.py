@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+descargas.py - DESCARGAS GRANDES EN STREAMING (CSV Y EXCEL)
+═══════════════════════════════════════════════════════════════════════════════
+Exportar un año de detalle_factura o stock_movimiento armando todo en
+memoria (.all() → StringIO → respuesta) tarda en empezar y ocupa RAM en
+proporción al período. Acá las filas van de la base al cliente de a una:
+
+    filas_cursor(sesion, consulta, parametros)   filas de un cursor del servidor
+    bloques_csv(filas)                           texto CSV en bloques de ~64 KB
+    respuesta_csv(filas, nombre_archivo)         respuesta en streaming (chunked)
+
+    return respuesta_csv(
+        itertools.chain([encabezados], (formatear(f) for f in filas_cursor(db.session, consulta, params))),
+        'movimientos.csv'
+    )
+
+La consulta se ejecuta con stream_results (con PyMySQL, un SSCursor) y se
+lee de a LOTE filas: la memoria no depende del tamaño del resultado y la
+descarga empieza con la primera fila. Mientras se recorre, esa conexión
+no puede usarse para otra consulta: lo que haga falta antes (totales,
+validaciones) se consulta antes de devolver la respuesta.
+
+EXCEL
+    wb, ws = libro_xlsx('Hoja', anchos=[15, 40, ...])
+    ws.append(celdas_xlsx(ws, encabezados, 'reporte_encabezado'))
+    for fila in filas_cursor(...):
+        ws.append([fila.codigo, celda_xlsx(ws, fila.total, 'reporte_moneda')])
+    return respuesta_xlsx(wb, 'reporte.xlsx')
+
+openpyxl en modo write-only: cada fila se escribe a disco al agregarla (no
+quedan objetos celda en memoria) y el libro se arma en un archivo temporal
+que se envía y se borra al terminar. Los formatos son estilos con nombre
+(reporte_titulo, reporte_encabezado, reporte_moneda, ...) registrados una
+vez por libro; los anchos de columna se fijan antes de escribir filas.
+═══════════════════════════════════════════════════════════════════════════════
+"""
+
+from flask import current_app, stream_with_context, send_file
+import tempfile
+import csv
+import io
+
+LOTE = 1000                     # filas por lectura del cursor
+TAMANO_BLOQUE = 64 * 1024       # caracteres por bloque enviado
+
+MIMETYPE_XLSX = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+AZUL_REPORTES = '366092'
+
+
+def filas_cursor(sesion, consulta, parametros=None, lote=LOTE):
+    """
+    Ejecuta 'consulta' con un cursor del servidor y genera sus filas de a una.
+
+    La consulta corre al pedir la primera fila (no al llamar la función).
+    """
+    resultado = sesion.execute(consulta, parametros or {},
+                               execution_options={'stream_results': True, 'yield_per': lote})
+    try:
+        for fila in resultado:
+            yield fila
+    finally:
+        resultado.close()
+
+
+def bloques_csv(filas):
+    """Filas (listas) → texto CSV en bloques de ~TAMANO_BLOQUE"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for fila in filas:
+        writer.writerow(fila)
+        if buffer.tell() >= TAMANO_BLOQUE:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+def respuesta_csv(filas, nombre_archivo, mimetype='text/csv; charset=utf-8'):
+    """
+    Descarga CSV en streaming: sin Content-Length (transferencia chunked),
+    con el contexto del pedido vivo hasta la última fila (db.session incluida).
+    """
+    respuesta = current_app.response_class(stream_with_context(bloques_csv(filas)), mimetype=mimetype)
+    respuesta.headers['Content-Disposition'] = f'attachment; filename={nombre_archivo}'
+    # Que un proxy (nginx) no junte todo antes de mandarlo
+    respuesta.headers['X-Accel-Buffering'] = 'no'
+    return respuesta
+
+
+# ═══════════════════════════════════════════════════════════════════════════════
+# EXCEL (openpyxl write-only)
+# ═══════════════════════════════════════════════════════════════════════════════
+
+def _estilos_xlsx():
+    """Estilos con nombre de los reportes (objetos nuevos: un NamedStyle pertenece a un solo libro)"""
+    from openpyxl.styles import NamedStyle, Font, PatternFill, Alignment, Border, Side
+
+    relleno = PatternFill(start_color=AZUL_REPORTES, end_color=AZUL_REPORTES, fill_type='solid')
+    centrado = Alignment(horizontal='center', vertical='center')
+    fino = Side(style='thin')
+    return [
+        NamedStyle(name='reporte_titulo', font=Font(bold=True, size=16, color='FFFFFF'),
+                   fill=relleno, alignment=centrado),
+        NamedStyle(name='reporte_seccion', font=Font(bold=True, size=12)),
+        NamedStyle(name='reporte_encabezado', font=Font(bold=True, size=11, color='FFFFFF'),
+                   fill=relleno, alignment=centrado,
+                   border=Border(left=fino, right=fino, top=fino, bottom=fino)),
+        NamedStyle(name='reporte_moneda', number_format='$#,##0.00'),
+        NamedStyle(name='reporte_numero', number_format='#,##0.00'),
+    ]
+
+
+def libro_xlsx(titulo_hoja, anchos=()):
+    """
+    Libro write-only con los estilos de los reportes y una hoja.
+
+    Args:
+        titulo_hoja: nombre de la hoja
+        anchos:      ancho de cada columna desde la A
+
+    Returns:
+        (libro, hoja). ImportError si openpyxl no está instalado
+    """
+    import openpyxl
+    from openpyxl.utils import get_column_letter
+
+    wb = openpyxl.Workbook(write_only=True)
+    for estilo in _estilos_xlsx():
+        wb.add_named_style(estilo)
+    ws = wb.create_sheet(titulo_hoja)
+    for columna, ancho in enumerate(anchos, 1):
+        ws.column_dimensions[get_column_letter(columna)].width = ancho
+    return wb, ws
+
+
+def celda_xlsx(ws, valor, estilo=None):
+    """Celda con estilo para ws.append() (las hojas write-only no permiten estilar después)"""
+    from openpyxl.cell import WriteOnlyCell
+
+    celda = WriteOnlyCell(ws, value=valor)
+    if estilo:
+        celda.style = estilo
+    return celda
+
+
+def celdas_xlsx(ws, valores, estilo):
+    """Misma celda_xlsx() para toda una fila"""
+    return [celda_xlsx(ws, valor, estilo) for valor in valores]
+
+
+def combinar_xlsx(ws, rango):
+    """Combina 'A1:K1' en una hoja write-only (no tiene merge_cells(); se escribe al guardar)"""
+    ws.merged_cells.add(rango)
+
+
+def respuesta_xlsx(wb, nombre_archivo):
+    """
+    Guarda el libro en un archivo temporal y lo envía: el archivo se borra
+    solo cuando termina la respuesta (TemporaryFile + cierre de send_file).
+    """
+    archivo = tempfile.TemporaryFile()
+    try:
+        wb.save(archivo)
+        archivo.seek(0)
+    except Exception:
+        archivo.close()
+        raise
+    return send_file(archivo, mimetype=MIMETYPE_XLSX, as_attachment=True, download_name=nombre_archivo)
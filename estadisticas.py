@@ -1,10 +1,13 @@
 # estadisticas.py
 from flask import Blueprint, jsonify, request, render_template, session, redirect, url_for
-from datetime import datetime, timedelta
-from sqlalchemy import func, extract
+from datetime import datetime, timedelta, date
 import calendar
 from functools import wraps
 
+from resumen_ventas import consultar_ventas
+from cache_reportes import cache_reporte
+from exportaciones import registrar_exportacion
+
 # Crear blueprint para estadísticas
 estadisticas_bp = Blueprint('estadisticas', __name__)
 
@@ -18,6 +21,22 @@ def login_required(f):
         return f(*args, **kwargs)
     return decorated_function
 
+# Último día del período pedido, para el cache de reportes (None = incluye hoy)
+def _fin_del_ano():
+    ano = request.args.get('ano', type=int)
+    return date(ano, 12, 31) if ano else None
+
+def _fin_del_ultimo_ano():
+    anos = request.args.getlist('anos', type=int)
+    return date(max(anos), 12, 31) if anos else None
+
+def _fin_del_mes():
+    mes = request.args.get('mes', type=int)
+    ano = request.args.get('ano', type=int)
+    if not mes or not ano or not 1 <= mes <= 12:
+        return None
+    return date(ano, mes, calendar.monthrange(ano, mes)[1])
+
 def init_estadisticas(db, Factura, DetalleFactura, Producto):
     """
     Inicializar el blueprint con las dependencias necesarias
@@ -30,37 +49,33 @@ def init_estadisticas(db, Factura, DetalleFactura, Producto):
     """
     
     @estadisticas_bp.route('/api/estadisticas_ventas')
+    @cache_reporte(hasta=_fin_del_ano)
     def estadisticas_ventas():
         try:
             # Obtener parámetros
             ano = request.args.get('ano', datetime.now().year, type=int)
             
-            # Consulta para ventas por mes del año especificado
-            ventas_mensuales = db.session.query(
-                extract('month', Factura.fecha).label('mes'),
-                func.count(Factura.id).label('cantidad_ventas'),
-                func.sum(Factura.total).label('total_ventas'),
-                func.avg(Factura.total).label('promedio_venta')
-            ).filter(
-                extract('year', Factura.fecha) == ano,
-                Factura.estado != 'cancelada'
-            ).group_by(
-                extract('month', Factura.fecha)
-            ).order_by('mes').all()
+            # Ventas por mes del año especificado (resúmenes diarios si están)
+            ventas_mensuales = consultar_ventas(
+                'facturas', ['tickets', 'importe'], date(ano, 1, 1), date(ano, 12, 31),
+                agrupar=['mes'], excluir=['cancelada']
+            )
             
             # Crear estructura de datos completa (todos los 12 meses)
             datos_mensuales = []
-            ventas_dict = {v.mes: v for v in ventas_mensuales}
+            ventas_dict = {int(v.mes): v for v in ventas_mensuales}
             
             for mes in range(1, 13):
                 venta_mes = ventas_dict.get(mes)
+                cantidad = int(venta_mes.tickets or 0) if venta_mes else 0
+                total = float(venta_mes.importe or 0) if venta_mes else 0.0
                 datos_mensuales.append({
                     'mes': mes,
                     'nombre_mes': calendar.month_name[mes],
                     'nombre_corto': calendar.month_abbr[mes],
-                    'cantidad_ventas': int(venta_mes.cantidad_ventas) if venta_mes else 0,
-                    'total_ventas': float(venta_mes.total_ventas) if venta_mes else 0.0,
-                    'promedio_venta': float(venta_mes.promedio_venta) if venta_mes else 0.0
+                    'cantidad_ventas': cantidad,
+                    'total_ventas': total,
+                    'promedio_venta': total / cantidad if cantidad else 0.0
                 })
             
             # Estadísticas generales del año
@@ -74,12 +89,10 @@ def init_estadisticas(db, Factura, DetalleFactura, Producto):
             
             # Comparación con año anterior
             ano_anterior = ano - 1
-            total_ano_anterior = db.session.query(
-                func.sum(Factura.total)
-            ).filter(
-                extract('year', Factura.fecha) == ano_anterior,
-                Factura.estado != 'cancelada'
-            ).scalar() or 0
+            total_ano_anterior = consultar_ventas(
+                'facturas', ['importe'], date(ano_anterior, 1, 1), date(ano_anterior, 12, 31),
+                excluir=['cancelada']
+            )[0].importe or 0
             total_ano_anterior = float(total_ano_anterior)  # Convertir a float para evitar error con Decimal
             
             crecimiento = 0
@@ -114,6 +127,7 @@ def init_estadisticas(db, Factura, DetalleFactura, Producto):
             }), 500
 
     @estadisticas_bp.route('/api/comparacion_anos')
+    @cache_reporte(hasta=_fin_del_ultimo_ano)
     def comparacion_anos():
         try:
             anos = request.args.getlist('anos', type=int)
@@ -125,20 +139,15 @@ def init_estadisticas(db, Factura, DetalleFactura, Producto):
             datos_comparacion = []
             
             for ano in anos:
-                ventas_ano = db.session.query(
-                    extract('month', Factura.fecha).label('mes'),
-                    func.sum(Factura.total).label('total')
-                ).filter(
-                    extract('year', Factura.fecha) == ano,
-                    Factura.estado != 'cancelada'
-                ).group_by(
-                    extract('month', Factura.fecha)
-                ).all()
+                ventas_ano = consultar_ventas(
+                    'facturas', ['importe'], date(ano, 1, 1), date(ano, 12, 31),
+                    agrupar=['mes'], excluir=['cancelada']
+                )
                 
                 # Crear array con todos los meses
                 ventas_mensuales = [0.0] * 12
                 for venta in ventas_ano:
-                    ventas_mensuales[int(venta.mes) - 1] = float(venta.total) if venta.total else 0.0
+                    ventas_mensuales[int(venta.mes) - 1] = float(venta.importe) if venta.importe else 0.0
                 
                 datos_comparacion.append({
                     'ano': ano,
@@ -159,6 +168,7 @@ def init_estadisticas(db, Factura, DetalleFactura, Producto):
             }), 500
 
     @estadisticas_bp.route('/api/top_productos_mes')
+    @cache_reporte(hasta=_fin_del_mes)
     def top_productos_mes():
         try:
             mes = request.args.get('mes', type=int)
@@ -170,33 +180,25 @@ def init_estadisticas(db, Factura, DetalleFactura, Producto):
                 'Julio', 'Agosto', 'Septiembre', 'Octubre', 'Noviembre', 'Diciembre'
             ]
             
-            # Consulta usando SQLAlchemy en lugar de SQL crudo
-            top_productos = db.session.query(
-                Producto.codigo,
-                Producto.nombre,
-                func.sum(DetalleFactura.cantidad).label('cantidad_vendida'),
-                func.sum(DetalleFactura.cantidad * DetalleFactura.precio_unitario).label('total_vendido')
-            ).join(
-                DetalleFactura, Producto.id == DetalleFactura.producto_id
-            ).join(
-                Factura, DetalleFactura.factura_id == Factura.id
-            ).filter(
-                extract('month', Factura.fecha) == mes,
-                extract('year', Factura.fecha) == ano,
-                Factura.estado == 'autorizada'
-            ).group_by(
-                Producto.id, Producto.codigo, Producto.nombre
-            ).order_by(
-                func.sum(DetalleFactura.cantidad).desc()
-            ).limit(limite).all()
+            # Ventas del mes desde los resúmenes diarios (si están)
+            top_productos = []
+            if ano and mes and 1 <= mes <= 12:
+                top_productos = consultar_ventas(
+                    'productos', ['cantidad', 'importe_bruto'],
+                    date(ano, mes, 1), date(ano, mes, calendar.monthrange(ano, mes)[1]),
+                    agrupar=['producto_id', 'codigo', 'nombre'],
+                    estados=['autorizada'],
+                    orden=['-cantidad'],
+                    limite=limite
+                )
             
             productos = []
             for producto in top_productos:
                 productos.append({
                     'codigo': producto.codigo,
                     'nombre': producto.nombre,
-                    'cantidad_vendida': int(producto.cantidad_vendida) if producto.cantidad_vendida else 0,
-                    'total_vendido': float(producto.total_vendido) if producto.total_vendido else 0.0
+                    'cantidad_vendida': int(producto.cantidad) if producto.cantidad else 0,
+                    'total_vendido': float(producto.importe_bruto) if producto.importe_bruto else 0.0
                 })
             
             return jsonify({
@@ -212,26 +214,21 @@ def init_estadisticas(db, Factura, DetalleFactura, Producto):
             }), 500
 
     @estadisticas_bp.route('/api/ventas_diarias')
+    @cache_reporte()
     def ventas_diarias():
         """Estadísticas de ventas por día (últimos 30 días)"""
         try:
             dias = request.args.get('dias', 30, type=int)
             fecha_inicio = datetime.now() - timedelta(days=dias-1)
             
-            ventas_diarias = db.session.query(
-                func.date(Factura.fecha).label('fecha'),
-                func.count(Factura.id).label('cantidad_ventas'),
-                func.sum(Factura.total).label('total_ventas')
-            ).filter(
-                Factura.fecha >= fecha_inicio,
-                Factura.estado != 'cancelada'
-            ).group_by(
-                func.date(Factura.fecha)
-            ).order_by('fecha').all()
+            ventas_diarias = consultar_ventas(
+                'facturas', ['tickets', 'importe'], fecha_inicio.date(), datetime.now().date(),
+                agrupar=['dia'], excluir=['cancelada']
+            )
             
             # Crear estructura completa de días
             datos_diarios = []
-            ventas_dict = {str(v.fecha): v for v in ventas_diarias}
+            ventas_dict = {str(v.dia): v for v in ventas_diarias}
             
             for i in range(dias):
                 fecha = (fecha_inicio + timedelta(days=i)).date()
@@ -242,8 +239,8 @@ def init_estadisticas(db, Factura, DetalleFactura, Producto):
                     'fecha': fecha_str,
                     'fecha_formateada': fecha.strftime('%d/%m'),
                     'dia_semana': fecha.strftime('%A'),
-                    'cantidad_ventas': int(venta_dia.cantidad_ventas) if venta_dia else 0,
-                    'total_ventas': float(venta_dia.total_ventas) if venta_dia else 0.0
+                    'cantidad_ventas': int(venta_dia.tickets or 0) if venta_dia else 0,
+                    'total_ventas': float(venta_dia.importe or 0) if venta_dia else 0.0
                 })
             
             return jsonify({
@@ -259,63 +256,44 @@ def init_estadisticas(db, Factura, DetalleFactura, Producto):
             }), 500
     
     @estadisticas_bp.route('/api/resumen_dashboard')
+    @cache_reporte()
     def resumen_dashboard():
         """Resumen general para el dashboard"""
         try:
             # Ventas de hoy
             hoy = datetime.now().date()
-            ventas_hoy = db.session.query(
-                func.count(Factura.id).label('cantidad'),
-                func.sum(Factura.total).label('total')
-            ).filter(
-                func.date(Factura.fecha) == hoy,
-                Factura.estado != 'cancelada'
-            ).first()
+            ventas_hoy = consultar_ventas('facturas', ['tickets', 'importe'], hoy, hoy,
+                                          excluir=['cancelada'])[0]
             
             # Ventas del mes actual
-            mes_actual = datetime.now().month
-            ano_actual = datetime.now().year
-            ventas_mes = db.session.query(
-                func.count(Factura.id).label('cantidad'),
-                func.sum(Factura.total).label('total')
-            ).filter(
-                extract('month', Factura.fecha) == mes_actual,
-                extract('year', Factura.fecha) == ano_actual,
-                Factura.estado != 'cancelada'
-            ).first()
+            inicio_mes = hoy.replace(day=1)
+            fin_mes = hoy.replace(day=calendar.monthrange(hoy.year, hoy.month)[1])
+            ventas_mes = consultar_ventas('facturas', ['tickets', 'importe'], inicio_mes, fin_mes,
+                                          excluir=['cancelada'])[0]
             
             # Top 5 productos del mes
-            top_productos = db.session.query(
-                Producto.nombre,
-                func.sum(DetalleFactura.cantidad).label('cantidad_vendida')
-            ).join(
-                DetalleFactura, Producto.id == DetalleFactura.producto_id
-            ).join(
-                Factura, DetalleFactura.factura_id == Factura.id
-            ).filter(
-                extract('month', Factura.fecha) == mes_actual,
-                extract('year', Factura.fecha) == ano_actual,
-                Factura.estado != 'cancelada'
-            ).group_by(
-                Producto.id, Producto.nombre
-            ).order_by(
-                func.sum(DetalleFactura.cantidad).desc()
-            ).limit(5).all()
+            top_productos = consultar_ventas(
+                'productos', ['cantidad'], inicio_mes, fin_mes,
+                agrupar=['producto_id', 'nombre'],
+                excluir=['cancelada'],
+                orden=['-cantidad'],
+                limite=5
+            )
             
             return jsonify({
                 'success': True,
                 'ventas_hoy': {
-                    'cantidad': int(ventas_hoy.cantidad) if ventas_hoy.cantidad else 0,
-                    'total': float(ventas_hoy.total) if ventas_hoy.total else 0.0
+                    'cantidad': int(ventas_hoy.tickets) if ventas_hoy.tickets else 0,
+                    'total': float(ventas_hoy.importe) if ventas_hoy.importe else 0.0
                 },
                 'ventas_mes': {
-                    'cantidad': int(ventas_mes.cantidad) if ventas_mes.cantidad else 0,
-                    'total': float(ventas_mes.total) if ventas_mes.total else 0.0
+                    'cantidad': int(ventas_mes.tickets) if ventas_mes.tickets else 0,
+                    'total': float(ventas_mes.importe) if ventas_mes.importe else 0.0
                 },
                 'top_productos': [
                     {
                         'nombre': p.nombre,
-                        'cantidad': float(p.cantidad_vendida) if p.cantidad_vendida else 0.0
+                        'cantidad': float(p.cantidad) if p.cantidad else 0.0
                     } for p in top_productos
                 ]
             })
@@ -327,6 +305,7 @@ def init_estadisticas(db, Factura, DetalleFactura, Producto):
             }), 500
     
     @estadisticas_bp.route('/api/reporte_medios_pago_completo')
+    @cache_reporte(hasta='hasta')
     def reporte_medios_pago_completo():
         """Reporte completo de medios de pago con estadísticas detalladas"""
         try:
@@ -349,73 +328,34 @@ def init_estadisticas(db, Factura, DetalleFactura, Producto):
                     'error': 'Formato de fecha inválido. Use YYYY-MM-DD'
                 }), 400
             
-            # IMPORTAR MedioPago dinámicamente desde el contexto
-            from flask import current_app
-            MedioPago = current_app.config.get('MEDIO_PAGO_MODEL')
-            
-            # Si no está configurado, intentar importar directamente
-            if not MedioPago:
-                try:
-                    from app import MedioPago
-                except ImportError:
-                    return jsonify({
-                        'success': False,
-                        'error': 'Modelo MedioPago no disponible'
-                    }), 500
+            # Todo desde los resúmenes diarios (si están): tickets, alícuotas y medios de pago
+            desde_dia, hasta_dia = desde_dt.date(), hasta_dt.date()
             
             # 1. ESTADÍSTICAS GENERALES
-            estadisticas_generales = db.session.query(
-                func.count(Factura.id).label('cantidad_tickets'),
-                func.sum(Factura.total).label('total_general'),
-                func.sum(Factura.subtotal).label('total_neto'),
-                func.sum(Factura.iva).label('total_iva'),
-                func.avg(Factura.total).label('ticket_promedio')
-            ).filter(
-                Factura.fecha >= desde_dt,
-                Factura.fecha <= hasta_dt,
-                Factura.estado != 'cancelada'
-            ).first()
+            estadisticas_generales = consultar_ventas(
+                'facturas', ['tickets', 'importe', 'neto', 'iva'], desde_dia, hasta_dia,
+                excluir=['cancelada']
+            )[0]
             
             # 2. IVA DISCRIMINADO POR ALÍCUOTA
-            iva_discriminado = db.session.query(
-                DetalleFactura.porcentaje_iva.label('alicuota'),
-                func.sum(DetalleFactura.importe_iva).label('total_iva')
-            ).join(
-                Factura, DetalleFactura.factura_id == Factura.id
-            ).filter(
-                Factura.fecha >= desde_dt,
-                Factura.fecha <= hasta_dt,
-                Factura.estado != 'cancelada'
-            ).group_by(
-                DetalleFactura.porcentaje_iva
-            ).order_by(
-                DetalleFactura.porcentaje_iva
-            ).all()
+            iva_discriminado = consultar_ventas(
+                'iva', ['iva'], desde_dia, hasta_dia,
+                agrupar=['alicuota'], excluir=['cancelada'], orden=['alicuota']
+            )
             
             # 3. MEDIOS DE PAGO
-            medios_pago = db.session.query(
-                MedioPago.medio_pago,
-                func.count(MedioPago.id).label('cantidad'),
-                func.sum(MedioPago.importe).label('total')
-            ).join(
-                Factura, MedioPago.factura_id == Factura.id
-            ).filter(
-                Factura.fecha >= desde_dt,
-                Factura.fecha <= hasta_dt,
-                Factura.estado != 'cancelada'
-            ).group_by(
-                MedioPago.medio_pago
-            ).order_by(
-                func.sum(MedioPago.importe).desc()
-            ).all()
+            medios_pago = consultar_ventas(
+                'medios_pago', ['operaciones', 'importe'], desde_dia, hasta_dia,
+                agrupar=['medio_pago'], excluir=['cancelada'], orden=['-importe']
+            )
             
             # Formatear IVA discriminado
             iva_detalle = []
             for iva in iva_discriminado:
-                if iva.alicuota and iva.total_iva:
+                if iva.alicuota and iva.iva:
                     iva_detalle.append({
                         'alicuota': float(iva.alicuota),
-                        'total': round(float(iva.total_iva), 2)
+                        'total': round(float(iva.iva), 2)
                     })
             
             # Formatear medios de pago
@@ -423,13 +363,13 @@ def init_estadisticas(db, Factura, DetalleFactura, Producto):
             for medio in medios_pago:
                 medios_pago_lista.append({
                     'medio_pago': medio.medio_pago,
-                    'cantidad': int(medio.cantidad) if medio.cantidad else 0,
-                    'total': round(float(medio.total), 2) if medio.total else 0.0,
+                    'cantidad': int(medio.operaciones) if medio.operaciones else 0,
+                    'total': round(float(medio.importe), 2) if medio.importe else 0.0,
                     'porcentaje': 0
                 })
             
             # Calcular porcentajes
-            total_general = float(estadisticas_generales.total_general or 0)
+            total_general = float(estadisticas_generales.importe or 0)
             if total_general > 0:
                 for medio in medios_pago_lista:
                     medio['porcentaje'] = round((medio['total'] / total_general) * 100, 1)
@@ -444,11 +384,12 @@ def init_estadisticas(db, Factura, DetalleFactura, Producto):
                     'hasta_formateado': hasta_dt.strftime('%d/%m/%Y')
                 },
                 'estadisticas': {
-                    'cantidad_tickets': int(estadisticas_generales.cantidad_tickets or 0),
+                    'cantidad_tickets': int(estadisticas_generales.tickets or 0),
                     'total_general': round(total_general, 2),
-                    'total_neto': round(float(estadisticas_generales.total_neto or 0), 2),
-                    'total_iva': round(float(estadisticas_generales.total_iva or 0), 2),
-                    'ticket_promedio': round(float(estadisticas_generales.ticket_promedio or 0), 2)
+                    'total_neto': round(float(estadisticas_generales.neto or 0), 2),
+                    'total_iva': round(float(estadisticas_generales.iva or 0), 2),
+                    'ticket_promedio': round(total_general / int(estadisticas_generales.tickets), 2)
+                                       if estadisticas_generales.tickets else 0.0
                 },
                 'iva_discriminado': iva_detalle,
                 'medios_pago': medios_pago_lista
@@ -464,6 +405,7 @@ def init_estadisticas(db, Factura, DetalleFactura, Producto):
             }), 500
     
     @estadisticas_bp.route('/api/estadisticas_periodo')
+    @cache_reporte(hasta='hasta')
     def estadisticas_periodo():
         """Estadísticas resumidas para cualquier período"""
         try:
@@ -479,26 +421,20 @@ def init_estadisticas(db, Factura, DetalleFactura, Producto):
             desde_dt = datetime.strptime(fecha_desde, '%Y-%m-%d')
             hasta_dt = datetime.strptime(fecha_hasta, '%Y-%m-%d').replace(hour=23, minute=59, second=59)
             
-            # Consulta rápida
-            stats = db.session.query(
-                func.count(Factura.id).label('tickets'),
-                func.sum(Factura.total).label('total'),
-                func.sum(Factura.subtotal).label('neto'),
-                func.sum(Factura.iva).label('iva'),
-                func.avg(Factura.total).label('promedio')
-            ).filter(
-                Factura.fecha >= desde_dt,
-                Factura.fecha <= hasta_dt,
-                Factura.estado != 'cancelada'
-            ).first()
+            # Consulta rápida (resúmenes diarios si están)
+            stats = consultar_ventas(
+                'facturas', ['tickets', 'importe', 'neto', 'iva'], desde_dt.date(), hasta_dt.date(),
+                excluir=['cancelada']
+            )[0]
+            promedio = float(stats.importe or 0) / int(stats.tickets) if stats.tickets else 0
             
             return jsonify({
                 'success': True,
                 'tickets': int(stats.tickets or 0),
-                'total': round(float(stats.total or 0), 2),
+                'total': round(float(stats.importe or 0), 2),
                 'neto': round(float(stats.neto or 0), 2),
                 'iva': round(float(stats.iva or 0), 2),
-                'promedio': round(float(stats.promedio or 0), 2)
+                'promedio': round(promedio, 2)
             })
             
         except Exception as e:
@@ -507,440 +443,404 @@ def init_estadisticas(db, Factura, DetalleFactura, Producto):
                 'error': str(e)
             }), 500
 
-    @estadisticas_bp.route('/estadisticas/imprimir_estadisticas')
-    @login_required
-    def imprimir_estadisticas():
-        """Genera vista para imprimir/exportar a PDF las estadísticas"""
-        try:
-            fecha_desde = request.args.get('desde')
-            fecha_hasta = request.args.get('hasta')
-            
-            if not fecha_desde or not fecha_hasta:
-                return "<h3>Error: Debe especificar rango de fechas</h3>", 400
-            
-            # Convertir fechas
-            desde_dt = datetime.strptime(fecha_desde, '%Y-%m-%d')
-            hasta_dt = datetime.strptime(fecha_hasta, '%Y-%m-%d').replace(hour=23, minute=59, second=59)
-            
-            # Importar MedioPago
-            from flask import current_app
-            MedioPago = current_app.config.get('MEDIO_PAGO_MODEL')
-            if not MedioPago:
-                from app import MedioPago
-            
-            # 1. ESTADÍSTICAS GENERALES
-            estadisticas_generales = db.session.query(
-                func.count(Factura.id).label('cantidad_tickets'),
-                func.sum(Factura.total).label('total_general'),
-                func.sum(Factura.subtotal).label('total_neto'),
-                func.sum(Factura.iva).label('total_iva'),
-                func.avg(Factura.total).label('ticket_promedio')
-            ).filter(
-                Factura.fecha >= desde_dt,
-                Factura.fecha <= hasta_dt,
-                Factura.estado != 'cancelada'
-            ).first()
-            
-            # 2. MEDIOS DE PAGO
-            medios_pago = db.session.query(
-                MedioPago.medio_pago,
-                func.count(MedioPago.id).label('cantidad'),
-                func.sum(MedioPago.importe).label('total')
-            ).join(
-                Factura, MedioPago.factura_id == Factura.id
-            ).filter(
-                Factura.fecha >= desde_dt,
-                Factura.fecha <= hasta_dt,
-                Factura.estado != 'cancelada'
-            ).group_by(
-                MedioPago.medio_pago
-            ).order_by(
-                func.sum(MedioPago.importe).desc()
-            ).all()
-            
-            # 3. IVA DISCRIMINADO
-            iva_discriminado = db.session.query(
-                DetalleFactura.porcentaje_iva.label('alicuota'),
-                func.sum(DetalleFactura.importe_iva).label('total_iva')
-            ).join(
-                Factura, DetalleFactura.factura_id == Factura.id
-            ).filter(
-                Factura.fecha >= desde_dt,
-                Factura.fecha <= hasta_dt,
-                Factura.estado != 'cancelada'
-            ).group_by(
-                DetalleFactura.porcentaje_iva
-            ).order_by(
-                DetalleFactura.porcentaje_iva
-            ).all()
-            
-            # 4. TOP 10 PRODUCTOS
-            top_productos = db.session.query(
-                Producto.codigo,
-                Producto.nombre,
-                func.sum(DetalleFactura.cantidad).label('cantidad_vendida'),
-                func.sum(DetalleFactura.subtotal).label('total_vendido')
-            ).join(
-                DetalleFactura, Producto.id == DetalleFactura.producto_id
-            ).join(
-                Factura, DetalleFactura.factura_id == Factura.id
-            ).filter(
-                Factura.fecha >= desde_dt,
-                Factura.fecha <= hasta_dt,
-                Factura.estado != 'cancelada'
-            ).group_by(
-                Producto.id, Producto.codigo, Producto.nombre
-            ).order_by(
-                func.sum(DetalleFactura.cantidad).desc()
-            ).limit(10).all()
-            
-            # Formatear datos
-            total_general = float(estadisticas_generales.total_general or 0)
-            
-            medios_pago_lista = []
-            for medio in medios_pago:
-                medio_total = float(medio.total) if medio.total else 0.0
-                medios_pago_lista.append({
-                    'medio': medio.medio_pago,
-                    'cantidad': int(medio.cantidad) if medio.cantidad else 0,
-                    'total': medio_total,
-                    'porcentaje': round((medio_total / total_general * 100), 1) if total_general > 0 else 0
-                })
-            
-            iva_lista = []
-            for iva in iva_discriminado:
-                if iva.alicuota and iva.total_iva:
-                    iva_lista.append({
-                        'alicuota': float(iva.alicuota),
-                        'total': float(iva.total_iva)
-                    })
-            
-            productos_lista = []
-            for prod in top_productos:
-                productos_lista.append({
-                    'codigo': prod.codigo,
-                    'nombre': prod.nombre,
-                    'cantidad': float(prod.cantidad_vendida) if prod.cantidad_vendida else 0.0,
-                    'total': float(prod.total_vendido) if prod.total_vendido else 0.0
+    def html_estadisticas(fecha_desde, fecha_hasta):
+        """HTML imprimible de las estadísticas del período (fechas YYYY-MM-DD)"""
+        # Convertir fechas
+        desde_dt = datetime.strptime(fecha_desde, '%Y-%m-%d')
+        hasta_dt = datetime.strptime(fecha_hasta, '%Y-%m-%d').replace(hour=23, minute=59, second=59)
+        
+        # Mismas consultas que la pantalla (resúmenes diarios si están)
+        desde_dia, hasta_dia = desde_dt.date(), hasta_dt.date()
+        
+        # 1. ESTADÍSTICAS GENERALES
+        estadisticas_generales = consultar_ventas(
+            'facturas', ['tickets', 'importe', 'neto', 'iva'], desde_dia, hasta_dia,
+            excluir=['cancelada']
+        )[0]
+        
+        # 2. MEDIOS DE PAGO
+        medios_pago = consultar_ventas(
+            'medios_pago', ['operaciones', 'importe'], desde_dia, hasta_dia,
+            agrupar=['medio_pago'], excluir=['cancelada'], orden=['-importe']
+        )
+        
+        # 3. IVA DISCRIMINADO
+        iva_discriminado = consultar_ventas(
+            'iva', ['iva'], desde_dia, hasta_dia,
+            agrupar=['alicuota'], excluir=['cancelada'], orden=['alicuota']
+        )
+        
+        # 4. TOP 10 PRODUCTOS
+        top_productos = consultar_ventas(
+            'productos', ['cantidad', 'neto'], desde_dia, hasta_dia,
+            agrupar=['producto_id', 'codigo', 'nombre'],
+            excluir=['cancelada'],
+            orden=['-cantidad'],
+            limite=10
+        )
+        
+        # Formatear datos
+        total_general = float(estadisticas_generales.importe or 0)
+        cantidad_tickets = int(estadisticas_generales.tickets or 0)
+        ticket_promedio = total_general / cantidad_tickets if cantidad_tickets else 0.0
+        
+        medios_pago_lista = []
+        for medio in medios_pago:
+            medio_total = float(medio.importe) if medio.importe else 0.0
+            medios_pago_lista.append({
+                'medio': medio.medio_pago,
+                'cantidad': int(medio.operaciones) if medio.operaciones else 0,
+                'total': medio_total,
+                'porcentaje': round((medio_total / total_general * 100), 1) if total_general > 0 else 0
+            })
+        
+        iva_lista = []
+        for iva in iva_discriminado:
+            if iva.alicuota and iva.iva:
+                iva_lista.append({
+                    'alicuota': float(iva.alicuota),
+                    'total': float(iva.iva)
                 })
-            
-            # Generar HTML
-            html = f"""
-            <!DOCTYPE html>
-            <html lang="es">
-            <head>
-                <meta charset="UTF-8">
-                <title>Reporte de Estadísticas - {fecha_desde} al {fecha_hasta}</title>
-                <style>
-                    @media print {{
-                        @page {{ margin: 1cm; }}
-                        body {{ margin: 0; }}
+        
+        productos_lista = []
+        for prod in top_productos:
+            productos_lista.append({
+                'codigo': prod.codigo,
+                'nombre': prod.nombre,
+                'cantidad': float(prod.cantidad) if prod.cantidad else 0.0,
+                'total': float(prod.neto) if prod.neto else 0.0
+            })
+        
+        # Generar HTML
+        html = f"""
+        <!DOCTYPE html>
+        <html lang="es">
+        <head>
+            <meta charset="UTF-8">
+            <title>Reporte de Estadísticas - {fecha_desde} al {fecha_hasta}</title>
+            <style>
+                @media print {{
+                    @page {{ margin: 1cm; }}
+                    body {{ margin: 0; }}
+                }}
+                
+                body {{
+                    font-family: 'Arial', sans-serif;
+                    margin: 20px;
+                    color: #333;
+                    background: #f5f5f5;
+                }}
+                
+                .container {{
+                    max-width: 1200px;
+                    margin: 0 auto;
+                    background: white;
+                    padding: 30px;
+                    box-shadow: 0 0 10px rgba(0,0,0,0.1);
+                }}
+                
+                h1 {{
+                    color: #2c3e50;
+                    border-bottom: 3px solid #3498db;
+                    padding-bottom: 10px;
+                    margin-bottom: 20px;
+                }}
+                
+                .header {{
+                    margin-bottom: 30px;
+                }}
+                
+                .header-row {{
+                    display: flex;
+                    justify-content: space-between;
+                    margin-bottom: 15px;
+                    padding: 15px;
+                    background: #ecf0f1;
+                    border-radius: 5px;
+                }}
+                
+                .header-item {{
+                    text-align: center;
+                    flex: 1;
+                }}
+                
+                .header-label {{
+                    font-size: 12px;
+                    color: #7f8c8d;
+                    text-transform: uppercase;
+                }}
+                
+                .header-value {{
+                    font-size: 24px;
+                    font-weight: bold;
+                    color: #2c3e50;
+                    margin-top: 5px;
+                }}
+                
+                .section {{
+                    margin-bottom: 30px;
+                    page-break-inside: avoid;
+                }}
+                
+                h2 {{
+                    color: #34495e;
+                    background: #3498db;
+                    color: white;
+                    padding: 10px 15px;
+                    border-radius: 5px;
+                    margin-bottom: 15px;
+                }}
+                
+                table {{
+                    width: 100%;
+                    border-collapse: collapse;
+                    margin-bottom: 20px;
+                    box-shadow: 0 2px 4px rgba(0,0,0,0.1);
+                }}
+                
+                th {{
+                    background: #34495e;
+                    color: white;
+                    padding: 12px;
+                    text-align: left;
+                    font-weight: bold;
+                }}
+                
+                td {{
+                    padding: 10px 12px;
+                    border-bottom: 1px solid #ecf0f1;
+                }}
+                
+                tr:hover {{
+                    background: #f8f9fa;
+                }}
+                
+                .text-right {{
+                    text-align: right;
+                }}
+                
+                .text-center {{
+                    text-align: center;
+                }}
+                
+                .total-row {{
+                    font-weight: bold;
+                    background: #f1c40f !important;
+                    color: #2c3e50;
+                }}
+                
+                .footer {{
+                    margin-top: 40px;
+                    padding-top: 20px;
+                    border-top: 2px solid #bdc3c7;
+                    text-align: center;
+                    color: #7f8c8d;
+                    font-size: 12px;
+                }}
+                
+                .print-button {{
+                    position: fixed;
+                    top: 20px;
+                    right: 20px;
+                    background: #27ae60;
+                    color: white;
+                    padding: 15px 30px;
+                    border: none;
+                    border-radius: 5px;
+                    cursor: pointer;
+                    font-size: 16px;
+                    box-shadow: 0 4px 6px rgba(0,0,0,0.2);
+                    z-index: 1000;
+                }}
+                
+                .print-button:hover {{
+                    background: #229954;
+                }}
+                
+                @media print {{
+                    .print-button {{
+                        display: none;
                     }}
-                    
                     body {{
-                        font-family: 'Arial', sans-serif;
-                        margin: 20px;
-                        color: #333;
-                        background: #f5f5f5;
-                    }}
-                    
-                    .container {{
-                        max-width: 1200px;
-                        margin: 0 auto;
                         background: white;
-                        padding: 30px;
-                        box-shadow: 0 0 10px rgba(0,0,0,0.1);
-                    }}
-                    
-                    h1 {{
-                        color: #2c3e50;
-                        border-bottom: 3px solid #3498db;
-                        padding-bottom: 10px;
-                        margin-bottom: 20px;
-                    }}
-                    
-                    .header {{
-                        margin-bottom: 30px;
                     }}
-                    
-                    .header-row {{
-                        display: flex;
-                        justify-content: space-between;
-                        margin-bottom: 15px;
-                        padding: 15px;
-                        background: #ecf0f1;
-                        border-radius: 5px;
-                    }}
-                    
-                    .header-item {{
-                        text-align: center;
-                        flex: 1;
-                    }}
-                    
-                    .header-label {{
-                        font-size: 12px;
-                        color: #7f8c8d;
-                        text-transform: uppercase;
-                    }}
-                    
-                    .header-value {{
-                        font-size: 24px;
-                        font-weight: bold;
-                        color: #2c3e50;
-                        margin-top: 5px;
-                    }}
-                    
-                    .section {{
-                        margin-bottom: 30px;
-                        page-break-inside: avoid;
-                    }}
-                    
-                    h2 {{
-                        color: #34495e;
-                        background: #3498db;
-                        color: white;
-                        padding: 10px 15px;
-                        border-radius: 5px;
-                        margin-bottom: 15px;
-                    }}
-                    
-                    table {{
-                        width: 100%;
-                        border-collapse: collapse;
-                        margin-bottom: 20px;
-                        box-shadow: 0 2px 4px rgba(0,0,0,0.1);
-                    }}
-                    
-                    th {{
-                        background: #34495e;
-                        color: white;
-                        padding: 12px;
-                        text-align: left;
-                        font-weight: bold;
-                    }}
-                    
-                    td {{
-                        padding: 10px 12px;
-                        border-bottom: 1px solid #ecf0f1;
-                    }}
-                    
-                    tr:hover {{
-                        background: #f8f9fa;
-                    }}
-                    
-                    .text-right {{
-                        text-align: right;
-                    }}
-                    
-                    .text-center {{
-                        text-align: center;
-                    }}
-                    
-                    .total-row {{
-                        font-weight: bold;
-                        background: #f1c40f !important;
-                        color: #2c3e50;
-                    }}
-                    
-                    .footer {{
-                        margin-top: 40px;
-                        padding-top: 20px;
-                        border-top: 2px solid #bdc3c7;
-                        text-align: center;
-                        color: #7f8c8d;
-                        font-size: 12px;
-                    }}
-                    
-                    .print-button {{
-                        position: fixed;
-                        top: 20px;
-                        right: 20px;
-                        background: #27ae60;
-                        color: white;
-                        padding: 15px 30px;
-                        border: none;
-                        border-radius: 5px;
-                        cursor: pointer;
-                        font-size: 16px;
-                        box-shadow: 0 4px 6px rgba(0,0,0,0.2);
-                        z-index: 1000;
-                    }}
-                    
-                    .print-button:hover {{
-                        background: #229954;
-                    }}
-                    
-                    @media print {{
-                        .print-button {{
-                            display: none;
-                        }}
-                        body {{
-                            background: white;
-                        }}
-                        .container {{
-                            box-shadow: none;
-                        }}
-                    }}
-                    
-                    .badge {{
-                        display: inline-block;
-                        padding: 4px 8px;
-                        border-radius: 3px;
-                        font-size: 12px;
-                        font-weight: bold;
+                    .container {{
+                        box-shadow: none;
                     }}
-                    
-                    .badge-efectivo {{ background: #2ecc71; color: white; }}
-                    .badge-credito {{ background: #3498db; color: white; }}
-                    .badge-debito {{ background: #9b59b6; color: white; }}
-                    .badge-mercado_pago {{ background: #f1c40f; color: #2c3e50; }}
-                </style>
-            </head>
-            <body>
-                <button class="print-button" onclick="window.print()">🖨️ Imprimir / Guardar PDF</button>
+                }}
                 
-                <div class="container">
-                    <h1>📊 Reporte de Estadísticas de Ventas</h1>
-                    
-                    <div class="header">
-                        <!-- Primera fila: Período y Total Ventas -->
-                        <div class="header-row">
-                            <div class="header-item">
-                                <div class="header-label">Período</div>
-                                <div class="header-value">{desde_dt.strftime('%d/%m/%Y')} - {hasta_dt.strftime('%d/%m/%Y')}</div>
-                            </div>
-                            <div class="header-item">
-                                <div class="header-label">Total Ventas</div>
-                                <div class="header-value">${total_general:,.2f}</div>
-                            </div>
+                .badge {{
+                    display: inline-block;
+                    padding: 4px 8px;
+                    border-radius: 3px;
+                    font-size: 12px;
+                    font-weight: bold;
+                }}
+                
+                .badge-efectivo {{ background: #2ecc71; color: white; }}
+                .badge-credito {{ background: #3498db; color: white; }}
+                .badge-debito {{ background: #9b59b6; color: white; }}
+                .badge-mercado_pago {{ background: #f1c40f; color: #2c3e50; }}
+            </style>
+        </head>
+        <body>
+            <button class="print-button" onclick="window.print()">🖨️ Imprimir / Guardar PDF</button>
+            
+            <div class="container">
+                <h1>📊 Reporte de Estadísticas de Ventas</h1>
+                
+                <div class="header">
+                    <!-- Primera fila: Período y Total Ventas -->
+                    <div class="header-row">
+                        <div class="header-item">
+                            <div class="header-label">Período</div>
+                            <div class="header-value">{desde_dt.strftime('%d/%m/%Y')} - {hasta_dt.strftime('%d/%m/%Y')}</div>
                         </div>
-                        
-                        <!-- Segunda fila: Total Tickets y Ticket Promedio -->
-                        <div class="header-row">
-                            <div class="header-item">
-                                <div class="header-label">Total Tickets</div>
-                                <div class="header-value">{int(estadisticas_generales.cantidad_tickets or 0)}</div>
-                            </div>
-                            <div class="header-item">
-                                <div class="header-label">Ticket Promedio</div>
-                                <div class="header-value">${float(estadisticas_generales.ticket_promedio or 0):,.2f}</div>
-                            </div>
+                        <div class="header-item">
+                            <div class="header-label">Total Ventas</div>
+                            <div class="header-value">${total_general:,.2f}</div>
                         </div>
                     </div>
                     
-                    <!-- MEDIOS DE PAGO -->
-                    <div class="section">
-                        <h2>💳 Medios de Pago</h2>
-                        <table>
-                            <thead>
-                                <tr>
-                                    <th>Medio de Pago</th>
-                                    <th class="text-center">Cantidad</th>
-                                    <th class="text-right">Total</th>
-                                    <th class="text-right">Porcentaje</th>
-                                </tr>
-                            </thead>
-                            <tbody>
-            """
-            
-            for medio in medios_pago_lista:
-                badge_class = f"badge badge-{medio['medio']}"
-                html += f"""
-                                <tr>
-                                    <td><span class="{badge_class}">{medio['medio'].upper()}</span></td>
-                                    <td class="text-center">{medio['cantidad']}</td>
-                                    <td class="text-right">${medio['total']:,.2f}</td>
-                                    <td class="text-right">{medio['porcentaje']}%</td>
-                                </tr>
-                """
-            
-            html += f"""
-                                <tr class="total-row">
-                                    <td><strong>TOTAL</strong></td>
-                                    <td class="text-center"><strong>{sum(m['cantidad'] for m in medios_pago_lista)}</strong></td>
-                                    <td class="text-right"><strong>${total_general:,.2f}</strong></td>
-                                    <td class="text-right"><strong>100%</strong></td>
-                                </tr>
-                            </tbody>
-                        </table>
+                    <!-- Segunda fila: Total Tickets y Ticket Promedio -->
+                    <div class="header-row">
+                        <div class="header-item">
+                            <div class="header-label">Total Tickets</div>
+                            <div class="header-value">{cantidad_tickets}</div>
+                        </div>
+                        <div class="header-item">
+                            <div class="header-label">Ticket Promedio</div>
+                            <div class="header-value">${ticket_promedio:,.2f}</div>
+                        </div>
                     </div>
-                    
-                    <!-- IVA DISCRIMINADO -->
-                    <div class="section">
-                        <h2>📋 IVA Discriminado</h2>
-                        <table>
-                            <thead>
-                                <tr>
-                                    <th>Alícuota</th>
-                                    <th class="text-right">Total IVA</th>
-                                </tr>
-                            </thead>
-                            <tbody>
-            """
-            
-            total_iva = 0
-            for iva in iva_lista:
-                total_iva += iva['total']
-                html += f"""
-                                <tr>
-                                    <td>IVA {iva['alicuota']}%</td>
-                                    <td class="text-right">${iva['total']:,.2f}</td>
-                                </tr>
-                """
-            
+                </div>
+                
+                <!-- MEDIOS DE PAGO -->
+                <div class="section">
+                    <h2>💳 Medios de Pago</h2>
+                    <table>
+                        <thead>
+                            <tr>
+                                <th>Medio de Pago</th>
+                                <th class="text-center">Cantidad</th>
+                                <th class="text-right">Total</th>
+                                <th class="text-right">Porcentaje</th>
+                            </tr>
+                        </thead>
+                        <tbody>
+        """
+        
+        for medio in medios_pago_lista:
+            badge_class = f"badge badge-{medio['medio']}"
             html += f"""
-                                <tr class="total-row">
-                                    <td><strong>TOTAL IVA</strong></td>
-                                    <td class="text-right"><strong>${total_iva:,.2f}</strong></td>
-                                </tr>
-                                <tr>
-                                    <td><strong>NETO (sin IVA)</strong></td>
-                                    <td class="text-right"><strong>${float(estadisticas_generales.total_neto or 0):,.2f}</strong></td>
-                                </tr>
-                            </tbody>
-                        </table>
-                    </div>
-                    
-                    <!-- TOP 10 PRODUCTOS -->
-                    <div class="section">
-                        <h2>🏆 Top 10 Productos Más Vendidos</h2>
-                        <table>
-                            <thead>
-                                <tr>
-                                    <th>Código</th>
-                                    <th>Producto</th>
-                                    <th class="text-right">Cantidad</th>
-                                    <th class="text-right">Total Vendido</th>
-                                </tr>
-                            </thead>
-                            <tbody>
+                            <tr>
+                                <td><span class="{badge_class}">{medio['medio'].upper()}</span></td>
+                                <td class="text-center">{medio['cantidad']}</td>
+                                <td class="text-right">${medio['total']:,.2f}</td>
+                                <td class="text-right">{medio['porcentaje']}%</td>
+                            </tr>
             """
-            
-            for i, prod in enumerate(productos_lista, 1):
-                html += f"""
-                                <tr>
-                                    <td><strong>#{i}</strong> {prod['codigo']}</td>
-                                    <td>{prod['nombre']}</td>
-                                    <td class="text-right">{prod['cantidad']:,.0f}</td>
-                                    <td class="text-right">${prod['total']:,.2f}</td>
-                                </tr>
-                """
-            
+        
+        html += f"""
+                            <tr class="total-row">
+                                <td><strong>TOTAL</strong></td>
+                                <td class="text-center"><strong>{sum(m['cantidad'] for m in medios_pago_lista)}</strong></td>
+                                <td class="text-right"><strong>${total_general:,.2f}</strong></td>
+                                <td class="text-right"><strong>100%</strong></td>
+                            </tr>
+                        </tbody>
+                    </table>
+                </div>
+                
+                <!-- IVA DISCRIMINADO -->
+                <div class="section">
+                    <h2>📋 IVA Discriminado</h2>
+                    <table>
+                        <thead>
+                            <tr>
+                                <th>Alícuota</th>
+                                <th class="text-right">Total IVA</th>
+                            </tr>
+                        </thead>
+                        <tbody>
+        """
+        
+        total_iva = 0
+        for iva in iva_lista:
+            total_iva += iva['total']
             html += f"""
-                            </tbody>
-                        </table>
-                    </div>
-                    
-                    <div class="footer">
-                        <p><strong>Reporte generado el:</strong> {datetime.now().strftime('%d/%m/%Y %H:%M:%S')}</p>
-                        <p>Sistema de Punto de Venta - FactuFacil</p>
-                    </div>
+                            <tr>
+                                <td>IVA {iva['alicuota']}%</td>
+                                <td class="text-right">${iva['total']:,.2f}</td>
+                            </tr>
+            """
+        
+        html += f"""
+                            <tr class="total-row">
+                                <td><strong>TOTAL IVA</strong></td>
+                                <td class="text-right"><strong>${total_iva:,.2f}</strong></td>
+                            </tr>
+                            <tr>
+                                <td><strong>NETO (sin IVA)</strong></td>
+                                <td class="text-right"><strong>${float(estadisticas_generales.neto or 0):,.2f}</strong></td>
+                            </tr>
+                        </tbody>
+                    </table>
                 </div>
-            </body>
-            </html>
+                
+                <!-- TOP 10 PRODUCTOS -->
+                <div class="section">
+                    <h2>🏆 Top 10 Productos Más Vendidos</h2>
+                    <table>
+                        <thead>
+                            <tr>
+                                <th>Código</th>
+                                <th>Producto</th>
+                                <th class="text-right">Cantidad</th>
+                                <th class="text-right">Total Vendido</th>
+                            </tr>
+                        </thead>
+                        <tbody>
+        """
+        
+        for i, prod in enumerate(productos_lista, 1):
+            html += f"""
+                            <tr>
+                                <td><strong>#{i}</strong> {prod['codigo']}</td>
+                                <td>{prod['nombre']}</td>
+                                <td class="text-right">{prod['cantidad']:,.0f}</td>
+                                <td class="text-right">${prod['total']:,.2f}</td>
+                            </tr>
             """
+        
+        html += f"""
+                        </tbody>
+                    </table>
+                </div>
+                
+                <div class="footer">
+                    <p><strong>Reporte generado el:</strong> {datetime.now().strftime('%d/%m/%Y %H:%M:%S')}</p>
+                    <p>Sistema de Punto de Venta - FactuFacil</p>
+                </div>
+            </div>
+        </body>
+        </html>
+        """
+        
+        return html
+    
+    @estadisticas_bp.route('/estadisticas/imprimir_estadisticas')
+    @login_required
+    def imprimir_estadisticas():
+        """Genera vista para imprimir/exportar a PDF las estadísticas"""
+        try:
+            fecha_desde = request.args.get('desde')
+            fecha_hasta = request.args.get('hasta')
             
-            return html
+            if not fecha_desde or not fecha_hasta:
+                return "<h3>Error: Debe especificar rango de fechas</h3>", 400
+            
+            return html_estadisticas(fecha_desde, fecha_hasta)
             
         except Exception as e:
             import traceback
@@ -951,4 +851,16 @@ def init_estadisticas(db, Factura, DetalleFactura, Producto):
             <pre>{error_detail}</pre>
             """, 500
 
+    def exportar_estadisticas_archivo(parametros, archivo, progreso):
+        """Exportación en segundo plano de la vista para imprimir (ver exportaciones.py)"""
+        fecha_desde = parametros.get('desde')
+        fecha_hasta = parametros.get('hasta')
+        if not fecha_desde or not fecha_hasta:
+            raise ValueError('Debe especificar rango de fechas')
+        progreso(10, 'Calculando estadísticas...')
+        archivo.write(html_estadisticas(fecha_desde, fecha_hasta).encode('utf-8'))
+        return f'estadisticas_{fecha_desde}_{fecha_hasta}.html', 'text/html'
+
+    registrar_exportacion('estadisticas', exportar_estadisticas_archivo)
+
     return estadisticas_bp
\ No newline at end of file
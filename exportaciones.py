@@ -0,0 +1,300 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+exportaciones.py - EXPORTACIONES PESADAS EN SEGUNDO PLANO (COLA DE TRABAJOS)
+═══════════════════════════════════════════════════════════════════════════════
+Un CSV/Excel/PDF de un año entero no se arma dentro de la request: se pide
+el trabajo, se consulta el avance y se descarga cuando está listo.
+
+    POST /api/exportaciones                    {tipo, parametros} → job_id (202)
+    GET  /api/exportaciones/<id>               estado, porcentaje, mensaje
+    GET  /api/exportaciones/<id>/descargar     el archivo (cuando está 'listo')
+
+    en_cola → procesando → listo | error
+
+Cada módulo registra sus exportadores con registrar_exportacion():
+
+    def exportar_algo(parametros, archivo, progreso):
+        ... escribe en 'archivo' (binario), llama progreso(0-100) ...
+        return 'nombre_descarga.xlsx', 'application/vnd...'
+
+    registrar_exportacion('algo', exportar_algo)
+
+    reporte_ventas      app.py           (parametros del reporte + formato)
+    cta_cte_pdf         app.py
+    cta_cte_excel       cta_cte.py
+    estadisticas        estadisticas.py  (HTML para imprimir/guardar como PDF)
+
+COLA
+    Como mucho EXPORTACIONES_HILOS trabajos a la vez (el resto espera en
+    cola). Los archivos van a EXPORTACIONES_DIRECTORIO y se borran
+    EXPORTACIONES_MINUTOS después de terminar.
+
+    Un pedido igual (mismo tipo y parámetros) a uno en curso, o a uno listo
+    hace menos de EXPORTACIONES_REUSO_MINUTOS, devuelve ese trabajo en lugar
+    de generar el archivo otra vez.
+
+Los trabajos viven en memoria del proceso (igual que la impresión de
+carteles por lotes): si el servidor se reinicia hay que pedirlos de nuevo.
+═══════════════════════════════════════════════════════════════════════════════
+"""
+
+from flask import Blueprint, jsonify, request, session, send_file
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+import tempfile
+import threading
+import itertools
+import json
+import time
+import os
+
+# Blueprint para las rutas de exportaciones
+exportaciones_bp = Blueprint('exportaciones', __name__)
+
+# Variables globales (se inicializan en init_exportaciones)
+_app = None
+_ejecutor = None
+
+HILOS = 2
+DIRECTORIO = None
+MINUTOS_EXPIRACION = 30
+MINUTOS_REUSO = 5
+
+# tipo → función(parametros, archivo, progreso) → (nombre_descarga, mimetype)
+EXPORTADORES = {}
+
+_trabajos = {}
+_lock = threading.Lock()
+_contador = itertools.count(1)
+
+
+def init_exportaciones(app):
+    """
+    Inicializa la cola de exportaciones
+
+    Uso en app.py:
+        from exportaciones import init_exportaciones, registrar_exportacion
+        init_exportaciones(app)
+
+    Config:
+        EXPORTACIONES_HILOS            trabajos simultáneos (2)
+        EXPORTACIONES_DIRECTORIO       dónde se guardan los archivos
+        EXPORTACIONES_MINUTOS          vida de un archivo terminado (30)
+        EXPORTACIONES_REUSO_MINUTOS    reusar un trabajo igual así de reciente (5)
+    """
+    global _app, _ejecutor, HILOS, DIRECTORIO, MINUTOS_EXPIRACION, MINUTOS_REUSO
+    _app = app
+    HILOS = app.config.get('EXPORTACIONES_HILOS', HILOS)
+    MINUTOS_EXPIRACION = app.config.get('EXPORTACIONES_MINUTOS', MINUTOS_EXPIRACION)
+    MINUTOS_REUSO = app.config.get('EXPORTACIONES_REUSO_MINUTOS', MINUTOS_REUSO)
+    DIRECTORIO = app.config.get('EXPORTACIONES_DIRECTORIO',
+                                os.path.join(tempfile.gettempdir(), 'factufacil_exportaciones'))
+    os.makedirs(DIRECTORIO, exist_ok=True)
+    _borrar_archivos_viejos()
+
+    _ejecutor = ThreadPoolExecutor(max_workers=HILOS, thread_name_prefix='exportacion')
+    app.register_blueprint(exportaciones_bp)
+    print(f"✅ Exportaciones en segundo plano inicializadas ({HILOS} a la vez)")
+
+
+def registrar_exportacion(tipo, funcion):
+    """Agrega un tipo de exportación (ver docstring del módulo)"""
+    EXPORTADORES[tipo] = funcion
+
+
+# ═══════════════════════════════════════════════════════════════════════════════
+# TRABAJOS
+# ═══════════════════════════════════════════════════════════════════════════════
+
+def _clave(tipo, parametros):
+    return (tipo, json.dumps(parametros, sort_keys=True, default=str))
+
+
+def _borrar_archivo(ruta):
+    if not ruta:
+        return
+    try:
+        os.remove(ruta)
+    except OSError:
+        pass
+
+
+def _borrar_archivos_viejos():
+    """Archivos que quedaron de una ejecución anterior del servidor"""
+    limite = time.time() - MINUTOS_EXPIRACION * 60
+    for nombre in os.listdir(DIRECTORIO):
+        ruta = os.path.join(DIRECTORIO, nombre)
+        try:
+            if os.path.isfile(ruta) and os.path.getmtime(ruta) < limite:
+                os.remove(ruta)
+        except OSError:
+            pass
+
+
+def _purgar_vencidos():
+    """Saca de la lista (y del disco) los trabajos terminados hace más de MINUTOS_EXPIRACION"""
+    limite = time.monotonic() - MINUTOS_EXPIRACION * 60
+    with _lock:
+        vencidos = [trabajo for trabajo in _trabajos.values()
+                    if trabajo['terminado'] is not None and trabajo['terminado'] < limite]
+        for trabajo in vencidos:
+            del _trabajos[trabajo['id']]
+    for trabajo in vencidos:
+        _borrar_archivo(trabajo['ruta'])
+
+
+def pedir_exportacion(tipo, parametros, usuario_id=None):
+    """
+    Encola una exportación (o devuelve una igual en curso o reciente).
+
+    Returns:
+        (trabajo_id, True si se reusó un trabajo existente)
+    """
+    if tipo not in EXPORTADORES:
+        raise ValueError(f'Tipo de exportación desconocido: {tipo}')
+    _purgar_vencidos()
+    clave = _clave(tipo, parametros)
+
+    with _lock:
+        limite_reuso = time.monotonic() - MINUTOS_REUSO * 60
+        for trabajo in _trabajos.values():
+            if trabajo['clave'] != clave or trabajo['estado'] == 'error':
+                continue
+            if trabajo['estado'] != 'listo' or trabajo['terminado'] >= limite_reuso:
+                return trabajo['id'], True
+
+        trabajo_id = next(_contador)
+        _trabajos[trabajo_id] = {
+            'id': trabajo_id,
+            'tipo': tipo,
+            'clave': clave,
+            'parametros': parametros,
+            'usuario_id': usuario_id,
+            'estado': 'en_cola',
+            'porcentaje': 0,
+            'mensaje': None,
+            'ruta': None,
+            'nombre': None,
+            'mimetype': None,
+            'creado': datetime.now(),
+            'terminado': None,
+        }
+
+    _ejecutor.submit(_ejecutar, trabajo_id)
+    return trabajo_id, False
+
+
+def _actualizar(trabajo_id, **campos):
+    with _lock:
+        trabajo = _trabajos.get(trabajo_id)
+        if trabajo is not None:
+            trabajo.update(campos)
+
+
+def _ejecutar(trabajo_id):
+    with _lock:
+        trabajo = _trabajos.get(trabajo_id)
+    if trabajo is None:
+        return
+
+    tipo = trabajo['tipo']
+    _actualizar(trabajo_id, estado='procesando')
+    inicio = time.perf_counter()
+    descriptor, ruta = tempfile.mkstemp(prefix=f'{tipo}_{trabajo_id}_', dir=DIRECTORIO)
+
+    def progreso(porcentaje, mensaje=None):
+        _actualizar(trabajo_id, porcentaje=max(0, min(99, int(porcentaje))),
+                    **({'mensaje': mensaje} if mensaje else {}))
+
+    with _app.app_context():
+        try:
+            with os.fdopen(descriptor, 'wb') as archivo:
+                nombre, mimetype = EXPORTADORES[tipo](dict(trabajo['parametros']), archivo, progreso)
+            _actualizar(trabajo_id, estado='listo', porcentaje=100, ruta=ruta, nombre=nombre,
+                        mimetype=mimetype, mensaje=None, terminado=time.monotonic())
+            print(f"📤 Exportación {trabajo_id} ({tipo}) lista en {time.perf_counter() - inicio:.1f}s: {nombre}")
+        except Exception as e:
+            _borrar_archivo(ruta)
+            _actualizar(trabajo_id, estado='error', mensaje=str(e)[:500], terminado=time.monotonic())
+            print(f"❌ Error en exportación {trabajo_id} ({tipo}): {e}")
+
+
+def estado_exportacion(trabajo_id):
+    """Copia del estado de un trabajo (sin rutas internas) o None"""
+    _purgar_vencidos()
+    with _lock:
+        trabajo = _trabajos.get(trabajo_id)
+        if trabajo is None:
+            return None
+        en_cola = sum(1 for otro in _trabajos.values()
+                      if otro['estado'] == 'en_cola' and otro['id'] < trabajo_id)
+        return {
+            'id': trabajo['id'],
+            'tipo': trabajo['tipo'],
+            'estado': trabajo['estado'],
+            'porcentaje': trabajo['porcentaje'],
+            'mensaje': trabajo['mensaje'],
+            'nombre': trabajo['nombre'],
+            'delante_en_cola': en_cola if trabajo['estado'] == 'en_cola' else 0,
+            'creado': trabajo['creado'].isoformat(),
+        }
+
+
+# ═══════════════════════════════════════════════════════════════════════════════
+# ENDPOINTS
+# ═══════════════════════════════════════════════════════════════════════════════
+
+@exportaciones_bp.route('/api/exportaciones', methods=['POST'])
+def api_pedir_exportacion():
+    """Encola una exportación: {tipo, parametros}"""
+    if 'user_id' not in session:
+        return jsonify({'error': 'No autorizado'}), 401
+
+    data = request.get_json(silent=True) or {}
+    tipo = data.get('tipo')
+    parametros = data.get('parametros') or {}
+    if tipo not in EXPORTADORES:
+        return jsonify({'success': False, 'error': f'Tipo de exportación inválido: {tipo}'}), 400
+    if not isinstance(parametros, dict):
+        return jsonify({'success': False, 'error': 'Los parámetros deben ser un objeto'}), 400
+
+    try:
+        trabajo_id, reutilizado = pedir_exportacion(tipo, parametros, session.get('user_id'))
+        return jsonify({'success': True, 'job_id': trabajo_id, 'reutilizado': reutilizado}), 202
+    except Exception as e:
+        print(f"❌ Error encolando exportación {tipo}: {e}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+
+@exportaciones_bp.route('/api/exportaciones/<int:trabajo_id>')
+def api_estado_exportacion(trabajo_id):
+    """Avance del trabajo (para consultar cada segundo)"""
+    if 'user_id' not in session:
+        return jsonify({'error': 'No autorizado'}), 401
+
+    estado = estado_exportacion(trabajo_id)
+    if estado is None:
+        return jsonify({'success': False, 'error': 'Exportación no encontrada o vencida'}), 404
+    return jsonify({'success': True, 'exportacion': estado})
+
+
+@exportaciones_bp.route('/api/exportaciones/<int:trabajo_id>/descargar')
+def api_descargar_exportacion(trabajo_id):
+    """El archivo generado"""
+    if 'user_id' not in session:
+        return jsonify({'error': 'No autorizado'}), 401
+
+    with _lock:
+        trabajo = dict(_trabajos.get(trabajo_id) or {})
+    if not trabajo:
+        return jsonify({'success': False, 'error': 'Exportación no encontrada o vencida'}), 404
+    if trabajo['estado'] != 'listo':
+        return jsonify({'success': False, 'error': f"La exportación está {trabajo['estado']}"}), 409
+    if not os.path.exists(trabajo['ruta']):
+        return jsonify({'success': False, 'error': 'El archivo de la exportación ya no existe'}), 410
+
+    # PDF y HTML se abren en el navegador; el resto se descarga
+    en_linea = trabajo['mimetype'] in ('application/pdf', 'text/html')
+    return send_file(trabajo['ruta'], mimetype=trabajo['mimetype'],
+                     as_attachment=not en_linea, download_name=trabajo['nombre'])
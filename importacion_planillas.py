@@ -0,0 +1,531 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+importacion_planillas.py - IMPORTACIÓN DE PLANILLAS DEL LADO DEL SERVIDOR
+═══════════════════════════════════════════════════════════════════════════════
+El navegador sube el archivo tal cual (XLS, XLSX o CSV) y el servidor lo
+lee fila por fila, sin cargarlo entero, alimentando el upsert por lotes de
+importacion_productos.py (mismo trabajo en segundo plano, mismo avance,
+mismos errores por fila):
+
+    .csv    csv.reader sobre el archivo abierto (encoding y separador detectados)
+    .xlsx   openpyxl en modo read_only (iter_rows, una fila a la vez)
+    .xls    xlrd con on_demand (formato viejo: máximo 65.536 filas por hoja)
+
+PERFILES
+    Cada proveedor arma sus listas distinto. Un perfil dice qué columna va a
+    qué campo (por nombre de encabezado o número de columna), cómo encontrar
+    el encabezado y cómo traducir valores (grupo → categoría, letra → IVA):
+
+        {'tipo': 'productos',
+         'columnas': {'codigo': 'Id_Articulo', 'descripcion': 'Descripción',
+                      'precio': 'Pcio.1', 'costo': 'Pcio_Cpra', ...},
+         'traducciones': {'categoria': {'11': 'quesos', ...}}}
+
+    Hay perfiles predefinidos (PERFILES_PREDEFINIDOS, p.ej. los listados de
+    MAYOR-ISTA como arti_cod.xls / clie_cod.xls) y se pueden guardar otros
+    en la tabla perfil_importacion.
+
+    POST /api/importaciones/archivo     multipart: archivo, tipo, perfil, opciones
+    GET  /api/importaciones/perfiles    predefinidos + guardados
+    POST /api/importaciones/perfiles    guarda un perfil
+═══════════════════════════════════════════════════════════════════════════════
+"""
+
+from flask import Blueprint, jsonify, request, session
+from werkzeug.utils import secure_filename
+from sqlalchemy import text
+from datetime import datetime
+import unicodedata
+import codecs
+import json
+import csv
+import os
+import re
+
+import importacion_productos
+from importacion_productos import FUENTES, DESTINOS, Destino, crear_trabajo, _texto, _rechazar, _nuevo_resultado
+from versiones import incrementar_version
+
+# Blueprint para las rutas de importación de planillas
+importacion_planillas_bp = Blueprint('importacion_planillas', __name__)
+
+# Variable global para db (se inicializa en init_importacion_planillas)
+db = None
+
+FILAS_BUSQUEDA_ENCABEZADO = 50
+EXTENSIONES = {'.csv': 'csv', '.txt': 'csv', '.xlsx': 'xlsx', '.xls': 'xls'}
+
+# Grupos de artículos del sistema anterior (categorias.xlsx)
+GRUPOS_MAYORISTA = {
+    '0': 'sin clasificar', '1': 'snacks', '2': 'aceite', '3': 'dulces',
+    '4': 'pan rayado / rebosadores', '5': 'enlatados', '6': 'aceituna', '7': 'aderezos',
+    '8': 'salchichas', '9': 'levaduras', '10': 'harinas', '11': 'quesos', '12': 'lacteos',
+    '13': 'fiambres', '14': 'pacualina/tapas De emp.', '15': 'hamburguesas', '16': 'panificado',
+    '17': 'pastas', '18': 'verduras congeladas', '19': 'especies y condimentos',
+    '20': 'papelera', '21': 'congelados', '22': 'varios', '23': 'combos'
+}
+
+CONDICIONES_IVA_MAYORISTA = {
+    'I': 'IVA_RESPONSABLE_INSCRIPTO', 'M': 'MONOTRIBUTISTA',
+    'E': 'IVA_SUJETO_EXENTO', 'C': 'CONSUMIDOR_FINAL'
+}
+
+PERFILES_PREDEFINIDOS = {
+    'mayorista_articulos': {
+        'nombre': 'MAYOR-ISTA - Informe de Artículos (arti_cod.xls)',
+        'tipo': 'productos',
+        'columnas': {
+            'codigo': 'Id_Articulo', 'descripcion': 'Descripción', 'categoria': 'Grupo',
+            'precio': 'Pcio.1', 'precio2': 'Pcio.2', 'precio3': 'Pcio.3', 'precio4': 'Pcio.4',
+            'costo': 'Pcio_Cpra'
+        },
+        'traducciones': {'categoria': GRUPOS_MAYORISTA}
+    },
+    'mayorista_clientes': {
+        'nombre': 'MAYOR-ISTA - Listado de Clientes (clie_cod.xls)',
+        'tipo': 'clientes',
+        'columnas': {
+            # Los datos vienen corridos respecto de los títulos: van por número de columna
+            'nombre': 3, 'direccion': [4, 8], 'telefono': 9, 'condicion_iva': 10,
+            'documento': 11, 'email': 12
+        },
+        'encabezado': 'Razon_Social',
+        'traducciones': {'condicion_iva': CONDICIONES_IVA_MAYORISTA}
+    },
+    'csv_productos': {
+        'nombre': 'CSV genérico de productos (codigo;descripcion;precio;costo;margen)',
+        'tipo': 'productos',
+        'columnas': {'codigo': 'codigo', 'descripcion': 'descripcion', 'precio': 'precio',
+                     'costo': 'costo', 'margen': 'margen'}
+    },
+    'csv_clientes': {
+        'nombre': 'CSV genérico de clientes (nombre;documento;email;telefono;direccion)',
+        'tipo': 'clientes',
+        'columnas': {'nombre': 'nombre', 'documento': 'documento', 'email': 'email',
+                     'telefono': 'telefono', 'direccion': 'direccion'}
+    }
+}
+
+# Campo que tiene que tener valor para que una fila cuente (saltea totales y pies)
+CAMPO_CLAVE = {'productos': 'codigo', 'clientes': 'nombre'}
+
+
+def init_importacion_planillas(app, database):
+    """
+    Inicializa la importación de planillas (requiere init_importacion antes)
+
+    Uso en app.py:
+        from importacion_planillas import init_importacion_planillas
+        init_importacion_planillas(app, db)
+    """
+    global db
+    db = database
+    app.register_blueprint(importacion_planillas_bp)
+    print("✅ Importación de planillas XLS/XLSX/CSV inicializada")
+
+
+_tabla_verificada = False
+
+
+def asegurar_tabla_perfiles():
+    """Crea perfil_importacion si no existe (una sola vez por proceso)"""
+    global _tabla_verificada
+    if _tabla_verificada:
+        return
+    with db.engine.begin() as conn:
+        conn.execute(text("""
+            CREATE TABLE IF NOT EXISTS perfil_importacion (
+                id INT NOT NULL AUTO_INCREMENT,
+                clave VARCHAR(50) NOT NULL,
+                nombre VARCHAR(150) NOT NULL,
+                tipo VARCHAR(20) NOT NULL,
+                configuracion TEXT NOT NULL,
+                fecha_modificacion DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+                PRIMARY KEY (id),
+                UNIQUE KEY uq_perfil_clave (clave)
+            ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
+        """))
+    _tabla_verificada = True
+
+
+# ═══════════════════════════════════════════════════════════════════════════════
+# LECTORES (una fila cruda a la vez)
+# ═══════════════════════════════════════════════════════════════════════════════
+
+class _PuntoYComa(csv.excel):
+    delimiter = ';'
+
+
+def _filas_csv(ruta):
+    with open(ruta, 'rb') as archivo:
+        muestra = archivo.read(65536)
+    try:
+        # Incremental: un carácter cortado al final de la muestra no la hace latin-1
+        muestra_texto = codecs.getincrementaldecoder('utf-8-sig')().decode(muestra, final=False)
+        encoding = 'utf-8-sig'
+    except UnicodeDecodeError:
+        muestra_texto = muestra.decode('latin-1')
+        encoding = 'latin-1'
+    try:
+        dialecto = csv.Sniffer().sniff(muestra_texto, delimiters=';,\t|')
+    except csv.Error:
+        dialecto = _PuntoYComa
+
+    with open(ruta, encoding=encoding, errors='replace', newline='') as archivo:
+        yield from csv.reader(archivo, dialecto)
+
+
+def _filas_xlsx(ruta):
+    import openpyxl
+    libro = openpyxl.load_workbook(ruta, read_only=True, data_only=True)
+    try:
+        yield from libro.worksheets[0].iter_rows(values_only=True)
+    finally:
+        libro.close()
+
+
+def _filas_xls(ruta):
+    import xlrd
+    libro = xlrd.open_workbook(ruta, on_demand=True)
+    try:
+        hoja = libro.sheet_by_index(0)
+        for numero in range(hoja.nrows):
+            yield hoja.row_values(numero)
+    finally:
+        libro.release_resources()
+
+
+LECTORES = {'csv': _filas_csv, 'xlsx': _filas_xlsx, 'xls': _filas_xls}
+DEPENDENCIAS = {'xlsx': 'openpyxl', 'xls': 'xlrd'}
+
+
+# ═══════════════════════════════════════════════════════════════════════════════
+# PERFILES: fila cruda → dict de campos
+# ═══════════════════════════════════════════════════════════════════════════════
+
+def _normalizar(valor):
+    """'  Descripción ' → 'descripcion' (para comparar encabezados)"""
+    valor = unicodedata.normalize('NFKD', _texto(valor)).encode('ascii', 'ignore').decode('ascii')
+    return re.sub(r'\s+', ' ', valor).lower()
+
+
+def _indices_encabezado(valores, perfil):
+    """
+    {campo: [índices]} si 'valores' es la fila de encabezado del perfil, si no None.
+
+    La fila de encabezado es la que contiene perfil['encabezado'] o, si no se
+    indica, el título de la columna clave. Las demás columnas que no estén en
+    la planilla se ignoran; los números de columna no necesitan título.
+    """
+    nombres = [_normalizar(v) for v in valores]
+    buscado = perfil.get('encabezado') or perfil['columnas'][CAMPO_CLAVE[perfil['tipo']]]
+    if _normalizar(buscado) not in nombres:
+        return None
+
+    indices = {}
+    for campo, columnas in perfil['columnas'].items():
+        posiciones = []
+        for columna in columnas if isinstance(columnas, list) else [columnas]:
+            if isinstance(columna, int):
+                posiciones.append(columna)
+            elif _normalizar(columna) in nombres:
+                posiciones.append(nombres.index(_normalizar(columna)))
+        if posiciones:
+            indices[campo] = posiciones
+    return indices
+
+
+def filas_con_perfil(filas_crudas, perfil):
+    """
+    Recorre las filas crudas de la planilla y genera un dict por fila de datos
+    según el perfil. Saltea todo lo anterior al encabezado y las filas sin
+    el campo clave (títulos, totales, pies de página).
+    """
+    clave = CAMPO_CLAVE[perfil['tipo']]
+    traducciones = perfil.get('traducciones') or {}
+    indices = None
+    if not perfil.get('encabezado') and all(isinstance(c, int) for c in perfil['columnas'].values()):
+        indices = {campo: [columna] for campo, columna in perfil['columnas'].items()}
+
+    for numero, valores in enumerate(filas_crudas, start=1):
+        valores = list(valores or ())
+        if indices is None:
+            indices = _indices_encabezado(valores, perfil)
+            if indices is None and numero >= FILAS_BUSQUEDA_ENCABEZADO:
+                raise ValueError('No se encontró la fila de encabezados del perfil '
+                                 f'en las primeras {FILAS_BUSQUEDA_ENCABEZADO} filas')
+            continue
+
+        fila = {'fila': numero}
+        for campo, posiciones in indices.items():
+            partes = [_texto(valores[i]) if i < len(valores) else '' for i in posiciones]
+            if len(partes) == 1:
+                valor = valores[posiciones[0]] if posiciones[0] < len(valores) else None
+            else:
+                valor = ', '.join(p for p in partes if p)
+            if campo in traducciones and valor not in (None, ''):
+                valor = traducciones[campo].get(_texto(valor), valor)
+            fila[campo] = valor
+
+        if _texto(fila.get(clave)):
+            yield fila
+
+
+def leer_planilla(ruta, opciones):
+    """Fuente de importacion_productos para csv / xlsx / xls (el perfil va en las opciones)"""
+    formato = opciones['formato_planilla']
+    return filas_con_perfil(LECTORES[formato](ruta), opciones['perfil'])
+
+
+for _formato in LECTORES:
+    FUENTES[_formato] = leer_planilla
+
+
+def obtener_perfil(clave):
+    """Perfil predefinido o guardado, o None"""
+    if clave in PERFILES_PREDEFINIDOS:
+        return dict(PERFILES_PREDEFINIDOS[clave])
+    asegurar_tabla_perfiles()
+    row = db.session.execute(text(
+        "SELECT configuracion FROM perfil_importacion WHERE clave = :clave"
+    ), {'clave': clave}).fetchone()
+    return json.loads(row.configuracion) if row else None
+
+
+def validar_perfil(perfil):
+    """Mensaje de error o None"""
+    if not isinstance(perfil, dict) or perfil.get('tipo') not in CAMPO_CLAVE:
+        return 'El perfil necesita un tipo válido (productos o clientes)'
+    columnas = perfil.get('columnas')
+    if not isinstance(columnas, dict) or not columnas:
+        return 'El perfil necesita el mapeo de columnas'
+    clave = CAMPO_CLAVE[perfil['tipo']]
+    if clave not in columnas or isinstance(columnas[clave], list):
+        return f'El perfil tiene que mapear la columna {clave} (una sola columna)'
+    solo_numeros = all(isinstance(c, int) for c in columnas.values())
+    if isinstance(columnas[clave], int) and not solo_numeros and not perfil.get('encabezado'):
+        return 'Si la columna clave va por número, indicar el título de encabezado a buscar'
+    return None
+
+
+# ═══════════════════════════════════════════════════════════════════════════════
+# DESTINO CLIENTES
+# ═══════════════════════════════════════════════════════════════════════════════
+
+def _clave_cliente(documento, nombre):
+    return f'doc:{documento}' if documento else f'nom:{nombre.upper()}'
+
+
+def clientes_existentes(db):
+    """{clave: id}: por documento (sólo dígitos) o, sin documento, por nombre"""
+    existentes = {}
+    for row in db.session.execute(text("SELECT id, nombre, documento FROM cliente")):
+        documento = re.sub(r'\D', '', row.documento or '')
+        existentes.setdefault(_clave_cliente(documento, row.nombre or ''), row.id)
+    return existentes
+
+
+def upsert_clientes(db, filas, opciones, existentes):
+    """
+    Valida un lote de clientes: los existentes (mismo documento, o mismo
+    nombre si no tiene) se actualizan con executemany y los nuevos entran
+    con un INSERT multi-fila. No hace commit.
+    """
+    crear_nuevos = opciones.get('crear_nuevos', True)
+    actualizar_existentes = opciones.get('solo_actualizar', False) or crear_nuevos
+
+    resultado = _nuevo_resultado()
+    nuevos, actualizados = [], []
+    vistos = set()
+
+    for fila in filas:
+        nombre = _texto(fila.get('nombre'))[:100]
+        documento = re.sub(r'\D', '', _texto(fila.get('documento')))
+        if not nombre:
+            _rechazar(resultado, fila, documento, 'Cliente sin nombre')
+            continue
+        if len(documento) > 20:
+            _rechazar(resultado, fila, documento, 'Documento demasiado largo')
+            continue
+
+        clave = _clave_cliente(documento, nombre)
+        if clave in vistos:
+            _rechazar(resultado, fila, documento or nombre, 'Cliente repetido en el mismo lote')
+            continue
+        vistos.add(clave)
+
+        condicion_iva = _texto(fila.get('condicion_iva')) or None
+        valores = {
+            'nombre': nombre,
+            'documento': documento or None,
+            'tipo_documento': 'CUIT' if len(documento) == 11 else 'DNI',
+            'email': _texto(fila.get('email'))[:100] or None,
+            'telefono': _texto(fila.get('telefono'))[:20] or None,
+            'direccion': _texto(fila.get('direccion')) or None,
+            'condicion_iva': condicion_iva if condicion_iva in CONDICIONES_IVA_MAYORISTA.values() else None
+        }
+
+        cliente_id = existentes.get(clave)
+        if cliente_id and not actualizar_existentes:
+            resultado['omitidos'] += 1
+            resultado['procesados'].append({'codigo': documento or nombre, 'estado': 'existente'})
+        elif not cliente_id and not crear_nuevos:
+            resultado['omitidos'] += 1
+            resultado['procesados'].append({'codigo': documento or nombre, 'estado': 'no_creado'})
+        elif cliente_id:
+            actualizados.append(dict(valores, id=cliente_id))
+            resultado['actualizados'] += 1
+            resultado['procesados'].append({'codigo': documento or nombre, 'estado': 'actualizado'})
+        else:
+            nuevos.append(valores)
+            resultado['nuevos'] += 1
+            resultado['procesados'].append({'codigo': documento or nombre, 'estado': 'nuevo'})
+
+    if actualizados:
+        db.session.execute(text("""
+            UPDATE cliente
+            SET nombre = :nombre, documento = :documento, tipo_documento = :tipo_documento,
+                email = COALESCE(:email, email), telefono = COALESCE(:telefono, telefono),
+                direccion = COALESCE(:direccion, direccion),
+                condicion_iva = COALESCE(:condicion_iva, condicion_iva)
+            WHERE id = :id
+        """), actualizados)
+
+    if nuevos:
+        db.session.execute(text("""
+            INSERT INTO cliente (nombre, documento, tipo_documento, email, telefono, direccion,
+                                 condicion_iva, lista_precio)
+            VALUES (:nombre, :documento, :tipo_documento, :email, :telefono, :direccion,
+                    COALESCE(:condicion_iva, 'CONSUMIDOR_FINAL'), 1)
+        """), nuevos)
+        # Registrar los nuevos para que un lote posterior no los duplique
+        claves = {_clave_cliente(v['documento'] or '', v['nombre']) for v in nuevos}
+        for row in db.session.execute(text(
+            "SELECT id, nombre, documento FROM cliente WHERE id > :desde"
+        ), {'desde': max(existentes.values(), default=0)}):
+            clave = _clave_cliente(re.sub(r'\D', '', row.documento or ''), row.nombre or '')
+            if clave in claves:
+                existentes[clave] = row.id
+
+    return resultado
+
+
+def _clientes_confirmados(resultado):
+    if resultado['nuevos'] or resultado['actualizados']:
+        incrementar_version('cliente')
+
+
+DESTINOS['clientes'] = Destino(clientes_existentes, upsert_clientes, _clientes_confirmados)
+
+
+# ═══════════════════════════════════════════════════════════════════════════════
+# ENDPOINTS
+# ═══════════════════════════════════════════════════════════════════════════════
+
+@importacion_planillas_bp.route('/api/importaciones/archivo', methods=['POST'])
+def api_importar_archivo():
+    """Sube una planilla y la importa en segundo plano con un perfil de columnas"""
+    if 'user_id' not in session:
+        return jsonify({'error': 'No autorizado'}), 401
+
+    try:
+        archivo = request.files.get('archivo')
+        if not archivo or not archivo.filename:
+            return jsonify({'success': False, 'error': 'No se recibió el archivo'}), 400
+
+        extension = os.path.splitext(archivo.filename)[1].lower()
+        formato = EXTENSIONES.get(extension)
+        if not formato:
+            return jsonify({'success': False, 'error': f'Formato no soportado: {extension}'}), 400
+        if formato in DEPENDENCIAS:
+            try:
+                __import__(DEPENDENCIAS[formato])
+            except ImportError:
+                return jsonify({'success': False, 'error':
+                                f'Para leer {extension} instalar {DEPENDENCIAS[formato]} '
+                                f'(pip install {DEPENDENCIAS[formato]})'}), 400
+
+        if request.form.get('perfil_json'):
+            perfil = json.loads(request.form['perfil_json'])
+        else:
+            perfil = obtener_perfil(request.form.get('perfil', ''))
+        if perfil is None:
+            return jsonify({'success': False, 'error': 'Perfil de importación no encontrado'}), 400
+        error = validar_perfil(perfil)
+        if error:
+            return jsonify({'success': False, 'error': error}), 400
+
+        opciones = json.loads(request.form.get('opciones') or '{}')
+        opciones.update({'perfil': perfil, 'formato_planilla': formato, 'borrar_archivo': True})
+
+        # save() copia de a bloques: el archivo nunca está entero en memoria
+        nombre = secure_filename(archivo.filename) or f'planilla{extension}'
+        ruta = os.path.join(importacion_productos.DIRECTORIO, f"{datetime.now():%Y%m%d_%H%M%S_%f}_{nombre}")
+        archivo.save(ruta)
+
+        job_id = crear_trabajo(perfil['tipo'], formato, ruta, opciones, nombre_original=archivo.filename)
+        return jsonify({'success': True, 'job_id': job_id}), 202
+
+    except (ValueError, KeyError) as e:
+        return jsonify({'success': False, 'error': f'Datos inválidos: {e}'}), 400
+    except Exception as e:
+        db.session.rollback()
+        print(f"❌ Error recibiendo planilla: {e}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+
+@importacion_planillas_bp.route('/api/importaciones/perfiles')
+def api_perfiles_importacion():
+    """Perfiles disponibles: predefinidos y guardados"""
+    if 'user_id' not in session:
+        return jsonify({'error': 'No autorizado'}), 401
+
+    try:
+        asegurar_tabla_perfiles()
+        perfiles = [{'clave': clave, 'nombre': p['nombre'], 'tipo': p['tipo'], 'predefinido': True,
+                     'configuracion': p} for clave, p in PERFILES_PREDEFINIDOS.items()]
+        for row in db.session.execute(text(
+            "SELECT clave, nombre, tipo, configuracion FROM perfil_importacion ORDER BY nombre"
+        )):
+            perfiles.append({'clave': row.clave, 'nombre': row.nombre, 'tipo': row.tipo,
+                             'predefinido': False, 'configuracion': json.loads(row.configuracion)})
+        db.session.commit()
+        return jsonify({'success': True, 'perfiles': perfiles})
+
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+
+@importacion_planillas_bp.route('/api/importaciones/perfiles', methods=['POST'])
+def api_guardar_perfil_importacion():
+    """Crea o reemplaza un perfil (clave, nombre, tipo, columnas, traducciones...)"""
+    if 'user_id' not in session:
+        return jsonify({'error': 'No autorizado'}), 401
+
+    try:
+        perfil = request.get_json() or {}
+        clave = re.sub(r'[^a-z0-9_]', '_', _normalizar(perfil.pop('clave', '')))[:50]
+        if not clave or clave in PERFILES_PREDEFINIDOS:
+            return jsonify({'success': False, 'error': 'Clave de perfil inválida'}), 400
+        perfil['nombre'] = _texto(perfil.get('nombre')) or clave
+        error = validar_perfil(perfil)
+        if error:
+            return jsonify({'success': False, 'error': error}), 400
+
+        asegurar_tabla_perfiles()
+        db.session.execute(text("""
+            INSERT INTO perfil_importacion (clave, nombre, tipo, configuracion, fecha_modificacion)
+            VALUES (:clave, :nombre, :tipo, :configuracion, NOW())
+            ON DUPLICATE KEY UPDATE nombre = VALUES(nombre), tipo = VALUES(tipo),
+                                    configuracion = VALUES(configuracion), fecha_modificacion = NOW()
+        """), {'clave': clave, 'nombre': perfil['nombre'][:150], 'tipo': perfil['tipo'],
+               'configuracion': json.dumps(perfil, ensure_ascii=False)})
+        db.session.commit()
+        return jsonify({'success': True, 'clave': clave})
+
+    except Exception as e:
+        db.session.rollback()
+        print(f"❌ Error guardando perfil de importación: {e}")
+        return jsonify({'success': False, 'error': str(e)}), 500
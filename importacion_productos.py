@@ -0,0 +1,629 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+importacion_productos.py - IMPORTACIÓN MASIVA EN SEGUNDO PLANO (UPSERT POR LOTES)
+═══════════════════════════════════════════════════════════════════════════════
+Una lista de proveedor de 10.000 líneas no se procesa dentro de una request:
+se guarda en disco, se crea un trabajo (importacion_job) y un hilo la
+recorre en lotes de IMPORTACION_TAMANO_LOTE filas:
+
+    1. Los códigos existentes se precargan UNA vez (codigo → id)
+    2. Cada lote se valida en Python y se graba con un solo
+       INSERT ... ON DUPLICATE KEY UPDATE (multi-fila)
+    3. Los errores del lote y el avance del trabajo se guardan en la MISMA
+       transacción que los datos: commit por lote
+    4. Después del commit se invalida el catálogo con los ids del lote
+
+Si el proceso se corta, /reanudar retoma desde el primer lote sin
+confirmar (lotes_confirmados). Un lote con errores no frena al resto: cada
+fila con problema queda en importacion_error y se descarga como CSV.
+
+    POST /api/importaciones                     crea el trabajo (JSON)
+    GET  /api/importaciones/<id>                avance y muestra de errores
+    POST /api/importaciones/<id>/reanudar       retoma un trabajo cortado
+    GET  /api/importaciones/<id>/errores.csv    una línea por fila rechazada
+
+/api/importar_productos_lote (la pantalla vieja, por lotes chicos) usa el
+mismo upsert de forma sincrónica. Las planillas XLS/XLSX/CSV subidas tal
+cual entran por importacion_planillas.py, que registra sus lectores en
+FUENTES y el destino 'clientes' en DESTINOS.
+═══════════════════════════════════════════════════════════════════════════════
+"""
+
+from flask import Blueprint, jsonify, request, session, Response, stream_with_context
+from sqlalchemy import text, bindparam
+from datetime import datetime
+from itertools import islice
+import threading
+import json
+import csv
+import io
+import os
+
+from catalogo_cache import invalidar_catalogo
+from clasificador_categorias import clasificar_lote
+
+# Blueprint para las rutas de importación
+importacion_bp = Blueprint('importacion', __name__)
+
+# Variables globales (se inicializan en init_importacion)
+db = None
+_app = None
+
+TAMANO_LOTE = 500
+DIRECTORIO = None
+MINUTOS_SIN_AVANCE = 5      # un trabajo 'procesando' sin avance se puede reanudar
+MUESTRA_ERRORES = 100
+MAXIMO_IMPORTE = 99999999.99     # DECIMAL(10,2): precios y costo
+MAXIMO_PORCENTAJE = 999.99       # DECIMAL(5,2): margen e IVA
+
+
+def init_importacion(app, database):
+    """
+    Inicializa las importaciones en segundo plano
+
+    Uso en app.py:
+        from importacion_productos import init_importacion
+        init_importacion(app, db)
+    """
+    global db, _app, TAMANO_LOTE, DIRECTORIO
+    db = database
+    _app = app
+    TAMANO_LOTE = app.config.get('IMPORTACION_TAMANO_LOTE', TAMANO_LOTE)
+    DIRECTORIO = app.config.get('IMPORTACION_DIRECTORIO', os.path.join(app.root_path, 'importaciones'))
+    os.makedirs(DIRECTORIO, exist_ok=True)
+    app.register_blueprint(importacion_bp)
+    print("✅ Importación masiva en segundo plano inicializada")
+
+
+_tablas_verificadas = False
+
+
+def asegurar_tablas_importacion():
+    """Crea importacion_job / importacion_error si no existen (una vez por proceso)"""
+    global _tablas_verificadas
+    if _tablas_verificadas:
+        return
+    with db.engine.begin() as conn:
+        conn.execute(text("""
+            CREATE TABLE IF NOT EXISTS importacion_job (
+                id INT NOT NULL AUTO_INCREMENT,
+                tipo VARCHAR(20) NOT NULL,
+                formato VARCHAR(10) NOT NULL,
+                archivo VARCHAR(255) NOT NULL,
+                nombre_original VARCHAR(255) NULL,
+                opciones TEXT NULL,
+                estado VARCHAR(20) NOT NULL DEFAULT 'pendiente',
+                tamano_lote INT NOT NULL,
+                total_filas INT NULL,
+                lotes_confirmados INT NOT NULL DEFAULT 0,
+                filas_procesadas INT NOT NULL DEFAULT 0,
+                nuevos INT NOT NULL DEFAULT 0,
+                actualizados INT NOT NULL DEFAULT 0,
+                omitidos INT NOT NULL DEFAULT 0,
+                errores INT NOT NULL DEFAULT 0,
+                mensaje TEXT NULL,
+                usuario_id INT NULL,
+                fecha_creacion DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+                fecha_actualizacion DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+                fecha_fin DATETIME NULL,
+                PRIMARY KEY (id),
+                KEY idx_estado (estado)
+            ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
+        """))
+        conn.execute(text("""
+            CREATE TABLE IF NOT EXISTS importacion_error (
+                id BIGINT NOT NULL AUTO_INCREMENT,
+                job_id INT NOT NULL,
+                lote INT NOT NULL,
+                fila INT NULL,
+                codigo VARCHAR(100) NULL,
+                error VARCHAR(500) NOT NULL,
+                PRIMARY KEY (id),
+                KEY idx_job_fila (job_id, fila)
+            ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
+        """))
+    _tablas_verificadas = True
+
+
+# ═══════════════════════════════════════════════════════════════════════════════
+# FUENTES (de dónde salen las filas) Y DESTINOS (a qué tabla van)
+# ═══════════════════════════════════════════════════════════════════════════════
+
+def leer_jsonl(ruta, opciones):
+    """Filas guardadas como un JSON por línea (lo que llega por POST /api/importaciones)"""
+    with open(ruta, encoding='utf-8') as archivo:
+        for numero, linea in enumerate(archivo, start=1):
+            if linea.strip():
+                fila = json.loads(linea)
+                fila.setdefault('fila', numero)
+                yield fila
+
+
+# formato → función(ruta, opciones) que genera dicts de a uno (sin cargar el archivo entero)
+FUENTES = {'jsonl': leer_jsonl}
+
+
+class Destino:
+    """Tabla destino de una importación"""
+
+    def __init__(self, existentes, upsert, confirmado):
+        self.existentes = existentes    # (db) → {clave: id} precargado una vez
+        self.upsert = upsert            # (db, filas, opciones, existentes) → resultado
+        self.confirmado = confirmado    # (resultado) después del commit del lote
+
+
+def _texto(valor):
+    if valor is None:
+        return ''
+    if isinstance(valor, float) and valor.is_integer():
+        valor = int(valor)
+    return str(valor).strip()
+
+
+def _decimal(valor):
+    """Número desde la planilla: acepta '1.234,56', '1234.56' o números"""
+    if valor is None or valor == '':
+        return 0.0
+    if isinstance(valor, (int, float)):
+        return float(valor)
+    valor = str(valor).strip().replace('$', '').replace(' ', '')
+    if ',' in valor:
+        valor = valor.replace('.', '').replace(',', '.')
+    return float(valor)
+
+
+def _margen(precio, costo):
+    """Margen % implícito entre costo y precio (None sin costo), dentro de DECIMAL(5,2)"""
+    if not costo or costo <= 0 or not precio:
+        return None
+    return round(min(max((precio / costo - 1) * 100, 0.0), 999.99), 2)
+
+
+def _fuera_de_rango(valor, maximo):
+    """True si el valor (ya redondeado a 2 decimales) no entra en la columna; NaN e infinito tampoco"""
+    return valor is not None and not -maximo <= round(valor, 2) <= maximo
+
+
+def _nuevo_resultado():
+    return {'nuevos': 0, 'actualizados': 0, 'omitidos': 0,
+            'errores': [], 'procesados': [], 'ids': [], 'sin_categoria': []}
+
+
+def _rechazar(resultado, fila, codigo, error):
+    resultado['errores'].append({'fila': fila.get('fila'), 'codigo': codigo, 'error': error})
+
+
+def codigos_existentes_productos(db):
+    """{CODIGO: id} de todos los productos (una consulta; la clave en mayúsculas
+    porque la collation de producto.codigo no distingue mayúsculas)"""
+    return {row.codigo.upper(): row.id for row in db.session.execute(text("SELECT id, codigo FROM producto"))}
+
+
+def upsert_productos(db, filas, opciones, existentes):
+    """
+    Valida un lote de filas y lo graba con un INSERT ... ON DUPLICATE KEY
+    UPDATE. No hace commit. Actualiza 'existentes' con los códigos nuevos.
+
+    Args:
+        filas: dicts con codigo, descripcion, precio, costo, margen (y 'fila');
+            opcionales precio2..precio5, categoria e iva
+        opciones: solo_actualizar, crear_nuevos, incluir_costo_margen, categorizar
+            (los productos nuevos sin categoría se clasifican por descripción)
+        existentes: {CODIGO: id} precargado
+
+    Returns:
+        dict con nuevos, actualizados, omitidos, errores [{fila, codigo, error}],
+        procesados [{codigo, estado}], ids de productos grabados y
+        sin_categoria (códigos nuevos que ninguna regla pudo clasificar)
+    """
+    crear_nuevos = opciones.get('crear_nuevos', True)
+    actualizar_existentes = opciones.get('solo_actualizar', False) or crear_nuevos
+    incluir_costo_margen = opciones.get('incluir_costo_margen', True)
+    categorizar = opciones.get('categorizar', True)
+
+    resultado = _nuevo_resultado()
+    valores = []
+    a_clasificar = []
+    vistos = set()
+    ahora = datetime.now()
+
+    for fila in filas:
+        codigo = _texto(fila.get('codigo'))
+        descripcion = _texto(fila.get('descripcion'))
+
+        try:
+            precio = _decimal(fila.get('precio'))
+            costo = _decimal(fila.get('costo')) if incluir_costo_margen else 0.0
+            if not incluir_costo_margen:
+                margen = 0.0
+            elif fila.get('margen') in (None, ''):
+                margen = _margen(precio, costo) or 0.0
+            else:
+                margen = _decimal(fila.get('margen'))
+            # Listas 2-5 opcionales: sin valor (o en cero) quedan como estaban
+            listas = {}
+            for lista in range(2, 6):
+                valor = _decimal(fila.get(f'precio{lista}'))
+                listas[lista] = round(valor, 2) if valor > 0 else None
+        except (TypeError, ValueError):
+            _rechazar(resultado, fila, codigo, 'Precio, costo o margen no numérico')
+            continue
+        try:
+            iva = round(_decimal(fila.get('iva')), 2) if fila.get('iva') not in (None, '') else None
+        except (TypeError, ValueError):
+            _rechazar(resultado, fila, codigo, 'IVA no numérico')
+            continue
+
+        if not codigo or not descripcion or precio <= 0:
+            _rechazar(resultado, fila, codigo, 'Datos incompletos o inválidos')
+            continue
+        # Un valor que no entra en su columna haría fallar el INSERT de todo el lote
+        if any(_fuera_de_rango(valor, MAXIMO_IMPORTE) for valor in (precio, costo, *listas.values())):
+            _rechazar(resultado, fila, codigo, 'Precio o costo fuera de rango (máximo 99.999.999,99)')
+            continue
+        if _fuera_de_rango(margen, MAXIMO_PORCENTAJE) or _fuera_de_rango(iva, MAXIMO_PORCENTAJE):
+            _rechazar(resultado, fila, codigo, 'Margen o IVA fuera de rango (máximo 999,99)')
+            continue
+        if len(codigo) > 50:
+            _rechazar(resultado, fila, codigo, 'El código supera los 50 caracteres')
+            continue
+        if codigo.upper() in vistos:
+            _rechazar(resultado, fila, codigo, 'Código repetido en el mismo lote')
+            continue
+        vistos.add(codigo.upper())
+
+        existe = codigo.upper() in existentes
+        if existe and not actualizar_existentes:
+            resultado['omitidos'] += 1
+            resultado['procesados'].append({'codigo': codigo, 'estado': 'existente'})
+            continue
+        if not existe and not crear_nuevos:
+            resultado['omitidos'] += 1
+            resultado['procesados'].append({'codigo': codigo, 'estado': 'no_creado'})
+            continue
+
+        valores.append({
+            'codigo': codigo,
+            'nombre': descripcion[:200],
+            'descripcion': descripcion,
+            'precio': round(precio, 2),
+            'costo': round(costo, 2),
+            'margen': round(margen, 2),
+            'categoria': _texto(fila.get('categoria'))[:100] or None,
+            'iva': iva,
+            'ahora': ahora,
+            **{f'precio{lista}': valor for lista, valor in listas.items()},
+            **{f'margen{lista}': (_margen(valor, costo) if valor else None) for lista, valor in listas.items()}
+        })
+        if categorizar and not existe and valores[-1]['categoria'] is None:
+            a_clasificar.append(valores[-1])
+        resultado['actualizados' if existe else 'nuevos'] += 1
+        resultado['procesados'].append({'codigo': codigo, 'estado': 'actualizado' if existe else 'nuevo'})
+
+    if not valores:
+        return resultado
+
+    # Todo el lote en una sola pasada del clasificador
+    if a_clasificar:
+        categorias, sin_clasificar = clasificar_lote([v['descripcion'] for v in a_clasificar])
+        for valor, categoria in zip(a_clasificar, categorias):
+            valor['categoria'] = categoria
+        resultado['sin_categoria'] = [a_clasificar[i]['codigo'] for i in sin_clasificar]
+
+    # Las columnas opcionales (NULL en la fila) no pisan lo que ya había
+    actualizar = ['nombre = VALUES(nombre)', 'descripcion = VALUES(descripcion)',
+                  'precio = VALUES(precio)', 'fecha_modificacion = VALUES(fecha_modificacion)',
+                  'categoria = COALESCE(VALUES(categoria), categoria)', 'iva = COALESCE(VALUES(iva), iva)']
+    if incluir_costo_margen:
+        actualizar += ['costo = VALUES(costo)', 'margen = VALUES(margen)']
+    for lista in range(2, 6):
+        actualizar += [f'precio{lista} = COALESCE(VALUES(precio{lista}), precio{lista})',
+                       f'margen{lista} = COALESCE(VALUES(margen{lista}), margen{lista})']
+
+    db.session.execute(text(f"""
+        INSERT INTO producto (codigo, nombre, descripcion, precio, costo, margen,
+                              precio2, margen2, precio3, margen3, precio4, margen4, precio5, margen5,
+                              stock, categoria, iva, activo, fecha_creacion, fecha_modificacion)
+        VALUES (:codigo, :nombre, :descripcion, :precio, :costo, :margen,
+                :precio2, :margen2, :precio3, :margen3, :precio4, :margen4, :precio5, :margen5,
+                0, COALESCE(:categoria, 'Importado'), COALESCE(:iva, 21.00), 1, :ahora, :ahora)
+        ON DUPLICATE KEY UPDATE {', '.join(actualizar)}
+    """), valores)
+
+    codigos = [v['codigo'] for v in valores]
+    filas_ids = db.session.execute(
+        text("SELECT id, codigo FROM producto WHERE codigo IN :codigos")
+        .bindparams(bindparam('codigos', expanding=True)),
+        {'codigos': codigos}
+    )
+    for row in filas_ids:
+        existentes[row.codigo.upper()] = row.id
+        resultado['ids'].append(row.id)
+    return resultado
+
+
+def _productos_confirmados(resultado):
+    if resultado['ids']:
+        invalidar_catalogo(ids=resultado['ids'])
+
+
+DESTINOS = {
+    'productos': Destino(codigos_existentes_productos, upsert_productos, _productos_confirmados)
+}
+
+
+# ═══════════════════════════════════════════════════════════════════════════════
+# TRABAJOS
+# ═══════════════════════════════════════════════════════════════════════════════
+
+def _en_lotes(filas, tamano):
+    filas = iter(filas)
+    while True:
+        lote = list(islice(filas, tamano))
+        if not lote:
+            return
+        yield lote
+
+
+def crear_trabajo(tipo, formato, archivo, opciones, nombre_original=None, total_filas=None):
+    """Registra un trabajo de importación y lo arranca en segundo plano"""
+    asegurar_tablas_importacion()
+    job_id = db.session.execute(text("""
+        INSERT INTO importacion_job (tipo, formato, archivo, nombre_original, opciones,
+                                     tamano_lote, total_filas, usuario_id)
+        VALUES (:tipo, :formato, :archivo, :nombre, :opciones, :tamano, :total, :usuario)
+    """), {
+        'tipo': tipo, 'formato': formato, 'archivo': archivo, 'nombre': nombre_original,
+        'opciones': json.dumps(opciones), 'tamano': TAMANO_LOTE, 'total': total_filas,
+        'usuario': session.get('user_id')
+    }).lastrowid
+    db.session.commit()
+    lanzar_trabajo(job_id)
+    return job_id
+
+
+def lanzar_trabajo(job_id):
+    threading.Thread(target=_ejecutar_trabajo, args=(job_id,),
+                     name=f'importacion-{job_id}', daemon=True).start()
+
+
+def _reclamar(job_id):
+    """Marca el trabajo como 'procesando' si nadie lo está procesando; devuelve la fila"""
+    tomado = db.session.execute(text("""
+        UPDATE importacion_job
+        SET estado = 'procesando', mensaje = NULL, fecha_actualizacion = NOW()
+        WHERE id = :id AND estado <> 'completado'
+          AND (estado <> 'procesando'
+               OR fecha_actualizacion < NOW() - INTERVAL :minutos MINUTE)
+    """), {'id': job_id, 'minutos': MINUTOS_SIN_AVANCE}).rowcount
+    db.session.commit()
+    if not tomado:
+        return None
+    return db.session.execute(text("SELECT * FROM importacion_job WHERE id = :id"), {'id': job_id}).fetchone()
+
+
+def _confirmar_lote(job_id, numero_lote, cantidad_filas, resultado):
+    """Errores y avance del lote, en la misma transacción que sus datos"""
+    if resultado['errores']:
+        db.session.execute(text("""
+            INSERT INTO importacion_error (job_id, lote, fila, codigo, error)
+            VALUES (:job_id, :lote, :fila, :codigo, :error)
+        """), [{'job_id': job_id, 'lote': numero_lote, 'fila': e.get('fila'),
+                'codigo': (e.get('codigo') or '')[:100], 'error': e['error'][:500]}
+               for e in resultado['errores']])
+
+    db.session.execute(text("""
+        UPDATE importacion_job
+        SET lotes_confirmados = :lote,
+            filas_procesadas = filas_procesadas + :filas,
+            nuevos = nuevos + :nuevos,
+            actualizados = actualizados + :actualizados,
+            omitidos = omitidos + :omitidos,
+            errores = errores + :errores,
+            fecha_actualizacion = NOW()
+        WHERE id = :id
+    """), {'id': job_id, 'lote': numero_lote, 'filas': cantidad_filas,
+           'nuevos': resultado['nuevos'], 'actualizados': resultado['actualizados'],
+           'omitidos': resultado['omitidos'], 'errores': len(resultado['errores'])})
+
+
+def _finalizar(job_id, estado, mensaje=None):
+    db.session.execute(text("""
+        UPDATE importacion_job
+        SET estado = :estado, mensaje = :mensaje, fecha_actualizacion = NOW(),
+            fecha_fin = CASE WHEN :estado = 'completado' THEN NOW() ELSE NULL END
+        WHERE id = :id
+    """), {'id': job_id, 'estado': estado, 'mensaje': mensaje})
+    db.session.commit()
+
+
+def _ejecutar_trabajo(job_id):
+    """Cuerpo del hilo: recorre la fuente en lotes, saltando los ya confirmados"""
+    with _app.app_context():
+        job = None
+        try:
+            job = _reclamar(job_id)
+            if job is None:
+                return
+
+            opciones = json.loads(job.opciones or '{}')
+            destino = DESTINOS[job.tipo]
+            filas = FUENTES[job.formato](job.archivo, opciones)
+            existentes = destino.existentes(db)
+            db.session.commit()
+
+            print(f"📥 Importación {job_id}: {job.tipo} desde {job.nombre_original or job.formato}"
+                  f" (lote {job.tamano_lote}, retoma en lote {job.lotes_confirmados + 1})")
+
+            sin_categoria = 0
+            for numero_lote, lote in enumerate(_en_lotes(filas, job.tamano_lote), start=1):
+                if numero_lote <= job.lotes_confirmados:
+                    continue
+                resultado = destino.upsert(db, lote, opciones, existentes)
+                _confirmar_lote(job_id, numero_lote, len(lote), resultado)
+                db.session.commit()
+                destino.confirmado(resultado)
+                sin_categoria += len(resultado['sin_categoria'])
+
+            _finalizar(job_id, 'completado', f'{sin_categoria} productos nuevos sin categoría detectada'
+                                             if sin_categoria else None)
+            if job.formato == 'jsonl' or opciones.get('borrar_archivo'):
+                _borrar_archivo(job.archivo)
+            print(f"✅ Importación {job_id} completada")
+
+        except Exception as e:
+            db.session.rollback()
+            print(f"❌ Error en importación {job_id}: {e}")
+            if job is not None:
+                try:
+                    _finalizar(job_id, 'error', str(e)[:1000])
+                except Exception as error_final:
+                    print(f"⚠️ No se pudo marcar la importación {job_id} con error: {error_final}")
+
+
+def _borrar_archivo(ruta):
+    try:
+        os.remove(ruta)
+    except OSError:
+        pass
+
+
+def estado_trabajo(job_id):
+    job = db.session.execute(text("""
+        SELECT id, tipo, nombre_original, estado, tamano_lote, total_filas, lotes_confirmados,
+               filas_procesadas, nuevos, actualizados, omitidos, errores, mensaje,
+               fecha_creacion, fecha_actualizacion, fecha_fin
+        FROM importacion_job WHERE id = :id
+    """), {'id': job_id}).mappings().fetchone()
+    if job is None:
+        return None
+
+    datos = dict(job)
+    for campo in ('fecha_creacion', 'fecha_actualizacion', 'fecha_fin'):
+        datos[campo] = datos[campo].isoformat() if datos[campo] else None
+    datos['porcentaje'] = (round(datos['filas_procesadas'] * 100 / datos['total_filas'])
+                           if datos['total_filas'] else None)
+    datos['errores_muestra'] = [dict(row) for row in db.session.execute(text("""
+        SELECT fila, codigo, error FROM importacion_error
+        WHERE job_id = :id ORDER BY fila, id LIMIT :limite
+    """), {'id': job_id, 'limite': MUESTRA_ERRORES}).mappings()]
+    return datos
+
+
+# ═══════════════════════════════════════════════════════════════════════════════
+# ENDPOINTS
+# ═══════════════════════════════════════════════════════════════════════════════
+
+@importacion_bp.route('/api/importaciones', methods=['POST'])
+def api_crear_importacion():
+    """Crea un trabajo con las filas del JSON: {tipo, productos|filas, opciones}"""
+    if 'user_id' not in session:
+        return jsonify({'error': 'No autorizado'}), 401
+
+    try:
+        data = request.get_json() or {}
+        tipo = data.get('tipo', 'productos')
+        filas = data.get('filas') or data.get('productos') or []
+        if tipo not in DESTINOS:
+            return jsonify({'success': False, 'error': f'Tipo de importación inválido: {tipo}'}), 400
+        if not filas:
+            return jsonify({'success': False, 'error': 'No se recibieron filas para importar'}), 400
+
+        asegurar_tablas_importacion()
+        ruta = os.path.join(DIRECTORIO, f"{tipo}_{datetime.now():%Y%m%d_%H%M%S_%f}.jsonl")
+        with open(ruta, 'w', encoding='utf-8') as archivo:
+            for numero, fila in enumerate(filas, start=1):
+                fila.setdefault('fila', fila.pop('filaOriginal', numero))
+                archivo.write(json.dumps(fila, ensure_ascii=False) + '\n')
+
+        job_id = crear_trabajo(tipo, 'jsonl', ruta, data.get('opciones') or {},
+                               nombre_original=data.get('nombre_archivo'), total_filas=len(filas))
+        return jsonify({'success': True, 'job_id': job_id, 'total_filas': len(filas)}), 202
+
+    except Exception as e:
+        db.session.rollback()
+        print(f"❌ Error creando importación: {e}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+
+@importacion_bp.route('/api/importaciones/<int:job_id>')
+def api_estado_importacion(job_id):
+    """Avance del trabajo (para consultar cada pocos segundos)"""
+    if 'user_id' not in session:
+        return jsonify({'error': 'No autorizado'}), 401
+
+    try:
+        asegurar_tablas_importacion()
+        datos = estado_trabajo(job_id)
+        db.session.commit()  # cerrar la transacción de lectura
+        if datos is None:
+            return jsonify({'success': False, 'error': 'Importación no encontrada'}), 404
+        return jsonify({'success': True, 'importacion': datos})
+
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+
+@importacion_bp.route('/api/importaciones/<int:job_id>/reanudar', methods=['POST'])
+def api_reanudar_importacion(job_id):
+    """Retoma un trabajo cortado desde el primer lote sin confirmar"""
+    if 'user_id' not in session:
+        return jsonify({'error': 'No autorizado'}), 401
+
+    try:
+        asegurar_tablas_importacion()
+        job = db.session.execute(text(
+            "SELECT estado, archivo, lotes_confirmados FROM importacion_job WHERE id = :id"
+        ), {'id': job_id}).fetchone()
+        db.session.commit()
+        if job is None:
+            return jsonify({'success': False, 'error': 'Importación no encontrada'}), 404
+        if job.estado == 'completado':
+            return jsonify({'success': False, 'error': 'La importación ya está completa'}), 400
+        if not os.path.exists(job.archivo):
+            return jsonify({'success': False, 'error': 'El archivo de la importación ya no existe'}), 410
+
+        lanzar_trabajo(job_id)
+        return jsonify({'success': True, 'job_id': job_id,
+                        'desde_lote': job.lotes_confirmados + 1}), 202
+
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+
+@importacion_bp.route('/api/importaciones/<int:job_id>/errores.csv')
+def api_errores_importacion(job_id):
+    """Filas rechazadas (fila, código, error) como CSV, generado de a bloques"""
+    if 'user_id' not in session:
+        return jsonify({'error': 'No autorizado'}), 401
+
+    def generar():
+        buffer = io.StringIO()
+        escritor = csv.writer(buffer, delimiter=';')
+        escritor.writerow(['fila', 'codigo', 'error'])
+        ultimo_id = 0
+        while True:
+            filas = db.session.execute(text("""
+                SELECT id, fila, codigo, error FROM importacion_error
+                WHERE job_id = :job AND id > :desde ORDER BY id LIMIT 1000
+            """), {'job': job_id, 'desde': ultimo_id}).fetchall()
+            if not filas:
+                break
+            for row in filas:
+                escritor.writerow([row.fila, row.codigo, row.error])
+            ultimo_id = filas[-1].id
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+        db.session.commit()
+        yield buffer.getvalue()
+
+    asegurar_tablas_importacion()
+    return Response(
+        stream_with_context(generar()),
+        mimetype='text/csv; charset=utf-8',
+        headers={'Content-Disposition': f'attachment; filename=importacion_{job_id}_errores.csv'}
+    )
@@ -6,11 +6,17 @@ import win32print
 import win32api
 import tempfile
 import logging
+import threading
+import itertools
 
 # Configurar logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Comandos ESC/POS comunes
+INICIALIZAR = b'\x1B\x40'          # ESC @: reinicia formato al empezar cada documento
+CORTE_CARTEL = b'\n\n\x1B\x69'     # avance + corte parcial (ESC i) entre carteles
+
 class ImpresoraTermica:
     def __init__(self, nombre_impresora=None, ancho_mm=80):
         # Para impresoras térmicas de 80mm, el ancho típico es 42-48 caracteres
@@ -601,6 +607,74 @@ ESTADO: FUNCIONANDO CORRECTAMENTE
         except Exception as e:
             print(f"❌ Error listando impresoras: {e}")
 
+    def texto_cartel_precio(self, producto, tiene_ofertas=False):
+        """Texto del cartel de precio (con los comandos de tamaño de letra)"""
+        precio = float(producto.precio)
+        nombre_corto = producto.nombre[:30] if len(producto.nombre) > 30 else producto.nombre
+        
+        contenido = []
+        
+        # contenido.append("=" * self.ancho)  # ✅ COMENTADO
+        contenido.append(self.centrar_texto("PRECIO DE VENTA"))
+        # contenido.append("=" * self.ancho)  # ✅ COMENTADO
+        
+        if tiene_ofertas:
+            contenido.append("")
+            contenido.append("*" * self.ancho)
+            contenido.append(self.centrar_texto("¡OFERTA ESPECIAL!"))
+            contenido.append("*" * self.ancho)
+        
+        contenido.append("")
+        contenido.append(self.centrar_texto(nombre_corto))
+        
+        contenido.append("")
+        contenido.append("-" * self.ancho)
+        
+        precio_texto = f"$ {precio:.2f}"
+        ancho_precio = self.ancho // 2
+        espacios = (ancho_precio - len(precio_texto)) // 2
+        precio_centrado = " " * espacios + precio_texto
+        contenido.append("\x1B\x21\x30" + precio_centrado + "\x1B\x21\x00")
+        contenido.append("")
+                    
+        contenido.append("-" * self.ancho)
+        
+        # codigo_texto = f"Codigo: {producto.codigo}"
+        # contenido.append(self.centrar_texto(codigo_texto))
+        
+        if tiene_ofertas:
+            if producto.es_combo and hasattr(producto, 'calcular_ahorro_combo'):
+                ahorro = producto.calcular_ahorro_combo()
+                if ahorro > 0:
+                    contenido.append("")
+                    ahorro_texto = f"Ahorro: $ {ahorro:.2f}"
+                    contenido.append(self.centrar_texto(ahorro_texto))
+        
+        contenido.append("")
+        # contenido.append("=" * self.ancho)  # ✅ COMENTADO
+        
+        # fecha_hora = datetime.now().strftime("%d/%m/%Y %H:%M")
+        # contenido.append(self.centrar_texto(fecha_hora))
+        
+        # contenido.append("=" * self.ancho)  # ✅ COMENTADO
+        contenido.extend([""] * 3)
+        
+        return "\n".join(contenido)
+
+    def cartel_escpos(self, producto, tiene_ofertas=False):
+        """Cartel listo para la impresora: texto en cp850 + avance y corte"""
+        return self.texto_cartel_precio(producto, tiene_ofertas).encode('cp850', errors='replace') + CORTE_CARTEL
+
+    def _enviar_trabajo(self, hPrinter, nombre_documento, datos_bytes):
+        """Un documento RAW en la cola de la impresora (ya abierta)"""
+        win32print.StartDocPrinter(hPrinter, 1, (nombre_documento, None, "RAW"))
+        try:
+            win32print.StartPagePrinter(hPrinter)
+            win32print.WritePrinter(hPrinter, INICIALIZAR + datos_bytes)
+            win32print.EndPagePrinter(hPrinter)
+        finally:
+            win32print.EndDocPrinter(hPrinter)
+
     def imprimir_cartel_precio(self, producto, tiene_ofertas=False):
         """Imprimir cartel de precio individual para producto"""
         try:
@@ -610,80 +684,15 @@ ESTADO: FUNCIONANDO CORRECTAMENTE
             
             print(f"🏷️ Imprimiendo cartel para: {producto.codigo}")
             
-            precio = float(producto.precio)
-            nombre_corto = producto.nombre[:30] if len(producto.nombre) > 30 else producto.nombre
-            
-            contenido = []
-            
-            # contenido.append("=" * self.ancho)  # ✅ COMENTADO
-            contenido.append(self.centrar_texto("PRECIO DE VENTA"))
-            # contenido.append("=" * self.ancho)  # ✅ COMENTADO
-            
-            if tiene_ofertas:
-                contenido.append("")
-                contenido.append("*" * self.ancho)
-                contenido.append(self.centrar_texto("¡OFERTA ESPECIAL!"))
-                contenido.append("*" * self.ancho)
-            
-            contenido.append("")
-            contenido.append(self.centrar_texto(nombre_corto))
-            
-            contenido.append("")
-            contenido.append("-" * self.ancho)
-            
-            precio_texto = f"$ {precio:.2f}"
-            ancho_precio = self.ancho // 2
-            espacios = (ancho_precio - len(precio_texto)) // 2
-            precio_centrado = " " * espacios + precio_texto
-            contenido.append("\x1B\x21\x30" + precio_centrado + "\x1B\x21\x00")
-            contenido.append("")
-                        
-            contenido.append("-" * self.ancho)
-            
-            # codigo_texto = f"Codigo: {producto.codigo}"
-            # contenido.append(self.centrar_texto(codigo_texto))
-            
-            if tiene_ofertas:
-                if producto.es_combo and hasattr(producto, 'calcular_ahorro_combo'):
-                    ahorro = producto.calcular_ahorro_combo()
-                    if ahorro > 0:
-                        contenido.append("")
-                        ahorro_texto = f"Ahorro: $ {ahorro:.2f}"
-                        contenido.append(self.centrar_texto(ahorro_texto))
-            
-            contenido.append("")
-            # contenido.append("=" * self.ancho)  # ✅ COMENTADO
-            
-            # fecha_hora = datetime.now().strftime("%d/%m/%Y %H:%M")
-            # contenido.append(self.centrar_texto(fecha_hora))
-            
-            # contenido.append("=" * self.ancho)  # ✅ COMENTADO
-            contenido.extend([""] * 3)
-            
-            texto_completo = "\n".join(contenido)
+            datos_bytes = self.cartel_escpos(producto, tiene_ofertas)
             
             print("📄 Enviando cartel a impresora...")
             
             hPrinter = win32print.OpenPrinter(self.nombre_impresora)
-            
             try:
-                hJob = win32print.StartDocPrinter(hPrinter, 1, (f"Cartel_{producto.codigo}", None, "RAW"))
-                
-                try:
-                    win32print.StartPagePrinter(hPrinter)
-                    
-                    init_cmd = b'\x1B\x40'
-                    datos_bytes = init_cmd + texto_completo.encode('cp850', errors='replace')
-                    datos_bytes += b'\n\n\x1B\x69'
-                    
-                    win32print.WritePrinter(hPrinter, datos_bytes)
-                    win32print.EndPagePrinter(hPrinter)
-                    
-                    print(f"✅ *** CARTEL IMPRESO: {producto.codigo} ***")
-                    return True
-                    
-                finally:
-                    win32print.EndDocPrinter(hPrinter)
+                self._enviar_trabajo(hPrinter, f"Cartel_{producto.codigo}", datos_bytes)
+                print(f"✅ *** CARTEL IMPRESO: {producto.codigo} ***")
+                return True
             finally:
                 win32print.ClosePrinter(hPrinter)
             
@@ -693,6 +702,56 @@ ESTADO: FUNCIONANDO CORRECTAMENTE
             traceback.print_exc()
             return False
 
+    def imprimir_carteles_lote(self, carteles, por_trabajo=None, progreso=None):
+        """
+        Imprimir muchos carteles abriendo la impresora una sola vez.
+
+        carteles: lista de (producto_id, bytes de cartel_escpos()).
+        Todos van en un único documento RAW, o en documentos de 'por_trabajo'
+        carteles cada uno para no mandar al spooler un trabajo gigante.
+        progreso(impresos, total) se llama al terminar cada documento.
+
+        Devuelve (ids impresos, error o None): si un documento falla se
+        detiene ahí y los anteriores quedan impresos.
+        """
+        total = len(carteles)
+        if not self.nombre_impresora:
+            return [], "Impresora no disponible para carteles"
+        if not carteles:
+            return [], None
+        
+        por_trabajo = por_trabajo or total
+        partes = (total + por_trabajo - 1) // por_trabajo
+        fecha = datetime.now().strftime("%Y%m%d_%H%M%S")
+        impresos = []
+        
+        print(f"🏷️ Imprimiendo {total} carteles en {partes} trabajo(s)")
+        
+        try:
+            hPrinter = win32print.OpenPrinter(self.nombre_impresora)
+        except Exception as e:
+            print(f"❌ Error abriendo impresora para carteles: {e}")
+            return [], str(e)
+        
+        try:
+            for numero, inicio in enumerate(range(0, total, por_trabajo), start=1):
+                parte = carteles[inicio:inicio + por_trabajo]
+                nombre = f"Carteles_{fecha}_{numero}de{partes}" if partes > 1 else f"Carteles_{fecha}"
+                try:
+                    self._enviar_trabajo(hPrinter, nombre, b''.join(datos for _, datos in parte))
+                except Exception as e:
+                    print(f"❌ Error en trabajo de carteles {numero}/{partes}: {e}")
+                    return impresos, str(e)
+                
+                impresos.extend(producto_id for producto_id, _ in parte)
+                print(f"✅ Trabajo de carteles {numero}/{partes}: {len(impresos)}/{total}")
+                if progreso:
+                    progreso(len(impresos), total)
+        finally:
+            win32print.ClosePrinter(hPrinter)
+        
+        return impresos, None
+
 
 # ============================================
 # AQUÍ TERMINA LA CLASE - TODO LO DE ABAJO VA SIN INDENTACIÓN
@@ -772,4 +831,56 @@ def imprimir_factura_termica(datos_factura):
         return {
             'success': False,
             'error': str(e)
-        }
\ No newline at end of file
+        }
+
+
+# *** CARTELES EN LOTE (trabajo en segundo plano con progreso) ***
+_trabajos_carteles = {}
+_lock_carteles = threading.Lock()
+_ids_trabajos = itertools.count(1)
+TRABAJOS_CARTELES_GUARDADOS = 20
+
+def lanzar_carteles_lote(carteles, por_trabajo=None, al_terminar=None):
+    """
+    Imprime los carteles en un hilo y devuelve el id del trabajo.
+
+    carteles: lista de (producto_id, bytes de cartel_escpos()) ya generados
+    en el request (el hilo no toca la base de datos).
+    al_terminar(ids_impresos) se llama desde el hilo al finalizar.
+    """
+    trabajo_id = next(_ids_trabajos)
+    estado = {'id': trabajo_id, 'estado': 'imprimiendo', 'total': len(carteles),
+              'impresos': 0, 'error': None, 'inicio': datetime.now().isoformat()}
+    with _lock_carteles:
+        _trabajos_carteles[trabajo_id] = estado
+        for viejo in sorted(_trabajos_carteles)[:-TRABAJOS_CARTELES_GUARDADOS]:
+            if _trabajos_carteles[viejo]['estado'] != 'imprimiendo':
+                del _trabajos_carteles[viejo]
+
+    def progreso(impresos, total):
+        estado['impresos'] = impresos
+
+    def ejecutar():
+        ids, error = [], None
+        try:
+            ids, error = impresora_termica.imprimir_carteles_lote(carteles, por_trabajo, progreso)
+        except Exception as e:
+            logger.error(f"Error en trabajo de carteles {trabajo_id}: {e}")
+            error = str(e)
+        estado['impresos'] = len(ids)
+        estado['error'] = error
+        estado['estado'] = 'error' if error else 'terminado'
+        if al_terminar and ids:
+            try:
+                al_terminar(ids)
+            except Exception as e:
+                logger.error(f"Error cerrando trabajo de carteles {trabajo_id}: {e}")
+
+    threading.Thread(target=ejecutar, name=f'carteles-{trabajo_id}', daemon=True).start()
+    return trabajo_id
+
+def estado_carteles_lote(trabajo_id):
+    """Copia del estado del trabajo (o None si no existe)"""
+    with _lock_carteles:
+        estado = _trabajos_carteles.get(trabajo_id)
+        return dict(estado) if estado else None
@@ -0,0 +1,138 @@
+# migration_combo_componente.py - Componentes de combos en tabla propia (combo_componente)
+#
+# Pasa los combos de las columnas fijas producto_base_id / _2 / _3 (con
+# cantidad_combo / _2 / _3) a una fila por componente en combo_componente.
+# Las columnas quedan como espejo de los 3 primeros componentes.
+#
+# Se puede correr más de una vez: sólo migra los combos que todavía no
+# tienen componentes cargados.
+
+from sqlalchemy import text
+import sys
+import os
+
+
+def crear_tabla_combo_componente():
+    """Crear la tabla combo_componente si no existe"""
+
+    sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+    from app import app, db
+
+    with app.app_context():
+        try:
+            print("🏗️ Creando tabla combo_componente...")
+
+            db.session.execute(text("""
+                CREATE TABLE IF NOT EXISTS combo_componente (
+                    id INT AUTO_INCREMENT PRIMARY KEY,
+                    combo_id INT NOT NULL,
+                    producto_id INT NOT NULL,
+                    cantidad DECIMAL(8,3) NOT NULL DEFAULT 1.000,
+                    orden INT DEFAULT 0,
+                    UNIQUE KEY uq_combo_componente (combo_id, producto_id),
+                    KEY idx_combo_componente_producto (producto_id),
+                    FOREIGN KEY (combo_id) REFERENCES producto(id) ON DELETE CASCADE,
+                    FOREIGN KEY (producto_id) REFERENCES producto(id)
+                )
+            """))
+            db.session.commit()
+
+            print("✅ Tabla combo_componente lista")
+            return True
+
+        except Exception as e:
+            print(f"❌ Error creando tabla: {e}")
+            db.session.rollback()
+            return False
+
+
+def migrar_componentes_desde_columnas():
+    """Copiar los componentes de las 3 columnas fijas a combo_componente"""
+
+    sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+    from app import app, db
+    from stock_combos import recalcular_stock_disponible
+    from catalogo_cache import invalidar_catalogo
+
+    with app.app_context():
+        try:
+            print("🔄 Migrando componentes de combos...")
+
+            # Una fila por (combo, base); si una base se repite en dos columnas se suman
+            result = db.session.execute(text("""
+                INSERT INTO combo_componente (combo_id, producto_id, cantidad, orden)
+                SELECT t.combo_id, t.producto_id, SUM(t.cantidad), MIN(t.orden)
+                FROM (
+                    SELECT id AS combo_id, producto_base_id AS producto_id,
+                           cantidad_combo AS cantidad, 1 AS orden
+                    FROM producto
+                    WHERE es_combo = 1 AND producto_base_id IS NOT NULL AND cantidad_combo > 0
+                    UNION ALL
+                    SELECT id, producto_base_2_id, cantidad_combo_2, 2
+                    FROM producto
+                    WHERE es_combo = 1 AND producto_base_2_id IS NOT NULL AND cantidad_combo_2 > 0
+                    UNION ALL
+                    SELECT id, producto_base_3_id, cantidad_combo_3, 3
+                    FROM producto
+                    WHERE es_combo = 1 AND producto_base_3_id IS NOT NULL AND cantidad_combo_3 > 0
+                ) t
+                WHERE t.combo_id NOT IN (SELECT DISTINCT combo_id FROM combo_componente)
+                GROUP BY t.combo_id, t.producto_id
+            """))
+            print(f"➕ {result.rowcount} componentes migrados")
+
+            actualizados = recalcular_stock_disponible(db)
+            db.session.commit()
+            invalidar_catalogo()
+
+            print(f"✅ Stock disponible recalculado para {actualizados} combos")
+            return True
+
+        except Exception as e:
+            print(f"❌ Error migrando componentes: {e}")
+            db.session.rollback()
+            return False
+
+
+def verificar_combos_sin_componentes():
+    """Listar combos activos que quedaron sin componentes"""
+
+    sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+    from app import app, db
+
+    with app.app_context():
+        try:
+            sin_componentes = db.session.execute(text("""
+                SELECT p.id, p.codigo, p.nombre
+                FROM producto p
+                LEFT JOIN combo_componente cc ON cc.combo_id = p.id
+                WHERE p.es_combo = 1 AND p.activo = 1 AND cc.id IS NULL
+            """)).fetchall()
+
+            if not sin_componentes:
+                print("✅ Todos los combos activos tienen componentes")
+            for combo in sin_componentes:
+                print(f"⚠️ Combo sin componentes: {combo.codigo} - {combo.nombre}")
+            return True
+
+        except Exception as e:
+            print(f"❌ Error verificando combos: {e}")
+            return False
+
+
+if __name__ == "__main__":
+    print("🚀 Migración de componentes de combos")
+    print("=" * 40)
+
+    print("\n1. Creando tabla...")
+    if not crear_tabla_combo_componente():
+        sys.exit(1)
+
+    print("\n2. Migrando componentes...")
+    if not migrar_componentes_desde_columnas():
+        sys.exit(1)
+
+    print("\n3. Verificación final...")
+    verificar_combos_sin_componentes()
+
+    print("\n✅ Migración completada")
@@ -0,0 +1,87 @@
+# migration_stock_disponible_combos.py - Stock materializado de combos (producto.stock_disponible)
+#
+# Uso:
+#   python migration_stock_disponible_combos.py                 agrega la columna y recalcula
+#   python migration_stock_disponible_combos.py --recalcular    sólo recalcula (reconstrucción)
+
+from sqlalchemy import text
+import sys
+import os
+
+
+def agregar_columna_stock_disponible():
+    """Agregar columna producto.stock_disponible si no existe"""
+
+    sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+    from app import app, db
+
+    with app.app_context():
+        try:
+            print("🔄 Verificando columna producto.stock_disponible...")
+
+            result = db.session.execute(text("""
+                SELECT COUNT(*) as count
+                FROM INFORMATION_SCHEMA.COLUMNS
+                WHERE TABLE_NAME = 'producto'
+                AND COLUMN_NAME = 'stock_disponible'
+                AND TABLE_SCHEMA = DATABASE()
+            """)).fetchone()
+
+            if result.count > 0:
+                print("✅ La columna stock_disponible ya existe")
+                return True
+
+            print("➕ Agregando columna stock_disponible...")
+            db.session.execute(text("""
+                ALTER TABLE producto
+                ADD COLUMN stock_disponible INT NOT NULL DEFAULT 0
+            """))
+            db.session.commit()
+
+            print("✅ Columna stock_disponible agregada")
+            return True
+
+        except Exception as e:
+            print(f"❌ Error agregando columna: {e}")
+            db.session.rollback()
+            return False
+
+
+def recalcular_todos_los_combos():
+    """Reconstruir stock_disponible de todos los combos desde el stock de sus bases"""
+
+    sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+    from app import app, db
+    from stock_combos import recalcular_stock_disponible
+    from catalogo_cache import invalidar_catalogo
+
+    with app.app_context():
+        try:
+            print("🔄 Recalculando stock disponible de combos...")
+            actualizados = recalcular_stock_disponible(db)
+            db.session.commit()
+            invalidar_catalogo()
+
+            print(f"✅ {actualizados} combos recalculados")
+            return True
+
+        except Exception as e:
+            print(f"❌ Error recalculando combos: {e}")
+            db.session.rollback()
+            return False
+
+
+if __name__ == "__main__":
+    print("🚀 Migración de stock disponible de combos")
+    print("=" * 40)
+
+    if '--recalcular' not in sys.argv:
+        print("\n1. Agregando columna...")
+        if not agregar_columna_stock_disponible():
+            sys.exit(1)
+
+    print("\n2. Recalculando combos...")
+    if not recalcular_todos_los_combos():
+        sys.exit(1)
+
+    print("\n✅ Migración completada")
@@ -8,6 +8,10 @@ from functools import wraps
 from datetime import datetime
 from decimal import Decimal
 from sqlalchemy import and_, or_, func
+from catalogo_cache import invalidar_catalogo
+from stock_combos import recalcular_stock_disponible
+from resumen_ventas import moviendo_factura
+from cache_reportes import cache_reporte, invalidar_reportes
 
 # Blueprint para las rutas de NC
 notas_credito_bp = Blueprint('notas_credito', __name__)
@@ -231,6 +235,7 @@ def api_detalle_nota_credito(nc_id):
 
 @notas_credito_bp.route('/api/notas_credito/estadisticas', methods=['GET'])
 @login_required
+@cache_reporte(hasta='fecha_hasta')
 def api_estadisticas_notas_credito():
     """API para obtener estadísticas de notas de crédito"""
     try:
@@ -439,11 +444,15 @@ def emitir_nota_credito(factura_id):
                     })
                     print(f"   📦 {producto.codigo}: {stock_anterior} → {producto.stock} (+{item.cantidad})")
             
-            # Marcar factura como anulada
-            factura.estado = 'anulada'
+            # Marcar factura como anulada (también en los resúmenes de ventas)
+            with moviendo_factura(factura.id):
+                factura.estado = 'anulada'
             
-            # Guardar TODO
+            # Guardar TODO (con el stock de los combos afectados)
+            recalcular_stock_disponible(db, bases=[item.producto_id for item in items_factura])
             db.session.commit()
+            invalidar_catalogo(ids=[item.producto_id for item in items_factura])
+            invalidar_reportes(factura.fecha)
             
             print(f"✅ Stock reintegrado: {len(productos_reintegrados)} productos")
             print(f"✅ Factura {factura.numero} anulada")
@@ -11,6 +11,7 @@ from flask import Blueprint, jsonify, request, session, render_template, redirec
 from sqlalchemy import text, and_, or_
 from datetime import datetime
 from decimal import Decimal
+from versiones import get_condicional
 
 # Blueprint para las rutas de pedidos
 pedidos_bp = Blueprint('pedidos', __name__)
@@ -110,6 +111,7 @@ def obtener_productos_catalogo(lista_precio=1, buscar=None, categoria=None):
             {precio_campo} as precio,
             p.precio as precio_base,
             p.stock,
+            p.stock_disponible,
             p.iva,
             p.categoria,
             p.es_combo,
@@ -139,16 +141,11 @@ def obtener_productos_catalogo(lista_precio=1, buscar=None, categoria=None):
     
     productos = []
     for row in result:
-        # Calcular stock dinámico para combos
+        # Combos: stock materializado según sus productos base
         stock = float(row.stock) if row.stock else 0
         
         if row.es_combo:
-            # Para combos, calcular stock basado en productos base
-            stock = calcular_stock_combo(
-                row.producto_base_id, row.cantidad_combo,
-                row.producto_base_2_id, row.cantidad_combo_2,
-                row.producto_base_3_id, row.cantidad_combo_3
-            )
+            stock = int(row.stock_disponible or 0)
         
         productos.append({
             'id': row.id,
@@ -166,35 +163,6 @@ def obtener_productos_catalogo(lista_precio=1, buscar=None, categoria=None):
     return productos
 
 
-def calcular_stock_combo(base_id_1, cant_1, base_id_2, cant_2, base_id_3, cant_3):
-    """Calcula stock disponible de un combo basado en productos base"""
-    stocks_disponibles = []
-    
-    if base_id_1 and cant_1:
-        query = "SELECT stock FROM producto WHERE id = :id"
-        result = ejecutar_query(query, {'id': base_id_1})
-        row = result.fetchone()
-        if row and row.stock:
-            stock_posible = int(float(row.stock) / float(cant_1))
-            stocks_disponibles.append(stock_posible)
-    
-    if base_id_2 and cant_2:
-        result = ejecutar_query(query, {'id': base_id_2})
-        row = result.fetchone()
-        if row and row.stock:
-            stock_posible = int(float(row.stock) / float(cant_2))
-            stocks_disponibles.append(stock_posible)
-    
-    if base_id_3 and cant_3:
-        result = ejecutar_query(query, {'id': base_id_3})
-        row = result.fetchone()
-        if row and row.stock:
-            stock_posible = int(float(row.stock) / float(cant_3))
-            stocks_disponibles.append(stock_posible)
-    
-    return min(stocks_disponibles) if stocks_disponibles else 0
-
-
 def obtener_categorias():
     """Obtiene lista de categorías únicas"""
     query = """
@@ -283,6 +251,8 @@ def api_cliente_actual():
 
 
 @pedidos_bp.route('/api/pedidos/catalogo')
+@get_condicional('catalogo', requiere_sesion=None,
+                 variante=lambda: session.get('pedidos_lista_precio', 1))
 def api_catalogo():
     """Obtiene catálogo de productos"""
     try:
@@ -0,0 +1,411 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+precios_programados.py - CAMBIOS DE PRECIO CON FECHA DE VIGENCIA
+═══════════════════════════════════════════════════════════════════════════════
+Los aumentos se cargan antes (la noche anterior, o con el local cerrado) y
+entran en vigencia solos a la hora indicada, sin repreciar con las cajas
+vendiendo:
+
+    precio_programado   una fila por producto y lista (1-5) con el precio
+                        nuevo, opcionalmente margen y costo, y vigente_desde
+    cartel_pendiente    productos cuyo precio de lista 1 cambió y necesitan
+                        cartel nuevo (se limpia al imprimirlo)
+
+Mientras un cambio está pendiente no toca la tabla producto: cargar miles
+de precios no compite con las ventas. Un hilo revisa cada
+PRECIOS_PROGRAMADOS_INTERVALO segundos y aplica lo vencido en UNA
+transacción, con un UPDATE por conjuntos por lista:
+
+    1. SELECT ... FOR UPDATE de lo vencido (otro proceso que llegue a la
+       vez espera y después no encuentra nada pendiente)
+    2. Por producto y lista gana la programación más reciente; las
+       anteriores quedan 'reemplazado'
+    3. UPDATE producto JOIN precio_programado, lista por lista
+    4. cartel_pendiente para los que cambiaron en lista 1
+    5. commit + invalidar_catalogo() (avanza la versión del catálogo)
+
+    GET  /api/precios_programados              pendientes agrupados por fecha
+    POST /api/precios_programados              programa precios explícitos
+    POST /api/precios_programados/cancelar     cancela una fecha o ids
+    POST /api/precios_programados/aplicar      aplica ya lo vencido
+    GET  /api/carteles_pendientes              ids a reimprimir
+
+La actualización masiva (actualizacion_precios.py) también puede programar
+en vez de aplicar: /api/precios_masivos/programar.
+═══════════════════════════════════════════════════════════════════════════════
+"""
+
+from flask import Blueprint, jsonify, request, session
+from sqlalchemy import text, bindparam
+from datetime import datetime
+import threading
+import time
+
+import catalogo_cache
+from catalogo_cache import invalidar_catalogo
+
+# Blueprint para las rutas de precios programados
+precios_programados_bp = Blueprint('precios_programados', __name__)
+
+# Variables globales (se inicializan en init_precios_programados)
+db = None
+_app = None
+
+INTERVALO = 30              # segundos entre revisiones de lo vencido
+LISTAS = (1, 2, 3, 4, 5)
+MARGEN_MAXIMO = 999.99
+
+
+def init_precios_programados(app, database):
+    """
+    Inicializa los precios programados y arranca el hilo que los aplica
+
+    Uso en app.py:
+        from precios_programados import init_precios_programados
+        init_precios_programados(app, db)
+
+    Config:
+        PRECIOS_PROGRAMADOS_INTERVALO   segundos entre revisiones (30)
+        PRECIOS_PROGRAMADOS_AUTOMATICO  False para no arrancar el hilo
+                                        (p.ej. en procesos de consola)
+    """
+    global db, _app, INTERVALO
+    db = database
+    _app = app
+    INTERVALO = app.config.get('PRECIOS_PROGRAMADOS_INTERVALO', INTERVALO)
+    app.register_blueprint(precios_programados_bp)
+
+    if app.config.get('PRECIOS_PROGRAMADOS_AUTOMATICO', True):
+        threading.Thread(target=_programador, name='precios-programados', daemon=True).start()
+    print(f"✅ Precios programados inicializados (revisión cada {INTERVALO}s)")
+
+
+_tablas_verificadas = False
+
+
+def asegurar_tablas_precios_programados():
+    """Crea precio_programado / cartel_pendiente si no existen (una vez por proceso)"""
+    global _tablas_verificadas
+    if _tablas_verificadas:
+        return
+    with db.engine.begin() as conn:
+        conn.execute(text("""
+            CREATE TABLE IF NOT EXISTS precio_programado (
+                id BIGINT NOT NULL AUTO_INCREMENT,
+                producto_id INT NOT NULL,
+                lista TINYINT NOT NULL,
+                precio DECIMAL(10,2) NOT NULL,
+                margen DECIMAL(5,2) NULL,
+                costo DECIMAL(10,2) NULL,
+                vigente_desde DATETIME NOT NULL,
+                estado VARCHAR(20) NOT NULL DEFAULT 'pendiente',
+                usuario_id INT NULL,
+                fecha_creacion DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+                fecha_aplicacion DATETIME NULL,
+                PRIMARY KEY (id),
+                KEY idx_estado_vigencia (estado, vigente_desde),
+                KEY idx_producto (producto_id)
+            ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
+        """))
+        conn.execute(text("""
+            CREATE TABLE IF NOT EXISTS cartel_pendiente (
+                producto_id INT NOT NULL,
+                motivo VARCHAR(30) NOT NULL,
+                fecha DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+                PRIMARY KEY (producto_id)
+            ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
+        """))
+    _tablas_verificadas = True
+
+
+def _columnas(lista):
+    """(columna de margen, columna de precio) de una lista"""
+    return ('margen', 'precio') if lista == 1 else (f'margen{lista}', f'precio{lista}')
+
+
+def _expandir(sql, *nombres):
+    consulta = text(sql)
+    for nombre in nombres:
+        consulta = consulta.bindparams(bindparam(nombre, expanding=True))
+    return consulta
+
+
+def leer_vigencia(valor):
+    """'2025-03-01T08:00' / '2025-03-01 08:00:00' → datetime (ValueError si no es válida)"""
+    valor = str(valor or '').strip().replace('T', ' ')
+    for formato in ('%Y-%m-%d %H:%M:%S', '%Y-%m-%d %H:%M', '%Y-%m-%d'):
+        try:
+            return datetime.strptime(valor, formato)
+        except ValueError:
+            continue
+    raise ValueError('Fecha de vigencia inválida')
+
+
+def marcar_carteles(ids, motivo):
+    """Marca productos para reimprimir su cartel (dentro de la transacción actual)"""
+    if not ids:
+        return
+    asegurar_tablas_precios_programados()
+    db.session.execute(text("""
+        INSERT INTO cartel_pendiente (producto_id, motivo, fecha)
+        VALUES (:producto_id, :motivo, NOW())
+        ON DUPLICATE KEY UPDATE motivo = VALUES(motivo), fecha = VALUES(fecha)
+    """), [{'producto_id': producto_id, 'motivo': motivo} for producto_id in ids])
+
+
+def limpiar_carteles(ids):
+    """Quita la marca de reimpresión (después de imprimir los carteles)"""
+    if not ids:
+        return
+    asegurar_tablas_precios_programados()
+    db.session.execute(_expandir(
+        "DELETE FROM cartel_pendiente WHERE producto_id IN :ids", 'ids'
+    ), {'ids': list(ids)})
+
+
+# ═══════════════════════════════════════════════════════════════════════════════
+# APLICACIÓN
+# ═══════════════════════════════════════════════════════════════════════════════
+
+def aplicar_vencidos():
+    """
+    Aplica todo lo programado con vigente_desde <= ahora en una transacción.
+
+    Returns:
+        dict con cambios (filas aplicadas), reemplazados y productos
+    """
+    asegurar_tablas_precios_programados()
+    ahora = datetime.now()
+
+    vencidos = db.session.execute(text("""
+        SELECT id, producto_id, lista FROM precio_programado
+        WHERE estado = 'pendiente' AND vigente_desde <= :ahora
+        ORDER BY vigente_desde, id
+        FOR UPDATE
+    """), {'ahora': ahora}).fetchall()
+    if not vencidos:
+        db.session.rollback()
+        return {'cambios': 0, 'reemplazados': 0, 'productos': 0}
+
+    # La última programación de cada producto y lista pisa a las anteriores
+    ganadores = {(row.producto_id, row.lista): row.id for row in vencidos}
+    ids_ganadores = list(ganadores.values())
+    ids_vencidos = [row.id for row in vencidos]
+    productos = sorted({producto_id for producto_id, _ in ganadores})
+
+    for lista in {lista for _, lista in ganadores}:
+        columna_margen, columna_precio = _columnas(lista)
+        db.session.execute(_expandir(f"""
+            UPDATE producto p
+            JOIN precio_programado pp ON pp.producto_id = p.id
+            SET p.{columna_precio} = pp.precio,
+                p.{columna_margen} = COALESCE(pp.margen, CASE
+                    WHEN COALESCE(pp.costo, p.costo) > 0 THEN
+                        LEAST(GREATEST(ROUND((pp.precio / COALESCE(pp.costo, p.costo) - 1) * 100, 2), 0), {MARGEN_MAXIMO})
+                    ELSE p.{columna_margen} END),
+                p.fecha_modificacion = :ahora
+            WHERE pp.id IN :ids AND pp.lista = :lista
+        """, 'ids'), {'ids': ids_ganadores, 'lista': lista, 'ahora': ahora})
+
+    # El costo va al final: los márgenes de arriba ya usaron COALESCE(pp.costo, p.costo)
+    db.session.execute(_expandir("""
+        UPDATE producto p
+        JOIN precio_programado pp ON pp.producto_id = p.id
+        SET p.costo = pp.costo
+        WHERE pp.id IN :ids AND pp.costo IS NOT NULL
+    """, 'ids'), {'ids': ids_ganadores})
+
+    db.session.execute(_expandir("""
+        UPDATE precio_programado
+        SET estado = CASE WHEN id IN :ganadores THEN 'aplicado' ELSE 'reemplazado' END,
+            fecha_aplicacion = :ahora
+        WHERE id IN :vencidos
+    """, 'ganadores', 'vencidos'), {'ganadores': ids_ganadores, 'vencidos': ids_vencidos, 'ahora': ahora})
+
+    marcar_carteles([producto_id for producto_id, lista in ganadores if lista == 1], 'precio_programado')
+    db.session.commit()
+
+    if len(productos) > catalogo_cache.MAX_CAMBIOS_INCREMENTALES:
+        invalidar_catalogo()
+    else:
+        invalidar_catalogo(ids=productos)
+
+    return {'cambios': len(ids_ganadores), 'reemplazados': len(ids_vencidos) - len(ids_ganadores),
+            'productos': len(productos)}
+
+
+def _programador():
+    """Hilo: aplica lo vencido cada INTERVALO segundos"""
+    while True:
+        time.sleep(INTERVALO)
+        with _app.app_context():
+            try:
+                resultado = aplicar_vencidos()
+                if resultado['cambios']:
+                    print(f"🕒 Precios programados aplicados: {resultado['cambios']} cambios "
+                          f"en {resultado['productos']} productos")
+            except Exception as e:
+                db.session.rollback()
+                print(f"❌ Error aplicando precios programados: {e}")
+
+
+def programar_precios(cambios, vigente_desde, usuario_id=None):
+    """
+    Programa precios explícitos: [{producto_id o codigo, lista, precio, margen?, costo?}].
+    No hace commit. Devuelve la cantidad de filas programadas.
+    """
+    asegurar_tablas_precios_programados()
+    codigos = {str(c['codigo']).strip().upper() for c in cambios if not c.get('producto_id') and c.get('codigo')}
+    ids_por_codigo = {}
+    if codigos:
+        ids_por_codigo = {row.codigo.upper(): row.id for row in db.session.execute(_expandir(
+            "SELECT id, codigo FROM producto WHERE codigo IN :codigos", 'codigos'
+        ), {'codigos': list(codigos)})}
+
+    filas = []
+    for cambio in cambios:
+        producto_id = cambio.get('producto_id') or ids_por_codigo.get(str(cambio.get('codigo', '')).strip().upper())
+        if not producto_id:
+            raise ValueError(f"Producto no encontrado: {cambio.get('codigo') or cambio.get('producto_id')}")
+        lista = int(cambio.get('lista', 1))
+        if lista not in LISTAS:
+            raise ValueError('Las listas válidas son 1 a 5')
+        precio = round(float(cambio['precio']), 2)
+        if precio <= 0:
+            raise ValueError('El precio debe ser mayor a 0')
+        filas.append({
+            'producto_id': int(producto_id), 'lista': lista, 'precio': precio,
+            'margen': round(float(cambio['margen']), 2) if cambio.get('margen') not in (None, '') else None,
+            'costo': round(float(cambio['costo']), 2) if cambio.get('costo') not in (None, '') else None,
+            'vigente_desde': vigente_desde, 'usuario_id': usuario_id
+        })
+
+    if filas:
+        db.session.execute(text("""
+            INSERT INTO precio_programado (producto_id, lista, precio, margen, costo, vigente_desde, usuario_id)
+            VALUES (:producto_id, :lista, :precio, :margen, :costo, :vigente_desde, :usuario_id)
+        """), filas)
+    return len(filas)
+
+
+# ═══════════════════════════════════════════════════════════════════════════════
+# ENDPOINTS
+# ═══════════════════════════════════════════════════════════════════════════════
+
+@precios_programados_bp.route('/api/precios_programados')
+def api_precios_programados():
+    """Programaciones pendientes agrupadas por fecha de vigencia"""
+    if 'user_id' not in session:
+        return jsonify({'error': 'No autorizado'}), 401
+
+    try:
+        asegurar_tablas_precios_programados()
+        grupos = db.session.execute(text("""
+            SELECT vigente_desde, COUNT(*) AS cambios, COUNT(DISTINCT producto_id) AS productos,
+                   MIN(fecha_creacion) AS creado
+            FROM precio_programado
+            WHERE estado = 'pendiente'
+            GROUP BY vigente_desde
+            ORDER BY vigente_desde
+        """)).fetchall()
+        db.session.commit()
+        return jsonify({'success': True, 'programaciones': [{
+            'vigente_desde': g.vigente_desde.strftime('%Y-%m-%d %H:%M:%S'),
+            'cambios': g.cambios,
+            'productos': g.productos,
+            'creado': g.creado.strftime('%Y-%m-%d %H:%M:%S') if g.creado else None
+        } for g in grupos]})
+
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+
+@precios_programados_bp.route('/api/precios_programados', methods=['POST'])
+def api_programar_precios():
+    """Programa precios explícitos: {vigente_desde, cambios: [{producto_id|codigo, lista, precio}]}"""
+    if 'user_id' not in session:
+        return jsonify({'error': 'No autorizado'}), 401
+
+    try:
+        data = request.get_json() or {}
+        vigente_desde = leer_vigencia(data.get('vigente_desde'))
+        if vigente_desde <= datetime.now():
+            return jsonify({'success': False, 'error': 'La fecha de vigencia tiene que ser futura'}), 400
+        programados = programar_precios(data.get('cambios') or [], vigente_desde, session['user_id'])
+        db.session.commit()
+        return jsonify({'success': True, 'programados': programados,
+                        'vigente_desde': vigente_desde.strftime('%Y-%m-%d %H:%M:%S')})
+
+    except (KeyError, TypeError, ValueError) as e:
+        db.session.rollback()
+        return jsonify({'success': False, 'error': str(e)}), 400
+    except Exception as e:
+        db.session.rollback()
+        print(f"❌ Error programando precios: {e}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+
+@precios_programados_bp.route('/api/precios_programados/cancelar', methods=['POST'])
+def api_cancelar_precios_programados():
+    """Cancela lo pendiente de una fecha de vigencia ({vigente_desde}) o por ids"""
+    if 'user_id' not in session:
+        return jsonify({'error': 'No autorizado'}), 401
+
+    try:
+        data = request.get_json() or {}
+        asegurar_tablas_precios_programados()
+        if data.get('ids'):
+            cancelados = db.session.execute(_expandir("""
+                UPDATE precio_programado SET estado = 'cancelado'
+                WHERE estado = 'pendiente' AND id IN :ids
+            """, 'ids'), {'ids': [int(i) for i in data['ids']]}).rowcount
+        else:
+            cancelados = db.session.execute(text("""
+                UPDATE precio_programado SET estado = 'cancelado'
+                WHERE estado = 'pendiente' AND vigente_desde = :vigente_desde
+            """), {'vigente_desde': leer_vigencia(data.get('vigente_desde'))}).rowcount
+        db.session.commit()
+        return jsonify({'success': True, 'cancelados': cancelados})
+
+    except (TypeError, ValueError) as e:
+        db.session.rollback()
+        return jsonify({'success': False, 'error': str(e)}), 400
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+
+@precios_programados_bp.route('/api/precios_programados/aplicar', methods=['POST'])
+def api_aplicar_precios_programados():
+    """Aplica ahora lo que ya está vencido (sin esperar al hilo)"""
+    if 'user_id' not in session:
+        return jsonify({'error': 'No autorizado'}), 401
+
+    try:
+        return jsonify({'success': True, **aplicar_vencidos()})
+
+    except Exception as e:
+        db.session.rollback()
+        print(f"❌ Error aplicando precios programados: {e}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+
+@precios_programados_bp.route('/api/carteles_pendientes')
+def api_carteles_pendientes():
+    """Productos con cartel desactualizado"""
+    if 'user_id' not in session:
+        return jsonify({'error': 'No autorizado'}), 401
+
+    try:
+        asegurar_tablas_precios_programados()
+        filas = db.session.execute(text(
+            "SELECT producto_id, motivo, fecha FROM cartel_pendiente ORDER BY fecha"
+        )).fetchall()
+        db.session.commit()
+        return jsonify({'success': True, 'productos_ids': [f.producto_id for f in filas], 'total': len(filas)})
+
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'success': False, 'error': str(e)}), 500
@@ -0,0 +1,512 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+prueba_carga_ventas.py - PRUEBA DE CARGA CON VARIAS CAJAS SIMULTÁNEAS
+═══════════════════════════════════════════════════════════════════════════════
+Simula N cajeros vendiendo a la vez contra /procesar_venta con tickets
+realistas (productos base, combos de varios productos base, pesables, ofertas
+por volumen, varios medios de pago y ventas fiadas).
+
+Al terminar informa throughput, percentiles de latencia, tiempos por etapa
+(Server-Timing), esperas de lock / deadlocks de InnoDB y verifica que el
+stock final coincida con lo vendido.
+
+🚨 USAR SOLO CONTRA UNA BASE DE PRUEBA Y CON AFIP SIMULADO:
+
+    set AFIP_SIMULADO=1
+    set AFIP_SIMULADO_LATENCIA_MS=150
+    python iniciar.py
+
+    python prueba_carga_ventas.py --cajeros 6 --ventas 40 --semilla 7
+═══════════════════════════════════════════════════════════════════════════════
+"""
+
+import argparse
+import math
+import random
+import sys
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime
+
+import requests
+from sqlalchemy import create_engine, text, bindparam
+
+
+MEDIOS_PAGO = ['efectivo', 'debito', 'credito', 'mercado_pago']
+
+
+# ═══════════════════════════════════════════════════════════════════════════════
+# CATÁLOGO DE PRUEBA
+# ═══════════════════════════════════════════════════════════════════════════════
+
+def cargar_catalogo(engine):
+    """Lee de la base los productos con los que se arman los tickets"""
+    with engine.connect() as conn:
+        productos = {}
+        for row in conn.execute(text("""
+            SELECT id, codigo, nombre, precio, stock, iva, es_combo, es_pesable
+            FROM producto
+            WHERE activo = 1 AND precio > 0
+        """)):
+            productos[row.id] = row
+
+        componentes = defaultdict(list)
+        for row in conn.execute(text("""
+            SELECT combo_id, producto_id, cantidad
+            FROM combo_componente
+            WHERE cantidad > 0
+            ORDER BY combo_id, orden, id
+        """)):
+            componentes[row.combo_id].append((row.producto_id, float(row.cantidad)))
+
+        ofertas = defaultdict(list)
+        for row in conn.execute(text("""
+            SELECT producto_id, cantidad_minima, precio_oferta
+            FROM ofertas_volumen
+            WHERE activo = 1
+            ORDER BY producto_id, cantidad_minima
+        """)):
+            if row.producto_id in productos:
+                ofertas[row.producto_id].append((float(row.cantidad_minima), float(row.precio_oferta)))
+
+        clientes = [row.id for row in conn.execute(text(
+            "SELECT id FROM cliente WHERE id > 1 ORDER BY id LIMIT 50"
+        ))]
+
+    base = [p for p in productos.values() if not p.es_combo and not p.es_pesable]
+    pesables = [p for p in productos.values() if p.es_pesable and not p.es_combo]
+    combos = [p for p in productos.values() if p.es_combo and componentes.get(p.id)]
+    combos_multi = [p for p in combos if len(componentes[p.id]) > 1]
+    con_ofertas = [productos[pid] for pid in ofertas]
+
+    return {
+        'productos': productos,
+        'componentes': componentes,
+        'ofertas': ofertas,
+        'clientes': clientes,
+        'base': base,
+        'pesables': pesables,
+        'combos': combos,
+        'combos_multi': combos_multi,
+        'con_ofertas': con_ofertas
+    }
+
+
+def componentes_combo(catalogo, producto):
+    """[(producto_base_id, cantidad)] de un combo"""
+    return catalogo['componentes'].get(producto.id, [])
+
+
+def precio_para_cantidad(catalogo, producto, cantidad):
+    """Precio unitario con IVA aplicando la mejor oferta por volumen"""
+    precio = float(producto.precio)
+    for minimo, precio_oferta in catalogo['ofertas'].get(producto.id, []):
+        if cantidad >= minimo:
+            precio = precio_oferta
+    return precio
+
+
+# ═══════════════════════════════════════════════════════════════════════════════
+# GENERACIÓN DE TICKETS
+# ═══════════════════════════════════════════════════════════════════════════════
+
+def elegir_item(rnd, catalogo):
+    """Elige un producto y cantidad según la mezcla típica de un sábado"""
+    tirada = rnd.random()
+    if tirada < 0.15 and catalogo['pesables']:
+        producto = rnd.choice(catalogo['pesables'])
+        cantidad = round(rnd.uniform(0.2, 2.5), 3)
+    elif tirada < 0.25 and catalogo['combos_multi']:
+        producto = rnd.choice(catalogo['combos_multi'])
+        cantidad = 1
+    elif tirada < 0.35 and catalogo['combos']:
+        producto = rnd.choice(catalogo['combos'])
+        cantidad = rnd.choice([1, 1, 2])
+    elif tirada < 0.50 and catalogo['con_ofertas']:
+        producto = rnd.choice(catalogo['con_ofertas'])
+        escalones = catalogo['ofertas'][producto.id]
+        minimo = rnd.choice(escalones)[0]
+        cantidad = max(1, int(minimo)) + rnd.choice([0, 0, 1])
+        if producto.es_pesable:
+            cantidad = round(minimo + rnd.uniform(0, 1), 3)
+    else:
+        producto = rnd.choice(catalogo['base'])
+        cantidad = rnd.choice([1, 1, 1, 2, 2, 3, 6])
+    return producto, cantidad
+
+
+def generar_ticket(rnd, catalogo, tipo_comprobante, proporcion_fiadas):
+    """Arma el JSON que envía nueva_venta.html a /procesar_venta"""
+    items = []
+    items_detalle = []
+    subtotal_total = 0.0
+    iva_total = 0.0
+
+    for _ in range(rnd.randint(1, 8)):
+        producto, cantidad = elegir_item(rnd, catalogo)
+        iva = float(producto.iva or 21)
+        precio_con_iva = precio_para_cantidad(catalogo, producto, cantidad)
+        precio_sin_iva = round(precio_con_iva / (1 + iva / 100), 2)
+        subtotal = round(precio_sin_iva * cantidad, 2)
+        importe_iva = round(subtotal * iva / 100, 2)
+
+        items.append({
+            'producto_id': producto.id,
+            'cantidad': cantidad,
+            'precio_unitario': precio_sin_iva,
+            'subtotal': subtotal,
+            'es_cta_cte': False
+        })
+        items_detalle.append({
+            'producto_id': producto.id,
+            'codigo': producto.codigo,
+            'nombre': producto.nombre,
+            'cantidad': cantidad,
+            'precio_unitario': precio_sin_iva,
+            'subtotal': subtotal,
+            'iva_porcentaje': iva,
+            'iva_importe': importe_iva
+        })
+        subtotal_total += subtotal
+        iva_total += importe_iva
+
+    total = round(subtotal_total + iva_total, 2)
+    cliente_id = 1
+    es_fiada = bool(catalogo['clientes']) and rnd.random() < proporcion_fiadas
+
+    if es_fiada:
+        cliente_id = rnd.choice(catalogo['clientes'])
+        medios = [{'medio_pago': 'CTA.CTE', 'importe': total}]
+    else:
+        tirada = rnd.random()
+        if tirada < 0.45:
+            # Efectivo redondeado hacia arriba (con vuelto)
+            medios = [{'medio_pago': 'efectivo', 'importe': float(int(total / 100 + 1) * 100)}]
+        elif tirada < 0.80:
+            medios = [{'medio_pago': rnd.choice(MEDIOS_PAGO[1:]), 'importe': total}]
+        else:
+            # Pago dividido
+            parte = round(total * rnd.uniform(0.2, 0.8), 2)
+            medios = [
+                {'medio_pago': 'efectivo', 'importe': parte},
+                {'medio_pago': rnd.choice(MEDIOS_PAGO[1:]), 'importe': round(total - parte, 2)}
+            ]
+
+    return {
+        'cliente_id': cliente_id,
+        'saldo_anterior': 0,
+        'tipo_comprobante': tipo_comprobante,
+        'items': items,
+        'items_detalle': items_detalle,
+        'subtotal': round(subtotal_total, 2),
+        'iva': round(iva_total, 2),
+        'descuento_porcentaje': 0,
+        'descuento_monto': 0,
+        'total': total,
+        'medios_pago': medios,
+        'imprimir_automatico': False,
+        'productos_cta_cte_ids': []
+    }
+
+
+# ═══════════════════════════════════════════════════════════════════════════════
+# CAJEROS
+# ═══════════════════════════════════════════════════════════════════════════════
+
+class ResultadosCarga:
+    """Resultados compartidos entre hilos"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencias = []
+        self.etapas = defaultdict(list)
+        self.errores = defaultdict(int)
+        self.ok = 0
+        self.fiadas = 0
+        self.facturas = []
+        self.descuentos_esperados = defaultdict(float)
+
+    def registrar_ok(self, latencia_ms, ticket, respuesta, catalogo):
+        with self.lock:
+            self.ok += 1
+            self.latencias.append(latencia_ms)
+            for etapa, ms in (respuesta.get('tiempos') or {}).items():
+                self.etapas[etapa].append(ms)
+            if respuesta.get('es_venta_fiada'):
+                self.fiadas += 1
+            elif respuesta.get('factura_id'):
+                self.facturas.append((respuesta['factura_id'], len(ticket['items'])))
+
+            # Stock que debería haberse descontado
+            for item in ticket['items']:
+                producto = catalogo['productos'][item['producto_id']]
+                if producto.es_combo:
+                    for base_id, cantidad in componentes_combo(catalogo, producto):
+                        self.descuentos_esperados[base_id] += cantidad * float(item['cantidad'])
+                else:
+                    self.descuentos_esperados[producto.id] += float(item['cantidad'])
+
+    def registrar_error(self, latencia_ms, motivo):
+        with self.lock:
+            self.latencias.append(latencia_ms)
+            self.errores[motivo] += 1
+
+
+def iniciar_sesion(url, usuario, password):
+    http = requests.Session()
+    respuesta = http.post(f"{url}/login", data={'username': usuario, 'password': password},
+                          allow_redirects=False, timeout=30)
+    if respuesta.status_code not in (302, 303) or 'login' in respuesta.headers.get('Location', ''):
+        raise RuntimeError(f"No se pudo iniciar sesión como {usuario}")
+    return http
+
+
+def cajero(numero, http, url, tickets, resultados, catalogo, pausa_ms, barrera):
+    barrera.wait()
+    for ticket in tickets:
+        inicio = time.perf_counter()
+        try:
+            respuesta = http.post(f"{url}/procesar_venta", json=ticket, timeout=120)
+            latencia = (time.perf_counter() - inicio) * 1000
+            datos = respuesta.json() if respuesta.headers.get('Content-Type', '').startswith('application/json') else {}
+            if respuesta.status_code == 200 and datos.get('success'):
+                resultados.registrar_ok(latencia, ticket, datos, catalogo)
+            else:
+                error = str(datos.get('error') or f"HTTP {respuesta.status_code}")
+                if 'deadlock' in error.lower() or '1213' in error:
+                    motivo = 'deadlock'
+                elif 'lock wait' in error.lower() or '1205' in error:
+                    motivo = 'lock_wait_timeout'
+                else:
+                    motivo = error[:80]
+                resultados.registrar_error(latencia, motivo)
+        except requests.RequestException as e:
+            resultados.registrar_error((time.perf_counter() - inicio) * 1000, f"red: {type(e).__name__}")
+
+        if pausa_ms:
+            time.sleep(pausa_ms / 1000)
+
+
+# ═══════════════════════════════════════════════════════════════════════════════
+# MÉTRICAS DE INNODB Y CONSISTENCIA
+# ═══════════════════════════════════════════════════════════════════════════════
+
+def estado_innodb(engine):
+    """Contadores globales de locks (MySQL / MariaDB)"""
+    valores = {}
+    with engine.connect() as conn:
+        for nombre, valor in conn.execute(text(
+            "SHOW GLOBAL STATUS WHERE Variable_name IN "
+            "('Innodb_row_lock_waits', 'Innodb_row_lock_time', "
+            "'Innodb_row_lock_time_max', 'Innodb_deadlocks')"
+        )):
+            try:
+                valores[nombre] = int(valor)
+            except (TypeError, ValueError):
+                pass
+    return valores
+
+
+def stock_actual(engine, ids):
+    if not ids:
+        return {}
+    with engine.connect() as conn:
+        filas = conn.execute(
+            text("SELECT id, stock FROM producto WHERE id IN :ids").bindparams(
+                bindparam('ids', expanding=True)),
+            {'ids': list(ids)}
+        )
+        return {row.id: float(row.stock or 0) for row in filas}
+
+
+def verificar_consistencia(engine, stock_inicial, resultados, inicio_prueba):
+    """Compara stock final, detalle de facturas y auditoría contra lo vendido"""
+    problemas = []
+
+    stock_final = stock_actual(engine, stock_inicial.keys())
+    for producto_id, esperado in resultados.descuentos_esperados.items():
+        real = stock_inicial.get(producto_id, 0) - stock_final.get(producto_id, 0)
+        if abs(real - esperado) > 0.001:
+            problemas.append(f"Stock producto {producto_id}: se descontó {real:.3f}, esperado {esperado:.3f}")
+
+    with engine.connect() as conn:
+        # Cada factura debe tener todos sus renglones
+        for factura_id, renglones in resultados.facturas:
+            cantidad = conn.execute(text(
+                "SELECT COUNT(*) FROM detalle_factura WHERE factura_id = :id"
+            ), {'id': factura_id}).scalar()
+            if cantidad != renglones:
+                problemas.append(f"Factura {factura_id}: {cantidad} renglones, esperados {renglones}")
+
+        # Números de comprobante repetidos
+        for row in conn.execute(text("""
+            SELECT numero, COUNT(*) AS veces FROM factura
+            WHERE fecha >= :inicio GROUP BY numero HAVING COUNT(*) > 1
+        """), {'inicio': inicio_prueba}):
+            problemas.append(f"Número de factura duplicado: {row.numero} ({row.veces} veces)")
+
+        # La auditoría debe explicar el mismo descuento
+        auditado = defaultdict(float)
+        for row in conn.execute(text("""
+            SELECT producto_id, SUM(CASE WHEN signo = '-' THEN cantidad ELSE -cantidad END) AS total
+            FROM stock_movimiento
+            WHERE fecha >= :inicio AND tipo IN ('venta', 'combo', 'venta_fiada')
+            GROUP BY producto_id
+        """), {'inicio': inicio_prueba}):
+            auditado[row.producto_id] = float(row.total or 0)
+        for producto_id, esperado in resultados.descuentos_esperados.items():
+            if abs(auditado.get(producto_id, 0) - esperado) > 0.001:
+                problemas.append(f"Auditoría producto {producto_id}: {auditado.get(producto_id, 0):.3f}, esperado {esperado:.3f}")
+
+    return problemas
+
+
+# ═══════════════════════════════════════════════════════════════════════════════
+# REPORTE
+# ═══════════════════════════════════════════════════════════════════════════════
+
+def percentil(valores, p):
+    if not valores:
+        return 0.0
+    ordenados = sorted(valores)
+    # Rango más cercano: el menor valor con al menos p% de las muestras <= él
+    indice = max(0, min(len(ordenados) - 1, math.ceil(p * len(ordenados) / 100.0) - 1))
+    return ordenados[indice]
+
+
+def imprimir_reporte(args, resultados, duracion, innodb_antes, innodb_despues, problemas):
+    total = resultados.ok + sum(resultados.errores.values())
+    print()
+    print("=" * 70)
+    print(f"📊 RESULTADO PRUEBA DE CARGA - {args.cajeros} cajeros x {args.ventas} ventas (semilla {args.semilla})")
+    print("=" * 70)
+    print(f"   Ventas enviadas:   {total}")
+    print(f"   Ventas OK:         {resultados.ok} ({resultados.fiadas} fiadas)")
+    print(f"   Ventas con error:  {total - resultados.ok}")
+    print(f"   Duración:          {duracion:.1f} s")
+    print(f"   Throughput:        {resultados.ok / duracion if duracion else 0:.2f} ventas/s")
+
+    print("\n⏱️ Latencia /procesar_venta (ms):")
+    for p in (50, 90, 95, 99):
+        print(f"   p{p}: {percentil(resultados.latencias, p):8.1f}")
+    print(f"   max: {max(resultados.latencias) if resultados.latencias else 0:8.1f}")
+
+    if resultados.etapas:
+        print("\n🔬 Tiempos por etapa (Server-Timing, ms):")
+        print(f"   {'etapa':<16}{'p50':>10}{'p90':>10}{'p99':>10}{'max':>10}")
+        for etapa, valores in resultados.etapas.items():
+            print(f"   {etapa:<16}{percentil(valores, 50):>10.1f}{percentil(valores, 90):>10.1f}"
+                  f"{percentil(valores, 99):>10.1f}{max(valores):>10.1f}")
+
+    print("\n🔒 InnoDB (delta global durante la prueba):")
+    for clave in ('Innodb_row_lock_waits', 'Innodb_row_lock_time', 'Innodb_deadlocks'):
+        if clave in innodb_despues:
+            print(f"   {clave}: {innodb_despues[clave] - innodb_antes.get(clave, 0)}")
+    if 'Innodb_row_lock_time_max' in innodb_despues:
+        print(f"   Innodb_row_lock_time_max: {innodb_despues['Innodb_row_lock_time_max']} ms")
+
+    if resultados.errores:
+        print("\n❌ Errores:")
+        for motivo, cantidad in sorted(resultados.errores.items(), key=lambda x: -x[1]):
+            print(f"   {cantidad:5d}  {motivo}")
+
+    print("\n📦 Consistencia de stock:")
+    if problemas:
+        for problema in problemas[:50]:
+            print(f"   ⚠️ {problema}")
+        if len(problemas) > 50:
+            print(f"   ... y {len(problemas) - 50} más")
+    else:
+        print(f"   ✅ Stock, detalle de facturas y auditoría coinciden ({len(resultados.descuentos_esperados)} productos)")
+    print("=" * 70)
+
+
+# ═══════════════════════════════════════════════════════════════════════════════
+# MAIN
+# ═══════════════════════════════════════════════════════════════════════════════
+
+def main():
+    parser = argparse.ArgumentParser(description='Prueba de carga de /procesar_venta con varias cajas')
+    parser.add_argument('--url', default='http://localhost:5000')
+    parser.add_argument('--usuario', default='admin')
+    parser.add_argument('--password', default='admin123')
+    parser.add_argument('--cajeros', type=int, default=4)
+    parser.add_argument('--ventas', type=int, default=25, help='Ventas por cajero')
+    parser.add_argument('--semilla', type=int, default=42)
+    parser.add_argument('--fiadas', type=float, default=0.1, help='Proporción de ventas fiadas (0-1)')
+    parser.add_argument('--tipo', default='06', help='Tipo de comprobante (06, 11, 01)')
+    parser.add_argument('--pausa-ms', type=int, default=0, help='Pausa entre ventas de un mismo cajero')
+    parser.add_argument('--db', default=None, help='URI SQLAlchemy (por defecto la de config_cliente.py)')
+    args = parser.parse_args()
+
+    uri = args.db
+    if not uri:
+        from config_cliente import Config
+        uri = Config.SQLALCHEMY_DATABASE_URI
+    engine = create_engine(uri, pool_pre_ping=True)
+
+    # Seguridad: nunca correr contra AFIP real
+    estado = requests.get(f"{args.url}/api/estado_afip_rapido", timeout=30).json()
+    if not estado.get('simulado'):
+        print("🚨 El servidor NO está usando AFIP simulado. Iniciarlo con AFIP_SIMULADO=1.")
+        sys.exit(1)
+
+    print("📦 Cargando catálogo de prueba...")
+    catalogo = cargar_catalogo(engine)
+    if not catalogo['base']:
+        print("❌ No hay productos base activos para armar tickets")
+        sys.exit(1)
+    print(f"   {len(catalogo['base'])} base, {len(catalogo['pesables'])} pesables, "
+          f"{len(catalogo['combos'])} combos ({len(catalogo['combos_multi'])} multi), "
+          f"{len(catalogo['con_ofertas'])} con ofertas, {len(catalogo['clientes'])} clientes")
+
+    # Tickets generados de antemano: misma semilla → misma carga
+    tickets_por_cajero = []
+    for numero in range(args.cajeros):
+        rnd = random.Random(args.semilla * 1000 + numero)
+        tickets_por_cajero.append([
+            generar_ticket(rnd, catalogo, args.tipo, args.fiadas) for _ in range(args.ventas)
+        ])
+
+    ids_involucrados = set()
+    for tickets in tickets_por_cajero:
+        for ticket in tickets:
+            for item in ticket['items']:
+                producto = catalogo['productos'][item['producto_id']]
+                ids_involucrados.add(producto.id)
+                ids_involucrados.update(base_id for base_id, _ in componentes_combo(catalogo, producto))
+
+    sesiones = [iniciar_sesion(args.url, args.usuario, args.password) for _ in range(args.cajeros)]
+
+    stock_inicial = stock_actual(engine, ids_involucrados)
+    innodb_antes = estado_innodb(engine)
+    inicio_prueba = datetime.now().replace(microsecond=0)
+
+    resultados = ResultadosCarga()
+    barrera = threading.Barrier(args.cajeros + 1)
+    hilos = [
+        threading.Thread(target=cajero, args=(n, sesiones[n], args.url, tickets_por_cajero[n],
+                                              resultados, catalogo, args.pausa_ms, barrera))
+        for n in range(args.cajeros)
+    ]
+    for hilo in hilos:
+        hilo.start()
+
+    print(f"🚀 {args.cajeros} cajeros vendiendo...")
+    barrera.wait()
+    inicio = time.perf_counter()
+    for hilo in hilos:
+        hilo.join()
+    duracion = time.perf_counter() - inicio
+
+    innodb_despues = estado_innodb(engine)
+    problemas = verificar_consistencia(engine, stock_inicial, resultados, inicio_prueba)
+    imprimir_reporte(args, resultados, duracion, innodb_antes, innodb_despues, problemas)
+
+    sys.exit(1 if problemas else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,565 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+resumen_ventas.py - RESÚMENES DIARIOS DE VENTAS (ROLLUPS) PARA REPORTES
+═══════════════════════════════════════════════════════════════════════════════
+Los reportes y estadísticas agregaban factura × detalle_factura × producto
+sobre todo el rango pedido: dos años = recorrer todas las ventas. Ahora leen
+tablas resumen con una fila por día y clave:
+
+    resumen_venta_producto    día × producto × estado   cantidad, importes,
+                                                        líneas, última venta
+    resumen_venta_usuario     día × usuario × estado    tickets, total, neto, IVA
+    resumen_venta_medio_pago  día × medio × estado      operaciones, importe
+    resumen_venta_iva         día × alícuota × estado   neto, IVA, líneas
+
+El estado de la factura es parte de la clave: cada reporte conserva su
+propio filtro ('autorizada', distinto de 'cancelada', todas).
+
+MANTENIMIENTO (en la misma transacción que la venta)
+    sumar_factura(id)           procesar_venta, antes del commit
+    with moviendo_factura(id):  anulación, nota de crédito, reintento AFIP:
+        factura.estado = ...    resta lo de la factura con el estado viejo y
+                                lo vuelve a sumar con el nuevo
+
+RECONSTRUCCIÓN (backfill)
+    flask --app app reconstruir-resumen-ventas [--desde AAAA-MM-DD] [--hasta ...]
+    POST /api/resumen_ventas/reconstruir
+Recalcula mes por mes desde las tablas originales. Hasta la primera
+reconstrucción los reportes siguen leyendo las tablas originales.
+
+CONSULTAS
+    consultar_ventas('productos', ['unidades', 'neto'], desde, hasta,
+                     agrupar=['producto_id', 'codigo'], excluir=['cancelada'])
+Devuelve las mismas filas desde los resúmenes o desde factura/detalle_factura
+si todavía no están reconstruidos o si se pide algo que los resúmenes no
+tienen (hora, cliente, tipo de comprobante). Es el motor de /api/ventas/cubo.
+═══════════════════════════════════════════════════════════════════════════════
+"""
+
+from flask import Blueprint, jsonify, request, session
+from sqlalchemy import text, bindparam
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta
+import click
+
+from versiones import versiones, incrementar_version
+
+# Blueprint para las rutas de resúmenes de ventas
+resumen_ventas_bp = Blueprint('resumen_ventas', __name__)
+
+# Variable global para db (se inicializa en init_resumen_ventas)
+db = None
+USAR_RESUMEN = True
+
+
+def init_resumen_ventas(app, database):
+    """
+    Inicializa los resúmenes de ventas y el comando de reconstrucción
+
+    Uso en app.py:
+        from resumen_ventas import init_resumen_ventas, sumar_factura, moviendo_factura
+        init_resumen_ventas(app, db)
+
+    Config:
+        RESUMEN_VENTAS   False para que los reportes lean siempre las tablas
+                         originales (los resúmenes se siguen manteniendo)
+    """
+    global db, USAR_RESUMEN
+    db = database
+    USAR_RESUMEN = app.config.get('RESUMEN_VENTAS', True)
+    app.register_blueprint(resumen_ventas_bp)
+
+    @app.cli.command('reconstruir-resumen-ventas')
+    @click.option('--desde', help='Primer día (AAAA-MM-DD); por defecto la primera factura')
+    @click.option('--hasta', help='Último día (AAAA-MM-DD); por defecto hoy')
+    def comando_reconstruir(desde, hasta):
+        """Recalcula los resúmenes diarios de ventas desde las facturas"""
+        reconstruir(_leer_dia(desde), _leer_dia(hasta))
+
+    print("✅ Resúmenes diarios de ventas inicializados")
+
+
+_tablas_verificadas = False
+
+
+def asegurar_tablas_resumen():
+    """Crea las tablas resumen si no existen (una vez por proceso)"""
+    global _tablas_verificadas
+    if _tablas_verificadas:
+        return
+    with db.engine.begin() as conn:
+        conn.execute(text("""
+            CREATE TABLE IF NOT EXISTS resumen_venta_producto (
+                fecha DATE NOT NULL,
+                producto_id INT NOT NULL,
+                estado VARCHAR(20) NOT NULL,
+                cantidad DECIMAL(14,3) NOT NULL DEFAULT 0,
+                neto DECIMAL(14,2) NOT NULL DEFAULT 0,
+                importe_bruto DECIMAL(14,2) NOT NULL DEFAULT 0,
+                iva DECIMAL(14,2) NOT NULL DEFAULT 0,
+                suma_precios DECIMAL(16,2) NOT NULL DEFAULT 0,
+                lineas INT NOT NULL DEFAULT 0,
+                ultima_venta DATETIME NULL,
+                PRIMARY KEY (fecha, producto_id, estado),
+                KEY idx_producto (producto_id, fecha)
+            ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
+        """))
+        conn.execute(text("""
+            CREATE TABLE IF NOT EXISTS resumen_venta_usuario (
+                fecha DATE NOT NULL,
+                usuario_id INT NOT NULL,
+                estado VARCHAR(20) NOT NULL,
+                tickets INT NOT NULL DEFAULT 0,
+                total DECIMAL(14,2) NOT NULL DEFAULT 0,
+                neto DECIMAL(14,2) NOT NULL DEFAULT 0,
+                iva DECIMAL(14,2) NOT NULL DEFAULT 0,
+                PRIMARY KEY (fecha, usuario_id, estado)
+            ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
+        """))
+        conn.execute(text("""
+            CREATE TABLE IF NOT EXISTS resumen_venta_medio_pago (
+                fecha DATE NOT NULL,
+                medio_pago VARCHAR(20) NOT NULL,
+                estado VARCHAR(20) NOT NULL,
+                operaciones INT NOT NULL DEFAULT 0,
+                importe DECIMAL(14,2) NOT NULL DEFAULT 0,
+                PRIMARY KEY (fecha, medio_pago, estado)
+            ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
+        """))
+        conn.execute(text("""
+            CREATE TABLE IF NOT EXISTS resumen_venta_iva (
+                fecha DATE NOT NULL,
+                porcentaje_iva DECIMAL(5,2) NOT NULL,
+                estado VARCHAR(20) NOT NULL,
+                lineas INT NOT NULL DEFAULT 0,
+                neto DECIMAL(14,2) NOT NULL DEFAULT 0,
+                iva DECIMAL(14,2) NOT NULL DEFAULT 0,
+                PRIMARY KEY (fecha, porcentaje_iva, estado)
+            ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
+        """))
+    _tablas_verificadas = True
+
+
+# ═══════════════════════════════════════════════════════════════════════════════
+# MANTENIMIENTO
+# ═══════════════════════════════════════════════════════════════════════════════
+
+# (tabla, columna que cuenta filas de origen, INSERT ... SELECT con {filtro} sobre f)
+_ACUMULADORES = (
+    ('resumen_venta_producto', 'lineas', """
+        INSERT INTO resumen_venta_producto
+            (fecha, producto_id, estado, cantidad, neto, importe_bruto, iva,
+             suma_precios, lineas, ultima_venta)
+        SELECT DATE(f.fecha), COALESCE(d.producto_id, 0), COALESCE(f.estado, ''),
+               :signo * SUM(d.cantidad), :signo * SUM(d.subtotal),
+               :signo * SUM(d.cantidad * d.precio_unitario), :signo * SUM(d.importe_iva),
+               :signo * SUM(d.precio_unitario), :signo * COUNT(*), MAX(f.fecha)
+        FROM factura f
+        JOIN detalle_factura d ON d.factura_id = f.id
+        WHERE {filtro}
+        GROUP BY DATE(f.fecha), COALESCE(d.producto_id, 0), COALESCE(f.estado, '')
+        ON DUPLICATE KEY UPDATE
+            cantidad = cantidad + VALUES(cantidad),
+            neto = neto + VALUES(neto),
+            importe_bruto = importe_bruto + VALUES(importe_bruto),
+            iva = iva + VALUES(iva),
+            suma_precios = suma_precios + VALUES(suma_precios),
+            lineas = lineas + VALUES(lineas),
+            ultima_venta = GREATEST(COALESCE(ultima_venta, VALUES(ultima_venta)), VALUES(ultima_venta))
+    """),
+    ('resumen_venta_usuario', 'tickets', """
+        INSERT INTO resumen_venta_usuario (fecha, usuario_id, estado, tickets, total, neto, iva)
+        SELECT DATE(f.fecha), COALESCE(f.usuario_id, 0), COALESCE(f.estado, ''),
+               :signo * COUNT(*), :signo * COALESCE(SUM(f.total), 0),
+               :signo * COALESCE(SUM(f.subtotal), 0), :signo * COALESCE(SUM(f.iva), 0)
+        FROM factura f
+        WHERE {filtro}
+        GROUP BY DATE(f.fecha), COALESCE(f.usuario_id, 0), COALESCE(f.estado, '')
+        ON DUPLICATE KEY UPDATE
+            tickets = tickets + VALUES(tickets),
+            total = total + VALUES(total),
+            neto = neto + VALUES(neto),
+            iva = iva + VALUES(iva)
+    """),
+    ('resumen_venta_medio_pago', 'operaciones', """
+        INSERT INTO resumen_venta_medio_pago (fecha, medio_pago, estado, operaciones, importe)
+        SELECT DATE(f.fecha), m.medio_pago, COALESCE(f.estado, ''),
+               :signo * COUNT(*), :signo * SUM(m.importe)
+        FROM factura f
+        JOIN medios_pago m ON m.factura_id = f.id
+        WHERE {filtro}
+        GROUP BY DATE(f.fecha), m.medio_pago, COALESCE(f.estado, '')
+        ON DUPLICATE KEY UPDATE
+            operaciones = operaciones + VALUES(operaciones),
+            importe = importe + VALUES(importe)
+    """),
+    ('resumen_venta_iva', 'lineas', """
+        INSERT INTO resumen_venta_iva (fecha, porcentaje_iva, estado, lineas, neto, iva)
+        SELECT DATE(f.fecha), d.porcentaje_iva, COALESCE(f.estado, ''),
+               :signo * COUNT(*), :signo * SUM(d.subtotal), :signo * SUM(d.importe_iva)
+        FROM factura f
+        JOIN detalle_factura d ON d.factura_id = f.id
+        WHERE {filtro}
+        GROUP BY DATE(f.fecha), d.porcentaje_iva, COALESCE(f.estado, '')
+        ON DUPLICATE KEY UPDATE
+            lineas = lineas + VALUES(lineas),
+            neto = neto + VALUES(neto),
+            iva = iva + VALUES(iva)
+    """),
+)
+
+
+def sumar_factura(factura_id, signo=1):
+    """
+    Suma (signo=1) o resta (signo=-1) una factura en los resúmenes, con el
+    estado que tiene en la base. No hace commit: va en la transacción de la
+    venta. Los detalles y medios de pago tienen que estar en la base (flush).
+    """
+    asegurar_tablas_resumen()
+    fecha = db.session.execute(
+        text("SELECT DATE(fecha) FROM factura WHERE id = :id AND fecha IS NOT NULL"),
+        {'id': factura_id}
+    ).scalar()
+    if fecha is None:
+        return
+
+    for tabla, contador, sql in _ACUMULADORES:
+        db.session.execute(text(sql.format(filtro='f.id = :factura_id')),
+                           {'factura_id': factura_id, 'signo': signo})
+        if signo < 0:
+            # Lo que quedó en cero no se guarda (como si nunca se hubiera vendido)
+            db.session.execute(text(f"DELETE FROM {tabla} WHERE fecha = :fecha AND {contador} <= 0"),
+                               {'fecha': fecha})
+
+
+@contextmanager
+def moviendo_factura(factura_id):
+    """
+    Cambio de estado de una factura ya resumida:
+
+        with moviendo_factura(factura.id):
+            factura.estado = 'anulada'
+    """
+    db.session.flush()
+    sumar_factura(factura_id, -1)
+    yield
+    db.session.flush()
+    sumar_factura(factura_id, 1)
+
+
+def _leer_dia(valor):
+    return datetime.strptime(valor, '%Y-%m-%d').date() if valor else None
+
+
+def _fin_de_mes(dia):
+    return (dia.replace(day=28) + timedelta(days=4)).replace(day=1) - timedelta(days=1)
+
+
+def reconstruir(desde=None, hasta=None):
+    """
+    Recalcula los resúmenes de [desde, hasta] mes por mes (un commit por mes)
+    desde las tablas originales. Sin desde: desde la primera factura.
+
+    Returns:
+        cantidad de meses procesados
+    """
+    asegurar_tablas_resumen()
+    if desde is None:
+        primera = db.session.execute(text("SELECT MIN(fecha) FROM factura")).scalar()
+        desde = primera.date() if primera else date.today()
+    hasta = hasta or date.today()
+
+    print(f"📊 Reconstruyendo resúmenes de ventas: {desde} a {hasta}")
+    meses = 0
+    inicio = desde
+    while inicio <= hasta:
+        fin = min(_fin_de_mes(inicio), hasta)
+        try:
+            for tabla, _, _ in _ACUMULADORES:
+                db.session.execute(text(f"DELETE FROM {tabla} WHERE fecha BETWEEN :desde AND :hasta"),
+                                   {'desde': inicio, 'hasta': fin})
+            for _, _, sql in _ACUMULADORES:
+                db.session.execute(text(sql.format(filtro='f.fecha >= :desde AND f.fecha < :hasta')),
+                                   {'desde': inicio, 'hasta': fin + timedelta(days=1), 'signo': 1})
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+        meses += 1
+        print(f"   ✅ {inicio:%Y-%m}")
+        inicio = fin + timedelta(days=1)
+
+    # A partir de acá los reportes leen los resúmenes
+    incrementar_version('resumen_ventas')
+    print(f"✅ Resúmenes de ventas reconstruidos ({meses} meses)")
+    return meses
+
+
+def disponible():
+    """True si los resúmenes ya se reconstruyeron alguna vez (y están habilitados)"""
+    return USAR_RESUMEN and versiones.obtener().get('resumen_ventas', (0, None))[0] > 0
+
+
+# ═══════════════════════════════════════════════════════════════════════════════
+# CONSULTAS
+# ═══════════════════════════════════════════════════════════════════════════════
+
+# Cada columna: (expresión sobre el resumen 'r' o None si el resumen no la
+# tiene, expresión sobre las tablas originales[, unión que necesita])
+_DIMENSIONES_COMUNES = {
+    'dia': ('r.fecha', 'DATE(f.fecha)'),
+    'semana': ('YEARWEEK(r.fecha, 3)', 'YEARWEEK(f.fecha, 3)'),
+    'mes': ('MONTH(r.fecha)', 'MONTH(f.fecha)'),
+    'ano_mes': ("DATE_FORMAT(r.fecha, '%Y-%m')", "DATE_FORMAT(f.fecha, '%Y-%m')"),
+    'ano': ('YEAR(r.fecha)', 'YEAR(f.fecha)'),
+    'hora': (None, 'HOUR(f.fecha)'),
+    'estado': ('r.estado', "COALESCE(f.estado, '')"),
+    'tipo_comprobante': (None, 'f.tipo_comprobante'),
+    'usuario_id': (None, 'COALESCE(f.usuario_id, 0)'),
+    'usuario': (None, 'u.nombre', 'usuario'),
+    'cliente_id': (None, 'f.cliente_id'),
+    'cliente': (None, 'c.nombre', 'cliente'),
+}
+
+# Uniones que se agregan sólo si alguna columna pedida las usa: (resumen, originales)
+_UNIONES_COMUNES = {
+    'usuario': (None, 'LEFT JOIN usuario u ON u.id = f.usuario_id'),
+    'cliente': (None, 'LEFT JOIN cliente c ON c.id = f.cliente_id'),
+}
+
+_UNIDADES = "SUM(CASE WHEN p.es_combo = 1 THEN {c} * p.cantidad_combo ELSE {c} END)"
+
+FUENTES = {
+    'facturas': {
+        'resumen': 'resumen_venta_usuario r',
+        'original': 'factura f',
+        'uniones': {
+            'usuario': ('LEFT JOIN usuario u ON u.id = r.usuario_id',
+                        'LEFT JOIN usuario u ON u.id = f.usuario_id'),
+        },
+        'dimensiones': {
+            'usuario_id': ('r.usuario_id', 'COALESCE(f.usuario_id, 0)'),
+            'usuario': ('u.nombre', 'u.nombre', 'usuario'),
+        },
+        'medidas': {
+            'tickets': ('SUM(r.tickets)', 'COUNT(*)'),
+            'importe': ('SUM(r.total)', 'SUM(f.total)'),
+            'neto': ('SUM(r.neto)', 'SUM(f.subtotal)'),
+            'iva': ('SUM(r.iva)', 'SUM(f.iva)'),
+        },
+    },
+    'productos': {
+        'resumen': 'resumen_venta_producto r JOIN producto p ON p.id = r.producto_id',
+        'original': ('factura f JOIN detalle_factura d ON d.factura_id = f.id '
+                     'JOIN producto p ON p.id = d.producto_id'),
+        'dimensiones': {
+            'producto_id': ('p.id', 'p.id'),
+            'codigo': ('p.codigo', 'p.codigo'),
+            'nombre': ('p.nombre', 'p.nombre'),
+            'descripcion': ('p.descripcion', 'p.descripcion'),
+            'categoria': ('p.categoria', 'p.categoria'),
+            'es_combo': ('p.es_combo', 'p.es_combo'),
+            'cantidad_combo': ('p.cantidad_combo', 'p.cantidad_combo'),
+        },
+        'medidas': {
+            'cantidad': ('SUM(r.cantidad)', 'SUM(d.cantidad)'),
+            'unidades': (_UNIDADES.format(c='r.cantidad'), _UNIDADES.format(c='d.cantidad')),
+            'importe': ('SUM(r.neto + r.iva)', 'SUM(d.subtotal + d.importe_iva)'),
+            'neto': ('SUM(r.neto)', 'SUM(d.subtotal)'),
+            'iva': ('SUM(r.iva)', 'SUM(d.importe_iva)'),
+            'importe_bruto': ('SUM(r.importe_bruto)', 'SUM(d.cantidad * d.precio_unitario)'),
+            'precio_promedio': ('SUM(r.suma_precios) / NULLIF(SUM(r.lineas), 0)', 'AVG(d.precio_unitario)'),
+            'lineas': ('SUM(r.lineas)', 'COUNT(*)'),
+            'tickets': (None, 'COUNT(DISTINCT f.id)'),
+            'ultima_venta': ('MAX(r.ultima_venta)', 'MAX(f.fecha)'),
+            'productos': ('COUNT(DISTINCT r.producto_id)', 'COUNT(DISTINCT d.producto_id)'),
+        },
+    },
+    'medios_pago': {
+        'resumen': 'resumen_venta_medio_pago r',
+        'original': 'factura f JOIN medios_pago m ON m.factura_id = f.id',
+        'dimensiones': {
+            'medio_pago': ('r.medio_pago', 'm.medio_pago'),
+        },
+        'medidas': {
+            'operaciones': ('SUM(r.operaciones)', 'COUNT(*)'),
+            'importe': ('SUM(r.importe)', 'SUM(m.importe)'),
+            'tickets': (None, 'COUNT(DISTINCT f.id)'),
+        },
+    },
+    'iva': {
+        'resumen': 'resumen_venta_iva r',
+        'original': 'factura f JOIN detalle_factura d ON d.factura_id = f.id',
+        'dimensiones': {
+            'alicuota': ('r.porcentaje_iva', 'd.porcentaje_iva'),
+        },
+        'medidas': {
+            'lineas': ('SUM(r.lineas)', 'COUNT(*)'),
+            'importe': ('SUM(r.neto + r.iva)', 'SUM(d.subtotal + d.importe_iva)'),
+            'neto': ('SUM(r.neto)', 'SUM(d.subtotal)'),
+            'iva': ('SUM(r.iva)', 'SUM(d.importe_iva)'),
+            'tickets': (None, 'COUNT(DISTINCT f.id)'),
+        },
+    },
+}
+
+
+def compilar_consulta(fuente, medidas, desde, hasta, agrupar=(), estados=None, excluir=None,
+                      filtros=None, orden=None, limite=None):
+    """
+    Arma la consulta de consultar_ventas() sin ejecutarla.
+
+    Usa los resúmenes si ya están reconstruidos y tienen todas las columnas
+    pedidas; si no (p.ej. 'hora' o 'cliente'), las tablas originales.
+
+    Returns:
+        (consulta, parámetros, True si lee los resúmenes)
+    """
+    if fuente not in FUENTES:
+        raise ValueError(f'Fuente desconocida: {fuente}')
+    definicion = FUENTES[fuente]
+    columnas = dict(_DIMENSIONES_COMUNES, **definicion['dimensiones'])
+    uniones = dict(_UNIONES_COMUNES, **definicion.get('uniones', {}))
+    filtros = filtros or {}
+
+    for nombre in list(agrupar) + list(filtros):
+        if nombre not in columnas:
+            raise ValueError(f'Dimensión desconocida para {fuente}: {nombre}')
+    for nombre in medidas:
+        if nombre not in definicion['medidas']:
+            raise ValueError(f'Medida desconocida para {fuente}: {nombre}')
+
+    usadas = ([columnas[nombre] for nombre in list(agrupar) + list(filtros)]
+              + [definicion['medidas'][nombre] for nombre in medidas])
+    if estados or excluir:
+        usadas.append(columnas['estado'])
+    usar_resumen = all(columna[0] is not None for columna in usadas) and disponible()
+    lado = 0 if usar_resumen else 1
+
+    if usar_resumen:
+        asegurar_tablas_resumen()
+        desde_sql = [definicion['resumen']]
+        condiciones = ['r.fecha BETWEEN :desde AND :hasta']
+        parametros = {'desde': desde, 'hasta': hasta}
+    else:
+        desde_sql = [definicion['original']]
+        condiciones = ['f.fecha >= :desde AND f.fecha < :hasta']
+        parametros = {'desde': desde, 'hasta': hasta + timedelta(days=1)}
+    for union in sorted({columna[2] for columna in usadas if len(columna) > 2}):
+        desde_sql.append(uniones[union][lado])
+
+    expandir = []
+    if estados:
+        condiciones.append(f"{columnas['estado'][lado]} IN :estados")
+        parametros['estados'] = list(estados)
+        expandir.append('estados')
+    if excluir:
+        condiciones.append(f"{columnas['estado'][lado]} NOT IN :excluir")
+        parametros['excluir'] = list(excluir)
+        expandir.append('excluir')
+    for i, (nombre, valor) in enumerate(filtros.items()):
+        if isinstance(valor, (list, tuple, set)):
+            condiciones.append(f"{columnas[nombre][lado]} IN :filtro_{i}")
+            parametros[f'filtro_{i}'] = list(valor)
+            expandir.append(f'filtro_{i}')
+        else:
+            condiciones.append(f"{columnas[nombre][lado]} = :filtro_{i}")
+            parametros[f'filtro_{i}'] = valor
+
+    seleccion = [f"{columnas[nombre][lado]} AS {nombre}" for nombre in agrupar]
+    seleccion += [f"{definicion['medidas'][nombre][lado]} AS {nombre}" for nombre in medidas]
+
+    sql = (f"SELECT {', '.join(seleccion)} "
+           f"FROM {' '.join(desde_sql)} "
+           f"WHERE {' AND '.join(condiciones)}")
+    if agrupar:
+        sql += f" GROUP BY {', '.join(columnas[nombre][lado] for nombre in agrupar)}"
+    if orden:
+        partes = []
+        for campo in orden:
+            nombre = campo.lstrip('-')
+            if nombre not in agrupar and nombre not in medidas:
+                raise ValueError(f'No se puede ordenar por {nombre}')
+            partes.append(f"{nombre} DESC" if campo.startswith('-') else nombre)
+        sql += f" ORDER BY {', '.join(partes)}"
+    if limite:
+        sql += " LIMIT :limite"
+        parametros['limite'] = int(limite)
+
+    consulta = text(sql)
+    if expandir:
+        consulta = consulta.bindparams(*[bindparam(nombre, expanding=True) for nombre in expandir])
+    return consulta, parametros, usar_resumen
+
+
+def consultar_ventas(fuente, medidas, desde, hasta, agrupar=(), estados=None, excluir=None,
+                     filtros=None, orden=None, limite=None):
+    """
+    Agrega ventas de [desde, hasta] (días, ambos incluidos).
+
+    Args:
+        fuente:   'facturas', 'productos', 'medios_pago' o 'iva'
+        medidas:  nombres de FUENTES[fuente]['medidas']
+        agrupar:  dimensiones ('dia', 'semana', 'mes', 'ano', 'estado', ... o
+                  las de la fuente)
+        estados:  sólo facturas en estos estados
+        excluir:  facturas en cualquier estado salvo estos
+        filtros:  {dimensión: valor o lista de valores}
+        orden:    ['-unidades', 'codigo'] ('-' = descendente)
+        limite:   máximo de filas
+
+    Returns:
+        filas con un atributo por dimensión y por medida
+    """
+    consulta, parametros, _ = compilar_consulta(fuente, medidas, desde, hasta, agrupar, estados,
+                                                excluir, filtros, orden, limite)
+    return db.session.execute(consulta, parametros).fetchall()
+
+
+# ═══════════════════════════════════════════════════════════════════════════════
+# ENDPOINTS
+# ═══════════════════════════════════════════════════════════════════════════════
+
+@resumen_ventas_bp.route('/api/resumen_ventas/estado')
+def api_estado_resumen():
+    """Si los reportes leen los resúmenes y qué rango cubren"""
+    if 'user_id' not in session:
+        return jsonify({'error': 'No autorizado'}), 401
+
+    try:
+        asegurar_tablas_resumen()
+        fila = db.session.execute(text(
+            "SELECT MIN(fecha) AS desde, MAX(fecha) AS hasta, COUNT(*) AS filas FROM resumen_venta_producto"
+        )).first()
+        return jsonify({
+            'success': True,
+            'disponible': disponible(),
+            'desde': fila.desde.isoformat() if fila.desde else None,
+            'hasta': fila.hasta.isoformat() if fila.hasta else None,
+            'filas_producto': int(fila.filas or 0)
+        })
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+
+@resumen_ventas_bp.route('/api/resumen_ventas/reconstruir', methods=['POST'])
+def api_reconstruir_resumen():
+    """Recalcula los resúmenes (todo, o el rango {desde, hasta})"""
+    if 'user_id' not in session:
+        return jsonify({'error': 'No autorizado'}), 401
+
+    data = request.get_json(silent=True) or {}
+    try:
+        desde = _leer_dia(data.get('desde'))
+        hasta = _leer_dia(data.get('hasta'))
+    except ValueError:
+        return jsonify({'success': False, 'error': 'Formato de fecha inválido. Use YYYY-MM-DD'}), 400
+
+    try:
+        meses = reconstruir(desde, hasta)
+        return jsonify({'success': True, 'meses': meses})
+    except Exception as e:
+        db.session.rollback()
+        print(f"❌ Error reconstruyendo resúmenes de ventas: {e}")
+        return jsonify({'success': False, 'error': str(e)}), 500
@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+serializacion.py - SERIALIZACIÓN JSON RÁPIDA (PRODUCTOS, FACTURAS, LISTADOS)
+═══════════════════════════════════════════════════════════════════════════════
+Una sola capa para convertir datos a JSON:
+
+    ProveedorJSON       reemplaza el proveedor de Flask: todos los jsonify()
+                        usan orjson si está instalado, también con debug
+                        (claves ordenadas, Decimal como texto, fechas en
+                        formato HTTP, acentos en UTF-8 sin escapar)
+    respuesta_json()    para listados grandes: Decimal como número, fechas
+                        ISO, sin ordenar claves; bytes directo a la respuesta
+    respuesta_json_cruda()  cuerpo ya codificado (p.ej. productos
+                        pre-serializados del cache del catálogo)
+    producto_a_dict()   EL formato de producto de venta para objetos ORM
+                        (mismo que catalogo.a_dict_venta sobre el cache)
+    proyectar()         ?campos=id,codigo,precio → sólo esos campos
+
+orjson es opcional: sin él todo funciona igual con json de la biblioteca
+estándar (más lento).
+═══════════════════════════════════════════════════════════════════════════════
+"""
+
+from flask import request, current_app
+from flask.json.provider import DefaultJSONProvider
+from datetime import date, datetime
+from decimal import Decimal
+import json
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def init_serializacion(app):
+    """
+    Instala el proveedor JSON rápido en la app
+
+    Uso en app.py:
+        from serializacion import init_serializacion, respuesta_json, producto_a_dict
+        init_serializacion(app)
+    """
+    app.json = ProveedorJSON(app)
+    print(f"✅ Serialización JSON: {'orjson' if orjson else 'json estándar (instalar orjson para más velocidad)'}")
+
+
+# ═══════════════════════════════════════════════════════════════════════════════
+# PROVEEDOR PARA jsonify()
+# ═══════════════════════════════════════════════════════════════════════════════
+
+class ProveedorJSON(DefaultJSONProvider):
+    """
+    DefaultJSONProvider con orjson: misma salida con o sin orjson, bastante
+    menos tiempo. orjson no escapa lo que no es ASCII, así que el json
+    estándar tampoco (ensure_ascii = False). La salida indentada sólo se usa
+    si se pide con app.json.compact = False, no por correr con debug.
+    """
+
+    ensure_ascii = False
+
+    def _opciones(self):
+        opciones = orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+        if self.sort_keys:
+            opciones |= orjson.OPT_SORT_KEYS
+        return opciones
+
+    def dumps(self, obj, **kwargs):
+        if orjson is None or kwargs:
+            return super().dumps(obj, **kwargs)
+        try:
+            return orjson.dumps(obj, default=self.default, option=self._opciones()).decode('utf-8')
+        except TypeError:
+            # Enteros de más de 64 bits u otros casos que orjson no cubre
+            return super().dumps(obj)
+
+    def response(self, *args, **kwargs):
+        if self.compact is False:
+            return super().response(*args, **kwargs)
+        obj = self._prepare_response_obj(args, kwargs)
+        cuerpo = None
+        if orjson is not None:
+            try:
+                cuerpo = orjson.dumps(obj, default=self.default, option=self._opciones() | orjson.OPT_APPEND_NEWLINE)
+            except TypeError:
+                pass
+        if cuerpo is None:
+            cuerpo = f"{self.dumps(obj, separators=(',', ':'))}\n"
+        return self._app.response_class(cuerpo, mimetype=self.mimetype)
+
+
+# ═══════════════════════════════════════════════════════════════════════════════
+# LISTADOS GRANDES
+# ═══════════════════════════════════════════════════════════════════════════════
+
+def _por_defecto(valor):
+    if isinstance(valor, Decimal):
+        return float(valor)
+    if isinstance(valor, (datetime, date)):
+        return valor.isoformat()
+    if isinstance(valor, (set, frozenset)) or type(valor).__name__ in ('dict_keys', 'dict_values'):
+        return list(valor)
+    raise TypeError(f'{type(valor).__name__} no es serializable a JSON')
+
+
+def codificar(datos):
+    """datos → bytes JSON (Decimal como número, fechas ISO, claves no-texto permitidas)"""
+    if orjson is not None:
+        try:
+            return orjson.dumps(datos, default=_por_defecto, option=orjson.OPT_NON_STR_KEYS)
+        except TypeError:
+            pass
+    return json.dumps(datos, default=_por_defecto, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+
+def respuesta_json(datos, status=200):
+    """Como jsonify(datos) pero pensado para respuestas grandes"""
+    return respuesta_json_cruda(codificar(datos), status)
+
+
+def respuesta_json_cruda(cuerpo, status=200):
+    """Respuesta con un cuerpo JSON ya codificado (bytes)"""
+    return current_app.response_class(cuerpo, status=status, mimetype='application/json')
+
+
+def campos_pedidos():
+    """Campos de ?campos=a,b,c (tupla) o None si no se pidió proyección"""
+    campos = request.args.get('campos', '').strip()
+    if not campos:
+        return None
+    return tuple(c.strip() for c in campos.split(',') if c.strip())
+
+
+def proyectar(datos, campos):
+    """Deja sólo 'campos' en un dict o en cada dict de una lista (campos None = todo)"""
+    if not campos:
+        return datos
+    if isinstance(datos, dict):
+        return {campo: datos[campo] for campo in campos if campo in datos}
+    return [{campo: d[campo] for campo in campos if campo in d} for d in datos]
+
+
+# ═══════════════════════════════════════════════════════════════════════════════
+# PRODUCTOS (objetos ORM, cuando no hay cache de catálogo)
+# ═══════════════════════════════════════════════════════════════════════════════
+
+def _float(valor):
+    return float(valor) if valor else None
+
+
+def producto_a_dict(producto, tiene_ofertas=None, match_tipo=None):
+    """
+    Producto ORM → mismo dict que catalogo.a_dict_venta() arma desde el cache.
+
+    tiene_ofertas se incluye sólo si se pasa (calcularlo por producto es una
+    consulta: en listados usar Producto.ids_con_ofertas_volumen()).
+    """
+    precio = float(producto.precio)
+    datos = {
+        'id': producto.id,
+        'codigo': producto.codigo,
+        'nombre': producto.nombre,
+        'precio': precio,
+        'precio2': _float(producto.precio2),
+        'precio3': _float(producto.precio3),
+        'precio4': _float(producto.precio4),
+        'precio5': _float(producto.precio5),
+        'precio_base': precio,
+        'costo': float(producto.costo) if producto.costo else 0.0,
+        'margen': float(producto.margen) if producto.margen else 0.0,
+        'margen2': _float(producto.margen2),
+        'margen3': _float(producto.margen3),
+        'margen4': _float(producto.margen4),
+        'margen5': _float(producto.margen5),
+        'stock': producto.stock_dinamico,
+        'iva': float(producto.iva),
+        'descripcion': producto.descripcion or '',
+        'categoria': producto.categoria,
+        'es_combo': producto.es_combo,
+        'es_pesable': bool(producto.es_pesable),
+        'producto_base_id': producto.producto_base_id,
+        'cantidad_combo': float(producto.cantidad_combo) if producto.cantidad_combo else 1.0,
+        'precio_unitario_base': float(producto.precio_unitario_base) if producto.precio_unitario_base else precio,
+        'descuento_porcentaje': float(producto.descuento_porcentaje) if producto.descuento_porcentaje else 0.0,
+        'ahorro_combo': producto.calcular_ahorro_combo(),
+        'precio_normal': producto.calcular_precio_normal()
+    }
+    if tiene_ofertas is not None:
+        datos['tiene_ofertas'] = tiene_ofertas
+    if match_tipo:
+        datos['match_tipo'] = match_tipo
+    return datos
@@ -0,0 +1,82 @@
+// ═══════════════════════════════════════════════════════════════════════════
+// EXPORTACIONES EN SEGUNDO PLANO (ver exportaciones.py)
+// ═══════════════════════════════════════════════════════════════════════════
+// Pide el trabajo, consulta el avance cada segundo y descarga cuando está listo:
+//
+//     exportarEnSegundoPlano('reporte_ventas', {...parametros, formato: 'excel'}, {
+//         alAvanzar: (estado) => ...,     // {estado, porcentaje, mensaje, delante_en_cola}
+//         abrirEnVentana: true            // PDF/HTML: abrir en otra pestaña
+//     });
+//
+// Devuelve una Promise que se resuelve con el estado final.
+
+const INTERVALO_EXPORTACION_MS = 1000;
+
+async function exportarEnSegundoPlano(tipo, parametros, opciones = {}) {
+    const { alAvanzar = null, abrirEnVentana = false } = opciones;
+
+    // La ventana se abre ahora (dentro del click) para que el navegador no la bloquee
+    const ventana = abrirEnVentana ? window.open('', '_blank') : null;
+    if (ventana) {
+        ventana.document.write('<p style="font-family: Arial, sans-serif">⏳ Generando archivo...</p>');
+    }
+
+    try {
+        const respuesta = await fetch('/api/exportaciones', {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({ tipo: tipo, parametros: parametros })
+        });
+        const data = await respuesta.json();
+        if (!data.success) {
+            throw new Error(data.error || 'No se pudo iniciar la exportación');
+        }
+        console.log(`📤 Exportación ${tipo} #${data.job_id}${data.reutilizado ? ' (reutilizada)' : ''}`);
+
+        while (true) {
+            const r = await fetch(`/api/exportaciones/${data.job_id}`);
+            const estado = await r.json();
+            if (!estado.success) {
+                throw new Error(estado.error || 'Exportación no encontrada');
+            }
+            const exportacion = estado.exportacion;
+            if (alAvanzar) {
+                alAvanzar(exportacion);
+            }
+            if (exportacion.estado === 'error') {
+                throw new Error(exportacion.mensaje || 'Error generando el archivo');
+            }
+            if (exportacion.estado === 'listo') {
+                const url = `/api/exportaciones/${data.job_id}/descargar`;
+                if (ventana) {
+                    ventana.location.href = url;
+                } else {
+                    const link = document.createElement('a');
+                    link.href = url;
+                    link.download = exportacion.nombre || '';
+                    document.body.appendChild(link);
+                    link.click();
+                    document.body.removeChild(link);
+                }
+                console.log(`✅ Exportación lista: ${exportacion.nombre}`);
+                return exportacion;
+            }
+            await new Promise(resolver => setTimeout(resolver, INTERVALO_EXPORTACION_MS));
+        }
+    } catch (error) {
+        if (ventana) {
+            ventana.close();
+        }
+        console.error('❌ Error en exportación:', error);
+        throw error;
+    }
+}
+
+function textoAvanceExportacion(exportacion) {
+    if (exportacion.estado === 'en_cola') {
+        return exportacion.delante_en_cola
+            ? `En cola (${exportacion.delante_en_cola} antes)...`
+            : 'En cola...';
+    }
+    return `${exportacion.mensaje || 'Generando archivo...'} ${exportacion.porcentaje}%`;
+}
@@ -11,6 +11,9 @@ NO MODIFICA el comportamiento existente, solo REGISTRA.
 from flask import Blueprint, jsonify, request, session, render_template
 from sqlalchemy import text
 from datetime import datetime, timedelta
+import itertools
+
+from descargas import filas_cursor, respuesta_csv
 
 stock_audit_bp = Blueprint('stock_audit', __name__)
 
@@ -19,11 +22,14 @@ def registrar_movimiento_stock(db, producto_id, tipo, cantidad, signo,
                                 stock_anterior, stock_nuevo, 
                                 referencia_tipo=None, referencia_id=None,
                                 motivo=None, usuario_id=None, usuario_nombre=None,
-                                codigo_producto=None, nombre_producto=None):
+                                codigo_producto=None, nombre_producto=None, commit=True):
     """
     Registra un movimiento de stock en la tabla de auditoría.
     Esta función SOLO registra, no modifica stock.
     
+    commit=False deja el registro dentro de la transacción de quien llama
+    (se confirma junto con el descuento de stock).
+    
     Tipos válidos:
     - 'venta': Venta normal facturada
     - 'venta_fiada': Venta en cuenta corriente
@@ -60,7 +66,8 @@ def registrar_movimiento_stock(db, producto_id, tipo, cantidad, signo,
             'usuario_id': usuario_id,
             'usuario_nombre': usuario_nombre
         })
-        db.session.commit()
+        if commit:
+            db.session.commit()
         
         print(f"📋 AUDIT: {codigo_producto} | {tipo} | {signo}{cantidad} | {stock_anterior} → {stock_nuevo}")
         return True
@@ -81,6 +88,51 @@ def vista_stock_audit():
     return render_template('stock_audit.html')
 
 
+def _consulta_movimientos(args):
+    """(SQL, parámetros) de movimientos con los filtros del pedido, más nuevos primero"""
+    # Parámetros de filtro
+    producto_id = args.get('producto_id', type=int)
+    codigo = args.get('codigo', '').strip()
+    tipo = args.get('tipo', '').strip()
+    fecha_desde = args.get('fecha_desde', '')
+    fecha_hasta = args.get('fecha_hasta', '')
+    
+    # Query base
+    query = """
+        SELECT 
+            id, producto_id, codigo_producto, nombre_producto,
+            tipo, cantidad, signo, stock_anterior, stock_nuevo,
+            referencia_tipo, referencia_id, motivo,
+            usuario_nombre, fecha
+        FROM stock_movimiento
+        WHERE 1=1
+    """
+    params = {}
+    
+    if producto_id:
+        query += " AND producto_id = :producto_id"
+        params['producto_id'] = producto_id
+        
+    if codigo:
+        query += " AND codigo_producto LIKE :codigo"
+        params['codigo'] = f"%{codigo}%"
+        
+    if tipo:
+        query += " AND tipo = :tipo"
+        params['tipo'] = tipo
+        
+    if fecha_desde:
+        query += " AND DATE(fecha) >= :fecha_desde"
+        params['fecha_desde'] = fecha_desde
+        
+    if fecha_hasta:
+        query += " AND DATE(fecha) <= :fecha_hasta"
+        params['fecha_hasta'] = fecha_hasta
+    
+    query += " ORDER BY fecha DESC"
+    return query, params
+
+
 @stock_audit_bp.route('/api/stock_audit/movimientos')
 def api_movimientos_stock():
     """Obtener movimientos de stock con filtros"""
@@ -88,47 +140,10 @@ def api_movimientos_stock():
     db = current_app.extensions['sqlalchemy'].db
     
     try:
-        # Parámetros de filtro
-        producto_id = request.args.get('producto_id', type=int)
-        codigo = request.args.get('codigo', '').strip()
-        tipo = request.args.get('tipo', '').strip()
-        fecha_desde = request.args.get('fecha_desde', '')
-        fecha_hasta = request.args.get('fecha_hasta', '')
         limit = request.args.get('limit', 100, type=int)
         
-        # Query base
-        query = """
-            SELECT 
-                id, producto_id, codigo_producto, nombre_producto,
-                tipo, cantidad, signo, stock_anterior, stock_nuevo,
-                referencia_tipo, referencia_id, motivo,
-                usuario_nombre, fecha
-            FROM stock_movimiento
-            WHERE 1=1
-        """
-        params = {}
-        
-        if producto_id:
-            query += " AND producto_id = :producto_id"
-            params['producto_id'] = producto_id
-            
-        if codigo:
-            query += " AND codigo_producto LIKE :codigo"
-            params['codigo'] = f"%{codigo}%"
-            
-        if tipo:
-            query += " AND tipo = :tipo"
-            params['tipo'] = tipo
-            
-        if fecha_desde:
-            query += " AND DATE(fecha) >= :fecha_desde"
-            params['fecha_desde'] = fecha_desde
-            
-        if fecha_hasta:
-            query += " AND DATE(fecha) <= :fecha_hasta"
-            params['fecha_hasta'] = fecha_hasta
-        
-        query += " ORDER BY fecha DESC LIMIT :limit"
+        query, params = _consulta_movimientos(request.args)
+        query += " LIMIT :limit"
         params['limit'] = limit
         
         result = db.session.execute(text(query), params)
@@ -163,6 +178,45 @@ def api_movimientos_stock():
         return jsonify({'success': False, 'error': str(e)}), 500
 
 
+@stock_audit_bp.route('/api/stock_audit/exportar_csv')
+def api_exportar_movimientos_csv():
+    """
+    Todos los movimientos que cumplen los filtros (sin límite) en CSV.
+    Se envían a medida que se leen de la base: memoria constante aunque sea un año entero.
+    """
+    from flask import current_app
+    
+    if 'user_id' not in session:
+        return jsonify({'error': 'No autorizado'}), 401
+    
+    db = current_app.extensions['sqlalchemy'].db
+    query, params = _consulta_movimientos(request.args)
+    
+    encabezados = [
+        'Fecha', 'Código', 'Producto', 'Tipo', 'Cantidad', 'Stock Anterior',
+        'Stock Nuevo', 'Referencia', 'Referencia ID', 'Motivo', 'Usuario'
+    ]
+    filas = (
+        [
+            row.fecha.strftime('%d/%m/%Y %H:%M') if row.fecha else '',
+            row.codigo_producto,
+            row.nombre_producto,
+            row.tipo,
+            f"{row.signo}{float(row.cantidad):g}",
+            float(row.stock_anterior) if row.stock_anterior is not None else '',
+            float(row.stock_nuevo) if row.stock_nuevo is not None else '',
+            row.referencia_tipo or '',
+            row.referencia_id or '',
+            row.motivo or '',
+            row.usuario_nombre or ''
+        ]
+        for row in filas_cursor(db.session, text(query), params)
+    )
+    
+    return respuesta_csv(itertools.chain([encabezados], filas),
+                         f"movimientos_stock_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv")
+
+
 @stock_audit_bp.route('/api/stock_audit/reporte_producto/<int:producto_id>')
 def api_reporte_producto(producto_id):
     """Reporte detallado de movimientos de un producto"""
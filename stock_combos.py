@@ -0,0 +1,271 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+stock_combos.py - COMPONENTES Y DISPONIBILIDAD DE COMBOS
+═══════════════════════════════════════════════════════════════════════════════
+Un combo no tiene stock propio: se arma con N productos base, cada uno con
+su cantidad, guardados en la tabla combo_componente (una fila por base).
+
+    disponible    = MIN( int(stock_base / cantidad) )   sobre bases activas
+    precio normal = SUM( precio_base * cantidad )
+
+Todo se resuelve con consultas por conjuntos sobre combo_componente
+(GROUP BY combo), sin recorrer los componentes uno por uno:
+
+    calcular_stock_combos()        disponibilidad en vivo de una lista de combos
+    precio_normal_combos()         precio normal de una lista de combos
+    descontar_stock_combo()        descuenta de todas las bases de un combo
+    recalcular_stock_disponible()  mantiene producto.stock_disponible
+
+El resultado de la disponibilidad queda materializado en
+producto.stock_disponible: recalcular_stock_disponible() lo actualiza en la
+misma transacción en que cambia el stock de los productos base, así los
+combos se leen, filtran y ordenan en SQL igual que cualquier producto.
+
+Las columnas producto_base_id / _2 / _3 y cantidad_combo / _2 / _3 quedan
+como espejo de los tres primeros componentes para las pantallas y reportes
+que todavía las muestran; la fuente de verdad es combo_componente.
+═══════════════════════════════════════════════════════════════════════════════
+"""
+
+from sqlalchemy import text, bindparam
+
+_SIN_LIMITE = 2147483647
+
+
+class ComboSinComponentes(ValueError):
+    """Venta de un combo sin filas en combo_componente (no hay de qué descontar)"""
+
+
+def _consulta(sql, *expandidos):
+    """text() con los parámetros de lista (IN :x) marcados como expanding"""
+    consulta = text(sql)
+    for nombre in expandidos:
+        consulta = consulta.bindparams(bindparam(nombre, expanding=True))
+    return consulta
+
+
+def _ids(valores):
+    return list({int(v) for v in (valores or ()) if v})
+
+
+def normalizar_componentes(componentes):
+    """
+    Limpia una lista de (producto_id, cantidad): descarta vacíos y cantidades
+    <= 0 y suma las bases repetidas, manteniendo el orden de aparición.
+    """
+    resultado = {}
+    for producto_id, cantidad in componentes:
+        if not producto_id or not cantidad or float(cantidad) <= 0:
+            continue
+        producto_id = int(producto_id)
+        resultado[producto_id] = resultado.get(producto_id, 0.0) + float(cantidad)
+    return list(resultado.items())
+
+
+def componentes_de_combos(db, combo_ids):
+    """{combo_id: [(producto_id, cantidad)]} de los combos pedidos (una consulta)"""
+    ids = _ids(combo_ids)
+    if not ids:
+        return {}
+
+    filas = db.session.execute(_consulta("""
+        SELECT combo_id, producto_id, cantidad
+        FROM combo_componente
+        WHERE combo_id IN :ids AND cantidad > 0
+        ORDER BY combo_id, orden, id
+    """, 'ids'), {'ids': ids})
+
+    resultado = {}
+    for row in filas:
+        resultado.setdefault(row.combo_id, []).append((row.producto_id, float(row.cantidad)))
+    return resultado
+
+
+def combos_que_usan(db, bases):
+    """ids de los combos que tienen alguno de estos productos como componente"""
+    ids = _ids(bases)
+    if not ids:
+        return []
+    filas = db.session.execute(_consulta(
+        "SELECT DISTINCT combo_id FROM combo_componente WHERE producto_id IN :ids", 'ids'
+    ), {'ids': ids})
+    return [row.combo_id for row in filas]
+
+
+# ═══════════════════════════════════════════════════════════════════════════════
+# DISPONIBILIDAD Y PRECIO NORMAL
+# ═══════════════════════════════════════════════════════════════════════════════
+
+SQL_DISPONIBLE = """
+    SELECT cc.combo_id,
+           MIN(TRUNCATE(b.stock / cc.cantidad, 0)) AS disponible
+    FROM combo_componente cc
+    JOIN producto b ON b.id = cc.producto_id AND b.activo = 1
+    WHERE cc.cantidad > 0 {filtro}
+    GROUP BY cc.combo_id
+"""
+
+
+def calcular_stock_combos(db, productos):
+    """
+    Stock disponible de todos los combos de 'productos', calculado en vivo.
+
+    Args:
+        db: Instancia de SQLAlchemy
+        productos: objetos o filas con id y es_combo
+
+    Returns:
+        dict {combo_id: unidades disponibles} (sólo combos)
+    """
+    combos = _ids(p.id for p in productos if getattr(p, 'es_combo', False))
+    if not combos:
+        return {}
+
+    filas = db.session.execute(
+        _consulta(SQL_DISPONIBLE.format(filtro="AND cc.combo_id IN :ids"), 'ids'),
+        {'ids': combos}
+    )
+    disponibles = {row.combo_id: int(row.disponible or 0) for row in filas}
+    return {combo_id: disponibles.get(combo_id, 0) for combo_id in combos}
+
+
+def precio_normal_combos(db, combo_ids):
+    """
+    Precio normal (suma de precio de lista de cada base por su cantidad).
+
+    Returns:
+        dict {combo_id: precio_normal}; los combos sin componentes quedan en 0
+    """
+    ids = _ids(combo_ids)
+    if not ids:
+        return {}
+
+    filas = db.session.execute(_consulta("""
+        SELECT cc.combo_id, SUM(b.precio * cc.cantidad) AS precio_normal
+        FROM combo_componente cc
+        JOIN producto b ON b.id = cc.producto_id
+        WHERE cc.combo_id IN :ids AND cc.cantidad > 0
+        GROUP BY cc.combo_id
+    """, 'ids'), {'ids': ids})
+    precios = {row.combo_id: float(row.precio_normal or 0) for row in filas}
+    return {combo_id: precios.get(combo_id, 0.0) for combo_id in ids}
+
+
+# ═══════════════════════════════════════════════════════════════════════════════
+# DESCUENTO DE STOCK
+# ═══════════════════════════════════════════════════════════════════════════════
+
+def _expirar_productos(db, ids):
+    """
+    Los UPDATE en SQL no pasan por el ORM: si algún producto base ya estaba
+    cargado en la sesión, se marca su stock como vencido para que la próxima
+    lectura (o resta) use el valor nuevo y no pise el descuento.
+    """
+    ids = set(ids)
+    for objeto in list(db.session.identity_map.values()):
+        if getattr(objeto, '__tablename__', None) == 'producto' and objeto.id in ids:
+            db.session.expire(objeto, ['stock', 'fecha_modificacion'])
+
+
+def descontar_stock_combo(db, combo_id, cantidad_vendida):
+    """
+    Descuenta cantidad_vendida combos del stock de todas sus bases con un
+    solo UPDATE, dentro de la transacción en curso (no hace commit).
+
+    Returns:
+        [dict] por base con producto_id, codigo, nombre, descuento,
+        stock_anterior y stock_nuevo (para la auditoría de stock)
+
+    Raises:
+        ComboSinComponentes si el combo no tiene bases: la venta tiene que
+        fallar (rollback) en vez de seguir sin descontar nada
+    """
+    cantidad_vendida = float(cantidad_vendida)
+
+    # Que el SELECT y el UPDATE vean los cambios pendientes de la sesión
+    db.session.flush()
+
+    bases = db.session.execute(text("""
+        SELECT b.id, b.codigo, b.nombre, b.stock, cc.cantidad
+        FROM combo_componente cc
+        JOIN producto b ON b.id = cc.producto_id
+        WHERE cc.combo_id = :combo AND cc.cantidad > 0
+        ORDER BY cc.orden, cc.id
+        FOR UPDATE
+    """), {'combo': combo_id}).fetchall()
+    if not bases:
+        raise ComboSinComponentes(f'El combo {combo_id} no tiene productos base cargados')
+
+    db.session.execute(text("""
+        UPDATE producto b
+        JOIN combo_componente cc ON cc.producto_id = b.id
+        SET b.stock = b.stock - cc.cantidad * :cantidad,
+            b.fecha_modificacion = NOW()
+        WHERE cc.combo_id = :combo AND cc.cantidad > 0
+    """), {'combo': combo_id, 'cantidad': cantidad_vendida})
+
+    _expirar_productos(db, [row.id for row in bases])
+
+    movimientos = []
+    for row in bases:
+        descuento = float(row.cantidad) * cantidad_vendida
+        stock_anterior = float(row.stock or 0)
+        movimientos.append({
+            'producto_id': row.id,
+            'codigo': row.codigo,
+            'nombre': row.nombre,
+            'descuento': descuento,
+            'stock_anterior': stock_anterior,
+            'stock_nuevo': stock_anterior - descuento
+        })
+    return movimientos
+
+
+# ═══════════════════════════════════════════════════════════════════════════════
+# STOCK MATERIALIZADO (producto.stock_disponible)
+# ═══════════════════════════════════════════════════════════════════════════════
+
+SQL_RECALCULAR = """
+    UPDATE producto c
+    LEFT JOIN ({disponible}) d ON d.combo_id = c.id
+    SET c.stock_disponible = LEAST(COALESCE(d.disponible, 0), {sin_limite}),
+        c.fecha_modificacion = c.fecha_modificacion
+    WHERE c.es_combo = 1 {filtro}
+"""
+
+
+def recalcular_stock_disponible(db, bases=None, combos=None):
+    """
+    Actualiza producto.stock_disponible de los combos afectados, dentro de la
+    transacción en curso (no hace commit). Llamar después de cambiar el stock
+    o el estado de productos base, o la composición de un combo.
+
+    Args:
+        db: Instancia de SQLAlchemy
+        bases: ids de productos base cuyo stock/estado cambió
+        combos: ids de combos a recalcular
+        (sin bases ni combos = todos los combos)
+
+    Returns:
+        Cantidad de combos actualizados
+    """
+    # Que el UPDATE vea los cambios de stock pendientes en la sesión
+    db.session.flush()
+
+    if bases is None and combos is None:
+        sql = SQL_RECALCULAR.format(disponible=SQL_DISPONIBLE.format(filtro=''),
+                                    sin_limite=_SIN_LIMITE, filtro='')
+        return db.session.execute(text(sql)).rowcount
+
+    ids = set(_ids(combos)) | set(combos_que_usan(db, bases))
+    if not ids:
+        return 0
+
+    sql = SQL_RECALCULAR.format(
+        disponible=SQL_DISPONIBLE.format(filtro="AND cc.combo_id IN :ids_componentes"),
+        sin_limite=_SIN_LIMITE,
+        filtro="AND c.id IN :ids"
+    )
+    return db.session.execute(_consulta(sql, 'ids_componentes', 'ids'),
+                              {'ids_componentes': list(ids), 'ids': list(ids)}).rowcount
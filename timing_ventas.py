@@ -0,0 +1,354 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+timing_ventas.py - MEDICIÓN DE TIEMPOS POR ETAPA DE VENTA
+═══════════════════════════════════════════════════════════════════════════════
+Mide cuánto tarda cada etapa de procesar_venta (validación, numeración, stock,
+auditoría, AFIP, saldo, impresión...) y lo devuelve en el header Server-Timing
+y en el campo 'tiempos' del JSON. Mantiene un histograma en memoria por etapa
+y registra en logs/ventas_lentas.log las ventas que superan el umbral.
+═══════════════════════════════════════════════════════════════════════════════
+"""
+
+from flask import Blueprint, jsonify, request, session, g, current_app
+from collections import deque, OrderedDict
+from functools import wraps
+from datetime import datetime
+import threading
+import time
+import json
+import math
+import os
+
+timing_ventas_bp = Blueprint('timing_ventas', __name__)
+
+# Umbral por defecto para considerar una venta "lenta" (milisegundos)
+UMBRAL_VENTA_LENTA_MS = 3000
+
+# Cantidad de muestras que guarda el histograma por etapa
+MUESTRAS_POR_ETAPA = 500
+
+# Ventas lentas que se guardan en memoria (con su desglose)
+MAX_VENTAS_LENTAS = 50
+
+# Límites de los buckets del histograma (milisegundos)
+BUCKETS_MS = (10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+ARCHIVO_VENTAS_LENTAS = os.path.join('logs', 'ventas_lentas.log')
+
+
+# ═══════════════════════════════════════════════════════════════════════════════
+# CRONÓMETRO DE UNA VENTA
+# ═══════════════════════════════════════════════════════════════════════════════
+
+class CronometroVenta:
+    """
+    Cronómetro por etapas. Cada llamada a etapa() cierra la anterior y abre
+    la nueva; sub_etapa() pausa la etapa en curso mientras dura el bloque,
+    así los tiempos no se superponen y suman el total.
+    """
+
+    def __init__(self):
+        self.inicio = time.perf_counter()
+        self.tiempos = OrderedDict()
+        self._etapa_actual = None
+        self._inicio_etapa = None
+
+    def _acumular(self, nombre, segundos):
+        self.tiempos[nombre] = self.tiempos.get(nombre, 0.0) + segundos * 1000
+
+    def etapa(self, nombre):
+        """Cerrar la etapa en curso y empezar a medir 'nombre'"""
+        ahora = time.perf_counter()
+        if self._etapa_actual:
+            self._acumular(self._etapa_actual, ahora - self._inicio_etapa)
+        self._etapa_actual = nombre
+        self._inicio_etapa = ahora
+
+    def finalizar(self):
+        """Cerrar la etapa en curso"""
+        if self._etapa_actual:
+            self._acumular(self._etapa_actual, time.perf_counter() - self._inicio_etapa)
+        self._etapa_actual = None
+        self._inicio_etapa = None
+
+    def sub_etapa(self, nombre):
+        """Context manager que mide un bloque anidado descontándolo de la etapa en curso"""
+        return _SubEtapa(self, nombre)
+
+    @property
+    def total_ms(self):
+        return (time.perf_counter() - self.inicio) * 1000
+
+    def resumen(self):
+        """Diccionario {etapa: ms} redondeado, incluyendo 'total'"""
+        datos = OrderedDict((k, round(v, 2)) for k, v in self.tiempos.items())
+        datos['total'] = round(self.total_ms, 2)
+        return datos
+
+    def header_server_timing(self):
+        """Valor para el header HTTP Server-Timing"""
+        partes = [f"{nombre};dur={ms:.2f}" for nombre, ms in self.tiempos.items()]
+        partes.append(f"total;dur={self.total_ms:.2f}")
+        return ', '.join(partes)
+
+
+class _SubEtapa:
+    def __init__(self, cronometro, nombre):
+        self.cronometro = cronometro
+        self.nombre = nombre
+
+    def __enter__(self):
+        c = self.cronometro
+        self._etapa_padre = c._etapa_actual
+        self._inicio = time.perf_counter()
+        if c._etapa_actual:
+            c._acumular(c._etapa_actual, self._inicio - c._inicio_etapa)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        c = self.cronometro
+        ahora = time.perf_counter()
+        c._acumular(self.nombre, ahora - self._inicio)
+        # Reanudar la etapa padre
+        c._etapa_actual = self._etapa_padre
+        c._inicio_etapa = ahora
+        return False
+
+
+class _CronometroNulo:
+    """Cronómetro que no mide nada (fuera de una venta instrumentada)"""
+
+    def etapa(self, nombre):
+        pass
+
+    def finalizar(self):
+        pass
+
+    def sub_etapa(self, nombre):
+        return _SubEtapaNula()
+
+
+class _SubEtapaNula:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_CRONOMETRO_NULO = _CronometroNulo()
+
+
+def cronometro_actual():
+    """Cronómetro de la venta en curso (o uno nulo si no hay)"""
+    try:
+        return g.get('cronometro_venta') or _CRONOMETRO_NULO
+    except RuntimeError:
+        # Fuera de un contexto de request
+        return _CRONOMETRO_NULO
+
+
+# ═══════════════════════════════════════════════════════════════════════════════
+# HISTOGRAMA EN MEMORIA Y LOG DE VENTAS LENTAS
+# ═══════════════════════════════════════════════════════════════════════════════
+
+class HistogramaEtapas:
+    """Últimas N duraciones por etapa, protegidas con lock (varios hilos de Flask)"""
+
+    def __init__(self, muestras=MUESTRAS_POR_ETAPA):
+        self.muestras = muestras
+        self._datos = {}
+        self._ventas_lentas = deque(maxlen=MAX_VENTAS_LENTAS)
+        self._lock = threading.Lock()
+
+    def registrar(self, tiempos):
+        with self._lock:
+            for etapa, ms in tiempos.items():
+                if etapa not in self._datos:
+                    self._datos[etapa] = deque(maxlen=self.muestras)
+                self._datos[etapa].append(ms)
+
+    def registrar_lenta(self, registro):
+        with self._lock:
+            self._ventas_lentas.append(registro)
+
+    def ventas_lentas(self):
+        with self._lock:
+            return list(self._ventas_lentas)
+
+    def resumen(self):
+        with self._lock:
+            copia = {etapa: sorted(valores) for etapa, valores in self._datos.items()}
+
+        resultado = {}
+        for etapa, valores in copia.items():
+            if not valores:
+                continue
+            buckets = OrderedDict()
+            for limite in BUCKETS_MS:
+                buckets[f"<={limite}"] = 0
+            buckets['>10000'] = 0
+            for v in valores:
+                for limite in BUCKETS_MS:
+                    if v <= limite:
+                        buckets[f"<={limite}"] += 1
+                        break
+                else:
+                    buckets['>10000'] += 1
+
+            resultado[etapa] = {
+                'muestras': len(valores),
+                'p50': round(_percentil(valores, 50), 2),
+                'p90': round(_percentil(valores, 90), 2),
+                'p99': round(_percentil(valores, 99), 2),
+                'max': round(valores[-1], 2),
+                'promedio': round(sum(valores) / len(valores), 2),
+                'buckets': buckets
+            }
+        return resultado
+
+    def limpiar(self):
+        with self._lock:
+            self._datos.clear()
+            self._ventas_lentas.clear()
+
+
+def _percentil(valores_ordenados, p):
+    """Percentil por rango más cercano sobre una lista ya ordenada"""
+    if not valores_ordenados:
+        return 0.0
+    indice = max(0, min(len(valores_ordenados) - 1,
+                        math.ceil(p * len(valores_ordenados) / 100.0) - 1))
+    return valores_ordenados[indice]
+
+
+histograma_etapas = HistogramaEtapas()
+_lock_archivo = threading.Lock()
+
+
+def _registrar_venta_lenta(tiempos, status_code, datos_respuesta):
+    """Guarda el desglose completo de una venta lenta en memoria y en el log"""
+    registro = {
+        'fecha': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+        'usuario_id': _valor_sesion('user_id'),
+        'status': status_code,
+        'factura_id': datos_respuesta.get('factura_id') if isinstance(datos_respuesta, dict) else None,
+        'numero': datos_respuesta.get('numero') if isinstance(datos_respuesta, dict) else None,
+        'tiempos': tiempos
+    }
+    histograma_etapas.registrar_lenta(registro)
+
+    print(f"🐢 VENTA LENTA ({tiempos.get('total', 0):.0f} ms): "
+          + ' | '.join(f"{k}={v:.0f}" for k, v in tiempos.items() if k != 'total'))
+
+    try:
+        with _lock_archivo:
+            os.makedirs(os.path.dirname(ARCHIVO_VENTAS_LENTAS), exist_ok=True)
+            with open(ARCHIVO_VENTAS_LENTAS, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(registro, ensure_ascii=False) + '\n')
+    except Exception as e:
+        print(f"⚠️ No se pudo escribir log de ventas lentas: {e}")
+
+
+def _valor_sesion(clave):
+    from flask import session
+    try:
+        return session.get(clave)
+    except RuntimeError:
+        return None
+
+
+# ═══════════════════════════════════════════════════════════════════════════════
+# DECORADOR PARA LA VISTA DE VENTA
+# ═══════════════════════════════════════════════════════════════════════════════
+
+def medir_etapas_venta(f):
+    """
+    Decorador para procesar_venta: crea el cronómetro en g, y al terminar
+    agrega Server-Timing + campo 'tiempos' a la respuesta JSON, alimenta el
+    histograma y registra la venta si superó el umbral.
+    """
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        cronometro = CronometroVenta()
+        g.cronometro_venta = cronometro
+
+        respuesta = f(*args, **kwargs)
+
+        cronometro.finalizar()
+        tiempos = cronometro.resumen()
+
+        # La vista puede devolver Response o (Response, status)
+        respuesta_final = current_app.make_response(respuesta)
+
+        datos = None
+        if respuesta_final.is_json:
+            datos = respuesta_final.get_json(silent=True)
+            if isinstance(datos, dict):
+                datos['tiempos'] = tiempos
+                respuesta_final.set_data(json.dumps(datos, ensure_ascii=False))
+
+        respuesta_final.headers['Server-Timing'] = cronometro.header_server_timing()
+
+        histograma_etapas.registrar(tiempos)
+
+        umbral = current_app.config.get('VENTA_LENTA_UMBRAL_MS', UMBRAL_VENTA_LENTA_MS)
+        if tiempos['total'] >= umbral:
+            _registrar_venta_lenta(tiempos, respuesta_final.status_code, datos)
+
+        return respuesta_final
+
+    return decorated_function
+
+
+# ═══════════════════════════════════════════════════════════════════════════════
+# ENDPOINTS DE CONSULTA
+# ═══════════════════════════════════════════════════════════════════════════════
+
+@timing_ventas_bp.route('/api/timing_ventas')
+def api_timing_ventas():
+    """Histograma de tiempos por etapa de las últimas ventas"""
+    if 'user_id' not in session:
+        return jsonify({'error': 'No autorizado'}), 401
+    
+    return jsonify({
+        'success': True,
+        'umbral_ms': current_app.config.get('VENTA_LENTA_UMBRAL_MS', UMBRAL_VENTA_LENTA_MS),
+        'etapas': histograma_etapas.resumen()
+    })
+
+
+@timing_ventas_bp.route('/api/timing_ventas/lentas')
+def api_ventas_lentas():
+    """Últimas ventas que superaron el umbral, con su desglose completo"""
+    if 'user_id' not in session:
+        return jsonify({'error': 'No autorizado'}), 401
+    
+    limit = max(1, min(request.args.get('limit', MAX_VENTAS_LENTAS, type=int) or MAX_VENTAS_LENTAS,
+                       MAX_VENTAS_LENTAS))
+    lentas = histograma_etapas.ventas_lentas()[-limit:]
+    return jsonify({
+        'success': True,
+        'ventas': list(reversed(lentas)),
+        'total': len(lentas)
+    })
+
+
+@timing_ventas_bp.route('/api/timing_ventas/reset', methods=['POST'])
+def api_reset_timing_ventas():
+    """Vaciar el histograma en memoria"""
+    if 'user_id' not in session:
+        return jsonify({'error': 'No autorizado'}), 401
+    
+    histograma_etapas.limpiar()
+    return jsonify({'success': True})
+
+
+# ═══════════════════════════════════════════════════════════════════════════════
+# INICIALIZACIÓN
+# ═══════════════════════════════════════════════════════════════════════════════
+
+def init_timing_ventas(app):
+    """Inicializa el módulo de tiempos por etapa de venta"""
+    app.register_blueprint(timing_ventas_bp)
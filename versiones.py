@@ -0,0 +1,207 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+versiones.py - VERSIONES POR ENTIDAD Y GET CONDICIONAL (ETag / Last-Modified)
+═══════════════════════════════════════════════════════════════════════════════
+Los endpoints de lectura que las pantallas consultan seguido (clientes,
+categorías, acceso rápido, ofertas, catálogo de pedidos...) responden 304
+cuando nada cambió desde la última vez, sin consultar ni serializar nada:
+
+    @app.route('/api/clientes')
+    @get_condicional('cliente')
+    def api_clientes(): ...
+
+VERSIONES
+    entidad_version     un contador por entidad ('cliente', 'gasto', ...),
+                        incrementado con incrementar_version() DESPUÉS del
+                        commit de cada escritura.
+    'catalogo'          productos y ofertas: la versión es MAX(id) de
+                        catalogo_cambio (la misma del cache del catálogo),
+                        así que invalidar_catalogo() ya la hace avanzar.
+
+Cada proceso lee todas las versiones con una sola consulta como mucho cada
+VERSIONES_INTERVALO segundos; en el medio un 304 no toca la base.
+
+El ETag combina la ruta, los parámetros, las versiones de las entidades y
+(opcionalmente) una variante de la sesión, p.ej. la lista de precios.
+═══════════════════════════════════════════════════════════════════════════════
+"""
+
+from flask import request, session, make_response
+from werkzeug.http import is_resource_modified
+from sqlalchemy import text
+from functools import wraps
+from datetime import datetime, timezone
+import threading
+import hashlib
+import time
+
+# Variable global para db (se inicializa en init_versiones)
+db = None
+
+INTERVALO_CHEQUEO = 0.5    # segundos entre lecturas de versiones
+CACHE_CONTROL = 'private, no-cache'
+
+
+def init_versiones(app, database):
+    """
+    Inicializa las versiones por entidad
+
+    Uso en app.py:
+        from versiones import init_versiones, get_condicional, incrementar_version
+        init_versiones(app, db)
+    """
+    global db, INTERVALO_CHEQUEO
+    db = database
+    INTERVALO_CHEQUEO = app.config.get('VERSIONES_INTERVALO', INTERVALO_CHEQUEO)
+    print("✅ Versiones por entidad (GET condicional) inicializadas")
+
+
+_tabla_verificada = False
+
+
+def asegurar_tabla_versiones():
+    """Crea entidad_version si no existe (una sola vez por proceso)"""
+    global _tabla_verificada
+    if _tabla_verificada:
+        return
+    with db.engine.begin() as conn:
+        conn.execute(text("""
+            CREATE TABLE IF NOT EXISTS entidad_version (
+                entidad VARCHAR(40) NOT NULL,
+                version BIGINT NOT NULL DEFAULT 0,
+                fecha TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+                PRIMARY KEY (entidad)
+            ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
+        """))
+    _tabla_verificada = True
+
+
+# ═══════════════════════════════════════════════════════════════════════════════
+# CONTADORES
+# ═══════════════════════════════════════════════════════════════════════════════
+
+class _Versiones:
+    """Copia en memoria de todas las versiones: {entidad: (version, fecha)}"""
+
+    def __init__(self):
+        self._valores = None
+        self._ultimo_chequeo = 0.0
+        self._forzar_chequeo = False
+        self._lock = threading.Lock()
+
+    def marcar_desactualizado(self):
+        self._forzar_chequeo = True
+
+    def obtener(self):
+        valores = self._valores
+        if (valores is not None and not self._forzar_chequeo
+                and time.monotonic() - self._ultimo_chequeo < INTERVALO_CHEQUEO):
+            return valores
+
+        with self._lock:
+            if (self._valores is not None and not self._forzar_chequeo
+                    and time.monotonic() - self._ultimo_chequeo < INTERVALO_CHEQUEO):
+                return self._valores
+            asegurar_tabla_versiones()
+            self._forzar_chequeo = False
+            self._ultimo_chequeo = time.monotonic()
+
+            # Conexión propia: no abrir ni cerrar la transacción de la request
+            with db.engine.connect() as conn:
+                filas = conn.execute(text("""
+                    SELECT entidad, version, UNIX_TIMESTAMP(fecha) AS fecha FROM entidad_version
+                    UNION ALL
+                    SELECT 'catalogo', COALESCE(MAX(id), 0), UNIX_TIMESTAMP(MAX(fecha)) FROM catalogo_cambio
+                """)).fetchall()
+            # Last-Modified va en UTC: UNIX_TIMESTAMP evita depender de la zona del servidor
+            self._valores = {
+                row.entidad: (int(row.version),
+                              datetime.fromtimestamp(int(row.fecha), timezone.utc) if row.fecha else None)
+                for row in filas
+            }
+            return self._valores
+
+
+versiones = _Versiones()
+
+
+def incrementar_version(*entidades):
+    """
+    Avanza la versión de una o más entidades (p.ej. 'cliente', 'gasto').
+
+    Llamar DESPUÉS del commit de la escritura, igual que invalidar_catalogo().
+    Nunca rompe la operación: si falla, como mucho un cliente recibe datos
+    viejos hasta el próximo cambio.
+    """
+    try:
+        asegurar_tabla_versiones()
+        with db.engine.begin() as conn:
+            conn.execute(text("""
+                INSERT INTO entidad_version (entidad, version, fecha)
+                VALUES (:entidad, 1, NOW())
+                ON DUPLICATE KEY UPDATE version = version + 1, fecha = NOW()
+            """), [{'entidad': entidad} for entidad in entidades])
+    except Exception as e:
+        print(f"⚠️ Error incrementando versión de {', '.join(entidades)}: {e}")
+    versiones.marcar_desactualizado()
+
+
+# ═══════════════════════════════════════════════════════════════════════════════
+# GET CONDICIONAL
+# ═══════════════════════════════════════════════════════════════════════════════
+
+def _etag(entidades, valores, variante):
+    partes = [request.path, request.query_string.decode('latin-1'), repr(variante)]
+    partes += [f"{entidad}:{valores.get(entidad, (0, None))[0]}" for entidad in entidades]
+    return hashlib.sha1('|'.join(partes).encode('utf-8')).hexdigest()[:20]
+
+
+def _ultima_modificacion(entidades, valores):
+    fechas = [valores[entidad][1] for entidad in entidades
+              if entidad in valores and valores[entidad][1] is not None]
+    return max(fechas) if fechas else None
+
+
+def get_condicional(*entidades, requiere_sesion='user_id', variante=None):
+    """
+    Decorador de endpoints GET: responde 304 sin ejecutar la vista si el
+    cliente ya tiene la versión vigente (If-None-Match / If-Modified-Since).
+
+    Args:
+        entidades: entidades de las que dependen los datos ('catalogo', 'cliente', ...)
+        requiere_sesion: clave de sesión requerida; sin ella la vista se
+            ejecuta normalmente (y responde su 401). None = endpoint público
+        variante: función sin argumentos cuyo resultado también distingue la
+            respuesta (p.ej. la lista de precios de la sesión)
+    """
+    def decorador(vista):
+        @wraps(vista)
+        def envoltura(*args, **kwargs):
+            if requiere_sesion and requiere_sesion not in session:
+                return vista(*args, **kwargs)
+
+            try:
+                valores = versiones.obtener()
+            except Exception as e:
+                print(f"⚠️ Versiones no disponibles, respuesta sin ETag: {e}")
+                return vista(*args, **kwargs)
+
+            etag = _etag(entidades, valores, variante() if variante else None)
+            ultima_modificacion = _ultima_modificacion(entidades, valores)
+
+            if not is_resource_modified(request.environ, etag=etag,
+                                        last_modified=ultima_modificacion):
+                respuesta = make_response('', 304)
+            else:
+                respuesta = make_response(vista(*args, **kwargs))
+                if respuesta.status_code != 200:
+                    return respuesta
+
+            respuesta.set_etag(etag)
+            if ultima_modificacion:
+                respuesta.last_modified = ultima_modificacion
+            respuesta.headers['Cache-Control'] = CACHE_CONTROL
+            return respuesta
+        return envoltura
+    return decorador